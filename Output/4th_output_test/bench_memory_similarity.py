@@ -0,0 +1,78 @@
+"""
+대화 기록 유사도 계산 마이크로 벤치마크
+
+기존 방식(결과 항목마다 normalize_embedding → cosine_similarity를 파이썬 루프로 호출, 항목마다 디버그 출력)과
+메모리 색인 방식(미리 정규화된 float32 행렬과 질문 벡터의 행렬 곱 한 번 + 임계값 마스크)을 비교합니다.
+
+    python Output/4th_output_test/bench_memory_similarity.py
+"""
+
+import io
+import os
+import sys
+import time
+import contextlib
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from memory_index import SessionMemoryIndex
+
+DIMENSION = 1536  # text-embedding-3-small 차원
+SIZES = (5, 100, 1000, 5000)  # 비교할 항목 수 (5는 기존 query 결과 수)
+REPEAT = 20
+
+
+def legacy_normalize_embedding(embedding):
+    embedding = np.array(embedding)
+    norm = np.linalg.norm(embedding)
+    if norm == 0:
+        return embedding
+    normalized = np.round(embedding / norm, decimals=6)
+    print(f"[DEBUG] 정규화 후 L2 norm: {np.linalg.norm(normalized):.6f}")
+    return normalized
+
+
+def legacy_cosine_similarity(v1, v2):
+    v1, v2 = np.array(v1), np.array(v2)
+    norm_v1, norm_v2 = np.linalg.norm(v1), np.linalg.norm(v2)
+    print(f"[DEBUG] 벡터 정규화 확인 - v1: {norm_v1:.6f}, v2: {norm_v2:.6f}")
+    return np.round(np.dot(v1, v2) / (norm_v1 * norm_v2), decimals=6)
+
+
+def legacy_search(query, stored, threshold=0.8):
+    """기존 get_relevant_conversations의 유사도 루프 (저장소가 돌려준 임베딩 리스트를 항목마다 처리)"""
+    found = []
+    for idx, embedding in enumerate(stored):
+        similarity = legacy_cosine_similarity(query, legacy_normalize_embedding(embedding))
+        print(f"대화 {idx+1} 코사인 유사도: {similarity:.6f}")
+        if similarity > threshold:
+            found.append((similarity, idx))
+    return found
+
+
+def measure(fn, repeat=REPEAT):
+    with contextlib.redirect_stdout(io.StringIO()):  # 디버그 출력은 버리되 문자열 포맷 비용은 포함
+        started = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    rng = np.random.default_rng(0)
+    query = rng.normal(size=DIMENSION)
+    print(f"{'항목 수':>8} {'기존 루프(ms)':>14} {'행렬 연산(ms)':>14} {'배율':>8}")
+    for size in SIZES:
+        vectors = rng.normal(size=(size, DIMENSION))
+        stored = [vector.tolist() for vector in vectors]  # 저장소가 돌려주는 형태
+        index = SessionMemoryIndex()
+        for i, vector in enumerate(vectors):
+            index.add(f'h{i}', f'id{i}', f'doc{i}', {}, vector)
+        legacy_ms = measure(lambda: legacy_search(query, stored))
+        matrix_ms = measure(lambda: index.search(query, 3, min_similarity=0.8))
+        print(f"{size:>8} {legacy_ms:>14.3f} {matrix_ms:>14.3f} {legacy_ms / max(matrix_ms, 1e-9):>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+import unittest
+import tempfile
+import shutil
+import os
+from unittest.mock import patch
+import github_analyzer
+from answer_cache import AnswerCache, normalize_question, is_cacheable_question
+
+REPO = 'https://github.com/owner/repo'
+
+class TestAnswerCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = AnswerCache(threshold=0.95, max_entries=2, max_buckets=2)
+
+    def test_exact_question_hit_without_embedding(self):
+        self.cache.put(REPO, 'c1', '진입점이 어디야?', None, 'app.py')
+        hit = self.cache.get(REPO + '.git', 'c1', '  진입점이   어디야 ')
+        self.assertEqual(hit['answer'], 'app.py')
+        self.assertEqual(self.cache.stats()['hits'], 1)
+
+    def test_semantic_hit_and_threshold(self):
+        self.cache.put(REPO, 'c1', '로그인은 어떻게 동작해', [1.0, 0.0], 'OAuth')
+        self.assertEqual(self.cache.get(REPO, 'c1', '로그인 동작 방식 알려줘', [0.99, 0.05])['answer'], 'OAuth')
+        self.assertIsNone(self.cache.get(REPO, 'c1', 'DB 구조 알려줘', [0.0, 1.0]))
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['hit_rate']), (1, 1, 0.5))
+
+    def test_commit_change_misses(self):
+        self.cache.put(REPO, 'c1', '진입점이 어디야', [1.0, 0.0], 'app.py')
+        self.assertIsNone(self.cache.get(REPO, 'c2', '진입점이 어디야', [1.0, 0.0]))
+        self.assertIsNone(self.cache.get(REPO, None, '진입점이 어디야', [1.0, 0.0]))
+
+    def test_context_dependent_questions_not_cached(self):
+        self.assertFalse(is_cacheable_question('그거 다시 설명해줘'))
+        self.cache.put(REPO, 'c1', '그거 다시 설명해줘', [1.0, 0.0], 'x')
+        self.assertEqual(self.cache.stats()['entries'], 0)
+
+    def test_eviction_and_invalidate(self):
+        for i in range(3):
+            self.cache.put(REPO, 'c1', f'질문 번호 {i}', None, str(i))
+        self.assertIsNone(self.cache.get(REPO, 'c1', '질문 번호 0'))
+        self.assertEqual(self.cache.get(REPO, 'c1', '질문 번호 2')['answer'], '2')
+        self.cache.invalidate(REPO)
+        self.assertEqual(self.cache.stats()['entries'], 0)
+
+    def test_normalize_question(self):
+        self.assertEqual(normalize_question(' a\n b?! '), 'a b')
+
+class TestRepoHeadCommit(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.git_dir = os.path.join(self.temp_dir, 's1', '.git')
+        os.makedirs(os.path.join(self.git_dir, 'refs', 'heads'))
+        self.patch = patch.object(github_analyzer, 'REPOS_PATH', self.temp_dir)
+        self.patch.start()
+
+    def tearDown(self):
+        self.patch.stop()
+        shutil.rmtree(self.temp_dir)
+
+    def _write(self, name, text):
+        with open(os.path.join(self.git_dir, name), 'w') as f:
+            f.write(text)
+
+    def test_reads_branch_ref_and_packed_refs(self):
+        self._write('HEAD', 'ref: refs/heads/main\n')
+        self._write('packed-refs', '# pack-refs\nabc123 refs/heads/main\n')
+        self.assertEqual(github_analyzer.repo_head_commit('s1'), 'abc123')
+        self._write(os.path.join('refs', 'heads', 'main'), 'def456\n')
+        self.assertEqual(github_analyzer.repo_head_commit('s1'), 'def456')
+        self._write('HEAD', 'fff000\n')  # detached HEAD
+        self.assertEqual(github_analyzer.repo_head_commit('s1'), 'fff000')
+        self.assertIsNone(github_analyzer.repo_head_commit('missing'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -17,10 +17,10 @@ class TestChatHandler(unittest.TestCase):
         }
 
     @patch('chat_handler.openai')
-    @patch('chat_handler.chroma_client')
+    @patch('chat_handler.get_repo_store')
     @patch('chat_handler.save_conversation')
     @patch('chat_handler.sessions', {'test_session': {'repo_url': 'https://github.com/test/repo', 'directory_structure': 'test.py', 'token': 'test_token'}})
-    def test_handle_chat(self, mock_save, mock_chroma, mock_openai):
+    def test_handle_chat(self, mock_save, mock_get_store, mock_openai):
         # Mock OpenAI embeddings
         mock_embedding = MagicMock()
         mock_embedding.data = [MagicMock(embedding=[0.1, 0.2, 0.3])]
@@ -28,7 +28,7 @@ class TestChatHandler(unittest.TestCase):
 
         # Mock ChromaDB
         mock_collection = MagicMock()
-        mock_chroma.get_collection.return_value = mock_collection
+        mock_get_store.return_value = mock_collection
         mock_collection.count.return_value = 1
         mock_collection.query.return_value = {
             'documents': [['Test content']],
@@ -0,0 +1,146 @@
+import unittest
+import tempfile
+import shutil
+import os
+import ast
+from unittest.mock import patch
+import github_analyzer
+from code_graph import CodeGraph, js_references, js_imports
+
+ROUTES = '''from .service import handle_login
+import util
+
+def login_route(request):
+    user = handle_login(request.form)
+    return util.render(user)
+'''
+
+SERVICE = '''from app.db import find_user
+
+class AuthService:
+    def check(self, user):
+        return verify_password(user)
+
+def handle_login(form):
+    user = find_user(form['id'])
+    AuthService().check(user)
+    return user
+
+def verify_password(user):
+    return save(user)
+'''
+
+DB = '''def find_user(user_id):
+    return save(user_id)
+
+def save(value):
+    return value
+'''
+
+UTIL = '''def render(value):
+    return str(value)
+
+def save(value):
+    return value
+'''
+
+def build_graph():
+    graph = CodeGraph()
+    for path, source in [('app/routes.py', ROUTES), ('app/service.py', SERVICE), ('app/db.py', DB), ('util.py', UTIL)]:
+        graph.add_python_module(path, ast.parse(source))
+    graph.resolve()
+    return graph
+
+class TestCodeGraph(unittest.TestCase):
+    def setUp(self):
+        self.graph = build_graph()
+
+    def test_imports_resolved_to_repo_files(self):
+        self.assertEqual(self.graph.imports['app/routes.py'], ['app/service.py', 'util.py'])
+        self.assertEqual(self.graph.imports['app/service.py'], ['app/db.py'])
+
+    def test_calls_and_callers(self):
+        calls = self.graph.calls['app/service.py::handle_login']
+        self.assertEqual(calls, ['app/db.py::find_user', 'app/service.py::AuthService.check', 'app/service.py::AuthService'])
+        self.assertEqual(self.graph.callers['app/service.py::handle_login'], ['app/routes.py::login_route'])
+        self.assertEqual(self.graph.calls['app/routes.py::login_route'], ['app/service.py::handle_login', 'util.py::render'])
+
+    def test_reference_resolution_order(self):
+        """같은 파일 → import한 파일 → 저장소 전체에서 유일한 정의 순, 정할 수 없으면 연결하지 않음"""
+        self.assertEqual(self.graph.calls['app/db.py::find_user'], ['app/db.py::save'])
+        self.assertEqual(self.graph.calls['app/service.py::verify_password'], ['app/db.py::save'])  # db.py를 import
+        graph = CodeGraph()
+        graph.add_definition('a.py', 'save', 1, 2, 'function')
+        graph.add_definition('b.py', 'save', 1, 2, 'function')
+        graph.add_definition('c.py', 'run', 1, 2, 'function', ['save'])
+        graph.resolve()
+        self.assertNotIn('c.py::run', graph.calls)
+
+    def test_node_at_and_neighbours(self):
+        self.assertEqual(self.graph.node_at('app/service.py', 5)['qualified_name'], 'AuthService.check')
+        self.assertEqual(self.graph.node_at('app/service.py', 5)['kind'], 'method')
+        self.assertIsNone(self.graph.node_at('app/service.py', 1))
+        neighbours = self.graph.neighbours('app/service.py', 8, limit=3)
+        self.assertEqual([(n['relation'], n['qualified_name']) for n in neighbours],
+                         [('callee', 'find_user'), ('caller', 'login_route'), ('callee', 'AuthService.check')])
+        self.assertEqual(neighbours[0]['via'], 'handle_login')
+
+    def test_expand_skips_seeds_and_duplicates(self):
+        seeds = [{'path': 'app/routes.py', 'start_line': 5}, {'path': 'app/service.py', 'start_line': 8}]
+        found = [n['qualified_name'] for n in self.graph.expand(seeds, limit=10)]
+        self.assertNotIn('handle_login', found)
+        self.assertNotIn('login_route', found)
+        self.assertEqual(found[0], 'render')
+        self.assertEqual(len(found), len(set(found)))
+
+    def test_save_and_load(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            self.graph.commit = 'abc123'
+            path = os.path.join(temp_dir, 'graph.json')
+            self.graph.save(path)
+            loaded = CodeGraph.load(path)
+            self.assertEqual(loaded.commit, 'abc123')
+            self.assertEqual(len(loaded), len(self.graph))
+            self.assertEqual(loaded.callers, self.graph.callers)
+            self.assertEqual(loaded.node_at('app/db.py', 2)['name'], 'find_user')
+            self.assertIsNone(CodeGraph.load(os.path.join(temp_dir, 'missing.json')))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_stale_graph_is_not_used(self):
+        """그래프를 만든 커밋과 클론 HEAD가 다르면 사용하지 않음"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            with patch.object(github_analyzer, 'REPOS_PATH', os.path.join(temp_dir, 'repos')), \
+                 patch.object(github_analyzer, 'CODE_GRAPH_PATH', os.path.join(temp_dir, 'graphs')):
+                git_dir = os.path.join(temp_dir, 'repos', 'graph_session', '.git')
+                os.makedirs(git_dir)
+                os.makedirs(github_analyzer.CODE_GRAPH_PATH)
+                self.graph.commit = 'abc123'
+                self.graph.save(github_analyzer.code_graph_file('graph_session'))
+                with open(os.path.join(git_dir, 'HEAD'), 'w') as f:
+                    f.write('abc123\n')
+                self.assertEqual(len(github_analyzer.get_code_graph('graph_session')), len(self.graph))
+                with open(os.path.join(git_dir, 'HEAD'), 'w') as f:
+                    f.write('def456\n')  # 로컬 커밋 적용 후
+                self.assertIsNone(github_analyzer.get_code_graph('graph_session'))
+        finally:
+            github_analyzer.release_repo_index('graph_session')
+            shutil.rmtree(temp_dir)
+
+    def test_js_helpers(self):
+        self.assertEqual(js_imports(["import api from './api';", "const x = require('../lib/x')", "import 'react'"]),
+                         ['./api', '../lib/x', 'react'])
+        self.assertEqual(js_references("function load() { if (a) { fetchData(id); } return load(); }", 'load'),
+                         ['fetchData'])
+        graph = CodeGraph()
+        graph.add_imports('src/app.js', ['./api', 'react'])
+        graph.add_definition('src/app.js', 'main', 1, 3, 'function', ['fetchData'])
+        graph.add_definition('src/api.js', 'fetchData', 1, 5, 'function')
+        graph.resolve()
+        self.assertEqual(graph.imports['src/app.js'], ['src/api.js'])
+        self.assertEqual(graph.calls['src/app.js::main'], ['src/api.js::fetchData'])
+
+if __name__ == '__main__':
+    unittest.main()
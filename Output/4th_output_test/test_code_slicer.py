@@ -0,0 +1,73 @@
+import unittest
+from code_slicer import (find_definitions, import_header, enclosing_definition, slice_file,
+                         pack_modify_context, parse_region_edits, apply_region_edits)
+
+def make_source():
+    lines = ['"""모듈 설명"""', 'import os', 'from typing import List', '']
+    for i in range(40):
+        lines += [f'def helper_{i}(x):', f'    y = x + {i}', f'    return y * {i}', '']
+    lines += ['class Target:', '    def run(self):', '        value = compute()', '        return value', '']
+    return '\n'.join(lines) + '\n'
+
+class TestCodeSlicer(unittest.TestCase):
+    def setUp(self):
+        self.source = make_source()
+        self.lines = self.source.splitlines()
+        self.run_line = self.lines.index('    def run(self):') + 1
+
+    def test_definitions_and_header(self):
+        definitions = find_definitions(self.source, 'mod.py')
+        self.assertEqual(len(definitions), 42)
+        self.assertEqual(import_header(self.lines, 'mod.py'), (1, 3))
+        self.assertEqual(find_definitions(self.source, 'mod.js'), [])
+        js = ['// util', "import React from 'react';", "const fs = require('fs');", '', 'function a() {}']
+        self.assertEqual(import_header(js, 'a.js'), (1, 3))
+
+    def test_enclosing_definition_is_innermost(self):
+        definitions = find_definitions(self.source, 'mod.py')
+        found = enclosing_definition(definitions, self.run_line + 1, self.run_line + 1)
+        self.assertEqual(found['name'], 'run')
+        self.assertIsNone(enclosing_definition(definitions, 2, 2))
+
+    def test_small_file_is_sent_whole(self):
+        piece = slice_file('mod.py', self.source, [(self.run_line, self.run_line)], budget=100000)
+        self.assertTrue(piece['whole'])
+        self.assertIn('def helper_0', piece['text'])
+
+    def test_slice_expands_to_function_with_header_and_outline(self):
+        piece = slice_file('mod.py', self.source, [(self.run_line + 1, self.run_line + 1)], budget=300)
+        self.assertFalse(piece['whole'])
+        self.assertEqual(piece['regions'], [(1, 3), (self.run_line, self.run_line + 2)])
+        self.assertIn('// REGION: 1-3\n"""모듈 설명"""\nimport os', piece['text'])
+        self.assertIn('        value = compute()', piece['text'])
+        self.assertIn('L5-7 def helper_0(x):', piece['text'])
+        self.assertNotIn('y = x + 0', piece['text'])
+        self.assertLessEqual(piece['tokens'], 300)
+
+    def test_pack_splits_budget(self):
+        files = [{'path': 'a.py', 'source': self.source, 'ranges': [(5, 5)]},
+                 {'path': 'b.py', 'source': self.source, 'ranges': []}]
+        slices = pack_modify_context(files, budget=400)
+        self.assertEqual([s['path'] for s in slices], ['a.py', 'b.py'])
+        self.assertLessEqual(sum(s['tokens'] for s in slices), 400)
+        self.assertIn((5, 7), slices[0]['regions'])
+
+    def test_parse_and_apply_region_edits(self):
+        code = ('```python\n// REGION: 5-7\ndef helper_0(x):\n    return x\n\n'
+                '// REGION: 1-3\nimport os\n```\n설명: 변경했습니다.\n// FILE: other.py\n// REGION: 1-1\nx')
+        edits = parse_region_edits(code)
+        self.assertEqual(edits, [(5, 7, 'def helper_0(x):\n    return x'), (1, 3, 'import os')])
+        merged = apply_region_edits(self.source, edits, [(1, 3), (5, 7)])
+        merged_lines = merged.splitlines()
+        self.assertEqual(merged_lines[:5], ['import os', '', 'def helper_0(x):', '    return x', ''])
+        self.assertEqual(len(merged_lines), len(self.lines) - 3)
+        self.assertTrue(merged.endswith('\n'))
+
+    def test_apply_rejects_bad_regions(self):
+        self.assertIsNone(apply_region_edits(self.source, [(5, 7, 'x')], [(1, 3)]))
+        self.assertIsNone(apply_region_edits(self.source, [(1, 5, 'a'), (4, 6, 'b')]))
+        self.assertIsNone(apply_region_edits(self.source, [(1, 99999, 'a')]))
+        self.assertEqual(parse_region_edits('// FILE: a.py\ndef f(): pass'), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+from unittest.mock import MagicMock
+import chromadb
+from collection_registry import CollectionRegistry
+
+class TestCollectionRegistry(unittest.TestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        self.collections = {}
+
+        def get_collection(name, **kwargs):
+            if name not in self.collections:
+                raise chromadb.errors.NotFoundError(f"Collection [{name}] does not exists")
+            return self.collections[name]
+
+        def get_or_create_collection(name, **kwargs):
+            return self.collections.setdefault(name, MagicMock(name=name))
+
+        self.client.get_collection.side_effect = get_collection
+        self.client.get_or_create_collection.side_effect = get_or_create_collection
+        self.registry = CollectionRegistry(self.client, capacity=2)
+
+    def test_get_caches_handle_without_listing(self):
+        """한 번 연 핸들은 다시 조회하지 않음"""
+        self.collections['repo_a'] = MagicMock()
+        self.assertIs(self.registry.get('repo_a'), self.collections['repo_a'])
+        self.registry.get('repo_a')
+        self.assertEqual(self.client.get_collection.call_count, 1)
+        self.client.list_collections.assert_not_called()
+
+    def test_missing_collection_returns_none(self):
+        """없는 컬렉션은 None"""
+        self.assertIsNone(self.registry.get('repo_missing'))
+        self.assertNotIn('repo_missing', self.registry)
+
+    def test_count_is_cached_until_invalidated(self):
+        """문서 수는 무효화 전까지 캐시"""
+        collection = MagicMock()
+        collection.count.return_value = 3
+        self.collections['repo_a'] = collection
+        self.assertEqual(self.registry.count('repo_a'), 3)
+        self.assertEqual(self.registry.count('repo_a'), 3)
+        self.assertEqual(collection.count.call_count, 1)
+
+        collection.count.return_value = 5
+        self.registry.invalidate_count('repo_a')
+        self.assertEqual(self.registry.count('repo_a'), 5)
+
+    def test_lru_eviction(self):
+        """용량 초과 시 가장 오래 쓰지 않은 핸들 제거"""
+        for name in ('repo_a', 'repo_b', 'repo_c'):
+            self.collections[name] = MagicMock()
+        self.registry.get('repo_a')
+        self.registry.get('repo_b')
+        self.registry.get('repo_a')
+        self.registry.get('repo_c')
+        self.assertIn('repo_a', self.registry)
+        self.assertNotIn('repo_b', self.registry)
+        self.assertEqual(len(self.registry), 2)
+
+    def test_create_and_delete_invalidate(self):
+        """생성·삭제 시 캐시 갱신"""
+        created = self.registry.get_or_create('chat_memory_x')
+        self.assertIsNotNone(created)
+        self.assertIn('chat_memory_x', self.registry)
+        self.assertTrue(self.registry.delete('chat_memory_x'))
+        self.assertNotIn('chat_memory_x', self.registry)
+        self.client.delete_collection.assert_called_once_with('chat_memory_x')
+
+if __name__ == '__main__':
+    unittest.main()
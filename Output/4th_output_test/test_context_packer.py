@@ -0,0 +1,46 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import context_packer
+from context_packer import (ContextPacker, encoding_name_for_model, estimate_tokens,
+                            chunk_tokens, context_budget, count_tokens)
+
+class TestContextPacker(unittest.TestCase):
+    def test_encoding_for_model(self):
+        self.assertEqual(encoding_name_for_model("gpt-4o"), "o200k_base")
+        self.assertEqual(encoding_name_for_model("gpt-4o-mini"), "o200k_base")
+        self.assertEqual(encoding_name_for_model("gpt-3.5-turbo"), "cl100k_base")
+        self.assertEqual(encoding_name_for_model("gpt-4-turbo"), "cl100k_base")
+
+    def test_estimate_tokens(self):
+        self.assertEqual(estimate_tokens(""), 0)
+        self.assertEqual(estimate_tokens("abcd" * 10), 10)
+        self.assertEqual(estimate_tokens("한글"), 2)
+
+    def test_chunk_tokens_prefers_stored_count(self):
+        self.assertEqual(chunk_tokens("x" * 400, {'token_count': 7}), 7)
+        self.assertEqual(chunk_tokens("x" * 400, {}), 100)  # 이전 인덱스는 추정값
+        self.assertEqual(chunk_tokens("x" * 400, None), 100)
+
+    def test_count_tokens_uses_model_encoding(self):
+        encoding = MagicMock()
+        encoding.encode.return_value = [1, 2, 3]
+        with patch.dict(context_packer._encodings, {'o200k_base': encoding}):
+            self.assertEqual(count_tokens("def f(): pass", "gpt-4o"), 3)
+        with patch.dict(context_packer._encodings, {'o200k_base': None}):
+            self.assertEqual(count_tokens("abcdefgh", "gpt-4o"), 2)  # 토크나이저 없으면 추정
+
+    def test_budget_and_packing(self):
+        self.assertEqual(context_budget("abcd", budget=100, reserve=10), 89)
+        packer = ContextPacker(100)
+        self.assertTrue(packer.fits(50, 0.5))
+        packer.add("a", 50)
+        self.assertFalse(packer.fits(1, 0.5))
+        self.assertTrue(packer.fits(40))
+        packer.add("b", 45)
+        self.assertTrue(packer.is_full(0.9))
+        self.assertEqual(packer.remaining, 5)
+        self.assertEqual(packer.text(), "a\n\nb")
+        self.assertEqual(len(packer), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import unittest
+import threading
+import time
+from db_pool import ConnectionPool, PoolTimeout
+from metrics import metrics
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.closed = False
+        self.rollbacks = 0
+        self.pings = 0
+        self.broken = False
+
+    def cursor(self):
+        return f'cursor-{self.number}'
+
+    def rollback(self):
+        if self.broken:
+            raise ConnectionError('gone away')
+        self.rollbacks += 1
+
+    def ping(self, reconnect=False):
+        self.pings += 1
+        if self.broken:
+            raise ConnectionError('gone away')
+
+    def close(self):
+        self.closed = True
+
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self):
+        self.created = []
+
+    def connect(self):
+        connection = FakeConnection(len(self.created))
+        self.created.append(connection)
+        return connection
+
+    def make_pool(self, **kwargs):
+        kwargs.setdefault('timeout', 0.2)
+        kwargs.setdefault('ping_after', None)
+        return ConnectionPool(self.connect, name='test.pool', **kwargs)
+
+    def test_connections_are_reused_and_reset(self):
+        pool = self.make_pool(size=2, max_overflow=0)
+        conn = pool.connection()
+        self.assertEqual(conn.cursor(), 'cursor-0')  # 실제 연결로 위임
+        conn.close()
+        conn.close()  # 두 번 닫아도 한 번만 반납
+        again = pool.connection()
+        self.assertEqual(again.cursor(), 'cursor-0')
+        again.close()
+        self.assertEqual(len(self.created), 1)
+        self.assertEqual(self.created[0].rollbacks, 2)  # 반납할 때마다 트랜잭션 정리
+        self.assertFalse(self.created[0].closed)
+        with self.assertRaises(AttributeError):
+            conn.cursor()  # 반납한 연결은 쓸 수 없음
+
+    def test_overflow_is_closed_and_timeout_raises(self):
+        pool = self.make_pool(size=1, max_overflow=1)
+        first, second = pool.connection(), pool.connection()
+        self.assertEqual(pool.stats()['utilization'], 1.0)
+        with self.assertRaises(PoolTimeout):
+            pool.connection()
+        second.close()
+        first.close()
+        stats = pool.stats()
+        self.assertEqual((stats['open'], stats['idle'], stats['in_use'], stats['peak_in_use']), (1, 1, 0, 2))
+        self.assertEqual(sum(conn.closed for conn in self.created), 1)  # 보관 수를 넘는 연결은 닫음
+
+    def test_waiters_get_released_connection(self):
+        pool = self.make_pool(size=1, max_overflow=0, timeout=5)
+        held = pool.connection()
+        got = []
+        waiter = threading.Thread(target=lambda: got.append(pool.connection()))
+        waiter.start()
+        time.sleep(0.05)
+        held.close()
+        waiter.join(timeout=5)
+        self.assertEqual(got[0].cursor(), 'cursor-0')
+        self.assertIn('test.pool.wait', metrics.snapshot()['timings'])
+
+    def test_unhealthy_connections_are_replaced(self):
+        pool = self.make_pool(size=2, max_overflow=0, ping_after=0)
+        conn = pool.connection()
+        conn.close()
+        self.created[0].broken = True
+        fresh = pool.connection()
+        self.assertEqual(fresh.cursor(), 'cursor-1')
+        self.assertTrue(self.created[0].closed)
+        fresh.close()
+        self.assertEqual(pool.stats()['open'], 1)
+
+        recycled = self.make_pool(size=1, max_overflow=0, recycle=0.01)
+        recycled.connection().close()
+        time.sleep(0.02)
+        recycled.connection().close()
+        self.assertEqual(recycled.stats()['open'], 1)
+        self.assertTrue(self.created[-2].closed)
+
+    def test_request_scope_reuses_one_connection(self):
+        pool = self.make_pool(size=2, max_overflow=0)
+        pool.begin_scope()
+        for _ in range(3):
+            conn = pool.connection()
+            self.assertEqual(conn.cursor(), 'cursor-0')
+            conn.close()
+        self.assertEqual(pool.stats()['in_use'], 1)
+        pool.end_scope()
+        self.assertEqual(pool.stats()['in_use'], 0)
+        self.assertEqual(self.created[0].rollbacks, 1)
+        other = []
+        pool.begin_scope()
+        pool.connection().close()  # 이 스레드가 cursor-0을 요청 끝까지 붙잡음
+        thread = threading.Thread(target=lambda: other.append(pool.connection().cursor()))
+        thread.start()
+        thread.join()
+        pool.end_scope()
+        self.assertEqual(other, ['cursor-1'])  # 요청 범위는 스레드별
+
+    def test_connect_failure_frees_slot(self):
+        def failing():
+            raise ConnectionError('refused')
+        pool = ConnectionPool(failing, size=1, max_overflow=0, timeout=0.1, name='test.pool')
+        for _ in range(2):
+            with self.assertRaises(ConnectionError):
+                pool.connection()
+        self.assertEqual(pool.stats()['open'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
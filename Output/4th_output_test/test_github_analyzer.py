@@ -2,6 +2,8 @@ import unittest
 from unittest.mock import patch, MagicMock
 import os
 import shutil
+import tempfile
+import github_analyzer
 from github_analyzer import GitHubRepositoryFetcher, analyze_repository
 
 class TestGitHubAnalyzer(unittest.TestCase):
@@ -81,5 +83,100 @@ class TestGitHubAnalyzer(unittest.TestCase):
                     self.assertIn('files', result)
                     self.assertIn('directory_structure', result)
 
+class TestDiscardRepoIndex(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.patches = [
+            patch.object(github_analyzer, 'REPOS_PATH', os.path.join(self.temp_dir, 'repos')),
+            patch.object(github_analyzer, 'NUMPY_STORE_PATH', os.path.join(self.temp_dir, 'numpy')),
+            patch.object(github_analyzer, 'LEXICAL_INDEX_PATH', os.path.join(self.temp_dir, 'lexical')),
+            patch.object(github_analyzer, 'SYMBOL_TABLE_PATH', os.path.join(self.temp_dir, 'symbols')),
+            patch.object(github_analyzer, 'CODE_GRAPH_PATH', os.path.join(self.temp_dir, 'graphs')),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        github_analyzer.release_repo_index('partial')
+        for p in self.patches:
+            p.stop()
+        shutil.rmtree(self.temp_dir)
+
+    def test_partial_index_is_discarded_but_clone_kept(self):
+        """인제스트 실패 시 반쯤 만든 인덱스는 지우고 클론은 유지"""
+        clone = os.path.join(github_analyzer.REPOS_PATH, 'partial')
+        os.makedirs(clone)
+        store = github_analyzer.create_vector_store('repo_partial', github_analyzer.repo_collections,
+                                                   github_analyzer.NUMPY_STORE_PATH, 1)
+        store.upsert(['a.py_0'], [[0.1, 0.2]], ['def a(): pass'], [{'path': 'a.py'}])
+        store.flush()  # 일부 배치만 저장된 상태
+        os.makedirs(github_analyzer.LEXICAL_INDEX_PATH)
+        with open(github_analyzer.lexical_index_file('partial'), 'w') as f:
+            f.write('{}')
+        self.assertTrue(github_analyzer.has_repo_index('partial'))
+        self.assertTrue(github_analyzer.discard_repo_index('partial'))
+        self.assertFalse(github_analyzer.has_repo_index('partial'))
+        self.assertFalse(os.path.exists(github_analyzer.lexical_index_file('partial')))
+        self.assertTrue(os.path.isdir(clone))
+
+class TestArtifactCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.loads = []
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def path(self, session_id):
+        return os.path.join(self.temp_dir, f"{session_id}.json")
+
+    def loader(self, session_id):
+        self.loads.append(session_id)
+        if not os.path.exists(self.path(session_id)):
+            return None
+        with open(self.path(session_id)) as f:
+            return f.read()
+
+    def write(self, session_id, content):
+        with open(self.path(session_id), 'w') as f:
+            f.write(content)
+
+    def test_reloads_when_file_changes(self):
+        """다른 워커가 파일을 다시 쓰면(수정 시각 변경) 다시 불러옴"""
+        cache = github_analyzer.ArtifactCache(self.loader, self.path)
+        self.write('s', 'v1')
+        self.assertEqual(cache.get('s'), 'v1')
+        self.assertEqual(cache.get('s'), 'v1')
+        self.assertEqual(self.loads, ['s'])
+        self.write('s', 'v2')
+        os.utime(self.path('s'), (0, 0))
+        self.assertEqual(cache.get('s'), 'v2')
+        self.assertEqual(self.loads, ['s', 's'])
+
+    def test_missing_artifact_is_not_cached(self):
+        cache = github_analyzer.ArtifactCache(self.loader, self.path)
+        self.assertIsNone(cache.get('none'))
+        self.assertNotIn('none', cache)
+
+    def test_lru_eviction(self):
+        cache = github_analyzer.ArtifactCache(self.loader, self.path, max_size=2)
+        for session_id in ('a', 'b', 'c'):
+            self.write(session_id, session_id)
+        cache.get('a')
+        cache.get('b')
+        cache.get('a')  # 'b'가 가장 오래 쓰지 않은 항목
+        cache.get('c')
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertIn('c', cache)
+
+    def test_release_repo_index_evicts_all_artifacts(self):
+        github_analyzer.cache_lexical_index('released', MagicMock())
+        github_analyzer.cache_symbol_table('released', MagicMock())
+        github_analyzer.cache_code_graph('released', MagicMock())
+        self.assertTrue(github_analyzer.is_repo_index_loaded('released'))
+        github_analyzer.release_repo_index('released')
+        self.assertFalse(github_analyzer.is_repo_index_loaded('released'))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,56 @@
+import unittest
+from intent_classifier import (classify_push_intent, classify_question_role, vectorize,
+                               PrototypeClassifier, PUSH_LABEL, NO_PUSH_LABEL,
+                               PUSH_INTENT_LLM_THRESHOLD, PUSH_STRONG_CONFIDENCE,
+                               ROLE_TAG_LLM_THRESHOLD)
+
+class TestIntentClassifier(unittest.TestCase):
+    def test_push_patterns(self):
+        for message in ["이거 깃허브에 올려줘", "PR 생성해줘", "pr해줘", "commit and push", "풀리퀘스트 만들어줘"]:
+            result = classify_push_intent(message)
+            self.assertEqual(result.label, PUSH_LABEL, message)
+            self.assertEqual(result.source, 'pattern')
+
+    def test_english_keywords_use_word_boundaries(self):
+        """'pr'이 print/product에 걸리지 않음"""
+        for message in ["print 함수 고쳐줘", "product 클래스 설명해줘", "compress 로직 설명해줘"]:
+            result = classify_push_intent(message)
+            self.assertEqual(result.label, NO_PUSH_LABEL, message)
+            self.assertEqual(result.source, 'prototype')
+
+    def test_bare_english_keywords_need_llm_check(self):
+        """영문 push/commit/PR 단독이나 식별자 일부는 LLM 확인 대상"""
+        for message in ["pr_number 변수 설명", "what does commit() do", "push 함수는 어디서 호출돼"]:
+            self.assertLess(classify_push_intent(message).confidence, PUSH_INTENT_LLM_THRESHOLD, message)
+        for message in ["PR 생성해줘", "open a PR for this", "github에 push해줘", "커밋해줘"]:
+            result = classify_push_intent(message)
+            self.assertEqual((result.label, result.confidence), (PUSH_LABEL, PUSH_STRONG_CONFIDENCE), message)
+
+    def test_prototype_confidence(self):
+        self.assertEqual(classify_push_intent("레포에 올려주면 좋겠어").label, PUSH_LABEL)
+        result = classify_push_intent("이 버그 고쳐줘")
+        self.assertEqual(result.label, NO_PUSH_LABEL)
+        self.assertGreater(result.confidence, 0.9)
+
+    def test_unfamiliar_code_questions_are_not_confident(self):
+        """예문과 닮지 않은 일반 코드 질문은 낮은 신뢰도로 LLM 확인을 받음"""
+        for message in ["what does apply_changes do", "임베딩은 어떻게 만들어", "handle_chat 함수는 뭐해"]:
+            self.assertLess(classify_push_intent(message).confidence, PUSH_INTENT_LLM_THRESHOLD, message)
+        for message in ["what does apply_changes do", "print 함수 추가해줘", "이 함수 설명해줘"]:
+            self.assertLess(classify_question_role(message).confidence, ROLE_TAG_LLM_THRESHOLD, message)
+
+    def test_question_role(self):
+        self.assertEqual(classify_question_role("DB 테이블 구조 알려줘").label, "데이터베이스 저장 조회")
+        self.assertEqual(classify_question_role("이 프로젝트 진입점이 뭐야").label, "프로젝트 구조 진입점")
+
+    def test_vectorize_is_stable_and_normalized(self):
+        a, b = vectorize("로그인 처리"), vectorize("로그인  처리")
+        self.assertAlmostEqual(float(a @ b), 1.0, places=5)
+        self.assertAlmostEqual(float(a @ a), 1.0, places=5)
+
+    def test_low_confidence_on_ambiguous_input(self):
+        classifier = PrototypeClassifier({'a': ["같은 문장"], 'b': ["같은 문장"]})
+        self.assertAlmostEqual(classifier.classify("같은 문장").confidence, 0.5)
+
+if __name__ == '__main__':
+    unittest.main()
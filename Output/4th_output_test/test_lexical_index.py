@@ -0,0 +1,69 @@
+import unittest
+import tempfile
+import shutil
+import os
+from lexical_index import LexicalIndex, split_identifier, tokenize, is_identifier_query, reciprocal_rank_fusion
+
+class TestLexicalIndex(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.index = LexicalIndex()
+        self.index.add(
+            ids=['github_analyzer.py_0', 'github_analyzer.py_1', 'app.py_0'],
+            documents=[
+                'def load_repo_data(self):\n    return json.load(f)',
+                'class GitHubRepositoryFetcher:\n    pass',
+                '@app.route("/chat")\ndef chat():\n    return handle_chat()',
+            ],
+            metadatas=[
+                {'path': 'github_analyzer.py', 'function_name': 'load_repo_data', 'role_tag': '저장소 데이터 로드'},
+                {'path': 'github_analyzer.py', 'class_name': 'GitHubRepositoryFetcher'},
+                {'path': 'app.py', 'function_name': 'chat', 'role_tag': '채팅 요청 처리'},
+            ]
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_split_identifier(self):
+        """snake_case / camelCase 분리"""
+        self.assertEqual(split_identifier('load_repo_data'), ['load', 'repo', 'data'])
+        self.assertEqual(split_identifier('GitHubRepositoryFetcher'), ['git', 'hub', 'repository', 'fetcher'])
+        self.assertIn('repo', tokenize('loadRepoData'))
+
+    def test_identifier_search(self):
+        """식별자 정확 검색"""
+        hits = self.index.search('load_repo_data', n_results=2)
+        self.assertEqual(hits[0][0], 'github_analyzer.py_0')
+        hits = self.index.search('repository fetcher', n_results=1)
+        self.assertEqual(hits[0][0], 'github_analyzer.py_1')
+
+    def test_where_filter(self):
+        """메타데이터 필터 적용"""
+        hits = self.index.search('def', n_results=5, where={'path': 'app.py'})
+        self.assertEqual([record_id for record_id, _ in hits], ['app.py_0'])
+
+    def test_identifier_query_detection(self):
+        """식별자 질문 판별"""
+        self.assertTrue(is_identifier_query('`load_repo_data`'))
+        self.assertTrue(is_identifier_query('GitHubRepositoryFetcher.load_repo_data()'))
+        self.assertFalse(is_identifier_query('load_repo_data 함수는 뭐 해?'))
+        self.assertTrue(self.index.has_symbol('load_repo_data'))
+        self.assertFalse(self.index.has_symbol('unknown_name'))
+
+    def test_save_and_load(self):
+        """저장 후 불러와도 같은 결과"""
+        path = os.path.join(self.temp_dir, 'repo_test.json')
+        self.index.save(path)
+        loaded = LexicalIndex.load(path)
+        self.assertEqual(len(loaded), 3)
+        self.assertEqual(loaded.search('handle_chat', 1), self.index.search('handle_chat', 1))
+
+    def test_reciprocal_rank_fusion(self):
+        """두 목록에 모두 있는 항목이 상위"""
+        fused = reciprocal_rank_fusion([['a', 'b', 'c'], ['b', 'd']])
+        self.assertEqual(fused[0][0], 'b')
+        self.assertEqual({record_id for record_id, _ in fused}, {'a', 'b', 'c', 'd'})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+import tempfile
+import shutil
+import os
+import time
+from context_packer import estimate_tokens
+from memory_compactor import (truncate_to_tokens, order_turns, SummaryStore, fold_turns, build_history,
+                              TRUNCATED_MARKER, RECENT_TURNS)
+
+def turn(i, answer_length=20):
+    return {'hash': f'h{i}', 'id': f's_h{i}', 'document': f"Q: 질문 {i}\nA: " + '답' * answer_length,
+            'metadata': {'timestamp': f'2026-01-01T00:00:{i:02d}', 'original_question': f'질문 {i}?'}}
+
+class TestMemoryCompactor(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = SummaryStore(self.temp_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_truncate_to_tokens(self):
+        self.assertEqual(truncate_to_tokens('short', 10), 'short')
+        text = truncate_to_tokens('가' * 1000, 100)
+        self.assertTrue(text.endswith(TRUNCATED_MARKER))
+        self.assertLessEqual(estimate_tokens(text), 100)
+
+    def test_order_turns_by_timestamp(self):
+        self.assertEqual([t['hash'] for t in order_turns([turn(3), turn(1), turn(2)])], ['h1', 'h2', 'h3'])
+
+    def test_fold_turns_keeps_recent_and_is_incremental(self):
+        calls = []
+        def summarize(summary, turns):
+            calls.append((summary, len(turns)))
+            return f"{summary}+{len(turns)}"
+        entries = [turn(i) for i in range(RECENT_TURNS + 2)]
+        self.assertTrue(fold_turns('s1', entries, self.store, summarize))
+        self.assertEqual(calls, [('', 2)])
+        self.assertFalse(fold_turns('s1', entries, self.store, summarize))  # 새로 접을 대화 없음
+        self.assertTrue(fold_turns('s1', entries + [turn(10)], self.store, summarize))
+        self.assertEqual(calls[-1], ('+2', 1))
+        reloaded = SummaryStore(self.temp_dir).load('s1')
+        self.assertEqual(reloaded['summary'], '+2+1')
+        self.assertEqual(len(reloaded['folded']), 3)
+        self.assertFalse(fold_turns('s2', entries, self.store, lambda s, t: None))  # 요약 실패 시 그대로
+        self.store.delete('s1')
+        self.assertEqual(SummaryStore(self.temp_dir).load('s1')['summary'], '')
+
+    def test_store_reloads_when_another_worker_writes(self):
+        self.store.save('s1', {'summary': 'A', 'folded': ['h1']})
+        other = SummaryStore(self.temp_dir)  # 다른 워커 프로세스의 저장소
+        self.assertEqual(other.load('s1')['summary'], 'A')
+        time.sleep(0.01)
+        self.store.save('s1', {'summary': 'B', 'folded': ['h1', 'h2']})
+        self.assertEqual(other.load('s1')['summary'], 'B')
+        self.store.delete('s1')
+        self.assertEqual(other.load('s1')['summary'], '')
+
+    def test_build_history_order_and_dedup(self):
+        recent = [turn(8), turn(9)]
+        relevant = [(0.91, turn(2)), (0.85, turn(9))]
+        history = build_history('- 로그인 흐름을 설명함', recent, relevant)
+        sections = [block.split('\n')[0] for block in history.split('\n\n')]
+        self.assertEqual(sections, ['[이전 대화 요약]', "[관련 대화 1 (유사도: 0.910000, 원본: '질문 2?')]",
+                                    '[최근 대화 1]', '[최근 대화 2]'])
+        self.assertEqual(build_history('', [], []), '')
+
+    def test_build_history_enforces_budget(self):
+        recent = [turn(i, answer_length=3000) for i in range(2)]
+        relevant = [(0.9, turn(i, answer_length=3000)) for i in range(3, 6)]
+        for budget in (200, 600, 1500):
+            history = build_history('요약 ' * 500, recent, relevant, budget=budget)
+            self.assertLessEqual(estimate_tokens(history), budget)
+        small = build_history('', recent, relevant, budget=600)
+        self.assertIn('[최근 대화 2]', small)  # 가장 최근 대화가 먼저 자리를 차지
+        self.assertNotIn('[관련 대화', small)
+
+if __name__ == '__main__':
+    unittest.main()
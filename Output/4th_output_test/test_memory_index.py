@@ -0,0 +1,98 @@
+import unittest
+import time
+import threading
+import numpy as np
+from memory_index import SessionMemoryIndex, MemoryIndexCache, WriteBehind
+
+def unit(*values):
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+class TestSessionMemoryIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = SessionMemoryIndex()
+        self.index.add('h1', 's_h1', 'Q: 로그인\nA: 인증', {'original_question': '로그인?'}, [1, 0, 0])
+        self.index.add('h2', 's_h2', 'Q: 메인\nA: 진입점', {}, [0, 1, 0])
+        self.index.add('h3', 's_h3', 'Q: 에러\nA: 예외', {}, [0, 0, 1])
+
+    def test_hash_lookup_and_dedup(self):
+        self.assertTrue(self.index.has('h1'))
+        self.assertEqual(self.index.get('h2')['document'], 'Q: 메인\nA: 진입점')
+        self.assertFalse(self.index.add('h1', 'x', 'dup', {}, [1, 1, 1]))
+        self.assertEqual(len(self.index), 3)
+
+    def test_search_orders_by_cosine(self):
+        found = self.index.search(unit(0.9, 0.1, 0.3), 2)
+        self.assertEqual([entry['hash'] for _, entry in found], ['h1', 'h3'])
+        self.assertGreater(found[0][0], found[1][0])
+        self.assertAlmostEqual(self.index.max_similarity([0, 2, 0]), 1.0, places=5)
+        self.assertEqual(SessionMemoryIndex().search([1, 0, 0], 3), [])
+
+    def test_search_threshold_is_strict(self):
+        found = self.index.search(unit(1, 1, 0), 3, min_similarity=0.7)
+        self.assertEqual(sorted(entry['hash'] for _, entry in found), ['h1', 'h2'])
+        self.assertEqual(self.index.search([1, 0, 0], 3, min_similarity=1.0), [])
+
+    def test_matrix_grows(self):
+        index = SessionMemoryIndex()
+        rng = np.random.default_rng(0)
+        vectors = rng.normal(size=(40, 8))
+        for i, vector in enumerate(vectors):
+            index.add(f'h{i}', f'id{i}', f'doc{i}', {}, vector)
+        self.assertEqual(len(index), 40)
+        self.assertEqual(index.search(vectors[37], 1)[0][1]['id'], 'id37')
+        self.assertFalse(index.add('bad', 'bad', 'bad', {}, [1, 2]))  # 차원이 다르면 추가하지 않음
+
+    def test_from_records(self):
+        index = SessionMemoryIndex.from_records(['a', 'b'], ['doc a', 'doc b'],
+                                                [{'question_hash': 'ha'}, None], np.eye(2))
+        self.assertTrue(index.has('ha'))
+        self.assertTrue(index.has('b'))
+        self.assertEqual(len(SessionMemoryIndex.from_records([], [], [], None)), 0)
+
+class TestMemoryIndexCache(unittest.TestCase):
+    def test_lazy_load_once_and_lru(self):
+        loads = []
+        def loader(session_id):
+            loads.append(session_id)
+            time.sleep(0.05)
+            return SessionMemoryIndex()
+        cache = MemoryIndexCache(loader, capacity=2)
+        threads = [threading.Thread(target=cache.get, args=('s1',)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(loads, ['s1'])  # 동시에 접근해도 한 번만 복원
+        cache.get('s2')
+        cache.get('s3')
+        self.assertNotIn('s1', cache)
+        cache.discard('s3')
+        self.assertNotIn('s3', cache)
+        self.assertIsNone(MemoryIndexCache(lambda s: None).get('x'))
+
+class TestWriteBehind(unittest.TestCase):
+    def test_writes_run_in_order_and_flush_waits(self):
+        written = []
+        writer = WriteBehind("test-writer", enabled=True)
+        for i in range(5):
+            writer.submit('s1', lambda i=i: (time.sleep(0.01), written.append(i)))
+        writer.flush('s1')
+        self.assertEqual(written, [0, 1, 2, 3, 4])
+        self.assertEqual(writer.pending(), 0)
+
+    def test_errors_do_not_stop_writer(self):
+        written = []
+        writer = WriteBehind("test-writer", enabled=True)
+        writer.submit('s1', lambda: 1 / 0)
+        writer.submit('s1', written.append, 'ok')
+        writer.flush()
+        self.assertEqual(written, ['ok'])
+
+    def test_disabled_runs_inline(self):
+        written = []
+        self.assertIsNone(WriteBehind("test-writer", enabled=False).submit('s1', written.append, 1))
+        self.assertEqual(written, [1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+import tempfile
+import shutil
+import os
+import json
+import time
+import threading
+from persistence_queue import PersistenceQueue, read_journal, fcntl
+
+class TestPersistenceQueue(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.directory = os.path.join(self.temp_dir, 'queue')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def make_queue(self, handler, **kwargs):
+        kwargs.setdefault('retry_delay', 0.01)
+        persist_queue = PersistenceQueue("test-persist", self.directory, **kwargs)
+        persist_queue.register('turn', handler)
+        return persist_queue
+
+    def test_jobs_run_in_order_and_journal_is_cleared(self):
+        written = []
+        persist_queue = self.make_queue(lambda job: (time.sleep(0.01), written.append(job['n']))[1] is None)
+        for n in range(5):
+            persist_queue.enqueue('turn', n=n)
+        self.assertTrue(persist_queue.flush(timeout=5))
+        self.assertEqual(written, [0, 1, 2, 3, 4])
+        stats = persist_queue.stats()
+        self.assertEqual((stats['pending'], stats['processed'], stats['failed']), (0, 5, 0))
+        with open(persist_queue.path, encoding='utf-8') as f:
+            self.assertEqual(f.read(), '')  # 큐가 비면 기록 파일도 비움
+
+    def test_failed_jobs_are_retried(self):
+        attempts = []
+        def flaky(job):
+            attempts.append(job['n'])
+            if len(attempts) < 3:
+                raise ConnectionError('db down')
+            return True
+        persist_queue = self.make_queue(flaky)
+        persist_queue.enqueue('turn', n=1)
+        self.assertTrue(persist_queue.flush(timeout=5))
+        self.assertEqual(attempts, [1, 1, 1])
+        self.assertEqual(persist_queue.processed, 1)
+
+        giving_up = self.make_queue(lambda job: False, max_retries=1)
+        giving_up.enqueue('turn', n=2)
+        self.assertTrue(giving_up.flush(timeout=5))
+        self.assertEqual(giving_up.failed, 1)
+
+    def write_journal(self, name, numbers, done=()):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, f'{name}.jsonl'), 'w', encoding='utf-8') as f:
+            for n in numbers:
+                job = {'id': f'{name}-{n}', 'kind': 'turn', 'payload': {'n': n}, 'enqueued_at': time.time()}
+                f.write(json.dumps({'op': 'add', 'job': job}) + '\n')
+            for n in done:
+                f.write(json.dumps({'op': 'done', 'id': f'{name}-{n}'}) + '\n')
+            f.write('{"op": "add", "job": ')  # 쓰다 만 줄
+        open(os.path.join(self.directory, f'{name}.lock'), 'w').close()
+
+    def test_unfinished_jobs_of_dead_process_are_replayed(self):
+        self.write_journal('dead', range(3), done=[1])
+        written = []
+        persist_queue = self.make_queue(lambda job: written.append(job['n']) is None)
+        persist_queue.start()
+        self.assertTrue(persist_queue.flush(timeout=5))
+        self.assertEqual(written, [0, 2])
+        self.assertFalse(os.path.exists(os.path.join(self.directory, 'dead.jsonl')))
+
+    @unittest.skipIf(fcntl is None, '파일 잠금이 없는 환경')
+    def test_live_process_journal_is_left_alone(self):
+        self.write_journal('alive', range(2))
+        fd = os.open(os.path.join(self.directory, 'alive.lock'), os.O_RDWR)
+        fcntl.flock(fd, fcntl.LOCK_EX)  # 아직 살아 있는 다른 워커
+        try:
+            written = []
+            persist_queue = self.make_queue(lambda job: written.append(job['n']) is None)
+            persist_queue.start()
+            persist_queue.enqueue('turn', n=9)
+            self.assertTrue(persist_queue.flush(timeout=5))
+            self.assertEqual(written, [9])
+            self.assertTrue(os.path.exists(os.path.join(self.directory, 'alive.jsonl')))
+        finally:
+            os.close(fd)
+
+    def test_enqueued_jobs_survive_concurrent_compaction(self):
+        persist_queue = self.make_queue(lambda job: True)
+        persist_queue.start()
+        blocker = threading.Event()
+        persist_queue.register('slow', lambda job: blocker.wait(5))
+        ids = [persist_queue.enqueue('turn', n=n) for n in range(50)]  # 처리/정리와 동시에 넣기
+        slow = persist_queue.enqueue('slow')
+        time.sleep(0.1)
+        self.assertEqual(set(read_journal(persist_queue.path)), {slow})  # 처리 안 된 작업은 기록 파일에 남음
+        blocker.set()
+        self.assertTrue(persist_queue.flush(timeout=5))
+        self.assertEqual(persist_queue.processed, len(ids) + 1)
+
+    def test_stats_report_lag(self):
+        release = threading.Event()
+        persist_queue = self.make_queue(lambda job: release.wait(5))
+        persist_queue.enqueue('turn', n=1)
+        time.sleep(0.05)
+        stats = persist_queue.stats()
+        self.assertEqual(stats['pending'], 1)
+        self.assertGreater(stats['oldest_age_seconds'], 0)
+        self.assertFalse(persist_queue.flush(timeout=0.01))
+        release.set()
+        self.assertTrue(persist_queue.flush(timeout=5))
+        self.assertEqual(persist_queue.stats()['oldest_age_seconds'], 0.0)
+
+if __name__ == '__main__':
+    unittest.main()
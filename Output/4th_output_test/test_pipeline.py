@@ -0,0 +1,126 @@
+import unittest
+import time
+import asyncio
+from pipeline import StepRunner, drain, token_events, atoken_events
+from metrics import Metrics, metrics
+
+class TestStepRunner(unittest.TestCase):
+    def setUp(self):
+        metrics.reset()
+
+    def test_steps_run_concurrently(self):
+        """독립 단계는 합이 아니라 가장 느린 단계 시간만큼 걸림"""
+        steps = StepRunner("test")
+        started = time.perf_counter()
+        steps.submit("a", time.sleep, 0.3, timeout=2)
+        steps.submit("b", time.sleep, 0.3, timeout=2)
+        with steps.timed("inline"):
+            time.sleep(0.3)
+        steps.result("a")
+        steps.result("b")
+        self.assertLess(time.perf_counter() - started, 0.8)
+        self.assertEqual(set(steps.timings), {"a", "b", "inline"})
+
+    def test_timeout_returns_default(self):
+        steps = StepRunner("test")
+        steps.submit("slow", time.sleep, 1.0, timeout=0.1, default="fallback")
+        self.assertEqual(steps.result("slow"), "fallback")
+        self.assertEqual(metrics.snapshot()['counters'].get("test.slow.timeout"), 1)
+
+    def test_error_returns_default(self):
+        def fail():
+            raise RuntimeError("boom")
+        steps = StepRunner("test")
+        steps.submit("fail", fail, default=[])
+        self.assertEqual(steps.result("fail"), [])
+        self.assertEqual(metrics.snapshot()['counters'].get("test.fail.error"), 1)
+
+    def test_result_and_metrics(self):
+        steps = StepRunner("test")
+        steps.submit("add", lambda x, y: x + y, 1, 2)
+        self.assertEqual(steps.result("add"), 3)
+        self.assertIn("test.add", metrics.snapshot()['timings'])
+        self.assertIn("total", steps.summary())
+
+    def test_mark_records_elapsed_since_start(self):
+        steps = StepRunner("test")
+        time.sleep(0.05)
+        steps.mark("first_token")
+        self.assertGreaterEqual(steps.timings["first_token"], 0.05)
+        self.assertIn("test.first_token", metrics.snapshot()['timings'])
+
+class FakeCall:
+    """LLM 호출 대신 정해진 토큰을 내보내는 호출 객체"""
+    def __init__(self, tokens, error=None):
+        self.tokens = tokens
+        self.error = error
+
+    def run(self):
+        yield from self.tokens
+        if self.error:
+            raise self.error
+
+    async def arun(self):
+        for token in self.tokens:
+            await asyncio.sleep(0)
+            yield token
+        if self.error:
+            raise self.error
+
+def answer_events(tokens, received):
+    answer = yield FakeCall(tokens)
+    received.append(answer)
+    return {'answer': answer, 'cached': False}
+
+def failing_events():
+    try:
+        yield FakeCall(['부분'], error=RuntimeError('stream broken'))
+    except Exception as e:
+        return {'answer': '오류가 발생했습니다.', 'error': 'llm_error', 'detail': str(e)}
+    return {'answer': 'unreachable'}
+
+class TestEventStream(unittest.TestCase):
+    def test_drain_sends_full_answer_back(self):
+        received = []
+        self.assertEqual(drain(answer_events(['a', 'b'], received)), {'answer': 'ab', 'cached': False})
+        self.assertEqual(received, ['ab'])
+
+    def test_token_events(self):
+        events = list(token_events(answer_events(['안', '녕'], [])))
+        self.assertEqual(events, [{'type': 'token', 'content': '안'}, {'type': 'token', 'content': '녕'},
+                                  {'type': 'done', 'answer': '안녕', 'cached': False}])
+
+    def test_early_return_without_llm_call(self):
+        def cached():
+            return {'answer': 'cached'}
+            yield
+        self.assertEqual(list(token_events(cached())), [{'type': 'done', 'answer': 'cached'}])
+
+    def test_call_error_is_thrown_into_generator(self):
+        self.assertEqual(drain(failing_events())['error'], 'llm_error')
+        events = list(token_events(failing_events()))
+        self.assertEqual(events[0], {'type': 'token', 'content': '부분'})
+        self.assertEqual(events[-1]['detail'], 'stream broken')
+        async def collect():
+            return [event async for event in atoken_events(failing_events())]
+        self.assertEqual(asyncio.run(collect())[-1]['error'], 'llm_error')
+
+    def test_async_token_events(self):
+        async def collect():
+            return [event async for event in atoken_events(answer_events(['x', 'y'], []))]
+        events = asyncio.run(collect())
+        self.assertEqual([e['type'] for e in events], ['token', 'token', 'done'])
+        self.assertEqual(events[-1]['answer'], 'xy')
+
+class TestMetrics(unittest.TestCase):
+    def test_snapshot_percentiles(self):
+        m = Metrics(window=10)
+        for i in range(1, 21):
+            m.observe("step", i / 1000)
+        summary = m.snapshot()['timings']['step']
+        self.assertEqual(summary['count'], 10)  # 최근 window개만 보관
+        self.assertEqual(summary['max_ms'], 20.0)
+        self.assertLessEqual(summary['p50_ms'], summary['p95_ms'])
+
+if __name__ == '__main__':
+    unittest.main()
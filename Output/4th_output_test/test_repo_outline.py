@@ -0,0 +1,60 @@
+import unittest
+import random
+from repo_outline import (parse_directory_structure, render_tree, repo_outline, related_tree,
+                          session_paths)
+
+PATHS = ['app.py', 'README.md', 'static/css/a.css', 'static/js/chat.js', 'static/js/x.js',
+         'templates/chat.html', 'src/pkg/core/a.py', 'src/pkg/core/b.py', 'src/pkg/util.py',
+         'tests/t1.py', 'tests/t2.py']
+
+STRUCTURE = '📄 app.py\n📁 static\n  📁 js\n    📄 chat.js\n  📄 style.css\n📄 z.py'
+
+class TestRepoOutline(unittest.TestCase):
+    def test_parse_directory_structure(self):
+        self.assertEqual(parse_directory_structure(STRUCTURE),
+                         ['app.py', 'static/js/chat.js', 'static/style.css', 'z.py'])
+        self.assertEqual(parse_directory_structure(''), [])
+
+    def test_outline_collapses_by_depth_with_counts(self):
+        outline = render_tree(PATHS, max_depth=1)
+        self.assertIn('static/ (파일 3개)', outline)
+        self.assertIn('src/pkg/ (파일 3개)', outline)  # 파일 없는 단일 하위 디렉토리는 한 줄로
+        self.assertNotIn('chat.js', outline)
+        deeper = render_tree(PATHS, max_depth=2)
+        self.assertIn('  js/ (파일 2개)', deeper)
+        self.assertIn('  util.py', deeper)
+        self.assertNotIn('chat.js', deeper)
+
+    def test_outline_is_byte_stable(self):
+        shuffled = list(PATHS)
+        random.Random(3).shuffle(shuffled)
+        self.assertEqual(repo_outline(shuffled), repo_outline(PATHS))
+        self.assertEqual(render_tree(shuffled), render_tree(PATHS))
+
+    def test_outline_limits_files_per_directory(self):
+        many = [f'f{i:02d}.py' for i in range(15)]
+        outline = render_tree(many, max_files=10)
+        self.assertIn('f09.py', outline)
+        self.assertNotIn('f10.py', outline)
+        self.assertIn('… 그 외 파일 5개', outline)
+
+    def test_related_tree_elides_unrelated(self):
+        tree = related_tree(PATHS, ['src/pkg/core/a.py', 'app.py', None])
+        self.assertEqual(tree.splitlines(), [
+            'src/pkg/ (파일 3개)',
+            '  core/ (파일 2개)',
+            '    a.py',
+            '    … 그 외 파일 1개',
+            '  … 그 외 파일 1개',
+            'app.py',
+            '… 그 외 디렉토리 3개, 파일 7개',
+        ])
+        self.assertEqual(related_tree(PATHS, []), '')
+
+    def test_session_paths_fallback(self):
+        self.assertEqual(session_paths({'directory_structure': STRUCTURE})[0], 'app.py')
+        self.assertEqual(session_paths({'files': [{'path': 'a.py'}, {}]}), ['a.py'])
+        self.assertEqual(session_paths({}), [])
+
+if __name__ == '__main__':
+    unittest.main()
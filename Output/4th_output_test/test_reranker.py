@@ -0,0 +1,25 @@
+import unittest
+from unittest.mock import patch
+import reranker
+from reranker import Reranker, LexicalReranker, get_reranker
+
+class TestReranker(unittest.TestCase):
+    def test_lexical_reranker_prefers_matching_chunk(self):
+        documents = ['def render(): return html', 'def load_repo_data(self): return files', 'class Config: pass']
+        metadatas = [{'function_name': 'render'}, {'function_name': 'load_repo_data'}, {'class_name': 'Config'}]
+        scores = LexicalReranker().score('load_repo_data는 뭐 해?', documents, metadatas)
+        self.assertEqual(len(scores), 3)
+        self.assertEqual(max(range(3), key=lambda i: scores[i]), 1)
+        self.assertTrue(all(0.0 <= s <= 1.0 for s in scores))
+
+    def test_none_reranker_keeps_order(self):
+        scores = Reranker().score('q', ['a', 'b', 'c'], [{}, {}, {}])
+        self.assertEqual(sorted(scores, reverse=True), scores)
+
+    def test_cross_encoder_falls_back_when_unavailable(self):
+        with patch.object(reranker, 'CrossEncoder', None), patch.dict(reranker._rerankers, {}, clear=True):
+            self.assertIsInstance(get_reranker('cross-encoder'), LexicalReranker)
+            self.assertEqual(get_reranker('none').name, 'none')
+
+if __name__ == '__main__':
+    unittest.main()
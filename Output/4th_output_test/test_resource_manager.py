@@ -0,0 +1,135 @@
+import unittest
+import tempfile
+import shutil
+import os
+import time
+from unittest.mock import patch, MagicMock
+import github_analyzer
+from resource_manager import ResourceManager
+
+class TestResourceManager(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.patches = [
+            patch.object(github_analyzer, 'REPOS_PATH', os.path.join(self.temp_dir, 'repos')),
+            patch.object(github_analyzer, 'NUMPY_STORE_PATH', os.path.join(self.temp_dir, 'numpy')),
+            patch.object(github_analyzer, 'LEXICAL_INDEX_PATH', os.path.join(self.temp_dir, 'lexical')),
+            patch.object(github_analyzer, 'SYMBOL_TABLE_PATH', os.path.join(self.temp_dir, 'symbols')),
+            patch.object(github_analyzer, 'CODE_GRAPH_PATH', os.path.join(self.temp_dir, 'graphs')),
+            patch('resource_manager.chat_memory.reset_memory'),
+        ]
+        for p in self.patches:
+            p.start()
+        self.manager = ResourceManager(state_file=os.path.join(self.temp_dir, 'state.json'),
+                                       ttl_seconds=100, disk_quota_bytes=10 ** 9, memory_quota_bytes=10 ** 9,
+                                       memory_idle_seconds=50, active_grace_seconds=0)
+        self.hook = MagicMock()
+        self.manager.add_purge_hook(self.hook)
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        shutil.rmtree(self.temp_dir)
+
+    def make_clone(self, session_id, size):
+        clone = os.path.join(github_analyzer.REPOS_PATH, session_id)
+        os.makedirs(clone, exist_ok=True)
+        with open(os.path.join(clone, 'main.py'), 'w') as f:
+            f.write('x' * size)
+        return clone
+
+    def make_index(self, session_id):
+        os.makedirs(github_analyzer.LEXICAL_INDEX_PATH, exist_ok=True)
+        with open(github_analyzer.lexical_index_file(session_id), 'w') as f:
+            f.write('{}')
+        return github_analyzer.lexical_index_file(session_id)
+
+    def test_ttl_purges_repo_artifacts_only(self):
+        """TTL이 지난 세션은 저장소 산출물만 삭제하고 대화 기록은 유지"""
+        old_clone = self.make_clone('old', 10)
+        new_clone = self.make_clone('new', 10)
+        now = time.time()
+        self.manager._last_access = {'old': now - 200, 'new': now}
+        stats = self.manager.sweep(now)
+        self.assertEqual(stats['expired'], ['old'])
+        self.assertFalse(os.path.exists(old_clone))
+        self.assertTrue(os.path.exists(new_clone))
+        from resource_manager import chat_memory
+        chat_memory.reset_memory.assert_not_called()
+        self.hook.assert_called_once_with('old')
+        self.assertNotIn('old', self.manager._last_access)
+
+    def test_purge_session_resets_conversation(self):
+        """사용자가 세션을 삭제할 때만 대화 기록까지 삭제"""
+        self.make_clone('gone', 10)
+        self.manager.touch('gone')
+        self.manager.purge_session('gone')
+        from resource_manager import chat_memory
+        chat_memory.reset_memory.assert_called_once_with('gone')
+        self.assertIsNone(self.manager.last_access('gone'))
+
+    def test_disk_quota_evicts_clone_before_index(self):
+        """디스크 할당량 초과 시 가장 오래된 세션의 로컬 클론만 삭제하고 인덱스는 유지"""
+        self.manager.disk_quota_bytes = 1500
+        a = self.make_clone('a', 1000)
+        b = self.make_clone('b', 1000)
+        a_index = self.make_index('a')
+        now = time.time()
+        self.manager._last_access = {'a': now - 20, 'b': now - 10}
+        stats = self.manager.sweep(now)
+        self.assertEqual(stats['clone_evicted'], ['a'])
+        self.assertEqual(stats['disk_evicted'], [])
+        self.assertFalse(os.path.exists(a))
+        self.assertTrue(os.path.exists(a_index))
+        self.assertTrue(os.path.exists(b))
+        self.hook.assert_not_called()
+        self.assertIn('a', self.manager._last_access)  # 대화 기록과 추적은 유지
+
+    def test_disk_quota_purges_index_when_clones_are_not_enough(self):
+        """클론을 지워도 할당량을 넘으면 오래된 세션의 인덱스까지 삭제"""
+        self.manager.disk_quota_bytes = 1
+        self.make_clone('a', 10)
+        a_index = self.make_index('a')
+        now = time.time()
+        self.manager._last_access = {'a': now - 20}
+        stats = self.manager.sweep(now)
+        self.assertEqual((stats['clone_evicted'], stats['disk_evicted']), (['a'], ['a']))
+        self.assertFalse(os.path.exists(a_index))
+        self.hook.assert_called_once_with('a')
+
+    def test_workers_merge_access_state(self):
+        """다른 워커에서 쓰이는 세션은 TTL 정리 대상이 아님"""
+        self.make_clone('shared', 10)
+        other = ResourceManager(state_file=self.manager.state_file, ttl_seconds=100)
+        now = time.time()
+        self.manager._last_access = {'shared': now - 200, 'mine': now - 5}
+        self.manager.save_state()
+        other._last_access = {'shared': now}
+        other.save_state()  # 병합: 세션별 최신 시각
+        stats = self.manager.sweep(now)
+        self.assertEqual(stats['expired'], [])
+        self.assertTrue(os.path.exists(os.path.join(github_analyzer.REPOS_PATH, 'shared')))
+        self.assertAlmostEqual(self.manager.last_access('shared'), now)
+        self.assertAlmostEqual(other.last_access('mine'), now - 5)
+
+    def test_idle_index_released_from_memory(self):
+        """오래 쓰지 않은 인덱스는 메모리에서 내림"""
+        self.make_clone('idle', 10)
+        self.make_index('idle')
+        now = time.time()
+        self.manager._last_access = {'idle': now - 60}
+        with patch.object(github_analyzer, 'is_repo_index_loaded', return_value=True), \
+             patch.object(github_analyzer, 'release_repo_index') as release:
+            stats = self.manager.sweep(now)
+        self.assertEqual(stats['released'], ['idle'])
+        release.assert_called_once_with('idle')
+
+    def test_state_persisted(self):
+        """마지막 사용 시각은 재시작 후에도 유지"""
+        self.manager.touch('s1')
+        self.manager.save_state()
+        reloaded = ResourceManager(state_file=self.manager.state_file)
+        self.assertAlmostEqual(reloaded.last_access('s1'), self.manager.last_access('s1'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+import unittest
+import tempfile
+import shutil
+import os
+import numpy as np
+from unittest.mock import MagicMock, patch
+import retrieval
+from retrieval import resolve_scope_paths, build_scope_filters, scoped_query, hybrid_query, \
+    retrieval_profile, mmr_select, retrieve_candidates
+from vector_store import NumpyVectorStore
+from lexical_index import LexicalIndex
+
+FILES = [
+    {'path': 'app.py'},
+    {'path': 'src/utils/helpers.py'},
+    {'path': 'src/utils/format.js'},
+    {'path': 'docs/README.md'},
+]
+
+class TestRetrieval(unittest.TestCase):
+    def test_resolve_file_before_directory(self):
+        """파일명이 매칭되면 디렉토리 전체로 넓히지 않음"""
+        scope = {'file': ['utils/helpers.py'], 'directory': ['utils'], 'class': [], 'function': []}
+        self.assertEqual(resolve_scope_paths(scope, FILES), ['src/utils/helpers.py'])
+
+    def test_resolve_directory_prefix(self):
+        """디렉토리 이름은 하위 파일 경로로 변환"""
+        scope = {'file': [], 'directory': ['utils'], 'class': [], 'function': []}
+        self.assertEqual(resolve_scope_paths(scope, FILES), ['src/utils/helpers.py', 'src/utils/format.js'])
+
+    def test_resolve_keeps_leading_dot_names(self):
+        """'./'만 떼고 .env, .github 같은 이름의 점은 유지"""
+        files = FILES + [{'path': '.env'}, {'path': 'env'}, {'path': '.github/workflows/ci.yml'}]
+        scope = {'file': ['./.env'], 'directory': [], 'class': [], 'function': []}
+        self.assertEqual(resolve_scope_paths(scope, files), ['.env'])
+        scope = {'file': [], 'directory': ['.github'], 'class': [], 'function': []}
+        self.assertEqual(resolve_scope_paths(scope, files), ['.github/workflows/ci.yml'])
+
+    def test_build_filters_most_specific_first(self):
+        """경로+심볼 → 경로 → 심볼 순으로 필터 생성"""
+        scope = {'file': ['app.py'], 'directory': [], 'class': [], 'function': ['handle_chat', '이']}
+        filters = build_scope_filters(scope, FILES)
+        self.assertEqual(filters, [
+            {'$and': [{'path': 'app.py'}, {'function_name': 'handle_chat'}]},
+            {'path': 'app.py'},
+            {'function_name': 'handle_chat'},
+        ])
+
+    def test_no_scope_no_filters(self):
+        """범위가 없으면 필터 없음"""
+        scope = {'file': [], 'directory': [], 'class': [], 'function': []}
+        self.assertEqual(build_scope_filters(scope, FILES), [])
+
+    def test_scoped_query_falls_back_to_global(self):
+        """필터 결과가 없으면 전체 검색"""
+        collection = MagicMock()
+        empty = {'ids': [[]], 'documents': [[]], 'metadatas': [[]], 'distances': [[]]}
+        hit = {'ids': [['x']], 'documents': [['doc']], 'metadatas': [[{'path': 'app.py'}]], 'distances': [[0.1]]}
+        collection.query.side_effect = [empty, hit]
+        scope = {'file': ['app.py'], 'directory': [], 'class': [], 'function': []}
+        results, where = scoped_query(collection, [0.1, 0.2], 5, scope, FILES)
+        self.assertIsNone(where)
+        self.assertEqual(results, hit)
+        self.assertNotIn('where', collection.query.call_args_list[-1].kwargs)
+
+class TestHybridQuery(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = NumpyVectorStore(os.path.join(self.temp_dir, 'repo_test'))
+        ids = ['app.py_0', 'app.py_1', 'db.py_0']
+        documents = ['def handle_chat(): pass', 'def analyze(): pass', 'def get_db_connection(): pass']
+        metadatas = [
+            {'path': 'app.py', 'function_name': 'handle_chat'},
+            {'path': 'app.py', 'function_name': 'analyze'},
+            {'path': 'db.py', 'function_name': 'get_db_connection'},
+        ]
+        self.store.upsert(ids, [[1.0, 0.0], [0.9, 0.1], [0.0, 1.0]], documents, metadatas)
+        self.lexical = LexicalIndex()
+        self.lexical.add(ids, documents, metadatas)
+        self.empty_scope = {'file': [], 'directory': [], 'class': [], 'function': []}
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_lexical_only_without_embedding(self):
+        """임베딩 없이 어휘 검색만으로 결과 생성"""
+        results, _ = hybrid_query(self.store, self.lexical, None, 'get_db_connection', 2, self.empty_scope, FILES)
+        self.assertEqual(results['ids'][0][0], 'db.py_0')
+        self.assertEqual(results['distances'][0][0], 0.0)
+
+    def test_fusion_adds_lexical_hit_with_real_distance(self):
+        """어휘 전용 결과도 실제 벡터 거리로 포함"""
+        results, _ = hybrid_query(self.store, self.lexical, [1.0, 0.0], 'get_db_connection', 2, self.empty_scope, FILES)
+        self.assertIn('db.py_0', results['ids'][0])
+        distance = results['distances'][0][results['ids'][0].index('db.py_0')]
+        self.assertAlmostEqual(distance, 2.0, places=5)
+
+class TestRetrievePipeline(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = NumpyVectorStore(os.path.join(self.temp_dir, 'repo_test'))
+        ids = ['a.py_0', 'a.py_1', 'b.py_0', 'c.py_0']
+        documents = ['def load_data(): pass', 'def load_data_again(): pass', 'def save_data(): pass', 'def render(): pass']
+        metadatas = [{'path': 'a.py', 'function_name': 'load_data'}, {'path': 'a.py', 'function_name': 'load_data_again'},
+                     {'path': 'b.py', 'function_name': 'save_data'}, {'path': 'c.py', 'function_name': 'render'}]
+        # a.py_0과 a.py_1은 거의 같은 벡터
+        self.store.upsert(ids, [[1.0, 0.0], [0.99, 0.01], [0.7, 0.7], [0.0, 1.0]], documents, metadatas)
+        self.empty_scope = {'file': [], 'directory': [], 'class': [], 'function': []}
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_profile_by_repo_size(self):
+        small, large = retrieval_profile(100), retrieval_profile(10 ** 6)
+        self.assertLess(small[0], large[0])
+        self.assertLessEqual(small[1], small[0])
+        with patch.object(retrieval, 'RETRIEVAL_FETCH_K', 7), patch.object(retrieval, 'RETRIEVAL_MMR_K', 3):
+            self.assertEqual(retrieval_profile(100), (7, 3))
+
+    def test_mmr_prefers_diverse_candidates(self):
+        similarity = np.array([[1.0, 0.99, 0.1], [0.99, 1.0, 0.1], [0.1, 0.1, 1.0]], dtype=np.float32)
+        self.assertEqual(mmr_select([1.0, 0.95, 0.6], similarity, 2, lambda_mult=0.5), [0, 2])
+        self.assertEqual(mmr_select([1.0, 0.95, 0.6], similarity, 2, lambda_mult=1.0), [0, 1])
+
+    def test_retrieve_candidates_diversifies_and_reranks(self):
+        with patch.object(retrieval, 'RETRIEVAL_FETCH_K', 4), patch.object(retrieval, 'RETRIEVAL_MMR_K', 2), \
+                patch.object(retrieval, 'MMR_LAMBDA', 0.5):
+            results, where = retrieve_candidates(self.store, None, [1.0, 0.0], 'render', self.empty_scope, [], chunk_count=4)
+        ids = results['ids'][0]
+        self.assertEqual(len(ids), 2)
+        self.assertFalse({'a.py_0', 'a.py_1'} <= set(ids))  # 거의 같은 청크는 하나만
+        self.assertEqual(ids, ['c.py_0', 'a.py_0'])  # 재순위기가 질문 식별자와 일치하는 청크를 앞으로
+        self.assertEqual(results['rerank_scores'][0][0], 1.0)
+        self.assertIsNone(where)
+
+    def test_mmr_uses_embeddings_from_vector_query(self):
+        """MMR은 벡터 검색에서 함께 받은 임베딩을 쓰고 추가 조회를 하지 않음"""
+        lexical = LexicalIndex()
+        stored = self.store.get(include=['documents', 'metadatas'])
+        lexical.add(stored['ids'], stored['documents'], stored['metadatas'])
+        with patch.object(retrieval, 'RETRIEVAL_FETCH_K', 3), patch.object(retrieval, 'RETRIEVAL_MMR_K', 2), \
+                patch.object(self.store, 'get', wraps=self.store.get) as get:
+            results, _ = retrieve_candidates(self.store, lexical, [1.0, 0.0], 'load_data', self.empty_scope, [], chunk_count=4)
+        self.assertEqual(len(results['ids'][0]), 2)
+        get.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
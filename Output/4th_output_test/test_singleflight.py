@@ -0,0 +1,163 @@
+import unittest
+import time
+import asyncio
+import threading
+from singleflight import SingleFlight, FlightFailed
+from pipeline import drain, token_events, atoken_events
+from metrics import metrics
+
+class SlowCall:
+    """토큰 사이에 지연을 두는 LLM 호출 대용 (error가 있으면 토큰을 보낸 뒤 예외)"""
+    def __init__(self, tokens, delay=0.05, error=None):
+        self.tokens = tokens
+        self.delay = delay
+        self.error = error
+
+    def run(self):
+        for token in self.tokens:
+            time.sleep(self.delay)
+            yield token
+        if self.error:
+            raise self.error
+
+    async def arun(self):
+        for token in self.tokens:
+            await asyncio.sleep(self.delay)
+            yield token
+        if self.error:
+            raise self.error
+
+class TestSingleFlight(unittest.TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.group = SingleFlight("test")
+        self.runs = 0
+
+    def make_events(self, fail=False):
+        def events():
+            self.runs += 1
+            if fail:
+                time.sleep(0.1)
+                raise RuntimeError("boom")  # 토큰을 보내기 전 실패 (검색 오류 등)
+            answer = yield SlowCall(['a', 'b', 'c'])
+            return {'answer': answer}
+        return events
+
+    def run_concurrently(self, count, make_events, on_shared=None):
+        results = [None] * count
+        def worker(i):
+            results[i] = list(token_events(self.group.events('key', make_events, on_shared)))
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+        for i, thread in enumerate(threads):
+            thread.start()
+            if i == 0:
+                time.sleep(0.02)  # 첫 요청이 leader가 되도록
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_requests_share_one_computation(self):
+        results = self.run_concurrently(3, self.make_events(), lambda r: dict(r, coalesced=True))
+        self.assertEqual(self.runs, 1)
+        for events in results:
+            self.assertEqual([e['content'] for e in events if e['type'] == 'token'], ['a', 'b', 'c'])
+            self.assertEqual(events[-1]['answer'], 'abc')
+        self.assertNotIn('coalesced', results[0][-1])
+        self.assertTrue(results[1][-1]['coalesced'])
+        self.assertEqual(metrics.snapshot()['counters']['test.coalesced'], 2)
+        self.assertEqual(self.group.in_flight(), 0)
+
+    def test_sequential_requests_are_not_merged(self):
+        drain(self.group.events('key', self.make_events()))
+        drain(self.group.events('key', self.make_events()))
+        self.assertEqual(self.runs, 2)
+
+    def test_follower_falls_back_when_leader_fails(self):
+        outcomes = []
+        def leader():
+            try:
+                drain(self.group.events('key', self.make_events(fail=True)))
+            except RuntimeError:
+                outcomes.append('leader failed')
+        thread = threading.Thread(target=leader)
+        thread.start()
+        time.sleep(0.02)
+        result = drain(self.group.events('key', self.make_events()))
+        thread.join()
+        self.assertEqual(outcomes, ['leader failed'])
+        self.assertEqual(result, {'answer': 'abc'})
+        self.assertEqual(self.runs, 2)
+        self.assertEqual(metrics.snapshot()['counters']['test.fallback'], 1)
+
+    def test_follower_falls_back_on_error_result(self):
+        def error_events():
+            self.runs += 1
+            time.sleep(0.1)
+            return {'answer': '검색 중 오류가 발생했습니다.', 'error': 'search_error'}
+            yield  # 생성기로 만들기 위한 자리
+
+        thread = threading.Thread(target=lambda: drain(self.group.events('key', error_events)))
+        thread.start()
+        time.sleep(0.02)
+        result = drain(self.group.events('key', self.make_events()))
+        thread.join()
+        self.assertEqual(result, {'answer': 'abc'})
+        self.assertEqual(self.runs, 2)
+        self.assertEqual(metrics.snapshot()['counters']['test.fallback'], 1)
+
+    def test_follower_does_not_fall_back_after_streaming(self):
+        def broken_events():
+            self.runs += 1
+            answer = yield SlowCall(['a', 'b'], error=ConnectionError('stream cut'))
+            return {'answer': answer}
+
+        def leader():
+            with self.assertRaises(ConnectionError):
+                drain(self.group.events('key', broken_events))
+        thread = threading.Thread(target=leader)
+        thread.start()
+        time.sleep(0.02)
+        tokens = []
+        with self.assertRaises(FlightFailed):
+            for event in token_events(self.group.events('key', self.make_events())):
+                tokens.append(event['content'])
+        thread.join()
+        self.assertEqual(tokens, ['a', 'b'])  # 받은 토큰 뒤에 새 답변을 이어 붙이지 않음
+        self.assertEqual(self.runs, 1)
+        self.assertEqual(metrics.snapshot()['counters']['test.failed_after_stream'], 1)
+
+    def test_llm_error_is_thrown_into_leader_generator(self):
+        """LLM 호출 실패는 leader의 생성기가 받아 오류 응답을 만들고, 합류한 요청도 같은 오류 응답을 받음"""
+        def llm_error_events():
+            self.runs += 1
+            try:
+                answer = yield SlowCall(['x'], error=RuntimeError('stream broken'))
+            except Exception as e:
+                return {'answer': '오류가 발생했습니다.', 'error': 'llm_error', 'detail': str(e)}
+            return {'answer': answer}
+
+        results = self.run_concurrently(3, llm_error_events)
+        self.assertEqual(self.runs, 1)
+        for events in results:
+            self.assertEqual(events[-1]['type'], 'done')
+            self.assertEqual(events[-1]['error'], 'llm_error')
+        self.assertEqual(drain(self.group.events('key', llm_error_events))['error'], 'llm_error')
+
+        async def collect():
+            return [e async for e in atoken_events(self.group.events('key', llm_error_events))]
+        self.assertEqual(asyncio.run(collect())[-1]['error'], 'llm_error')
+
+    def test_async_follower(self):
+        async def collect(delay):
+            await asyncio.sleep(delay)
+            return [e async for e in atoken_events(self.group.events('key', self.make_events()))]
+
+        async def main():
+            return await asyncio.gather(collect(0), collect(0.02))
+        leader, follower = asyncio.run(main())
+        self.assertEqual(self.runs, 1)
+        self.assertEqual(leader, follower)
+        self.assertEqual(follower[-1], {'type': 'done', 'answer': 'abc'})
+
+if __name__ == '__main__':
+    unittest.main()
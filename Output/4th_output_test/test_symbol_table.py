@@ -0,0 +1,67 @@
+import unittest
+import tempfile
+import shutil
+import os
+from symbol_table import SymbolTable, read_symbol_source, looks_like_code
+
+SOURCE = '''class GitHubRepositoryFetcher:
+    def load_repo_data(self):
+        return self.files
+
+def analyze_repository(url):
+    fetcher = GitHubRepositoryFetcher()
+    return fetcher.load_repo_data()
+'''
+
+class TestSymbolTable(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        with open(os.path.join(self.temp_dir, 'github_analyzer.py'), 'w', encoding='utf-8') as f:
+            f.write(SOURCE)
+        self.table = SymbolTable()
+        self.table.add('GitHubRepositoryFetcher', 'github_analyzer.py', 1, 3, 'class')
+        self.table.add('load_repo_data', 'github_analyzer.py', 2, 3, 'method', 'GitHubRepositoryFetcher')
+        self.table.add('analyze_repository', 'github_analyzer.py', 5, 7, 'function')
+        self.table.index_usages([{'path': 'github_analyzer.py', 'content': SOURCE}])
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_lookup_qualified_and_short(self):
+        """정규화된 이름과 짧은 이름으로 조회"""
+        entry = self.table.lookup('GitHubRepositoryFetcher.load_repo_data')[0]
+        self.assertEqual((entry['start_line'], entry['end_line'], entry['kind']), (2, 3, 'method'))
+        self.assertEqual(self.table.definitions('load_repo_data'), [entry])
+        self.assertEqual(self.table.lookup('missing'), [])
+
+    def test_definitions_in_file(self):
+        """파일 하나의 정의를 시작 라인 순으로"""
+        names = [e['name'] for e in self.table.definitions_in_file('github_analyzer.py')]
+        self.assertEqual(names, ['GitHubRepositoryFetcher', 'load_repo_data', 'analyze_repository'])
+        self.assertEqual(self.table.definitions_in_file('other.py'), [])
+
+    def test_usages_exclude_definition(self):
+        """사용 위치는 정의 라인 제외"""
+        self.assertEqual(self.table.usages('load_repo_data'), [{'path': 'github_analyzer.py', 'line': 7}])
+        self.assertEqual(self.table.usages('GitHubRepositoryFetcher'), [{'path': 'github_analyzer.py', 'line': 6}])
+
+    def test_find_in_text(self):
+        """질문에서 식별자 모양의 심볼만 매칭"""
+        found = self.table.find_in_text('load_repo_data 함수는 뭐 해?')
+        self.assertEqual([e['qualified_name'] for e in found], ['GitHubRepositoryFetcher.load_repo_data'])
+        self.assertFalse(looks_like_code('login'))
+        self.assertEqual(self.table.find_in_text('analyze 해줘'), [])
+
+    def test_read_source_and_persist(self):
+        """정의 범위 소스 읽기 및 저장/로드"""
+        entry = self.table.lookup('analyze_repository')[0]
+        self.assertTrue(read_symbol_source(self.temp_dir, entry).startswith('def analyze_repository'))
+        path = os.path.join(self.temp_dir, 'symbols.json')
+        self.table.save(path)
+        loaded = SymbolTable.load(path)
+        self.assertEqual(len(loaded), 3)
+        self.assertEqual(loaded.lookup('load_repo_data'), self.table.lookup('load_repo_data'))
+        self.assertEqual(loaded.usages('load_repo_data'), self.table.usages('load_repo_data'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+import tempfile
+import shutil
+import os
+import numpy as np
+from unittest.mock import patch, MagicMock
+import vector_store
+from vector_store import NumpyVectorStore, select_engine, open_vector_store, metadata_matches, NUMPY_ENGINE_MAX_CHUNKS
+
+class TestNumpyVectorStore(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'repo_test')
+        self.store = NumpyVectorStore(self.path)
+        self.store.upsert(
+            ids=['a.py_0', 'a.py_1', 'b.js_0'],
+            embeddings=[[1.0, 0.0], [0.0, 1.0], [0.7, 0.7]],
+            documents=['def a():', 'class A:', 'function b() {}'],
+            metadatas=[
+                {'path': 'a.py', 'function_name': 'a', 'start_line': 1},
+                {'path': 'a.py', 'class_name': 'A', 'start_line': 10},
+                {'path': 'b.js', 'function_name': 'b', 'start_line': 1},
+            ]
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_query_orders_by_squared_l2(self):
+        """제곱 L2 거리 오름차순으로 반환"""
+        results = self.store.query(query_embeddings=[[1.0, 0.0]], n_results=2)
+        self.assertEqual(results['ids'][0], ['a.py_0', 'b.js_0'])
+        self.assertAlmostEqual(results['distances'][0][0], 0.0, places=5)
+        self.assertAlmostEqual(results['distances'][0][1], 0.3**2 + 0.7**2, places=5)
+        self.assertEqual(results['metadatas'][0][0]['path'], 'a.py')
+
+    def test_batched_query(self):
+        """여러 질의를 한 번에 처리"""
+        results = self.store.query(query_embeddings=[[1.0, 0.0], [0.0, 1.0]], n_results=1)
+        self.assertEqual(results['ids'], [['a.py_0'], ['a.py_1']])
+
+    def test_where_filters(self):
+        """메타데이터 필터 적용"""
+        results = self.store.query(query_embeddings=[[1.0, 0.0]], n_results=5, where={'path': 'b.js'})
+        self.assertEqual(results['ids'][0], ['b.js_0'])
+        results = self.store.query(query_embeddings=[[1.0, 0.0]], n_results=5,
+                                   where={'$and': [{'path': {'$in': ['a.py']}}, {'start_line': {'$gte': 5}}]})
+        self.assertEqual(results['ids'][0], ['a.py_1'])
+        results = self.store.get(where={'$or': [{'class_name': 'A'}, {'function_name': 'b'}]})
+        self.assertEqual(sorted(results['ids']), ['a.py_1', 'b.js_0'])
+
+    def test_metadata_matches_agrees_with_store(self):
+        """저장소 밖 필터(metadata_matches)도 같은 where 해석 결과를 냄"""
+        records = self.store.get(include=['metadatas'])
+        for where in [{'path': 'a.py'}, {'class_name': {'$ne': 'A'}}, {'start_line': {'$lt': 5}},
+                      {'path': {'$nin': ['b.js']}}, {'$or': [{'class_name': 'A'}, {'start_line': {'$gt': 1}}]}]:
+            expected = self.store.get(where=where)['ids']
+            matched = [record_id for record_id, metadata in zip(records['ids'], records['metadatas'])
+                       if metadata_matches(metadata, where)]
+            self.assertEqual(matched, expected, where)
+
+    def test_flush_and_reload_memory_mapped(self):
+        """flush 후 다시 열면 mmap으로 동일한 결과"""
+        self.store.flush()
+        reopened = NumpyVectorStore(self.path)
+        self.assertEqual(reopened.count(), 3)
+        self.assertIsInstance(reopened._vectors, np.memmap)
+        results = reopened.query(query_embeddings=[[0.0, 1.0]], n_results=1)
+        self.assertEqual(results['documents'][0], ['class A:'])
+
+    def test_upsert_replaces_existing(self):
+        """같은 ID는 덮어씀"""
+        self.store.flush()
+        self.store.upsert(ids=['a.py_0'], embeddings=[[0.0, -1.0]], documents=['def a2():'], metadatas=[{'path': 'a.py'}])
+        self.assertEqual(self.store.count(), 3)
+        results = self.store.query(query_embeddings=[[0.0, -1.0]], n_results=1)
+        self.assertEqual(results['documents'][0], ['def a2():'])
+
+    def test_select_engine_by_size(self):
+        """인덱스 크기로 엔진 선택"""
+        self.assertEqual(select_engine(10), 'numpy')
+        self.assertEqual(select_engine(NUMPY_ENGINE_MAX_CHUNKS + 1), 'chroma')
+
+    def test_server_mode_uses_shared_chroma(self):
+        """서버 모드에서는 프로세스별 NumPy 엔진을 쓰지 않음"""
+        self.store.flush()
+        registry = MagicMock()
+        with patch.object(vector_store, 'VECTOR_STORE_MODE', 'server'):
+            self.assertEqual(select_engine(10), 'chroma')
+            store = open_vector_store('repo_test', registry, self.temp_dir)
+        self.assertEqual(store.engine, 'chroma')
+        registry.get.assert_called_once_with('repo_test')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,193 @@
+"""
+답변 캐시 모듈
+
+같은 저장소에 대해 반복되는 질문("진입점이 어디야", "로그인은 어떻게 동작해")은 매번 gpt-4o를
+호출하지 않고 이전 답변을 돌려줍니다.
+
+    - 키: (저장소 URL, 인덱스된 커밋, 정규화된 질문 임베딩)
+    - 정규화된 질문 문자열이 같으면 임베딩 없이 바로 적중
+    - 아니면 같은 저장소·커밋의 캐시된 질문 임베딩과 코사인 유사도가 ANSWER_CACHE_THRESHOLD 이상일 때 적중
+    - 인덱스된 커밋이 바뀌면 이전 커밋의 항목은 더 이상 적중하지 않음 (같은 저장소의 다른 세션이
+      이전 커밋을 쓰고 있을 수 있으므로 바로 지우지 않고 ANSWER_CACHE_MAX_BUCKETS 기준 LRU로 정리)
+    - 이전 대화 기록이 프롬프트에 들어간 답변은 호출하는 쪽에서 저장하지 않음 (다른 사용자에게 그 대화에 기댄 답이 가지 않도록)
+
+캐시는 프로세스 메모리에 있으며(여러 워커로 실행하면 워커마다 따로 채워짐), 적중/미스 수는 metrics에 answer_cache.hit / answer_cache.miss로 기록됩니다.
+"""
+
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+import numpy as np
+
+from metrics import metrics
+
+ANSWER_CACHE_ENABLED = os.environ.get("ANSWER_CACHE_ENABLED", "1") == "1"  # 답변 캐시 사용 여부
+ANSWER_CACHE_THRESHOLD = float(os.environ.get("ANSWER_CACHE_THRESHOLD", 0.97))  # 적중으로 볼 최소 코사인 유사도
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", 500))  # 저장소·커밋당 최대 항목 수
+ANSWER_CACHE_MAX_BUCKETS = int(os.environ.get("ANSWER_CACHE_MAX_BUCKETS", 64))  # 캐시를 유지할 최대 (저장소, 커밋) 수
+ANSWER_CACHE_TTL_SECONDS = int(os.environ.get("ANSWER_CACHE_TTL_SECONDS", 7 * 24 * 3600))  # 항목 보관 기간
+
+# 이전 대화에 기대는 질문은 같은 문장이라도 답이 달라지므로 캐시하지 않음
+CONTEXT_DEPENDENT_PATTERN = re.compile(r'(그거|그것|이거|이것|저거|위의|위에서|방금|아까|앞에서|이전 답변|다시)')
+
+
+def normalize_question(question: str) -> str:
+    """공백을 하나로 줄이고 앞뒤 공백과 끝의 문장부호를 제거합니다."""
+    text = re.sub(r'\s+', ' ', question or '').strip()
+    return text.rstrip('?!.。 ')
+
+
+def normalize_repo(repo_url: str) -> str:
+    """저장소 URL을 비교용으로 정규화합니다. (대소문자, 끝의 / 와 .git 무시)"""
+    repo = (repo_url or '').strip().rstrip('/').lower()
+    return repo[:-len('.git')] if repo.endswith('.git') else repo
+
+
+def is_cacheable_question(question: str) -> bool:
+    """이전 대화 맥락에 기대지 않는 질문인지 확인"""
+    text = normalize_question(question)
+    return len(text) >= 4 and not CONTEXT_DEPENDENT_PATTERN.search(text)
+
+
+class _Bucket:
+    """한 (저장소, 커밋)의 캐시 항목과 유사도 검색용 행렬"""
+
+    def __init__(self):
+        self.entries = OrderedDict()  # 정규화된 질문 -> {'answer', 'vector', 'created'}
+        self._matrix = None
+        self._keys = []
+
+    def invalidate_matrix(self):
+        self._matrix = None
+
+    def matrix(self):
+        if self._matrix is None:
+            self._keys = [key for key, entry in self.entries.items() if entry['vector'] is not None]
+            self._matrix = np.stack([self.entries[key]['vector'] for key in self._keys]) if self._keys else None
+        return self._matrix, self._keys
+
+
+class AnswerCache:
+    """
+    (저장소, 커밋)별 답변 캐시 (스레드 안전)
+    """
+
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD, max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+                 max_buckets: int = ANSWER_CACHE_MAX_BUCKETS, ttl_seconds: int = ANSWER_CACHE_TTL_SECONDS):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_buckets = max_buckets
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()  # (정규화된 저장소 URL, 커밋) -> _Bucket (최근 사용 순)
+        self.hits = 0
+        self.misses = 0
+
+    def _bucket(self, repo_url: str, commit: str, create: bool = False) -> Optional[_Bucket]:
+        key = (normalize_repo(repo_url), commit)
+        bucket = self._buckets.get(key)
+        if bucket is None and create:
+            bucket = self._buckets[key] = _Bucket()
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        if bucket is not None:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    @staticmethod
+    def _unit(embedding) -> Optional[np.ndarray]:
+        if embedding is None:
+            return None
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm > 0 else None
+
+    def _record(self, hit: bool):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        metrics.increment("answer_cache.hit" if hit else "answer_cache.miss")
+
+    def get(self, repo_url: str, commit: Optional[str], question: str, embedding=None, count_miss: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        캐시된 답변을 찾습니다.
+
+        Args:
+            repo_url (str): 저장소 URL
+            commit (str): 인덱스된 커밋 (None이면 캐시를 쓰지 않음)
+            question (str): 질문
+            embedding: 질문 임베딩 (None이면 정규화된 문자열 일치만 확인)
+            count_miss (bool): 미스를 적중률에 반영할지 (임베딩 후 다시 조회할 예정이면 False)
+
+        Returns:
+            {'answer', 'question', 'similarity'} 또는 None
+        """
+        if not ANSWER_CACHE_ENABLED or not commit or not repo_url or not is_cacheable_question(question):
+            return None
+        key = normalize_question(question)
+        now = time.time()
+        with self._lock:
+            bucket = self._bucket(repo_url, commit)
+            if bucket is not None:
+                entry = bucket.entries.get(key)
+                if entry is not None and now - entry['created'] <= self.ttl_seconds:
+                    bucket.entries.move_to_end(key)
+                    self._record(True)
+                    return {'answer': entry['answer'], 'question': key, 'similarity': 1.0}
+                vector = self._unit(embedding)
+                matrix, keys = bucket.matrix()
+                if vector is not None and matrix is not None and matrix.shape[1] == vector.shape[0]:
+                    similarities = matrix @ vector
+                    best = int(np.argmax(similarities))
+                    entry = bucket.entries[keys[best]]
+                    if similarities[best] >= self.threshold and now - entry['created'] <= self.ttl_seconds:
+                        bucket.entries.move_to_end(keys[best])
+                        self._record(True)
+                        return {'answer': entry['answer'], 'question': keys[best], 'similarity': float(similarities[best])}
+            if count_miss:
+                self._record(False)
+        return None
+
+    def put(self, repo_url: str, commit: Optional[str], question: str, embedding, answer: str):
+        """답변을 캐시에 저장합니다. (커밋을 모르거나 맥락 의존 질문이면 저장하지 않음)"""
+        if not ANSWER_CACHE_ENABLED or not commit or not repo_url or not answer or not is_cacheable_question(question):
+            return
+        key = normalize_question(question)
+        with self._lock:
+            bucket = self._bucket(repo_url, commit, create=True)
+            bucket.entries[key] = {'answer': answer, 'vector': self._unit(embedding), 'created': time.time()}
+            bucket.entries.move_to_end(key)
+            while len(bucket.entries) > self.max_entries:
+                bucket.entries.popitem(last=False)
+            bucket.invalidate_matrix()
+
+    def invalidate(self, repo_url: Optional[str] = None):
+        """저장소(없으면 전체)의 모든 커밋 캐시를 비웁니다."""
+        with self._lock:
+            if repo_url is None:
+                self._buckets.clear()
+                return
+            repo = normalize_repo(repo_url)
+            for key in [key for key in self._buckets if key[0] == repo]:
+                del self._buckets[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """적중률과 항목 수"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'buckets': len(self._buckets),
+                'entries': sum(len(bucket.entries) for bucket in self._buckets.values()),
+            }
+
+
+# 프로세스 전역 답변 캐시
+answer_cache = AnswerCache()
@@ -2,7 +2,7 @@ from flask import Flask, render_template, request, redirect, url_for, jsonify, R
 import uuid
 import time
 from github_analyzer import analyze_repository, GitHubRepositoryFetcher
-from chat_handler import handle_chat, handle_modify_request, apply_changes
+from chat_handler import handle_chat, handle_modify_request, apply_changes, chat_events, modify_events
 from dotenv import load_dotenv
 import os
 import sys
@@ -11,8 +11,17 @@ import traceback
 import json
 import openai
 from chat_handler import detect_github_push_intent
+from resource_manager import resource_manager
+from metrics import metrics
+from pipeline import token_events
+from answer_cache import answer_cache
+from persistence_queue import persistence_queue
 import requests
 import bcrypt  # 비밀번호 해싱을 위한 모듈 추가
+try:
+    import fcntl  # 세션 파일 잠금 (Windows에는 없음)
+except ImportError:
+    fcntl = None
 
 load_dotenv()
 
@@ -44,12 +53,28 @@ if not db_initialized:
     sys.exit(1)
 
 # 세션 데이터를 파일에 저장하고 로드하는 함수
-def save_sessions(sessions_data):
+# 여러 워커 프로세스가 같은 파일을 쓰므로, 저장할 때는 파일 잠금 후 디스크 내용에
+# 이번에 바뀐 세션만 병합하여 다른 워커가 추가/수정/삭제한 세션을 되돌리지 않도록 함
+def save_sessions(updated=None, removed=()):
+    """
+    Args:
+        updated (dict): 이번에 추가/수정한 세션 {session_id: 세션 데이터}
+        removed: 삭제한 세션 ID 목록
+    """
     try:
         os.makedirs('sessions', exist_ok=True)
-        with open('sessions/sessions.json', 'w', encoding='utf-8') as f:
-            json.dump(sessions_data, f, ensure_ascii=False, indent=2)
-        print(f"[DEBUG] 세션 데이터 저장 완료 (세션 수: {len(sessions_data)})")
+        with open('sessions/sessions.lock', 'w') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            merged = load_sessions()
+            merged.update(updated or {})
+            for session_id in removed:
+                merged.pop(session_id, None)
+            tmp_path = 'sessions/sessions.json.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(merged, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, 'sessions/sessions.json')
+        print(f"[DEBUG] 세션 데이터 저장 완료 (세션 수: {len(merged)})")
     except Exception as e:
         print(f"[DEBUG] 세션 데이터 저장 오류: {e}")
 
@@ -65,10 +90,81 @@ def load_sessions():
     return {}
 
 app = Flask(__name__)
-app.secret_key = os.urandom(24) # Flask 세션을 위한 secret_key 설정
+# Flask 세션을 위한 secret_key 설정 (여러 워커가 같은 세션 쿠키를 읽으려면 모든 워커가 같은 키를 써야 함)
+SECRET_KEY = os.environ.get("SECRET_KEY")
+if SECRET_KEY:
+    app.secret_key = SECRET_KEY
+else:
+    print("[WARNING] SECRET_KEY가 설정되어 있지 않아 임시 키를 사용합니다. (개발용: 재시작하거나 다른 워커로 요청이 가면 로그인이 풀림) .env 파일에 SECRET_KEY를 등록하세요.")
+    app.secret_key = os.urandom(24)
+
+# 한 요청 안의 DB 호출은 풀에서 꺼낸 연결 하나를 재사용하고, 요청이 끝나면 반납
+@app.before_request
+def begin_db_request():
+    db.begin_request()
+
+@app.teardown_request
+def end_db_request(exc):
+    db.end_request()
 
 sessions = load_sessions()  # session_id: {'repo_url': ..., 'token': ..., 'files': ...}
 
+def ensure_session_loaded(session_id):
+    """
+    세션이 메모리에 없으면 세션 파일에서 다시 읽어 합칩니다.
+    (다른 워커가 분석한 세션이나 이 워커가 시작된 뒤 만들어진 세션)
+
+    Returns:
+        bool: 세션 데이터가 있으면 True
+    """
+    if not session_id:
+        return False
+    if session_id in sessions:
+        return True
+    stored = load_sessions().get(session_id)
+    if stored:
+        sessions[session_id] = stored
+        print(f"[DEBUG] 세션 파일에서 세션 복원: {session_id}")
+        return True
+    return False
+
+def forget_session_data(session_id):
+    """
+    저장소 산출물이 정리된 세션은 파일 목록만 지워, 다음 사용 시 복원 경로를 타도록 함
+    (저장소 URL, 토큰 등 세션 정보는 유지해야 채팅 목록의 세션을 계속 열 수 있음)
+    """
+    if not ensure_session_loaded(session_id):
+        return
+    session_data = sessions[session_id]
+    session_data.pop('files', None)
+    session_data.pop('directory_structure', None)
+    save_sessions({session_id: session_data})
+
+def stream_events(events, error_label):
+    """
+    답변 생성기(chat_events/modify_events)를 NDJSON 스트리밍 응답으로 변환합니다.
+    토큰 조각마다 {"type": "token"} 한 줄, 마지막에 최종 결과를 담은 {"type": "done"} 한 줄을 보냅니다.
+    """
+    def generate():
+        try:
+            for event in token_events(events):
+                yield json.dumps(event) + '\n'
+        except Exception as e:
+            print(f"[{error_label} 에러]", str(e))
+            traceback.print_exc()
+            yield json.dumps({'type': 'error', 'error': f'{error_label} 오류: {str(e)}',
+                              'answer': f'{error_label} 중 오류가 발생했습니다: {str(e)}'}) + '\n'
+
+    return Response(generate(), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# 세션 산출물 수명 관리 (TTL/LRU 정리 스레드)
+resource_manager.add_purge_hook(forget_session_data)
+resource_manager.start_sweeper()
+
+# 답변 후 저장 큐 시작 (종료된 워커가 남긴 저장 작업도 여기서 다시 실행)
+persistence_queue.start()
+
 @app.route('/')
 def home():
     # 로그인 상태 확인
@@ -334,9 +430,9 @@ def chat(session_id):
     
     user_id = session.get('user_id')
     
-    # 세션 데이터 확인
-    from app import sessions as app_sessions
-    session_data = app_sessions.get(session_id, {})
+    # 세션 데이터 확인 (다른 워커가 분석한 세션이면 파일에서 복원)
+    ensure_session_loaded(session_id)
+    session_data = sessions.get(session_id, {})
     
     if not session_data:
         flash('존재하지 않는 세션입니다.', 'error')
@@ -372,14 +468,14 @@ def new_chat():
     
     # 세션 메모리에 기본 데이터 추가
     try:
-        # 기존 세션에서 파일 정보 복사
-        from app import sessions as app_sessions
+        # 기존 세션에서 파일 정보 복사 (다른 워커가 분석한 세션도 포함하도록 세션 파일과 합쳐서 찾음)
+        known_sessions = {**load_sessions(), **sessions}
         # 같은 레포의 기존 세션 찾기
-        existing_sessions = [s_id for s_id, s_data in app_sessions.items() 
+        existing_sessions = [s_id for s_id, s_data in known_sessions.items() 
                             if s_data.get('repo_url') == repo_url]
         
         # 세션 데이터 초기화
-        app_sessions[session_id] = {
+        sessions[session_id] = {
             'repo_url': repo_url,
             'token': token
         }
@@ -387,14 +483,14 @@ def new_chat():
         # 기존 세션이 있으면 파일 정보 복사
         if existing_sessions:
             existing_session_id = existing_sessions[0]
-            existing_data = app_sessions.get(existing_session_id, {})
+            existing_data = known_sessions.get(existing_session_id, {})
             if 'files' in existing_data:
-                app_sessions[session_id]['files'] = existing_data['files']
+                sessions[session_id]['files'] = existing_data['files']
             if 'directory_structure' in existing_data:
-                app_sessions[session_id]['directory_structure'] = existing_data['directory_structure']
+                sessions[session_id]['directory_structure'] = existing_data['directory_structure']
         
         # 세션 데이터 저장
-        save_sessions(app_sessions)
+        save_sessions({session_id: sessions[session_id]})
     except Exception as e:
         print(f"[ERROR] 세션 메모리 업데이트 실패: {e}")
     
@@ -435,7 +531,7 @@ def analyze():
             return jsonify({'status': '에러', 'error': '올바른 GitHub 저장소 URL을 입력하세요.'}), 400
         
         # GitHub 분석 모듈 미리 임포트
-        from github_analyzer import analyze_repository, GitHubRepositoryFetcher
+        from github_analyzer import analyze_repository, has_repo_artifacts, restore_repo_artifacts
         
         # 새 세션 ID 생성 - 처음부터 생성하여 사용
         session_id = str(uuid.uuid4())
@@ -445,14 +541,16 @@ def analyze():
         existing_session = db.get_session_by_repo_url(user_id, repo_url)
         if existing_session:
             session_id = existing_session['session_id']
+            resource_manager.touch(session_id)
             print(f"[DEBUG] 기존에 분석된 레포지토리를 발견했습니다. 세션 ID: {session_id}")
             # 채팅 기록 가져오기
             chat_history = db.get_chat_history(session_id)
             if chat_history:
                 print(f"[DEBUG] 기존 채팅 기록이 {len(chat_history)}건 있습니다.")
             
-            # 기존 세션 데이터가 메모리에 없으면 복원
-            if session_id not in sessions:
+            # 기존 세션 데이터가 메모리에 없거나 저장소 산출물(클론, 인덱스)이 정리되었으면 복원
+            ensure_session_loaded(session_id)
+            if session_id not in sessions or 'files' not in sessions[session_id] or not has_repo_artifacts(session_id):
                 print(f"[DEBUG] 세션 ID {session_id}의 데이터를 메모리에 복원합니다.")
                 # DB에서 조회한 세션 정보로 기본 데이터 설정
                 sessions[session_id] = {
@@ -460,35 +558,14 @@ def analyze():
                     'token': token
                 }
                 
-                # github_analyzer.py 사용하여 파일 정보 복원 (필요시)
+                # 인덱스가 남아 있으면 클론만 다시 받고, 없으면 새로 분석
                 try:
-                    # 레포지토리에서 직접 파일 정보 불러오기
-                    fetcher = GitHubRepositoryFetcher(repo_url, token, session_id)
-                    if fetcher.repo_path and os.path.exists(fetcher.repo_path):
-                        print(f"[DEBUG] 기존 저장소 경로 확인: {fetcher.repo_path}")
-                        # 기존 데이터 불러오기
-                        if fetcher.load_repo_data():
-                            sessions[session_id]['files'] = fetcher.files
-                            sessions[session_id]['directory_structure'] = fetcher.get_directory_structure()
-                            save_sessions(sessions)
-                            print(f"[DEBUG] 세션 ID {session_id}의 기존 파일 정보가 복원되었습니다.")
-                        else:
-                            print(f"[WARNING] 기존 데이터 불러오기 실패, 새로 분석합니다")
-                            # 실패시 새로 분석
-                            result = analyze_repository(repo_url, token, session_id)
-                            if 'files' in result and 'directory_structure' in result:
-                                sessions[session_id]['files'] = result['files']
-                                sessions[session_id]['directory_structure'] = result['directory_structure']
-                                save_sessions(sessions)
-                                print(f"[DEBUG] 세션 ID {session_id}의 파일 정보가 재분석되어 복원되었습니다.")
-                    else:
-                        # 저장소 폴더가 없으면 새로 분석
-                        result = analyze_repository(repo_url, token, session_id)
-                        if 'files' in result and 'directory_structure' in result:
-                            sessions[session_id]['files'] = result['files']
-                            sessions[session_id]['directory_structure'] = result['directory_structure']
-                            save_sessions(sessions)
-                            print(f"[DEBUG] 세션 ID {session_id}의 파일 정보가 새로 분석되어 복원되었습니다.")
+                    result = restore_repo_artifacts(repo_url, token, session_id)
+                    if 'files' in result and 'directory_structure' in result:
+                        sessions[session_id]['files'] = result['files']
+                        sessions[session_id]['directory_structure'] = result['directory_structure']
+                        save_sessions({session_id: sessions[session_id]})
+                        print(f"[DEBUG] 세션 ID {session_id}의 파일 정보가 복원되었습니다.")
                 except Exception as e:
                     print(f"[WARNING] 세션 파일 정보 복원 중 오류: {e}")
                     traceback.print_exc()
@@ -532,6 +609,7 @@ def analyze():
                     # 코드 분석 시작 - 30%
                     yield json.dumps({'status': '코드 분석 시작...', 'progress': 30, 'session_id': session_id}) + '\n'
                     
+                    resource_manager.touch(session_id)
                     result = analyze_repository(repo_url, token, session_id)
                     print(f"[DEBUG] analyze_repository 결과: {list(result.keys())}")
                     
@@ -593,7 +671,7 @@ def analyze():
                 }
                 
                 # 세션 데이터를 파일에 저장 (기존 호환성 유지)
-                save_sessions(sessions)
+                save_sessions({session_id: sessions[session_id]})
                 
                 # 세션 데이터를 데이터베이스에 저장
                 db.create_session(session_id, user_id, repo_url, token)
@@ -637,6 +715,8 @@ def chat_api():
         message = data.get('message')
         if not session_id or not message:
             return jsonify({'error': '세션ID와 질문을 모두 입력하세요.'}), 400
+        if data.get('stream'):
+            return stream_events(chat_events(session_id, message), '챗봇 응답')
         try:
             import chat_handler
             result = chat_handler.handle_chat(session_id, message)
@@ -685,6 +765,8 @@ def modify_request():
         message = data.get('message')
         if not session_id or not message:
             return jsonify({'error': '세션ID와 수정 요청을 모두 입력하세요.'}), 400
+        if data.get('stream'):
+            return stream_events(modify_events(session_id, message), '코드 수정')
         try:
             result = handle_modify_request(session_id, message)
             return jsonify(result)
@@ -721,6 +803,7 @@ def apply_changes_api():
             return jsonify({'error': '세션ID, 파일명, 코드 내용을 모두 입력하세요.'}), 400
         
         # GitHub 푸시 요청 시 토큰 확인
+        ensure_session_loaded(session_id)
         if push_to_github and not sessions.get(session_id, {}).get('token'):
             return jsonify({
                 'error': 'GitHub 토큰이 없어 원격 저장소에 푸시할 수 없습니다. 시작 화면에서 토큰을 입력해주세요.',
@@ -770,6 +853,7 @@ def check_push_intent():
         has_push_intent = detect_github_push_intent(message)
         
         # 토큰 확인
+        ensure_session_loaded(session_id)
         token_exists = bool(sessions.get(session_id, {}).get('token'))
         
         return jsonify({
@@ -798,8 +882,8 @@ def push_to_github():
         if not all([session_id, file_name, modified_code]):
             return jsonify({'success': False, 'error': '필수 파라미터가 누락되었습니다.'})
         
-        # 세션 데이터 확인
-        if session_id not in sessions:
+        # 세션 데이터 확인 (다른 워커가 만든 세션이면 파일에서 복원)
+        if not ensure_session_loaded(session_id):
             return jsonify({'success': False, 'error': '세션을 찾을 수 없습니다.'})
         
         # 토큰 확인
@@ -836,8 +920,8 @@ def apply_local():
         if not all([session_id, file_name, modified_code]):
             return jsonify({'success': False, 'error': '필수 파라미터가 누락되었습니다.'})
         
-        # 세션 데이터 확인
-        if session_id not in sessions:
+        # 세션 데이터 확인 (다른 워커가 만든 세션이면 파일에서 복원)
+        if not ensure_session_loaded(session_id):
             return jsonify({'success': False, 'error': '세션을 찾을 수 없습니다.'})
         
         # 변경사항 로컬에만 적용
@@ -974,9 +1058,13 @@ def delete_chat_session():
     remaining_sessions = db.get_all_chat_sessions(user_id, repo_url)
     next_session_id = remaining_sessions[0]['session_id'] if remaining_sessions else None
     
-    # 세션 데이터에서도 삭제
+    # 세션 데이터에서도 삭제 (세션 파일 포함)
     if session_id in sessions:
         del sessions[session_id]
+    save_sessions(removed=[session_id])
+    
+    # 클론, 저장소 인덱스, 대화 기록 컬렉션 삭제
+    resource_manager.purge_session(session_id)
     
     return jsonify({
         'status': '성공', 
@@ -984,5 +1072,13 @@ def delete_chat_session():
         'next_session_id': next_session_id
     })
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """단계별 소요 시간(p50/p95 등), 카운터, 답변 캐시 적중률, 저장 큐 지연, DB 연결 풀 사용률 조회 API"""
+    if 'user_id' not in session:
+        return jsonify({'status': '에러', 'error': '로그인이 필요합니다.'}), 401
+    return jsonify({**metrics.snapshot(), 'answer_cache': answer_cache.stats(),
+                    'persist_queue': persistence_queue.stats(), 'db_pool': db.pool.stats()})
+
 if __name__ == '__main__':
     app.run(debug=False) 
\ No newline at end of file
@@ -0,0 +1,90 @@
+"""
+비동기(ASGI) 서버 진입점
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+
+WSGI(app.run)에서는 진행 중인 채팅 하나가 LLM 응답 시간(수십 초) 내내 워커 스레드 하나를 점유하므로
+동시 채팅 수가 스레드 수로 제한됩니다. 여기서는 /chat, /modify_request를 이벤트 루프에서 처리합니다.
+
+    - 검색, 대화 기록 저장 같은 동기 단계(chromadb, pymysql)는 스레드에서 짧게 실행
+    - LLM 응답은 AsyncOpenAI로 스트리밍하므로 기다리는 동안 스레드를 점유하지 않음
+
+나머지 라우트(로그인, /analyze 등)는 기존 Flask 앱을 그대로 사용합니다.
+Flask 세션 쿠키는 환경 변수 SECRET_KEY로 서명하므로, 모든 워커에 같은 SECRET_KEY를 설정하면 여러 워커로 실행할 수 있습니다.
+"""
+
+import json
+import traceback
+
+from asgiref.wsgi import WsgiToAsgi
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route, Mount
+
+from app import app as flask_app
+from chat_handler import chat_events, modify_events
+from pipeline import atoken_events
+
+
+def logged_in(request) -> bool:
+    """Flask 세션 쿠키를 검증해 로그인 여부를 확인합니다."""
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    cookie = request.cookies.get(flask_app.config['SESSION_COOKIE_NAME'])
+    if not serializer or not cookie:
+        return False
+    try:
+        data = serializer.loads(cookie, max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+    except Exception:
+        return False
+    return 'user_id' in data
+
+
+def answer_endpoint(make_events, missing_message: str, error_label: str):
+    """
+    답변 생성기(chat_events/modify_events)를 실행하는 비동기 라우트를 만듭니다.
+    요청 형식과 응답은 app.py의 같은 라우트와 같습니다. ({"stream": true}면 NDJSON 스트리밍)
+    """
+    async def endpoint(request):
+        if not logged_in(request):
+            return JSONResponse({'error': '로그인이 필요합니다.'}, status_code=401)
+        data = await request.json()
+        session_id = data.get('session_id')
+        message = data.get('message')
+        if not session_id or not message:
+            return JSONResponse({'error': missing_message}, status_code=400)
+        events = atoken_events(make_events(session_id, message))
+
+        if data.get('stream'):
+            async def generate():
+                try:
+                    async for event in events:
+                        yield json.dumps(event) + '\n'
+                except Exception as e:
+                    print(f"[{error_label} 에러]", str(e))
+                    traceback.print_exc()
+                    yield json.dumps({'type': 'error', 'error': f'{error_label} 오류: {str(e)}',
+                                      'answer': f'{error_label} 중 오류가 발생했습니다: {str(e)}'}) + '\n'
+
+            return StreamingResponse(generate(), media_type='application/x-ndjson',
+                                     headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+        try:
+            result = {}
+            async for event in events:
+                if event['type'] == 'done':
+                    result = {key: value for key, value in event.items() if key != 'type'}
+            return JSONResponse(result)
+        except Exception as e:
+            print(f"[{error_label} 에러]", str(e))
+            traceback.print_exc()
+            return JSONResponse({'error': f'{error_label} 오류: {str(e)}'}, status_code=500)
+
+    return endpoint
+
+
+application = Starlette(routes=[
+    Route('/chat', answer_endpoint(chat_events, '세션ID와 질문을 모두 입력하세요.', '챗봇 응답'), methods=['POST']),
+    Route('/modify_request', answer_endpoint(modify_events, '세션ID와 수정 요청을 모두 입력하세요.', '코드 수정'),
+          methods=['POST']),
+    Mount('/', app=WsgiToAsgi(flask_app)),
+])
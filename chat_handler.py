@@ -2,18 +2,36 @@
 
 import openai
 import chromadb
-from github_analyzer import chroma_client
+from github_analyzer import chroma_client, get_repo_store, get_lexical_index, get_symbol_table, get_code_graph, repo_head_commit, \
+    has_repo_artifacts, restore_repo_artifacts
+from retrieval import scoped_query, retrieve_candidates
+from lexical_index import is_identifier_query
+from symbol_table import read_symbol_source
+from resource_manager import resource_manager
+from pipeline import StepRunner, drain
+from answer_cache import answer_cache, normalize_question, normalize_repo, is_cacheable_question
+from singleflight import SingleFlight
+from persistence_queue import persistence_queue
+from intent_classifier import classify_push_intent, classify_question_role, PUSH_LABEL, \
+    PUSH_INTENT_LLM_THRESHOLD, ROLE_TAG_LLM_THRESHOLD
+from context_packer import ANSWER_MODEL, ContextPacker, context_budget, chunk_tokens, estimate_tokens
+from code_slicer import pack_modify_context, parse_region_edits, apply_region_edits
+from code_graph import GRAPH_EXPANSION_ENABLED, GRAPH_SEED_COUNT, GRAPH_NEIGHBOUR_BUDGET_RATIO
+from repo_outline import repo_outline, related_tree, session_paths
 from git_modifier import create_branch_and_commit
 import re
-import tiktoken
-from chat_memory import save_conversation, get_relevant_conversations
+import os
+from chat_memory import save_conversation, get_conversation_context
 import db  # DB 모듈 임포트 추가
 
-# OpenAI 토큰 계산용 tokenizer 초기화
-enc = tiktoken.get_encoding("cl100k_base")
-
 # top-k 유사 청크 개수
 TOP_K = 5
+RERANK_WEIGHT = 5  # 청크 스코어링에서 재순위 점수(0~1)의 가중치
+MAX_SYMBOL_CONTEXT = 3  # 심볼 테이블에서 바로 컨텍스트에 넣을 최대 정의 수
+MAX_USAGE_REFERENCES = 10  # 정의와 함께 보여줄 최대 사용 위치 수
+EMBEDDING_TIMEOUT = float(os.environ.get("EMBEDDING_TIMEOUT", 10))  # 질문 임베딩 제한 시간(초)
+INTENT_TAG_TIMEOUT = float(os.environ.get("INTENT_TAG_TIMEOUT", 8))  # 질문 의도 태깅 제한 시간(초)
+MEMORY_LOOKUP_TIMEOUT = float(os.environ.get("MEMORY_LOOKUP_TIMEOUT", 8))  # 이전 대화 조회 제한 시간(초)
 
 # 새로운 역할과 메타데이터를 활용한 시스템 프롬프트
 SYSTEM_PROMPT_QA = """당신은 코드 분석과 이해에 특화된 전문적인 소프트웨어 엔지니어 AI입니다.
@@ -64,36 +82,17 @@ SYSTEM_PROMPT_MODIFY = """당신은 코드 리팩터링, 버그 수정, 기능 
 4. 수정이 다른 파일에 영향을 미칠 수 있는지 확인하고, 필요하다면 관련 변경 사항도 함께 제안하거나 명시하세요.
 
 **수정된 코드 반환 형식:**
-- 수정된 코드는 반드시 '// FILE: 파일명\n<전체 코드>' 형식으로 작성하세요.
+- 파일 전체가 제공된 경우: 반드시 '// FILE: 파일명\n<전체 코드>' 형식으로 작성하세요.
+- 파일의 일부 영역('// REGION: 시작-끝')만 제공된 경우: '// FILE: 파일명' 아래에 수정한 영역만 '// REGION: 시작-끝\n<수정된 영역 전체 코드>' 형식으로 작성하세요. 시작-끝은 제공된 영역의 라인 번호를 그대로 쓰고, 수정하지 않은 영역은 생략합니다.
 - 주요 변경 사항을 한글 주석으로 표시하여 사용자가 변경을 쉽게 이해할 수 있게 하세요.
 - 불필요한 변경은 하지 말고, 요청한 부분만 명확하게 반영하세요.
 """
 
-# 확장된 메타데이터와 계층적 코드 구조를 활용한 프롬프트
-PROMPT_TEMPLATE = """
-아래는 사용자의 질문과 관련된 코드 컨텍스트, 프로젝트 구조, 이전 대화 기록 및 엔티티 관계입니다.
-
-[프로젝트 디렉토리 구조]
-{directory_structure}
-
-[이전 대화 기록]
-{conversation_history}
-
-[코드 컨텍스트]
-각 코드 청크는 다음 메타데이터를 포함할 수 있습니다:
-- 기본 정보: 파일명, 함수명, 클래스명, 시작/종료 라인
-- 구조 정보: 청크 타입(class, method, function, code), 부모 엔티티
-- 추가 특성: 복잡도 점수, 상속 관계, 역할 태그
-
-{context}
-
-[질문]
-{question}
-
-**이 질문에 답변할 때, 다음 전략과 지침을 엄격히 따르세요:**
+# 질문 답변 지침 (고정 문자열: 시스템 프롬프트, 저장소 개요와 함께 프롬프트 캐싱 접두어가 됨)
+QA_GUIDELINES = """**질문에 답변할 때, 다음 전략과 지침을 엄격히 따르세요:**
 
 **1. 정보 종합 및 핵심 파악:**
-   - 제공된 모든 정보([프로젝트 디렉토리 구조], [이전 대화 기록], [코드 컨텍스트], [질문])를 면밀히 검토합니다.
+   - 제공된 모든 정보([프로젝트 구조 개요], [관련 파일 위치], [이전 대화 기록], [코드 컨텍스트], [질문])를 면밀히 검토합니다.
    - 질문의 핵심 의도와 가장 직접적으로 관련된 코드 청크, 메타데이터, 이전 대화 내용을 식별합니다.
 
 **2. 컨텍스트 심층 분석 및 활용:**
@@ -101,7 +100,7 @@ PROMPT_TEMPLATE = """
    - 부모-자식 관계와 상속 관계를 고려하여 코드의 구조적 맥락을 유지하세요.
    - 복잡도 점수가 높은 청크는 중요한 비즈니스 로직일 가능성이 높으니 특별히 주의하여 분석하고 설명에 반영하세요.
    - 역할 태그를 활용하여 코드의 기능적 의도를 파악하고, 이를 답변의 주요 근거로 활용하세요.
-   - 프로젝트 디렉토리 구조를 참고하여 파일 간의 연관성이나 전체 시스템에서의 역할 등을 설명에 포함하세요.
+   - 프로젝트 구조 개요와 관련 파일 위치를 참고하여 파일 간의 연관성이나 전체 시스템에서의 역할 등을 설명에 포함하세요.
 
 **3. 논리적이고 명확한 답변 생성:**
    - 분석된 내용을 바탕으로, 단계별로 명확하고 논리적인 답변을 구성합니다.
@@ -124,25 +123,35 @@ PROMPT_TEMPLATE = """
    - 답변의 신뢰도를 높이기 위해, 항상 답변의 출처(파일명, 함수명, 역할 등)를 함께 제시하세요.
 """
 
-MODIFY_PROMPT_TEMPLATE = """
-아래는 사용자의 코드 수정 요청과 관련된 코드 청크, 프로젝트 구조 및 이전 대화 기록입니다.
+# 질문마다 달라지는 부분 (확장된 메타데이터와 계층적 코드 구조를 활용한 프롬프트)
+PROMPT_TEMPLATE = """
+아래는 사용자의 질문과 관련된 코드 컨텍스트, 관련 파일 위치, 이전 대화 기록 및 엔티티 관계입니다.
 
-[프로젝트 디렉토리 구조]
+[관련 파일 위치]
 {directory_structure}
 
-[이전 관련 대화]
+[이전 대화 기록]
 {conversation_history}
 
 [코드 컨텍스트]
+각 코드 청크는 다음 메타데이터를 포함할 수 있습니다:
+- 기본 정보: 파일명, 함수명, 클래스명, 시작/종료 라인
+- 구조 정보: 청크 타입(class, method, function, code), 부모 엔티티
+- 추가 특성: 복잡도 점수, 상속 관계, 역할 태그
+
 {context}
 
-[수정 요청]
-{request}
+[질문]
+{question}
+
+시스템 메시지의 답변 전략과 지침에 따라 답변하세요.
+"""
 
-**요청된 코드를 수정할 때, 다음 전략과 지침을 엄격히 따르세요:**
+# 코드 수정 지침 (고정 문자열: 시스템 프롬프트, 저장소 개요와 함께 프롬프트 캐싱 접두어가 됨)
+MODIFY_GUIDELINES = """**요청된 코드를 수정할 때, 다음 전략과 지침을 엄격히 따르세요:**
 
 **1. 정보 종합 및 핵심 파악:**
-   - 제공된 모든 정보([프로젝트 디렉토리 구조], [이전 관련 대화], [코드 컨텍스트], [수정 요청])를 면밀히 검토합니다.
+   - 제공된 모든 정보([프로젝트 구조 개요], [관련 파일 위치], [이전 관련 대화], [코드 컨텍스트], [수정 요청])를 면밀히 검토합니다.
    - 수정 요청의 핵심 의도와 가장 직접적으로 관련된 코드 청크, 메타데이터, 이전 대화 내용을 식별합니다.
 
 **2. 컨텍스트 심층 분석 및 반영:**
@@ -150,22 +159,47 @@ MODIFY_PROMPT_TEMPLATE = """
    - 특히, 계층적 코드 구조와 상속 관계를 파악하여 영향을 받을 수 있는 모든 부분을 고려합니다.
    - 복잡도가 높은 코드를 수정할 때는 기존 로직이 손상되지 않도록 각별히 주의합니다.
    - 역할 태그를 참고하여 코드의 원래 목적과 기능이 유지되거나 개선되도록 합니다.
-   - 프로젝트 디렉토리 구조를 고려하여, 수정 사항이 다른 파일이나 모듈에 미칠 수 있는 잠재적 영향을 평가합니다.
+   - 프로젝트 구조 개요와 관련 파일 위치를 고려하여, 수정 사항이 다른 파일이나 모듈에 미칠 수 있는 잠재적 영향을 평가합니다.
 
 **3. 정확하고 완전한 코드 생성:**
-   - 분석된 내용을 바탕으로, 아래 지정된 형식에 맞춰 수정된 **전체 코드**를 생성합니다.
+   - 분석된 내용을 바탕으로, 아래 지정된 형식에 맞춰 수정된 코드를 생성합니다. 파일 전체가 제공되면 **전체 코드**를, 일부 영역만 제공되면 **수정한 영역의 전체 코드**를 작성합니다.
+   - 일부 영역만 제공된 파일의 [개요]는 참고용이며, 개요에만 있는 정의는 수정하지 않습니다.
    - 불필요한 변경은 최소화하고, 요청된 부분만 명확하게 반영합니다.
    - 이전 대화에서 논의된 수정 사항이 있다면 반드시 일관성을 유지합니다.
 
 **4. 코드 반환 형식 및 추가 설명:**
-   아래 형식으로 전체 코드를 수정해서 보여주세요.
+   파일 전체가 제공된 경우 아래 형식으로 전체 코드를 수정해서 보여주세요.
    // FILE: 파일명
    <수정된 전체 코드>
 
+   파일의 일부 영역('// REGION: 시작-끝')만 제공된 경우 수정한 영역만 아래 형식으로 보여주세요. (라인 번호는 제공된 영역 그대로)
+   // FILE: 파일명
+   // REGION: 시작-끝
+   <수정된 영역 전체 코드>
+
    - 반드시 한글 주석을 주요 변경 사항 위주로 포함하여 사용자가 이해하기 쉽게 만드세요.
    - 코드 외에 추가적인 설명(예: 변경 이유, 잠재적 영향 등)이 필요하다고 판단되면, 코드 블록 아래에 명확하게 작성하세요.
 """
 
+# 수정 요청마다 달라지는 부분
+MODIFY_PROMPT_TEMPLATE = """
+아래는 사용자의 코드 수정 요청과 관련된 코드 영역, 관련 파일 위치 및 이전 대화 기록입니다.
+
+[관련 파일 위치]
+{directory_structure}
+
+[이전 관련 대화]
+{conversation_history}
+
+[코드 컨텍스트]
+{context}
+
+[수정 요청]
+{request}
+
+시스템 메시지의 수정 전략, 지침과 반환 형식에 따라 코드를 수정하세요.
+"""
+
 def parse_llm_code_response(llm_response):
     # // FILE: ... 또는 파일명: ... 패턴에서 파일명과 코드 추출
     m = re.search(r'// FILE: ([^\n]+)\n([\s\S]+)', llm_response)
@@ -176,70 +210,230 @@ def parse_llm_code_response(llm_response):
         return m2.group(1).strip(), m2.group(2).strip()
     return None, llm_response.strip()
 
+def build_system_prompt(system_prompt, guidelines, outline):
+    """
+    시스템 프롬프트 + 고정 지침 + 저장소 개요를 하나의 시스템 메시지로 만듭니다.
+
+    질문과 무관한 부분만 담기 때문에 같은 저장소에서는 매 턴 바이트 단위로 같은 접두어가 되어
+    제공자의 프롬프트 캐싱이 적용됩니다. (질문마다 달라지는 내용은 user 메시지에만 넣음)
+    """
+    return f"{system_prompt}\n{guidelines}\n[프로젝트 구조 개요]\n{outline or '프로젝트 구조 정보가 없습니다.'}\n"
+
+def definition_identity(entry):
+    """심볼 테이블/코드 그래프 정의를 청크 중복 제거용 식별자(경로:함수:클래스)로 변환"""
+    parent_name = entry['parent'].rsplit('.', 1)[-1] if entry['parent'] else ''
+    if entry['kind'] == 'class':
+        return f"{entry['path']}::{entry['name']}"
+    return f"{entry['path']}:{entry['name']}:{parent_name}"
+
+def tag_question_intent(message):
+    """
+    질문의 의도(원하는 코드 역할/기능)를 짧은 한글 태그로 요약합니다. (청크 스코어링용)
+
+    로컬 분류기의 신뢰도가 ROLE_TAG_LLM_THRESHOLD 이상이면 그 태그를 쓰고, 낮을 때만 LLM에 요약을 요청합니다.
+
+    Returns:
+        str: 의도 태그 (실패 시 빈 문자열)
+    """
+    local = classify_question_role(message)
+    if local.confidence >= ROLE_TAG_LLM_THRESHOLD:
+        print(f"[DEBUG] 로컬 의도 분류: {local.label} (신뢰도 {local.confidence:.2f})")
+        return local.label
+    print(f"[DEBUG] 로컬 의도 분류 신뢰도 낮음 ({local.label}, {local.confidence:.2f}), LLM 태깅 사용")
+    try:
+        tag_prompt = f"아래 질문의 의도(원하는 코드 역할/기능)를 한글로 간단히 요약해줘.\n\n질문:\n{message}"
+        tag_resp = openai.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=[{"role": "user", "content": tag_prompt}],
+            temperature=0.0,
+            max_tokens=64,
+            timeout=INTENT_TAG_TIMEOUT
+        )
+        return tag_resp.choices[0].message.content.strip()
+    except Exception as e:
+        print(f"[WARNING] 질문 의도 태깅 실패: {e}")
+        return ''
+
+def persist_chat_turn(job):
+    """
+    저장 큐 작업 처리: 대화 한 턴을 DB 채팅 기록(한 트랜잭션)과 대화 메모리에 저장합니다.
+    DB 저장이 실패하면 False를 반환해 큐가 재시도합니다. (메모리 저장은 중복 질문이면 건너뜀)
+    """
+    session_id, question, answer = job['session_id'], job['question'], job['answer']
+    if job.get('chat_history', True):
+        if not db.add_chat_turn(session_id, [('user', question), ('assistant', answer)]):
+            return False
+    save_conversation(session_id, question, answer)
+    return True
+
+persistence_queue.register('chat_turn', persist_chat_turn)
+
+def record_answer(session_id, message, answer):
+    """대화 기록(DB + 대화 메모리) 저장을 저장 큐에 넣습니다. 응답은 저장을 기다리지 않습니다."""
+    persistence_queue.enqueue('chat_turn', session_id=session_id, question=message, answer=answer)
+
+def cached_answer_response(session_id, message, cached):
+    """캐시된 답변으로 응답합니다."""
+    answer = cached['answer']
+    print(f"[INFO] 답변 캐시 적중 (유사도: {cached['similarity']:.4f}, 캐시된 질문: '{cached['question'][:50]}')")
+    record_answer(session_id, message, answer)
+    return {'answer': answer, 'cached': True}
+
+def shared_answer_response(session_id, message, result):
+    """진행 중이던 같은 요청의 결과로 응답합니다. (정상 답변이면 이 세션의 대화 기록도 남김)"""
+    result = dict(result or {})
+    if result.get('answer') and not result.get('error'):
+        record_answer(session_id, message, result['answer'])
+    result['coalesced'] = True
+    return result
+
+# 진행 중인 동일 질문 합치기 (metrics: chat.coalesced)
+chat_flights = SingleFlight("chat")
+
+_async_openai = None
+
+def get_async_openai():
+    """비동기 서버용 AsyncOpenAI 클라이언트 (처음 사용할 때 생성)"""
+    global _async_openai
+    if _async_openai is None:
+        _async_openai = openai.AsyncOpenAI()
+    return _async_openai
+
+class CompletionCall:
+    """
+    답변 생성기가 yield하는 LLM 스트리밍 호출 (실행 방식은 소비하는 쪽이 선택)
+
+    - run: 동기 클라이언트로 스트리밍 (WSGI, 비스트리밍 호출)
+    - arun: AsyncOpenAI로 스트리밍 (ASGI, 응답을 기다리는 동안 스레드를 점유하지 않음)
+
+    전체 생성 시간은 llm 단계로, 요청 시작부터 첫 토큰까지 걸린 시간은 first_token 단계로 기록합니다.
+    """
+
+    def __init__(self, steps, **kwargs):
+        self.steps = steps
+        self.kwargs = kwargs
+        self._first = True
+
+    def _delta(self, chunk):
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if delta and self._first:
+            self._first = False
+            self.steps.mark("first_token")
+            print(f"[DEBUG] {self.steps.name} 첫 토큰까지 {self.steps.timings['first_token'] * 1000:.0f}ms")
+        return delta
+
+    def run(self):
+        with self.steps.timed("llm"):
+            for chunk in openai.chat.completions.create(stream=True, **self.kwargs):
+                delta = self._delta(chunk)
+                if delta:
+                    yield delta
+
+    async def arun(self):
+        with self.steps.timed("llm"):
+            stream = await get_async_openai().chat.completions.create(stream=True, **self.kwargs)
+            async for chunk in stream:
+                delta = self._delta(chunk)
+                if delta:
+                    yield delta
+
 def handle_chat(session_id, message):
-    # app.py의 sessions 데이터에서 세션 정보 확인
+    """질문에 대한 답변 결과 dict를 반환합니다. (chat_events를 스트리밍 없이 끝까지 실행)"""
+    return drain(chat_events(session_id, message))
+
+def chat_events(session_id, message):
+    """
+    질문 처리 생성기 (pipeline.drain/token_events/atoken_events로 실행)
+
+    같은 저장소·커밋에 같은 질문이 이미 처리 중이면 새로 계산하지 않고 그 결과와 토큰 스트림을 함께 받습니다.
+    이전 대화에 기대는 질문은 세션마다 답이 달라지므로 같은 세션 안의 중복(더블 클릭, 재시도)만 합칩니다.
+    """
+    from app import sessions, ensure_session_loaded
+    ensure_session_loaded(session_id)
+    repo_url = sessions.get(session_id, {}).get('repo_url')
+    question = normalize_question(message)
+    if repo_url and is_cacheable_question(message):
+        key = (normalize_repo(repo_url), repo_head_commit(session_id), question)
+    else:
+        key = (session_id, question)
+    return (yield from chat_flights.events(key, lambda: answer_events(session_id, message),
+                                           lambda result: shared_answer_response(session_id, message, result)))
+
+def restore_session_data(session_id):
+    """
+    세션 데이터를 반환합니다. 세션 정보가 없거나 리소스 정리로 저장소 산출물(클론, 인덱스)이 삭제되었으면
+    먼저 복원합니다. (인덱스가 남아 있으면 클론만 다시 받고, 없으면 새로 분석)
+
+    Returns:
+        dict: 세션 데이터 (복원하지 못했으면 빈 dict)
+    """
     from app import sessions
-    print(f"[DEBUG] 현재 세션 ID: {session_id}")
-    print(f"[DEBUG] 사용 가능한 세션 키: {list(sessions.keys())}")
-    
     session_data = sessions.get(session_id, {})
-    repo_path = f"./repos/{session_id}"
-    
-    # 세션 데이터가 없으면 메모리에 복원 시도
-    if not session_data:
-        print(f"[WARNING] 메모리에 세션 {session_id} 데이터가 없습니다. 복원을 시도합니다.")
+    if not session_data or 'files' not in session_data or not has_repo_artifacts(session_id):
+        print(f"[WARNING] 세션 {session_id}의 저장소 데이터가 없습니다. 복원을 시도합니다.")
         
-        # DB에서 세션 정보 조회
         try:
-            import db
-            import os
-            from github_analyzer import GitHubAnalyzer
-            
-            # DB에서 세션 정보 조회
-            db_conn = db.get_db_connection()
-            if db_conn:
-                try:
-                    with db_conn.cursor() as cursor:
-                        cursor.execute("SELECT * FROM sessions WHERE session_id = %s", (session_id,))
-                        db_session = cursor.fetchone()
-                finally:
-                    db_conn.close()
-                
+            repo_url = session_data.get('repo_url')
+            token = session_data.get('token')
+            if not repo_url:
+                # DB에서 세션 정보 조회
+                db_conn = db.get_db_connection()
+                db_session = None
+                if db_conn:
+                    try:
+                        with db_conn.cursor() as cursor:
+                            cursor.execute("SELECT * FROM sessions WHERE session_id = %s", (session_id,))
+                            db_session = cursor.fetchone()
+                    finally:
+                        db_conn.close()
                 if db_session:
                     print(f"[DEBUG] DB에서 세션 정보를 찾았습니다: {db_session}")
                     repo_url = db_session.get('repo_url')
                     token = db_session.get('token')
+            
+            if repo_url:
+                # 세션 데이터 메모리에 복원
+                sessions[session_id] = {**session_data, 'repo_url': repo_url, 'token': token}
+                
+                # 저장소 파일 정보 복원 (인덱스가 남아 있으면 클론만 다시 받고, 없으면 새로 분석)
+                try:
+                    result = restore_repo_artifacts(repo_url, token, session_id)
+                    if 'files' in result and 'directory_structure' in result:
+                        sessions[session_id]['files'] = result['files']
+                        sessions[session_id]['directory_structure'] = result['directory_structure']
+                        # 메모리에 세션 데이터 저장
+                        from app import save_sessions
+                        save_sessions({session_id: sessions[session_id]})
+                        print(f"[DEBUG] 세션 데이터 복원 성공")
                     
-                    # 세션 데이터 메모리에 복원
-                    sessions[session_id] = {
-                        'repo_url': repo_url,
-                        'token': token
-                    }
-                    
-                    # 저장소 파일 정보 복원
-                    try:
-                        analyzer = GitHubAnalyzer(repo_url, token, session_id)
-                        if os.path.exists(analyzer.repo_path):
-                            print(f"[DEBUG] 기존 저장소 경로 확인: {analyzer.repo_path}")
-                            if analyzer.load_repo_data():
-                                sessions[session_id]['files'] = analyzer.files
-                                sessions[session_id]['directory_structure'] = analyzer.get_directory_structure()
-                                # 메모리에 세션 데이터 저장
-                                from app import save_sessions
-                                save_sessions(sessions)
-                                print(f"[DEBUG] 세션 데이터 복원 성공")
-                                
-                                # 복원된 세션 데이터 가져오기
-                                session_data = sessions.get(session_id, {})
-                    except Exception as e:
-                        import traceback
-                        print(f"[ERROR] 세션 데이터 복원 중 오류: {e}")
-                        traceback.print_exc()
+                    # 복원된 세션 데이터 가져오기
+                    session_data = sessions.get(session_id, {})
+                except Exception as e:
+                    import traceback
+                    print(f"[ERROR] 세션 데이터 복원 중 오류: {e}")
+                    traceback.print_exc()
         except Exception as e:
             import traceback
             print(f"[ERROR] 세션 메타데이터 조회 오류: {e}")
             traceback.print_exc()
     
+    return session_data
+
+def answer_events(session_id, message):
+    """
+    답변 생성기: 답변 LLM 호출을 CompletionCall로 yield해 전체 응답을 돌려받고 최종 결과 dict를 return합니다.
+    대화 기록 저장과 답변 캐시 저장은 스트림이 끝난 뒤에 합니다.
+    """
+    # app.py의 sessions 데이터에서 세션 정보 확인 (없으면 세션 파일에서 복원)
+    from app import sessions, ensure_session_loaded
+    ensure_session_loaded(session_id)
+    resource_manager.touch(session_id)
+    print(f"[DEBUG] 현재 세션 ID: {session_id}")
+    print(f"[DEBUG] 사용 가능한 세션 키: {list(sessions.keys())}")
+    
+    session_data = restore_session_data(session_id)
+    repo_path = f"./repos/{session_id}"
+    
     # 세션 데이터가 여전히 없으면 오류 반환
     if not session_data:
         return {
@@ -253,45 +447,82 @@ def handle_chat(session_id, message):
     full_file_contexts = []
     directory_structure = ""
     
+    # 같은 저장소·커밋에 같은 질문이 있었으면 캐시된 답변 반환 (임베딩/검색/LLM 호출 없음)
+    repo_url = session_data.get('repo_url')
+    indexed_commit = repo_head_commit(session_id)
+    cached = answer_cache.get(repo_url, indexed_commit, message, count_miss=False)
+    if cached:
+        return cached_answer_response(session_id, message, cached)
+    
+    # 벡터 검색과 무관한 네트워크 단계(의도 태깅, 이전 대화 조회)는 먼저 병렬로 시작하고,
+    # 임베딩 → 검색은 호출 스레드에서 진행 (LLM 호출 전 지연 = 가장 느린 단계)
+    steps = StepRunner("chat")
+    steps.submit("intent_tag", tag_question_intent, message, timeout=INTENT_TAG_TIMEOUT, default='')
+    steps.submit("memory_lookup", get_conversation_context, session_id, message,
+                 timeout=MEMORY_LOOKUP_TIMEOUT, default='이전 대화 없음')
+    
+    # 0. 어휘 색인/심볼 테이블 로드
+    #    질문에 언급된 심볼은 심볼 테이블에서 정의를 바로 찾고, 이 경우와 식별자만으로 된 질문은
+    #    임베딩 없이 어휘 검색으로 처리
+    scope = extract_scope_from_question(message)
+    lexical_index = get_lexical_index(session_id)
+    symbol_table = get_symbol_table(session_id)
+    code_graph = get_code_graph(session_id)
+    symbol_hits = symbol_table.find_in_text(message, scope['function'] + scope['class']) if symbol_table else []
+    if symbol_hits:
+        print(f"[DEBUG] 심볼 테이블 매칭: {[entry['qualified_name'] for entry in symbol_hits]}")
+    skip_embedding = bool(lexical_index) and (bool(symbol_hits) or (is_identifier_query(message) and lexical_index.has_symbol(message)))
+    embedding = None
+    
     # 1. 질문 임베딩 생성
-    print(f"[DEBUG] 질문 임베딩 생성 시작: '{message[:50]}...'")
-    try:
-        # OpenAI API 키 확인
-        api_key = openai.api_key
-        if not api_key:
-            print("[ERROR] OpenAI API 키가 설정되지 않았습니다.")
-            return {
-                'answer': "OpenAI API 키가 설정되지 않았습니다.",
-                'error': "api_key_missing"
-            }
-        print(f"[DEBUG] OpenAI API 키 확인: {api_key[:4]}...{api_key[-4:]}")
+    if skip_embedding:
+        print(f"[DEBUG] 식별자 질문으로 판단하여 임베딩 생략: '{message[:50]}'")
+    else:
+        print(f"[DEBUG] 질문 임베딩 생성 시작: '{message[:50]}...'")
+        with steps.timed("embedding"):
+            try:
+                # OpenAI API 키 확인
+                api_key = openai.api_key
+                if not api_key:
+                    print("[ERROR] OpenAI API 키가 설정되지 않았습니다.")
+                    return {
+                        'answer': "OpenAI API 키가 설정되지 않았습니다.",
+                        'error': "api_key_missing"
+                    }
+                print(f"[DEBUG] OpenAI API 키 확인: {api_key[:4]}...{api_key[-4:]}")
         
-        # 임베딩 생성 시도
-        print(f"[DEBUG] OpenAI 임베딩 API 호출 시도")
-        embedding_response = openai.embeddings.create(
-            input=message,
-            model="text-embedding-3-small"
-        )
+                # 임베딩 생성 시도
+                print(f"[DEBUG] OpenAI 임베딩 API 호출 시도")
+                embedding_response = openai.embeddings.create(
+                    input=normalize_question(message),
+                    model="text-embedding-3-small",
+                    timeout=EMBEDDING_TIMEOUT
+                )
         
-        # 임베딩 결과 처리
-        if not embedding_response or not embedding_response.data or not embedding_response.data[0].embedding:
-            print(f"[ERROR] 임베딩 결과가 비어 있습니다: {embedding_response}")
-            return {
-                'answer': "임베딩 생성 중 오류가 발생했습니다: 임베딩 결과가 비어 있습니다.",
-                'error': "empty_embedding"
-            }
+                # 임베딩 결과 처리
+                if not embedding_response or not embedding_response.data or not embedding_response.data[0].embedding:
+                    print(f"[ERROR] 임베딩 결과가 비어 있습니다: {embedding_response}")
+                    return {
+                        'answer': "임베딩 생성 중 오류가 발생했습니다: 임베딩 결과가 비어 있습니다.",
+                        'error': "empty_embedding"
+                    }
             
-        embedding = embedding_response.data[0].embedding
-        print(f"[DEBUG] 질문 임베딩 생성 성공 (차원: {len(embedding)})")
-    except Exception as e:
-        import traceback
-        print(f"[ERROR] 질문 임베딩 생성 실패: {e}")
-        traceback.print_exc()
-        return {
-            'answer': f"임베딩 생성 중 오류가 발생했습니다: {str(e)}",
-            'error': "embedding_error"
-        }
-
+                embedding = embedding_response.data[0].embedding
+                print(f"[DEBUG] 질문 임베딩 생성 성공 (차원: {len(embedding)})")
+            except Exception as e:
+                import traceback
+                print(f"[ERROR] 질문 임베딩 생성 실패: {e}")
+                traceback.print_exc()
+                return {
+                    'answer': f"임베딩 생성 중 오류가 발생했습니다: {str(e)}",
+                    'error': "embedding_error"
+                }
+    
+    # 질문 임베딩으로 비슷한 질문의 캐시된 답변 확인
+    cached = answer_cache.get(repo_url, indexed_commit, message, embedding)
+    if cached:
+        return cached_answer_response(session_id, message, cached)
+    
     # 2. ChromaDB에서 유사 코드 청크 검색
     try:
         # ChromaDB 클라이언트 상태 확인
@@ -306,42 +537,29 @@ def handle_chat(session_id, message):
         collection_name = f"repo_{session_id}"
         print(f"[DEBUG] ChromaDB 컬렉션 조회 시도: {collection_name}")
         
-        # 컬렉션 목록 확인
-        try:
-            collections = chroma_client.list_collections()
-            collection_names = [col.name for col in collections]
-            print(f"[DEBUG] 사용 가능한 컬렉션 목록: {collection_names}")
+        # 인덱스 가져오기 (캐시된 저장소 재사용, 크기에 따라 NumPy/ChromaDB 엔진)
+        try:    
+            collection = get_repo_store(session_id)
         except Exception as e:
             import traceback
-            print(f"[ERROR] ChromaDB 컬렉션 목록 조회 실패: {e}")
+            print(f"[ERROR] 컬렉션 가져오기 실패: {e}")
             traceback.print_exc()
             return {
                 'answer': f"저장소 분석 데이터 접근 중 오류가 발생했습니다: {str(e)}",
-                'error': "collection_list_error"
+                'error': "collection_access_error"
             }
         
         # 컬렉션 존재 여부 확인
-        if collection_name not in collection_names:
+        if collection is None:
             print(f"[ERROR] 컬렉션을 찾을 수 없음: {collection_name}")
             return {
                 'answer': f"저장소 분석 데이터를 찾을 수 없습니다. 저장소를 다시 분석해주세요.",
                 'error': "collection_not_found"
             }
+        print(f"[DEBUG] 컬렉션 조회 성공: {collection_name}")
         
-        # 컬렉션 가져오기
-        try:    
-            collection = chroma_client.get_collection(name=collection_name)
-            print(f"[DEBUG] 컬렉션 조회 성공: {collection_name}")
-        except Exception as e:
-            import traceback
-            print(f"[ERROR] 컬렉션 가져오기 실패: {e}")
-            traceback.print_exc()
-            return {
-                'answer': f"저장소 분석 데이터 접근 중 오류가 발생했습니다: {str(e)}",
-                'error': "collection_access_error"
-            }
-        
-        # 컬렉션 내 문서 수 확인
+        # 컬렉션 내 문서 수 확인 (캐시된 값 사용)
+        collection_count = None
         try:
             collection_count = collection.count()
             print(f"[DEBUG] 컬렉션 내 문서 수: {collection_count}")
@@ -357,13 +575,15 @@ def handle_chat(session_id, message):
             traceback.print_exc()
             # 문서 수 확인 실패는 치명적이지 않을 수 있으므로 계속 진행
         
-        # 유사 코드 청크 검색
-        print(f"[DEBUG] 유사 코드 청크 검색 시작 (TOP_K={TOP_K})")
+        # 유사 코드 청크 검색 (범위 필터 우선, 결과 없으면 전체 검색 / 벡터+어휘 결과 RRF 결합)
+        # 후보를 넉넉히 가져와 MMR로 다양화하고 재순위한 뒤 아래에서 토큰 예산에 맞춰 패킹
+        print(f"[DEBUG] 유사 코드 청크 검색 시작 (문서 수={collection_count}, 범위={scope})")
         try:
-            results = collection.query(
-                query_embeddings=[embedding],
-                n_results=TOP_K
-            )
+            with steps.timed("search"):
+                results, scope_filter = retrieve_candidates(
+                    collection, lexical_index, embedding, message, scope,
+                    sessions.get(session_id, {}).get('files'), chunk_count=collection_count
+                )
             print(f"[DEBUG] 검색 결과 구조: {list(results.keys())}")
         except Exception as e:
             import traceback
@@ -374,26 +594,12 @@ def handle_chat(session_id, message):
                 'error': "query_error"
             }
         
-        # 1. 질문 의도 태깅 (LLM)
-        try:
-            tag_prompt = f"아래 질문의 의도(원하는 코드 역할/기능)를 한글로 간단히 요약해줘.\n\n질문:\n{message}"
-            tag_resp = openai.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": tag_prompt}],
-                temperature=0.0,
-                max_tokens=64
-            )
-            question_role_tag = tag_resp.choices[0].message.content.strip()
-            print(f"[DEBUG] 질문 의도 태그: {question_role_tag}")
-        except Exception as e:
-            print(f"[WARNING] 질문 의도 태깅 실패: {e}")
-            question_role_tag = ''
-        # 스코프 키워드 추출
-        scope = extract_scope_from_question(message)
+        # 1. 질문 의도 태그 (검색과 병렬로 실행된 결과)
+        question_role_tag = steps.result("intent_tag")
+        print(f"[DEBUG] 질문 의도 태그: {question_role_tag}")
         
-        # 동적 토큰 버젯 계산 (질문 복잡도에 따라 조정)
-        question_tokens = len(enc.encode(message))
-        max_context_tokens = 8192 - question_tokens - 1000  # 응답 공간 확보
+        # 동적 토큰 버젯 계산 (질문 길이에 따라 조정, 토크나이저 호출 없이 추정)
+        max_context_tokens = context_budget(message)  # 응답 공간 확보
         
         # 정규화된 질문 의도 키워드 추출
         question_keywords = []
@@ -402,12 +608,13 @@ def handle_chat(session_id, message):
         print(f"[DEBUG] 질문 키워드: {question_keywords}")
         
         # 청크 스코어링 및 선택 함수
-        def score_chunk(doc, meta, distance):
+        def score_chunk(doc, meta, distance, rerank_score=0.0):
             score = 0
             
             # 1. 유사도 점수 (거리가 작을수록 높은 점수)
             similarity_score = 1 - min(distance, 1.0)  # 0~1 범위 정규화
             score += similarity_score * 10  # 기본 가중치 10
+            score += rerank_score * RERANK_WEIGHT  # 재순위기 점수
             
             # 2. 역할 태그 매칭 점수
             role_tag = meta.get('role_tag', '')
@@ -460,7 +667,7 @@ def handle_chat(session_id, message):
                 'meta': meta,
                 'score': score,
                 'identity': identity,
-                'tokens': len(enc.encode(doc)),
+                'tokens': chunk_tokens(doc, meta),  # 인제스트 시 저장된 토큰 수
                 'distance': distance
             }
         
@@ -468,8 +675,9 @@ def handle_chat(session_id, message):
         scored_chunks = []
         if 'documents' in results and 'metadatas' in results and 'distances' in results:
             if results['documents'][0] and results['metadatas'][0] and results['distances'][0]:
-                for doc, meta, distance in zip(results['documents'][0], results['metadatas'][0], results['distances'][0]):
-                    scored_chunks.append(score_chunk(doc, meta, distance))
+                rerank_scores = (results.get('rerank_scores') or [[]])[0] or [0.0] * len(results['documents'][0])
+                for doc, meta, distance, rerank_score in zip(results['documents'][0], results['metadatas'][0], results['distances'][0], rerank_scores):
+                    scored_chunks.append(score_chunk(doc, meta, distance, rerank_score))
                 
                 # 점수 기준 내림차순 정렬
                 scored_chunks.sort(key=lambda x: x['score'], reverse=True)
@@ -481,17 +689,33 @@ def handle_chat(session_id, message):
                           f"유사도={1-chunk['distance']:.3f}")
         
         # 토큰 버젯 내에서 중복 제거하며 청크 선택
-        context_chunks = []
-        token_count = 0
+        packer = ContextPacker(max_context_tokens)
+        context_chunks = packer.parts
         seen_identities = set()
         
+        # 심볼 테이블에서 찾은 정의를 먼저 포함 (검색 결과가 아니라 소스에서 정의 범위를 바로 읽음)
+        for entry in symbol_hits[:MAX_SYMBOL_CONTEXT]:
+            source = read_symbol_source(repo_path, entry)
+            if not source:
+                continue
+            source_tokens = estimate_tokens(source)
+            if not packer.fits(source_tokens, 0.5):
+                continue
+            meta_info = [f"정의: {entry['qualified_name']}", f"파일명: {entry['path']}",
+                         f"라인: {entry['start_line']}~{entry['end_line']}", f"타입: {entry['kind']}"]
+            usages = symbol_table.usages(entry['name'])[:MAX_USAGE_REFERENCES]
+            usage_refs = ', '.join(f"{u['path']}:{u['line']}" for u in usages)
+            usage_text = f"\n사용 위치: {usage_refs}" if usages else ""
+            packer.add(f"[{'/'.join(meta_info)}]{usage_text}\n{source}", source_tokens)
+            seen_identities.add(definition_identity(entry))
+        
         for chunk in scored_chunks:
             # 이미 동일 파일/함수/클래스의 청크가 포함되었는지 확인
             if chunk['identity'] in seen_identities:
                 continue
             
             # 토큰 버젯 확인
-            if token_count + chunk['tokens'] > max_context_tokens:
+            if not packer.fits(chunk['tokens']):
                 # 버젯 초과 시 중요도가 낮은 청크는 스킵
                 if chunk['score'] < 5:  # 임계점 이하면 스킵
                     continue
@@ -512,12 +736,11 @@ def handle_chat(session_id, message):
             
             # 청크 컨텍스트에 추가
             chunk_str = f"[{'/'.join(meta_info)}]\n{chunk['doc']}"
-            context_chunks.append(chunk_str)
-            token_count += chunk['tokens']
+            packer.add(chunk_str, chunk['tokens'])
             seen_identities.add(chunk['identity'])
             
             # 충분한 컨텍스트를 모았으면 중단
-            if len(context_chunks) >= 10 or token_count >= max_context_tokens * 0.9:
+            if len(packer) >= 10 or packer.is_full(0.9):
                 break
         
         # 컨텍스트가 너무 적으면 스코어가 낮은 청크도 추가
@@ -534,16 +757,40 @@ def handle_chat(session_id, message):
                     if meta.get('role_tag'): meta_info.append(f"역할: {meta['role_tag']}")
                     
                     chunk_str = f"[{'/'.join(meta_info)}]\n{chunk['doc']}"
-                    context_chunks.append(chunk_str)
-                    token_count += chunk['tokens']
+                    packer.add(chunk_str, chunk['tokens'])
                     seen_identities.add(chunk['identity'])
                     
-                    if len(context_chunks) >= 5 or token_count >= max_context_tokens * 0.9:
+                    if len(packer) >= 5 or packer.is_full(0.9):
                         break
+        # 호출 그래프 이웃 확장: 상위 청크가 호출하는 정의와 그 정의를 호출하는 쪽을 남은 예산 안에서 추가
+        if code_graph is not None and GRAPH_EXPANSION_ENABLED and not packer.is_full():
+            seeds = [{'path': e['path'], 'start_line': e['start_line']} for e in symbol_hits[:MAX_SYMBOL_CONTEXT]]
+            seeds += [chunk['meta'] for chunk in scored_chunks if chunk['identity'] in seen_identities]
+            with steps.timed("graph_expand"):
+                neighbours = code_graph.expand(seeds[:GRAPH_SEED_COUNT])
+            for entry in neighbours:
+                identity = definition_identity(entry)
+                if identity in seen_identities:
+                    continue
+                source = read_symbol_source(repo_path, entry)
+                if not source:
+                    continue
+                source_tokens = estimate_tokens(source)
+                if source_tokens > max_context_tokens * GRAPH_NEIGHBOUR_BUDGET_RATIO or not packer.fits(source_tokens):
+                    continue
+                edge = f"{entry['via']} → {entry['qualified_name']}" if entry['relation'] == 'callee' \
+                    else f"{entry['qualified_name']} → {entry['via']}"
+                meta_info = [f"호출 관계: {edge}", f"파일명: {entry['path']}",
+                             f"라인: {entry['start_line']}~{entry['end_line']}", f"타입: {entry['kind']}"]
+                packer.add(f"[{'/'.join(meta_info)}]\n{source}", source_tokens)
+                seen_identities.add(identity)
+            if neighbours:
+                print(f"[DEBUG] 호출 그래프 이웃: {[(n['relation'], n['qualified_name']) for n in neighbours]}")
+        
         # 4. 프롬프트에 컨텍스트 범위 안내
         context = '\n\n'.join(context_chunks)
         context = f"아래는 [파일/함수/클래스/라인/역할] 단위로 추출된 컨텍스트입니다.\n{context}"
-        print(f"[DEBUG] 유사 코드 청크 {len(context_chunks)}개 찾음 (총 {len(context)} 문자)")
+        print(f"[DEBUG] 유사 코드 청크 {len(context_chunks)}개 찾음 (총 {len(context)} 문자, 약 {packer.used}/{max_context_tokens} 토큰)")
         print("[DEBUG] 컨텍스트 구성 요약:")
         if full_file_contexts: # 컨텍스트가 전체 파일 내용으로 구성된 경우
             print("  컨텍스트는 다음 전체 파일 내용으로 구성됩니다:")
@@ -579,14 +826,12 @@ def handle_chat(session_id, message):
             'error': "search_error"
         }
     
-    # 디렉토리 구조 확인
-    directory_structure = session_data.get('directory_structure')
-    
-    if directory_structure:
-        print(f"[DEBUG] 디렉토리 구조 정보 제공 (길이: {len(directory_structure)} 문자)")
-    else:
-        print("[DEBUG] 디렉토리 구조 정보가 없습니다.")
-        directory_structure = "프로젝트 구조 정보가 없습니다. 파일 내용만 참고하여 응답하겠습니다."
+    # 저장소 개요(질문과 무관 → 시스템 메시지 고정 접두어)와 검색된 파일로 가는 경로만 펼친 관련 트리
+    repo_paths = session_paths(session_data)
+    focus_paths = [entry['path'] for entry in symbol_hits] + [(meta or {}).get('path') for meta in ((results or {}).get('metadatas') or [[]])[0]]
+    system_prompt = build_system_prompt(SYSTEM_PROMPT_QA, QA_GUIDELINES, repo_outline(repo_paths))
+    directory_structure = related_tree(repo_paths, focus_paths) or "관련 파일 위치 정보가 없습니다."
+    print(f"[DEBUG] 구조 정보: 시스템 접두어 {len(system_prompt)}자, 관련 트리 {len(directory_structure)}자 (전체 파일 {len(repo_paths)}개)")
 
     # 파일 전체 코드 요구 패턴 감지
     file_full_keywords = ["전체", "전체 코드", "전체내용", "전체 보여", "전체 출력"]
@@ -634,8 +879,9 @@ def handle_chat(session_id, message):
     # 3. LLM에 컨텍스트와 함께 전달하여 답변 생성
     try:
         # 이전 대화 기록 가져오기
-        print(f"[CHAT_HANDLER] 이전 대화 기록 가져오기 시작 - 세션: {session_id}")
-        conversation_history = get_relevant_conversations(session_id, message)
+        print(f"[CHAT_HANDLER] 이전 대화 기록 가져오기 - 세션: {session_id}")
+        conversation_history = steps.result("memory_lookup")
+        print(f"[DEBUG] LLM 호출 전 단계별 소요 시간(ms): {steps.summary()}")
         
         # 대화 기록 결과 로그
         if conversation_history == '이전 대화 없음':
@@ -690,60 +936,22 @@ def handle_chat(session_id, message):
             prompt = PROMPT_TEMPLATE.format(
                 context=truncated_context, 
                 question=message,
-                directory_structure=directory_structure
+                directory_structure=directory_structure,
+                conversation_history=conversation_history
             )
             print(f"[DEBUG] 수정된 프롬프트 길이: {len(prompt)} 문자")
         
         # LLM 호출
-        print(f"[DEBUG] OpenAI API 호출 시작 (model=gpt-4o, temperature=0.2)")
-        response = openai.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "system", "content": SYSTEM_PROMPT_QA},
-                      {"role": "user", "content": prompt}],
-            temperature=0.2,
-            max_tokens=4096
-        )
+        print(f"[DEBUG] OpenAI API 호출 시작 (model={ANSWER_MODEL}, temperature=0.2)")
+        answer = (yield CompletionCall(steps, model=ANSWER_MODEL,
+                                       messages=[{"role": "system", "content": system_prompt},
+                                                 {"role": "user", "content": prompt}],
+                                       temperature=0.2, max_tokens=4096)).strip()
+        print(f"[DEBUG] LLM 응답 성공 (길이: {len(answer)} 문자, 단계별 소요 시간(ms): {steps.summary()})")
         
-        # 응답 처리
-        if not response or not response.choices or not response.choices[0].message:
-            print(f"[ERROR] LLM 응답이 비어 있습니다: {response}")
-            return {
-                'answer': "응답 생성 중 오류가 발생했습니다. 다시 시도해주세요.",
-                'error': "empty_response"
-            }
-        
-        answer = response.choices[0].message.content.strip()
-        print(f"[DEBUG] LLM 응답 성공 (길이: {len(answer)} 문자)")
-        
-        # 대화 기록 저장
-        try:
-            print(f"[CHAT_HANDLER] 대화 기록 저장 시작 - 세션: {session_id}")
-            print(f"[CHAT_HANDLER] 질문: {message[:100]}{'...' if len(message) > 100 else ''}")
-            print(f"[CHAT_HANDLER] 답변: {answer[:100]}{'...' if len(answer) > 100 else ''}")
-            
-            # 질문-답변 삼합수 계산 (디버깅용)
-            qa_hash = hash(message + answer) % 10000
-            print(f"[CHAT_HANDLER] 저장할 QA 삼합수: {qa_hash}")
-            
-            # 기존 메모리 기반 저장 방식 (호환성 유지)
-            save_conversation(session_id, message, answer)
-            print(f"[CHAT_HANDLER] 대화 기록 저장 성공: session_id={session_id}")
-            
-            # DB에 채팅 기록 저장
-            try:
-                # db 모듈 임포트
-                import db
-                # 사용자 질문 저장
-                db.add_chat_history(session_id, 'user', message)
-                # AI 응답 저장
-                db.add_chat_history(session_id, 'assistant', answer)
-                print(f"[CHAT_HANDLER] DB에 대화 기록 저장 성공: session_id={session_id}")
-            except Exception as e:
-                print(f"[CHAT_HANDLER] DB에 대화 기록 저장 실패: {str(e)}")
-        except Exception as e:
-            import traceback
-            print(f"[CHAT_HANDLER] 대화 기록 저장 실패: {str(e)}")
-            traceback.print_exc()
+        # 대화 기록 저장 (저장 큐에서 처리, 응답은 기다리지 않음)
+        record_answer(session_id, message, answer)
+        print(f"[CHAT_HANDLER] 대화 기록 저장 예약 - 세션: {session_id}")
         
         # 응답이 비어있는지 확인
         if not answer:
@@ -753,6 +961,13 @@ def handle_chat(session_id, message):
                 'error': "empty_answer"
             }
         
+        # 이전 대화가 프롬프트에 들어간 답변은 그 대화에 기댄 것일 수 있으므로 다른 세션과 공유하지 않음
+        # (is_cacheable_question의 맥락 표현 패턴은 한국어 지시어만 잡으므로 실제 대화 기록 유무로 판단)
+        if conversation_history and conversation_history != '이전 대화 없음':
+            print("[DEBUG] 이전 대화가 포함된 답변이라 답변 캐시에 저장하지 않습니다.")
+        else:
+            answer_cache.put(repo_url, indexed_commit, message, embedding, answer)
+        
         # 성공적인 응답 반환
         return {'answer': answer}
     except Exception as e:
@@ -765,20 +980,32 @@ def handle_chat(session_id, message):
         }
 
 def handle_modify_request(session_id, message):
-    from app import sessions
+    """코드 수정 결과 dict를 반환합니다. (modify_events를 스트리밍 없이 끝까지 실행)"""
+    return drain(modify_events(session_id, message))
+
+def modify_events(session_id, message):
+    """
+    코드 수정 생성기: 수정 코드 LLM 호출을 CompletionCall로 yield해 전체 응답을 돌려받고 최종 결과 dict를 return합니다.
+    파일명/영역 파싱과 원본 파일 복원은 스트림이 끝난 뒤 전체 응답으로 합니다.
+    """
+    from app import sessions, ensure_session_loaded
+    ensure_session_loaded(session_id)
+    resource_manager.touch(session_id)
+    steps = StepRunner("modify")
     print(f"[DEBUG] 현재 세션 ID: {session_id}")
     print(f"[DEBUG] 사용 가능한 세션 키: {list(sessions.keys())}")
     
+    # 세션 데이터 (리소스 정리로 클론이나 인덱스가 삭제되었으면 복원)
+    session_data = restore_session_data(session_id)
+    repo_path = f"./repos/{session_id}"
+    
     # GitHub 푸시 의도 감지 및 로깅
     has_push_intent = detect_github_push_intent(message)
-    token_exists = bool(sessions.get(session_id, {}).get('token'))
+    token_exists = bool(session_data.get('token'))
     requires_confirmation = has_push_intent
     push_intent_message = '깃허브에 적용하려면 확인이 필요합니다.' if has_push_intent else ''
     print(f"[DEBUG] GitHub 푸시 의도 감지 결과: {has_push_intent}, 토큰 존재: {token_exists}")
     
-    session_data = sessions.get(session_id, {})
-    repo_path = f"./repos/{session_id}"
-    
     # 세션 데이터가 없으면 오류 반환
     if not session_data:
         return {
@@ -794,77 +1021,68 @@ def handle_modify_request(session_id, message):
     
     print(f"[DEBUG] 세션 데이터 키: {list(session_data.keys())}")
     
-    # 1단계: 청크 검색으로 관련 파일 식별
-    try:
-        # OpenAI API 키 확인
-        api_key = openai.api_key
-        if not api_key:
-            print("[ERROR] OpenAI API 키가 설정되지 않았습니다.")
-            return {
-                'answer': "OpenAI API 키가 설정되지 않았습니다.",
-                'error': "api_key_missing",
-                'modified_code': "",
-                'file_name': "",
-                'has_push_intent': has_push_intent,
-                'token_exists': token_exists,
-                'requires_confirmation': requires_confirmation,
-                'push_intent_message': push_intent_message
-            }
-        print(f"[DEBUG] OpenAI API 키 확인: {api_key[:4]}...{api_key[-4:]}")
+    # 0단계: 심볼 테이블로 질문에 언급된 정의의 파일을 바로 식별 (임베딩/벡터 검색 생략)
+    related_files = set()
+    hit_ranges = {}  # 파일 경로 -> 찾은 (시작, 끝) 라인 범위 (중요한 순서)
+    results = None
+    symbol_table = get_symbol_table(session_id)
+    if symbol_table:
+        scope = extract_scope_from_question(message)
+        for entry in symbol_table.find_in_text(message, scope['function'] + scope['class']):
+            related_files.add(entry['path'])
+            hit_ranges.setdefault(entry['path'], []).append((entry['start_line'], entry['end_line']))
+        if related_files:
+            print(f"[DEBUG] 심볼 테이블로 관련 파일 식별: {related_files}")
+    
+    # 1단계: 청크 검색으로 관련 파일 식별 (심볼로 찾지 못한 경우)
+    if not related_files:
+        try:
+            # OpenAI API 키 확인
+            api_key = openai.api_key
+            if not api_key:
+                print("[ERROR] OpenAI API 키가 설정되지 않았습니다.")
+                return {
+                    'answer': "OpenAI API 키가 설정되지 않았습니다.",
+                    'error': "api_key_missing",
+                    'modified_code': "",
+                    'file_name': "",
+                    'has_push_intent': has_push_intent,
+                    'token_exists': token_exists,
+                    'requires_confirmation': requires_confirmation,
+                    'push_intent_message': push_intent_message
+                }
+            print(f"[DEBUG] OpenAI API 키 확인: {api_key[:4]}...{api_key[-4:]}")
         
-        # 임베딩 생성
-        print(f"[DEBUG] 수정 요청 임베딩 생성 시작: '{message[:50]}...'")
-        embedding_response = openai.embeddings.create(
-            input=message,
-            model="text-embedding-3-small"
-        )
+            # 임베딩 생성
+            print(f"[DEBUG] 수정 요청 임베딩 생성 시작: '{message[:50]}...'")
+            embedding_response = openai.embeddings.create(
+                input=message,
+                model="text-embedding-3-small"
+            )
         
-        # 임베딩 결과 처리
-        if not embedding_response or not embedding_response.data or not embedding_response.data[0].embedding:
-            print(f"[ERROR] 임베딩 결과가 비어 있습니다: {embedding_response}")
-            return {
-                'answer': "임베딩 생성 중 오류가 발생했습니다: 임베딩 결과가 비어 있습니다.",
-                'error': "empty_embedding",
-                'modified_code': "",
-                'file_name': "",
-                'has_push_intent': has_push_intent,
-                'token_exists': token_exists,
-                'requires_confirmation': requires_confirmation,
-                'push_intent_message': push_intent_message
-            }
+            # 임베딩 결과 처리
+            if not embedding_response or not embedding_response.data or not embedding_response.data[0].embedding:
+                print(f"[ERROR] 임베딩 결과가 비어 있습니다: {embedding_response}")
+                return {
+                    'answer': "임베딩 생성 중 오류가 발생했습니다: 임베딩 결과가 비어 있습니다.",
+                    'error': "empty_embedding",
+                    'modified_code': "",
+                    'file_name': "",
+                    'has_push_intent': has_push_intent,
+                    'token_exists': token_exists,
+                    'requires_confirmation': requires_confirmation,
+                    'push_intent_message': push_intent_message
+                }
             
-        embedding = embedding_response.data[0].embedding
-        print(f"[DEBUG] 수정 요청 임베딩 생성 성공 (차원: {len(embedding)})")
+            embedding = embedding_response.data[0].embedding
+            print(f"[DEBUG] 수정 요청 임베딩 생성 성공 (차원: {len(embedding)})")
         
-        # ChromaDB 클라이언트 상태 확인
-        if not chroma_client:
-            print("[ERROR] ChromaDB 클라이언트가 초기화되지 않았습니다.")
-            return {
-                'answer': "저장소 분석 데이터에 접근할 수 없습니다. 서버를 재시작하고 저장소를 다시 분석해주세요.",
-                'error': "chroma_client_not_initialized",
-                'modified_code': "",
-                'file_name': "",
-                'has_push_intent': has_push_intent,
-                'token_exists': token_exists,
-                'requires_confirmation': requires_confirmation,
-                'push_intent_message': push_intent_message
-            }
-        
-        # 컬렉션 이름 생성 및 조회 시도
-        collection_name = f"repo_{session_id}"
-        print(f"[DEBUG] ChromaDB 컬렉션 조회 시도: {collection_name}")
-        
-        # 컬렉션 존재 확인
-        try:
-            collections = chroma_client.list_collections()
-            collection_names = [col.name for col in collections]
-            print(f"[DEBUG] 사용 가능한 컬렉션 목록: {collection_names}")
-            
-            if collection_name not in collection_names:
-                print(f"[ERROR] 컬렉션을 찾을 수 없음: {collection_name}")
+            # ChromaDB 클라이언트 상태 확인
+            if not chroma_client:
+                print("[ERROR] ChromaDB 클라이언트가 초기화되지 않았습니다.")
                 return {
-                    'answer': "저장소 분석 데이터를 찾을 수 없습니다. 저장소를 다시 분석해주세요.",
-                    'error': "collection_not_found",
+                    'answer': "저장소 분석 데이터에 접근할 수 없습니다. 서버를 재시작하고 저장소를 다시 분석해주세요.",
+                    'error': "chroma_client_not_initialized",
                     'modified_code': "",
                     'file_name': "",
                     'has_push_intent': has_push_intent,
@@ -872,35 +1090,19 @@ def handle_modify_request(session_id, message):
                     'requires_confirmation': requires_confirmation,
                     'push_intent_message': push_intent_message
                 }
-        except Exception as e:
-            import traceback
-            print(f"[ERROR] ChromaDB 컬렉션 목록 조회 실패: {e}")
-            traceback.print_exc()
-            return {
-                'answer': f"저장소 분석 데이터 접근 중 오류가 발생했습니다: {str(e)}",
-                'error': "collection_list_error",
-                'modified_code': "",
-                'file_name': "",
-                'has_push_intent': has_push_intent,
-                'token_exists': token_exists,
-                'requires_confirmation': requires_confirmation,
-                'push_intent_message': push_intent_message
-            }
         
-        # 컬렉션 가져오기
-        try:
-            collection = chroma_client.get_collection(name=collection_name)
-            print(f"[DEBUG] 컬렉션 조회 성공: {collection_name}")
-            
-            # 컬렉션 내 문서 수 확인
+            # 컬렉션 이름 생성 및 조회 시도
+            collection_name = f"repo_{session_id}"
+            print(f"[DEBUG] ChromaDB 컬렉션 조회 시도: {collection_name}")
+        
+            # 인덱스 가져오기 (캐시된 저장소 재사용, 크기에 따라 NumPy/ChromaDB 엔진)
             try:
-                collection_count = collection.count()
-                print(f"[DEBUG] 컬렉션 내 문서 수: {collection_count}")
-                if collection_count == 0:
-                    print(f"[WARNING] 컬렉션이 비어 있습니다: {collection_name}")
+                collection = get_repo_store(session_id)
+                if collection is None:
+                    print(f"[ERROR] 컬렉션을 찾을 수 없음: {collection_name}")
                     return {
-                        'answer': "저장소 분석 데이터가 비어 있습니다. 저장소를 다시 분석해주세요.",
-                        'error': "empty_collection",
+                        'answer': "저장소 분석 데이터를 찾을 수 없습니다. 저장소를 다시 분석해주세요.",
+                        'error': "collection_not_found",
                         'modified_code': "",
                         'file_name': "",
                         'has_push_intent': has_push_intent,
@@ -908,74 +1110,125 @@ def handle_modify_request(session_id, message):
                         'requires_confirmation': requires_confirmation,
                         'push_intent_message': push_intent_message
                     }
+                print(f"[DEBUG] 컬렉션 조회 성공: {collection_name}")
+            
+                # 컬렉션 내 문서 수 확인 (캐시된 값 사용)
+                try:
+                    collection_count = collection.count()
+                    print(f"[DEBUG] 컬렉션 내 문서 수: {collection_count}")
+                    if collection_count == 0:
+                        print(f"[WARNING] 컬렉션이 비어 있습니다: {collection_name}")
+                        return {
+                            'answer': "저장소 분석 데이터가 비어 있습니다. 저장소를 다시 분석해주세요.",
+                            'error': "empty_collection",
+                            'modified_code': "",
+                            'file_name': "",
+                            'has_push_intent': has_push_intent,
+                            'token_exists': token_exists,
+                            'requires_confirmation': requires_confirmation,
+                            'push_intent_message': push_intent_message
+                        }
+                except Exception as e:
+                    print(f"[WARNING] 컬렉션 문서 수 확인 실패: {e}")
+                    # 문서 수 확인 실패는 치명적이지 않을 수 있으므로 계속 진행
             except Exception as e:
-                print(f"[WARNING] 컬렉션 문서 수 확인 실패: {e}")
-                # 문서 수 확인 실패는 치명적이지 않을 수 있으므로 계속 진행
-        except Exception as e:
-            import traceback
-            print(f"[ERROR] 컬렉션 가져오기 실패: {e}")
-            traceback.print_exc()
-            return {
-                'answer': f"저장소 분석 데이터 접근 중 오류가 발생했습니다: {str(e)}",
-                'error': "collection_access_error",
-                'modified_code': "",
-                'file_name': "",
-                'has_push_intent': has_push_intent,
-                'token_exists': token_exists,
-                'requires_confirmation': requires_confirmation,
-                'push_intent_message': push_intent_message
-            }
+                import traceback
+                print(f"[ERROR] 컬렉션 가져오기 실패: {e}")
+                traceback.print_exc()
+                return {
+                    'answer': f"저장소 분석 데이터 접근 중 오류가 발생했습니다: {str(e)}",
+                    'error': "collection_access_error",
+                    'modified_code': "",
+                    'file_name': "",
+                    'has_push_intent': has_push_intent,
+                    'token_exists': token_exists,
+                    'requires_confirmation': requires_confirmation,
+                    'push_intent_message': push_intent_message
+                }
         
-        # 유사 코드 청크 검색
-        print(f"[DEBUG] 유사 코드 청크 검색 시작 (TOP_K={TOP_K})")
-        try:
-            results = collection.query(
-                query_embeddings=[embedding],
-                n_results=TOP_K
-            )
-            print(f"[DEBUG] 검색 결과 구조: {list(results.keys())}")
-        except Exception as e:
-            import traceback
-            print(f"[ERROR] 유사 코드 청크 검색 실패: {e}")
-            traceback.print_exc()
-            return {
-                'answer': f"코드 검색 중 오류가 발생했습니다: {str(e)}",
-                'error': "query_error",
-                'modified_code': "",
-                'file_name': "",
-                'has_push_intent': has_push_intent,
-                'token_exists': token_exists,
-                'requires_confirmation': requires_confirmation,
-                'push_intent_message': push_intent_message
-            }
+            # 유사 코드 청크 검색 (범위 필터 우선, 결과 없으면 전체 검색)
+            scope = extract_scope_from_question(message)
+            print(f"[DEBUG] 유사 코드 청크 검색 시작 (TOP_K={TOP_K}, 범위={scope})")
+            try:
+                results, scope_filter = scoped_query(
+                    collection, embedding, TOP_K, scope,
+                    session_data.get('files')
+                )
+                print(f"[DEBUG] 검색 결과 구조: {list(results.keys())}")
+            except Exception as e:
+                import traceback
+                print(f"[ERROR] 유사 코드 청크 검색 실패: {e}")
+                traceback.print_exc()
+                return {
+                    'answer': f"코드 검색 중 오류가 발생했습니다: {str(e)}",
+                    'error': "query_error",
+                    'modified_code': "",
+                    'file_name': "",
+                    'has_push_intent': has_push_intent,
+                    'token_exists': token_exists,
+                    'requires_confirmation': requires_confirmation,
+                    'push_intent_message': push_intent_message
+                }
         
-        # 검색 결과 유효성 검증
-        if not results or 'metadatas' not in results or not results['metadatas'] or not results['metadatas'][0]:
-            print(f"[WARNING] 검색 결과가 비어 있습니다")
-            return {
-                'answer': "질문과 관련된 코드를 찾을 수 없습니다. 다른 질문을 시도해보세요.",
-                'error': "no_results",
-                'modified_code': "",
-                'file_name': "",
-                'has_push_intent': has_push_intent,
-                'token_exists': token_exists,
-                'requires_confirmation': requires_confirmation,
-                'push_intent_message': push_intent_message
-            }
+            # 검색 결과 유효성 검증
+            if not results or 'metadatas' not in results or not results['metadatas'] or not results['metadatas'][0]:
+                print(f"[WARNING] 검색 결과가 비어 있습니다")
+                return {
+                    'answer': "질문과 관련된 코드를 찾을 수 없습니다. 다른 질문을 시도해보세요.",
+                    'error': "no_results",
+                    'modified_code': "",
+                    'file_name': "",
+                    'has_push_intent': has_push_intent,
+                    'token_exists': token_exists,
+                    'requires_confirmation': requires_confirmation,
+                    'push_intent_message': push_intent_message
+                }
         
-        # 관련 파일 경로 추출
-        related_files = set()
-        for metadata in results['metadatas'][0]:
-            if 'path' in metadata:
-                related_files.add(metadata['path'])
-            else:
-                print(f"[WARNING] 메타데이터에 'path' 키가 없습니다: {metadata}")
+            # 관련 파일 경로 추출
+            related_files = set()
+            for metadata in results['metadatas'][0]:
+                if 'path' in metadata:
+                    related_files.add(metadata['path'])
+                    ranges = hit_ranges.setdefault(metadata['path'], [])
+                    if (metadata.get('start_line') or -1) > 0 and (metadata.get('end_line') or -1) > 0:
+                        ranges.append((metadata['start_line'], metadata['end_line']))
+                else:
+                    print(f"[WARNING] 메타데이터에 'path' 키가 없습니다: {metadata}")
+        
+            if not related_files:
+                print("[WARNING] 관련 파일을 찾을 수 없습니다.")
+                return {
+                    'answer': "질문과 관련된 코드 파일을 찾을 수 없습니다. 다른 질문을 시도해보세요.",
+                    'error': "no_related_files",
+                    'modified_code': "",
+                    'file_name': "",
+                    'has_push_intent': has_push_intent,
+                    'token_exists': token_exists,
+                    'requires_confirmation': requires_confirmation,
+                    'push_intent_message': push_intent_message
+                }
         
-        if not related_files:
-            print("[WARNING] 관련 파일을 찾을 수 없습니다.")
+            print(f"[DEBUG] 관련 파일 경로: {related_files}")
+        
+            # 유사도 점수 로깅 (있는 경우)
+            if 'distances' in results and results['distances'] and results['distances'][0]:
+                distances = results['distances'][0]
+                print(f"[DEBUG] 검색 유사도 점수: {distances}")
+            
+                # 파일 경로와 유사도 점수 매핑
+                path_scores = []
+                for i, metadata in enumerate(results['metadatas'][0]):
+                    if 'path' in metadata and i < len(distances):
+                        path_scores.append((metadata['path'], distances[i]))
+            
+                if path_scores:
+                    print(f"[DEBUG] 파일별 유사도 점수: {path_scores}")
+
+        except Exception as e:
+            print(f"[ERROR] 코드 청크 검색 오류: {e}")
             return {
-                'answer': "질문과 관련된 코드 파일을 찾을 수 없습니다. 다른 질문을 시도해보세요.",
-                'error': "no_related_files",
+                'answer': "코드 검색 중 오류가 발생했습니다. 새로운 레포지토리를 분석해주세요.",
+                'error': "search_error",
                 'modified_code': "",
                 'file_name': "",
                 'has_push_intent': has_push_intent,
@@ -983,42 +1236,14 @@ def handle_modify_request(session_id, message):
                 'requires_confirmation': requires_confirmation,
                 'push_intent_message': push_intent_message
             }
-        
-        print(f"[DEBUG] 관련 파일 경로: {related_files}")
-        
-        # 유사도 점수 로깅 (있는 경우)
-        if 'distances' in results and results['distances'] and results['distances'][0]:
-            distances = results['distances'][0]
-            print(f"[DEBUG] 검색 유사도 점수: {distances}")
-            
-            # 파일 경로와 유사도 점수 매핑
-            path_scores = []
-            for i, metadata in enumerate(results['metadatas'][0]):
-                if 'path' in metadata and i < len(distances):
-                    path_scores.append((metadata['path'], distances[i]))
-            
-            if path_scores:
-                print(f"[DEBUG] 파일별 유사도 점수: {path_scores}")
-
-    except Exception as e:
-        print(f"[ERROR] 코드 청크 검색 오류: {e}")
-        return {
-            'answer': "코드 검색 중 오류가 발생했습니다. 새로운 레포지토리를 분석해주세요.",
-            'error': "search_error",
-            'modified_code': "",
-            'file_name': "",
-            'has_push_intent': has_push_intent,
-            'token_exists': token_exists,
-            'requires_confirmation': requires_confirmation,
-            'push_intent_message': push_intent_message
-        }
     
-    # 관련 파일들의 전체 내용 로드
-    print(f"[DEBUG] 관련 파일 {len(related_files)}개의 전체 내용 로드 시작")
-    full_file_contents = []
+    # 관련 파일 내용 로드 (프롬프트에는 아래에서 필요한 영역만 잘라서 넣음)
+    print(f"[DEBUG] 관련 파일 {len(related_files)}개의 내용 로드 시작")
+    file_sources = {}  # 파일 경로 -> 전체 내용 (찾은 순서 유지)
     failed_files = []
+    ordered_files = list(hit_ranges) + [p for p in sorted(related_files) if p not in hit_ranges]
     
-    for file_path in related_files:
+    for file_path in ordered_files:
         print(f"[DEBUG] 파일 로드 시도: {file_path}")
         try:
             # 로컬 저장소 경로 확인
@@ -1026,7 +1251,6 @@ def handle_modify_request(session_id, message):
             print(f"[DEBUG] 로컬 파일 경로: {local_file_path}")
             
             # 파일 존재 확인
-            import os
             if not os.path.exists(local_file_path):
                 print(f"[WARNING] 파일이 로컬에 존재하지 않음: {local_file_path}")
                 raise FileNotFoundError(f"파일을 찾을 수 없습니다: {local_file_path}")
@@ -1035,7 +1259,7 @@ def handle_modify_request(session_id, message):
             with open(local_file_path, 'r', encoding='utf-8') as f:
                 content = f.read()
                 print(f"[DEBUG] 파일 로드 성공: {file_path} (길이: {len(content)} 문자)")
-                full_file_contents.append(f"// FILE: {file_path}\n{content}")
+                file_sources[file_path] = content
         except UnicodeDecodeError as ude:
             print(f"[WARNING] 파일 인코딩 오류 ({file_path}): {ude}")
             try:
@@ -1043,7 +1267,7 @@ def handle_modify_request(session_id, message):
                 with open(f"{repo_path}/{file_path}", 'r', encoding='latin-1') as f:
                     content = f.read()
                     print(f"[DEBUG] 파일 latin-1 인코딩으로 로드 성공: {file_path}")
-                    full_file_contents.append(f"// FILE: {file_path}\n{content}")
+                    file_sources[file_path] = content
             except Exception as e_inner:
                 print(f"[ERROR] 다른 인코딩으로도 파일 읽기 실패 ({file_path}): {e_inner}")
                 failed_files.append(file_path)
@@ -1055,7 +1279,7 @@ def handle_modify_request(session_id, message):
             # 읽기 실패 시 GitHub에서 직접 가져오기 시도
             try:
                 print(f"[DEBUG] GitHub에서 파일 가져오기 시도: {file_path}")
-                from github_analyzer import GitHubAnalyzer
+                from github_analyzer import GitHubRepositoryFetcher
                 
                 # 저장소 URL 확인
                 repo_url = session_data.get('repo_url')
@@ -1064,12 +1288,13 @@ def handle_modify_request(session_id, message):
                     failed_files.append(file_path)
                     continue
                     
-                analyzer = GitHubAnalyzer(repo_url, session_data.get('token'), session_id)
-                content = analyzer.fetch_file_content(file_path)
+                analyzer = GitHubRepositoryFetcher(repo_url, session_data.get('token'), session_id)
+                doc = analyzer.get_repo_content_as_document(file_path)
+                content = doc.page_content if doc else None
                 
                 if content:
                     print(f"[DEBUG] GitHub에서 파일 가져오기 성공: {file_path} (길이: {len(content)} 문자)")
-                    full_file_contents.append(f"// FILE: {file_path}\n{content}")
+                    file_sources[file_path] = content
                 else:
                     print(f"[WARNING] GitHub에서 파일 가져오기 실패 (내용 없음): {file_path}")
                     failed_files.append(file_path)
@@ -1080,12 +1305,12 @@ def handle_modify_request(session_id, message):
                 failed_files.append(file_path)
     
     # 파일 로드 결과 요약
-    print(f"[DEBUG] 총 {len(related_files)}개 파일 중 {len(full_file_contents)}개 로드 성공, {len(failed_files)}개 실패")
+    print(f"[DEBUG] 총 {len(related_files)}개 파일 중 {len(file_sources)}개 로드 성공, {len(failed_files)}개 실패")
     if failed_files:
         print(f"[WARNING] 로드 실패한 파일들: {failed_files}")
         
     # 로드된 파일이 없는 경우 처리
-    if not full_file_contents:
+    if not file_sources:
         print(f"[ERROR] 파일을 하나도 로드하지 못했습니다.")
         return {
             'answer': "관련 코드 파일을 로드하지 못했습니다. 저장소를 다시 분석해주세요.",
@@ -1098,30 +1323,36 @@ def handle_modify_request(session_id, message):
             'push_intent_message': push_intent_message
         }
     
-    # 청크 검색 결과도 함께 컨텍스트로 사용
-    context_chunks = [doc for doc in results['documents'][0]]
+    # 찾은 범위를 감싸는 함수/클래스 영역 + import 헤더 + 나머지 개요만 예산 안에서 잘라 넣기
+    file_slices = {piece['path']: piece for piece in pack_modify_context([
+        {'path': path, 'source': source, 'ranges': hit_ranges.get(path),
+         'definitions': symbol_table.definitions_in_file(path) if symbol_table and not path.endswith('.py') else None}
+        for path, source in file_sources.items()
+    ])}
+    for piece in file_slices.values():
+        print(f"[DEBUG] 코드수정 컨텍스트: {piece['path']} {'전체' if piece['whole'] else piece['regions']} (약 {piece['tokens']} 토큰)")
     
-    # 청크 검색 결과와 파일 전체 내용 합치기
-    if full_file_contents:
-        context = "\n\n=== 관련 파일 전체 내용 ===\n\n" + "\n\n---\n\n".join(full_file_contents)
-        context += "\n\n=== 관련 코드 청크 ===\n\n" + "\n---\n".join(context_chunks)
-    else:
-        # 파일 전체 내용을 가져오지 못한 경우 청크만 사용
-        context = "\n---\n".join(context_chunks)
+    # 파일을 읽지 못한 검색 청크만 따로 추가 (읽은 파일의 청크는 영역에 이미 포함됨)
+    context_chunks = []
+    if results:
+        for doc, meta in zip(results['documents'][0], results['metadatas'][0]):
+            if (meta or {}).get('path') not in file_slices:
+                context_chunks.append(doc)
     
-    # 디렉토리 구조 가져오기
-    directory_structure = session_data.get('directory_structure')
+    context = "\n\n=== 관련 파일 영역 ===\n\n" + "\n\n---\n\n".join(piece['text'] for piece in file_slices.values())
+    if context_chunks:
+        context += "\n\n=== 관련 코드 청크 ===\n\n" + "\n---\n".join(context_chunks)
     
-    if directory_structure:
-        print(f"[DEBUG] 디렉토리 구조 정보 제공 (길이: {len(directory_structure)} 문자)")
-    else:
-        print("[DEBUG] 디렉토리 구조 정보가 없습니다.")
-        directory_structure = "프로젝트 구조 정보가 없습니다. 파일 내용만 참고하여 응답하겠습니다."
+    # 저장소 개요(시스템 메시지 고정 접두어)와 수정 대상 파일로 가는 경로만 펼친 관련 트리
+    repo_paths = session_paths(session_data)
+    system_prompt = build_system_prompt(SYSTEM_PROMPT_MODIFY, MODIFY_GUIDELINES, repo_outline(repo_paths))
+    directory_structure = related_tree(repo_paths, list(file_slices) + sorted(related_files)) or "관련 파일 위치 정보가 없습니다."
+    print(f"[DEBUG] 구조 정보: 시스템 접두어 {len(system_prompt)}자, 관련 트리 {len(directory_structure)}자 (전체 파일 {len(repo_paths)}개)")
     
     # 프롬프트 생성 및 LLM 호출
     try:
         # 이전 대화 기록 가져오기
-        conversation_history = get_relevant_conversations(session_id, message)
+        conversation_history = get_conversation_context(session_id, message)
         print(f"[DEBUG] 코드 수정 관련 대화 기록 조회 결과: {len(conversation_history) if conversation_history != '이전 대화 없음' else 0} 문자")
         
         # 프롬프트 생성 (대화 기록 포함)
@@ -1164,7 +1395,7 @@ def handle_modify_request(session_id, message):
             prompt = MODIFY_PROMPT_TEMPLATE.format(
                 context=context,
                 request=message,
-                directory_structure=directory_structure, # 디렉토리 구조는 보통 크지 않으므로 일단 유지
+                directory_structure=directory_structure, # 관련 트리는 작으므로 유지
                 conversation_history=conversation_history
             )
             print(f"[DEBUG] 1차 축소 후 코드수정 프롬프트 길이: {len(prompt)} 문자")
@@ -1209,48 +1440,17 @@ def handle_modify_request(session_id, message):
         
         # LLM 호출
         print(f"[DEBUG] 코드수정용 OpenAI API 호출 시작 (model=gpt-4o, temperature=0.2, max_tokens=4096)")
-        response = openai.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "system", "content": SYSTEM_PROMPT_MODIFY},
-                      {"role": "user", "content": prompt}],
-            temperature=0.2,
-            max_tokens=4096
-        )
+        llm_code = (yield CompletionCall(steps, model="gpt-4o",
+                                         messages=[{"role": "system", "content": system_prompt},
+                                                   {"role": "user", "content": prompt}],
+                                         temperature=0.2, max_tokens=4096)).strip()
+        print(f"[DEBUG] 코드수정 LLM 응답 성공 (길이: {len(llm_code)} 문자, 단계별 소요 시간(ms): {steps.summary()})")
         
-        # 응답 처리
-        if not response or not response.choices or not response.choices[0].message:
-            print(f"[ERROR] 코드수정 LLM 응답이 비어 있습니다: {response}")
-            return {
-                'answer': "코드 수정 중 오류가 발생했습니다. 다시 시도해주세요.",
-                'error': "empty_response",
-                'modified_code': "",
-                'file_name': "",
-                'has_push_intent': has_push_intent,
-                'token_exists': token_exists,
-                'requires_confirmation': requires_confirmation,
-                'push_intent_message': push_intent_message
-            }
-        
-        llm_code = response.choices[0].message.content.strip()
-        print(f"[DEBUG] 코드수정 LLM 응답 성공 (길이: {len(llm_code)} 문자)")
-        
-        # 대화 기록 저장
-        try:
-            print(f"[CHAT_HANDLER] 코드 수정 대화 기록 저장 시작 - 세션: {session_id}")
-            summary_answer = f"코드 수정 요청: {message}\n\n수정 작업 완료"
-            print(f"[CHAT_HANDLER] 질문: {message[:100]}{'...' if len(message) > 100 else ''}")
-            print(f"[CHAT_HANDLER] 요약 답변: {summary_answer[:100]}{'...' if len(summary_answer) > 100 else ''}")
-            
-            # 질문-답변 삼합수 계산 (디버깅용)
-            qa_hash = hash(message + summary_answer) % 10000
-            print(f"[CHAT_HANDLER] 저장할 코드 수정 QA 삼합수: {qa_hash}")
-            
-            save_conversation(session_id, message, summary_answer)
-            print(f"[CHAT_HANDLER] 코드 수정 대화 기록 저장 성공: session_id={session_id}")
-        except Exception as e:
-            import traceback
-            print(f"[CHAT_HANDLER] 코드 수정 대화 기록 저장 실패: {str(e)}")
-            traceback.print_exc()
+        # 대화 기록 저장 (대화 메모리에만 요약 답변을 남김, 저장 큐에서 처리)
+        summary_answer = f"코드 수정 요청: {message}\n\n수정 작업 완료"
+        persistence_queue.enqueue('chat_turn', session_id=session_id, question=message, answer=summary_answer,
+                                  chat_history=False)
+        print(f"[CHAT_HANDLER] 코드 수정 대화 기록 저장 예약 - 세션: {session_id}")
         
         # 응답이 비어있는지 확인
         if not llm_code:
@@ -1270,6 +1470,28 @@ def handle_modify_request(session_id, message):
         file_name, code = parse_llm_code_response(llm_code)
         print(f"[DEBUG] 파싱된 파일명: '{file_name or '(none)'}', 코드 길이: {len(code)} 문자")
         
+        # 일부 영역만 보낸 파일이면 영역 수정을 원본에 끼워 넣어 전체 파일 내용으로 복원
+        piece = file_slices.get(file_name or '') or next(
+            (p for path, p in file_slices.items() if os.path.basename(path) == os.path.basename(file_name or '')), None)
+        if piece and not piece['whole'] and code:
+            file_name = piece['path']
+            edits = parse_region_edits(code)
+            merged = apply_region_edits(file_sources[file_name], edits, piece['regions']) if edits else None
+            if merged is None:
+                print(f"[WARNING] 영역 수정 결과를 원본 파일에 적용하지 못했습니다: {file_name}")
+                return {
+                    'answer': "수정된 코드 영역을 원본 파일에 적용하지 못했습니다. 수정 요청을 조금 더 구체적으로 다시 시도해주세요.",
+                    'error': "region_apply_error",
+                    'modified_code': "",
+                    'file_name': "",
+                    'has_push_intent': has_push_intent,
+                    'token_exists': token_exists,
+                    'requires_confirmation': requires_confirmation,
+                    'push_intent_message': push_intent_message
+                }
+            print(f"[DEBUG] 영역 수정 {len(edits)}개를 원본에 적용: {file_name}")
+            code = merged
+        
         # 코드가 비어있는지 확인
         if not code:
             print("[WARNING] 파싱된 코드가 비어 있습니다.")
@@ -1306,41 +1528,16 @@ def handle_modify_request(session_id, message):
         }
 
 def detect_github_push_intent(message):
-    """사용자 메시지에서 GitHub 푸시 의도를 감지 (정규식 + LLM 보조)"""
-    import re
-    import openai
+    """사용자 메시지에서 GitHub 푸시 의도를 감지 (로컬 분류기 + 신뢰도 낮을 때만 LLM 보조)"""
     print(f"[DEBUG] GitHub 푸시 의도 감지 시작: '{message}'")
     
-    # 다양한 자연어 패턴을 포괄하는 정규식 패턴
-    push_keywords = [
-        r'깃허브(에|로)?\s*(적용|반영|올려|업로드|푸시|push|commit|커밋|업데이트|동기화|sync|적용시켜|반영해|올려줘|업로드해|push해|commit해|커밋해|업데이트해|동기화해|pr|pull request|풀리퀘|풀 리퀘|풀리퀘스트|풀 리퀘스트)',
-        r'github(에|로)?\s*(적용|반영|올려|업로드|푸시|push|commit|커밋|업데이트|동기화|sync|pr|pull request)',
-        r'깃(에|로)?\s*(적용|반영|올려|업로드|푸시|push|commit|커밋|업데이트|동기화|sync)',
-        r'적용(해|시켜|해줘|시켜줘|해주세요|시켜주세요)',
-        r'반영(해|시켜|해줘|시켜줘|해주세요|시켜주세요)',
-        r'올려(줘|주세요|달라|달라고|달라요|달라구|달라구요|달라줘|달라주세요)',
-        r'업로드(해|시켜|해줘|시켜줘|해주세요|시켜주세요)',
-        r'푸시(해|시켜|해줘|시켜줘|해주세요|시켜주세요)',
-        r'commit(해|시켜|해줘|시켜줘|해주세요|시켜주세요)',
-        r'커밋(해|시켜|해줘|시켜줘|해주세요|시켜주세요)',
-        r'업데이트(해|시켜|해줘|시켜줘|해주세요|시켜주세요)',
-        r'동기화(해|시켜|해줘|시켜줘|해주세요|시켜주세요)',
-        r'pr(생성|만들|올려|해|해주세요|해줘|시켜|시켜줘|시켜주세요)',
-        r'풀\s*리퀘(스트)?',
-        r'pull\s*request',
-        r'push',
-        r'commit',
-        r'pr',
-        r'pull request',
-    ]
-    
-    message_lower = message.lower()
-    for pattern in push_keywords:
-        if re.search(pattern, message_lower):
-            print(f"[INFO] GitHub 푸시 의도 감지 성공: 패턴 '{pattern}' 매칭")
-            return True
+    # 로컬 분류 (패턴 집합 → 예문 프로토타입)
+    intent = classify_push_intent(message)
+    print(f"[DEBUG] 로컬 푸시 의도 분류: {intent.label} (신뢰도 {intent.confidence:.2f}, {intent.source})")
+    if intent.confidence >= PUSH_INTENT_LLM_THRESHOLD:
+        return intent.label == PUSH_LABEL
     
-    # LLM 보조 검사 (정규식에 안 걸릴 때만)
+    # LLM 보조 검사 (로컬 분류 신뢰도가 낮을 때만)
     try:
         prompt = (
             "다음 사용자의 요청이 '코드를 깃허브에 반영/적용/푸시/업로드/커밋/PR 생성' 등 "
@@ -1356,26 +1553,11 @@ def detect_github_push_intent(message):
         )
         answer = response.choices[0].message.content.strip()
         print(f"[DEBUG] LLM 의도 감지 답변: {answer}")
-        if answer.startswith("네"):
-            return True
+        return answer.startswith("네")
     except Exception as e:
         print(f"[WARNING] LLM 의도 감지 실패: {e}")
-    print("[INFO] GitHub 푸시 의도 감지 실패: 정규식/LLM 모두 불일치")
-    return False
-    
-    # 대소문자 무시하고 검색
-    message_lower = message.lower()
-    
-    print(f"[DEBUG] 소문자 변환된 메시지: '{message_lower}'")
-    
-    # 패턴 매칭
-    for pattern in push_keywords:
-        if re.search(pattern, message_lower):
-            print(f"[INFO] GitHub 푸시 의도 감지 성공: 패턴 '{pattern}' 매칭")
-            return True
-    
-    print("[INFO] GitHub 푸시 의도 감지 실패: 일치하는 패턴 없음")
-    return False
+    # LLM을 쓸 수 없으면 로컬 분류 결과를 따름
+    return intent.label == PUSH_LABEL
 
 def apply_changes(session_id, file_name, new_content, push_to_github=False, commit_msg=None):
     """코드 변경사항을 저장소에 적용하는 함수"""
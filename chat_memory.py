@@ -1,6 +1,10 @@
 """
 대화 기록 관리 모듈.
 이전 대화를 저장하고 검색하는 기능을 제공합니다.
+
+세션별 대화 기록은 처음 접근할 때 디스크 컬렉션에서 메모리 색인(memory_index)으로 한 번 복원하고,
+이후 중복 확인과 유사 대화 검색은 메모리에서 처리합니다. 새 대화의 디스크 저장은 백그라운드로 처리됩니다.
+프롬프트에는 get_conversation_context가 누적 요약과 최근 대화로 토큰 예산 안에서 만든 기록을 넣습니다.
 """
 
 import chromadb
@@ -14,6 +18,11 @@ import openai
 import numpy as np
 import unicodedata
 import re
+from collection_registry import CollectionRegistry
+from vector_store import create_chroma_client
+from memory_index import SessionMemoryIndex, MemoryIndexCache, WriteBehind, normalize_rows
+from persistence_queue import persistence_queue
+from memory_compactor import RECENT_TURNS, SummaryStore, fold_turns, order_turns, build_history
 
 # ChromaDB를 위한 디렉토리
 MEMORY_DB_PATH = "./chat_memory_db"
@@ -28,10 +37,9 @@ def compute_hash(text: str) -> str:
 
 # ChromaDB 클라이언트 초기화
 def init_memory_client():
-    """ChromaDB 클라이언트를 초기화합니다."""
+    """ChromaDB 클라이언트를 초기화합니다. (VECTOR_STORE_MODE=server이면 공유 서버에 접속)"""
     try:
-        os.makedirs(MEMORY_DB_PATH, exist_ok=True)
-        client = chromadb.PersistentClient(path=MEMORY_DB_PATH)
+        client = create_chroma_client(MEMORY_DB_PATH)
         print(f"[DEBUG] 대화 기록 DB 클라이언트 초기화 완료: {MEMORY_DB_PATH}")
         return client
     except Exception as e:
@@ -48,6 +56,9 @@ openai_ef = embedding_functions.OpenAIEmbeddingFunction(
 # 메모리 클라이언트 초기화
 memory_client = init_memory_client()
 
+# 열린 chat_memory_* 컬렉션 핸들 캐시
+memory_collections = CollectionRegistry(memory_client, embedding_function=openai_ef)
+
 def get_or_create_collection(session_id: str):
     """세션별 대화 기록 컬렉션을 가져오거나 생성합니다."""
     if not memory_client:
@@ -56,24 +67,11 @@ def get_or_create_collection(session_id: str):
     
     collection_name = f"chat_memory_{session_id}"
     try:
-        # 컬렉션 존재 여부 확인
-        collections = [col.name for col in memory_client.list_collections()]
-        
-        if collection_name not in collections:
-            print(f"[DEBUG] 컬렉션 생성: {collection_name}")
-            collection = memory_client.create_collection(
-                name=collection_name,
-                embedding_function=openai_ef,
-                metadata={"description": f"대화 기록 - 세션 {session_id}"}
-            )
-        else:
-            print(f"[DEBUG] 기존 컬렉션 사용: {collection_name}")
-            collection = memory_client.get_collection(
-                name=collection_name,
-                embedding_function=openai_ef
-            )
-        
-        return collection
+        # 캐시된 핸들이 있으면 재사용하고, 없을 때만 열거나 생성
+        return memory_collections.get_or_create(
+            collection_name,
+            metadata={"description": f"대화 기록 - 세션 {session_id}"}
+        )
     except Exception as e:
         print(f"[ERROR] 컬렉션 가져오기/생성 실패: {e}")
         traceback.print_exc()
@@ -107,72 +105,83 @@ def normalize_question(question: str) -> str:
     return question
 
 def normalize_embedding(embedding):
-    """임베딩 벡터를 정규화하고 반올림합니다."""
-    if isinstance(embedding, list):
-        embedding = np.array(embedding)
-    
-    # L2 정규화
-    norm = np.linalg.norm(embedding)
-    if norm == 0:
-        return embedding
-    
-    # 정규화 및 반올림
-    normalized = embedding / norm
-    # 소수점 6자리까지 반올림
-    normalized = np.round(normalized, decimals=6)
-    
-    # 정규화 확인
-    norm_after = np.linalg.norm(normalized)
-    print(f"[DEBUG] 정규화 후 L2 norm: {norm_after:.6f}")
-    
-    return normalized
+    """임베딩 벡터(또는 행렬의 각 행)를 L2 정규화한 float32 배열로 만듭니다."""
+    return normalize_rows(embedding)
 
 def get_embedding(text: str) -> np.ndarray:
     """텍스트의 임베딩을 생성하고 정규화합니다."""
     try:
-        # 1. 텍스트 정규화
-        normalized_text = normalize_question(text)
+        # 1. 텍스트 정규화 후 임베딩 생성
+        embedding = openai_ef([normalize_question(text)])
         
-        # 2. 임베딩 생성
-        embedding = openai_ef(normalized_text)
-        if hasattr(embedding, 'tolist'):
-            embedding = embedding.tolist()
-        if not isinstance(embedding, list):
-            embedding = [embedding]
-        
-        # 3. 임베딩 정규화
+        # 2. 임베딩 정규화
         normalized_embedding = normalize_embedding(embedding[0])
-        
         print(f"[DEBUG] 임베딩 생성 완료 (차원: {len(normalized_embedding)})")
-        print(f"[DEBUG] 임베딩 첫 5개 값: {normalized_embedding[:5]}")
-        
         return normalized_embedding
     except Exception as e:
         print(f"[ERROR] 임베딩 생성 중 오류 발생: {e}")
         raise
 
 def cosine_similarity(v1, v2):
-    """두 벡터 간의 코사인 유사도를 계산합니다."""
-    # 벡터가 리스트인 경우 numpy 배열로 변환
-    if isinstance(v1, list):
-        v1 = np.array(v1)
-    if isinstance(v2, list):
-        v2 = np.array(v2)
-    
-    # 정규화 확인
-    norm_v1 = np.linalg.norm(v1)
-    norm_v2 = np.linalg.norm(v2)
-    print(f"[DEBUG] 벡터 정규화 확인 - v1: {norm_v1:.6f}, v2: {norm_v2:.6f}")
-    
-    # 코사인 유사도 계산
-    dot_product = np.dot(v1, v2)
-    similarity = dot_product / (norm_v1 * norm_v2)
-    
-    # 반올림하여 반환
-    return np.round(similarity, decimals=6)
+    """두 벡터(또는 v1 행렬의 각 행과 v2) 간의 코사인 유사도를 계산합니다."""
+    return normalize_rows(v1) @ normalize_rows(v2).reshape(-1)
+
+def load_memory_index(session_id: str):
+    """세션의 대화 기록 컬렉션을 한 번 읽어 메모리 색인을 만듭니다. (컬렉션이 없으면 빈 색인)"""
+    if not memory_client:
+        print("[ERROR] 메모리 클라이언트가 초기화되지 않았습니다.")
+        return None
+    try:
+        memory_writes.flush(session_id)  # 아직 디스크에 쓰지 않은 대화가 빠지지 않도록
+        collection = memory_collections.get(f"chat_memory_{session_id}")
+        if collection is None:
+            return SessionMemoryIndex()
+        records = collection.get(include=['embeddings', 'documents', 'metadatas'])
+        index = SessionMemoryIndex.from_records(records['ids'], records['documents'], records['metadatas'],
+                                                records['embeddings'])
+        print(f"[DEBUG] 대화 기록 색인 복원: 세션 {session_id}, {len(index)}개")
+        return index
+    except Exception as e:
+        print(f"[ERROR] 대화 기록 색인 복원 실패: {e}")
+        traceback.print_exc()
+        return None
+
+# 세션별 대화 기록 메모리 색인과 디스크 컬렉션 백그라운드 쓰기
+memory_writes = WriteBehind("memory-writer")
+memory_indexes = MemoryIndexCache(load_memory_index)
+
+# 오래된 대화를 세션별 누적 요약에 접어 넣는 백그라운드 작업 (LLM 호출이므로 디스크 쓰기와 다른 스레드)
+memory_summaries = SummaryStore()
+summary_updates = WriteBehind("memory-summarizer")
+
+def update_summary(session_id):
+    """최근 대화를 뺀 나머지 중 아직 요약에 없는 대화를 누적 요약에 반영합니다."""
+    index = memory_indexes.get(session_id)
+    if index is not None:
+        fold_turns(session_id, index.entries(), memory_summaries)
+
+def embed_texts(texts):
+    """여러 텍스트를 임베딩 API 한 번으로 임베딩합니다."""
+    return list(normalize_embedding(np.asarray(openai_ef(list(texts)))))
+
+def persist_conversation(session_id, record_id, document, metadata, embedding):
+    """대화 한 건을 디스크 컬렉션에 씁니다. (백그라운드 쓰기 스레드에서 실행)"""
+    collection = get_or_create_collection(session_id)
+    if not collection:
+        print("[ERROR] 컬렉션을 가져오거나 생성할 수 없어 대화를 디스크에 저장하지 못했습니다.")
+        return
+    collection.add(documents=[document], metadatas=[metadata], ids=[record_id], embeddings=[embedding])
+    memory_collections.invalidate_count(f"chat_memory_{session_id}")
+    print(f"[DEBUG] 대화 디스크 저장 완료: {record_id}")
 
 def save_conversation(session_id, question, answer):
-    """대화 내용을 저장하고 중복을 제거합니다."""
+    """
+    대화 내용을 저장하고 중복을 제거합니다.
+    중복 확인은 메모리 색인에서 하고, 디스크 컬렉션 쓰기는 백그라운드로 넘깁니다.
+
+    Returns:
+        bool: 새로 저장했으면 True (중복이거나 오류면 False)
+    """
     try:
         # 1. 질문 정규화
         normalized_question = normalize_question(question)
@@ -182,66 +191,52 @@ def save_conversation(session_id, question, answer):
         current_hash = compute_hash(normalized_question)
         print(f"[DEBUG] 현재 질문 해시: {current_hash}")
         
-        # 3. 컬렉션 가져오기 또는 생성
-        collection = get_or_create_collection(session_id)
-        if not collection:
-            print("[ERROR] 컬렉션을 가져오거나 생성할 수 없습니다.")
-            return
-        
-        # 4. 현재 질문의 임베딩 생성
-        embedding = get_embedding(normalized_question)
-        
-        # 5. 해시값으로 중복 체크
-        results = collection.get(
-            where={"question_hash": current_hash}
-        )
+        # 3. 세션 색인 가져오기 (처음이면 디스크에서 복원)
+        index = memory_indexes.get(session_id)
+        if index is None:
+            print("[ERROR] 대화 기록 색인을 가져올 수 없습니다.")
+            return False
         
-        if results and len(results['ids']) > 0:
+        # 4. 해시값으로 중복 체크
+        if index.has(current_hash):
             print(f"[DEBUG] 동일한 해시값의 이전 질문이 발견되어 중복을 제거합니다.")
-            return
+            return False
         
-        # 6. 유사한 이전 대화 검색
-        results = collection.query(
-            query_embeddings=[embedding.tolist()],
-            n_results=5,
-            include=['embeddings', 'documents', 'metadatas']
-        )
+        # 5. 질문과 저장할 문서를 한 번에 임베딩
+        document = f"Q: {normalized_question}\nA: {answer}"
+        embedding, document_embedding = embed_texts([normalized_question, document])
         
-        # 7. 직접 코사인 유사도 계산
-        if 'embeddings' in results and results['embeddings']:
-            print("\n[DEBUG] 유사도 검사 결과:")
-            for idx, stored_embedding in enumerate(results['embeddings'][0]):
-                # 저장된 임베딩 정규화
-                stored_embedding = normalize_embedding(stored_embedding)
-                # 코사인 유사도 계산
-                similarity = cosine_similarity(embedding, stored_embedding)
-                print(f"대화 {idx+1} 코사인 유사도: {similarity:.6f}")
-                
-                # 유사도가 0.95 이상이면 중복으로 간주
-                if similarity > 0.95:
-                    print(f"[DEBUG] 유사도가 높은 이전 대화 발견 (유사도: {similarity:.6f})")
-                    return
+        # 6. 유사도가 0.95 이상인 이전 대화가 있으면 중복으로 간주
+        similarity = index.max_similarity(embedding)
+        if similarity > 0.95:
+            print(f"[DEBUG] 유사도가 높은 이전 대화 발견 (유사도: {similarity:.6f})")
+            return False
         
-        # 8. 새로운 대화 저장
-        collection.add(
-            documents=[f"Q: {normalized_question}\nA: {answer}"],
-            metadatas=[{
-                "session_id": session_id,
-                "question_hash": current_hash,
-                "timestamp": datetime.now().isoformat(),
-                "original_question": question
-            }],
-            ids=[f"{session_id}_{current_hash}"]
-        )
+        # 7. 색인에 추가하고 디스크 저장은 백그라운드로
+        record_id = f"{session_id}_{current_hash}"
+        metadata = {
+            "session_id": session_id,
+            "question_hash": current_hash,
+            "timestamp": datetime.now().isoformat(),
+            "original_question": question
+        }
+        if not index.add(current_hash, record_id, document, metadata, document_embedding):
+            return False
+        memory_writes.submit(session_id, persist_conversation, session_id, record_id, document, metadata,
+                             document_embedding.tolist())
+        if len(index) > RECENT_TURNS:
+            summary_updates.submit(session_id, update_summary, session_id)
         print(f"[DEBUG] 새로운 대화 저장 완료: {current_hash}")
+        return True
         
     except Exception as e:
         print(f"[ERROR] 대화 저장 중 오류 발생: {e}")
         import traceback
         traceback.print_exc()
+        return False
 
 def get_relevant_conversations(session_id: str, query: str, top_k: int = 3) -> str:
-    """현재 질문과 관련된 이전 대화를 검색합니다."""
+    """현재 질문과 관련된 이전 대화를 메모리 색인에서 검색합니다."""
     try:
         # 1. 질문 정규화
         normalized_query = normalize_question(query)
@@ -251,63 +246,41 @@ def get_relevant_conversations(session_id: str, query: str, top_k: int = 3) -> s
         current_hash = compute_hash(normalized_query)
         print(f"[DEBUG] 현재 질문 해시: {current_hash}")
         
-        # 3. 컬렉션 가져오기 또는 생성
-        collection = get_or_create_collection(session_id)
-        if not collection:
-            print("[ERROR] 컬렉션을 가져오거나 생성할 수 없습니다.")
+        # 3. 세션 색인 가져오기 (처음이면 디스크에서 복원)
+        index = memory_indexes.get(session_id)
+        if index is None:
+            print("[ERROR] 대화 기록 색인을 가져올 수 없습니다.")
+            return "이전 대화 없음"
+        if not len(index):
+            print("[DEBUG] 관련된 이전 대화가 없습니다.")
             return "이전 대화 없음"
         
         # 4. 해시값으로 정확히 일치하는 대화 검색
-        results = collection.get(
-            where={"question_hash": current_hash}
-        )
-        
-        if results and len(results['ids']) > 0:
+        entry = index.get(current_hash)
+        if entry:
             print(f"[DEBUG] 정확히 일치하는 이전 대화를 찾았습니다.")
-            return results['documents'][0]
+            return entry['document']
         
-        # 5. 현재 질문의 임베딩 생성
+        # 5. 현재 질문의 임베딩 생성 후 유사한 이전 대화 검색
         embedding = get_embedding(normalized_query)
+        found = index.search(embedding, top_k, min_similarity=0.8)  # 유사도가 0.8보다 큰 대화만
+        print(f"[DEBUG] 유사도 검사 결과: {[round(similarity, 4) for similarity, _ in found]}")
         
-        # 6. 유사한 이전 대화 검색
-        results = collection.query(
-            query_embeddings=[embedding.tolist()],
-            n_results=top_k,
-            include=['embeddings', 'documents', 'metadatas']
-        )
-        
-        # 7. 검색 결과 처리
-        if not results or 'documents' not in results or not results['documents'] or not results['documents'][0]:
-            print("[DEBUG] 관련된 이전 대화가 없습니다.")
-            return "이전 대화 없음"
-        
-        # 8. 대화 기록 포맷팅
+        # 6. 대화 기록 포맷팅
         conversations = []
-        if 'embeddings' in results and results['embeddings']:
-            print("\n[DEBUG] 유사도 검사 결과:")
-            for idx, stored_embedding in enumerate(results['embeddings'][0]):
-                # 저장된 임베딩 정규화
-                stored_embedding = normalize_embedding(stored_embedding)
-                # 코사인 유사도 계산
-                similarity = cosine_similarity(embedding, stored_embedding)
-                print(f"대화 {idx+1} 코사인 유사도: {similarity:.6f}")
-                
-                # 유사도가 0.8 이상인 대화만 포함
-                if similarity > 0.8:
-                    # 원본 질문이 있으면 표시
-                    original_question = results['metadatas'][0][idx].get('original_question', '')
-                    if original_question and original_question != normalized_query:
-                        conversations.append(f"[관련 대화 {idx+1} (유사도: {similarity:.6f}, 원본: '{original_question}')]\n{results['documents'][0][idx]}")
-                    else:
-                        conversations.append(f"[관련 대화 {idx+1} (유사도: {similarity:.6f})]\n{results['documents'][0][idx]}")
-                else:
-                    print(f"[DEBUG] 대화 {idx+1} 유사도가 너무 낮아 제외됨: {similarity:.6f}")
+        for idx, (similarity, entry) in enumerate(found):
+            # 원본 질문이 있으면 표시
+            original_question = entry['metadata'].get('original_question', '')
+            if original_question and original_question != normalized_query:
+                conversations.append(f"[관련 대화 {idx+1} (유사도: {similarity:.6f}, 원본: '{original_question}')]\n{entry['document']}")
+            else:
+                conversations.append(f"[관련 대화 {idx+1} (유사도: {similarity:.6f})]\n{entry['document']}")
         
         if not conversations:
             print("[DEBUG] 유사도가 충분히 높은 이전 대화가 없습니다.")
             return "이전 대화 없음"
         
-        # 9. 대화 기록 반환
+        # 7. 대화 기록 반환
         return "\n\n".join(conversations)
         
     except Exception as e:
@@ -316,6 +289,43 @@ def get_relevant_conversations(session_id: str, query: str, top_k: int = 3) -> s
         traceback.print_exc()
         return "이전 대화 없음"
 
+def get_conversation_context(session_id: str, query: str, top_k: int = 3) -> str:
+    """
+    프롬프트의 [이전 대화 기록]을 토큰 예산(HISTORY_TOKEN_BUDGET) 안에서 만듭니다.
+    누적 요약 + 질문과 비슷한 예전 대화 + 최근 대화 원문 (memory_compactor 참고)
+    """
+    try:
+        index = memory_indexes.get(session_id)
+        if index is None or not len(index):
+            print("[DEBUG] 관련된 이전 대화가 없습니다.")
+            return "이전 대화 없음"
+        
+        turns = order_turns(index.entries())
+        recent = turns[-RECENT_TURNS:] if RECENT_TURNS > 0 else []
+        
+        # 최근 대화 외에 예전 대화가 있을 때만 관련 대화 검색 (같은 질문이면 임베딩 없이 바로)
+        relevant = []
+        if len(turns) > len(recent):
+            normalized_query = normalize_question(query)
+            entry = index.get(compute_hash(normalized_query))
+            if entry:
+                relevant = [(1.0, entry)]
+            else:
+                relevant = index.search(get_embedding(normalized_query), top_k + len(recent), min_similarity=0.8)
+        
+        history = build_history(memory_summaries.load(session_id).get('summary', ''), recent, relevant)
+        print(f"[DEBUG] 이전 대화 기록 구성: 최근 {len(recent)}개, 관련 후보 {len(relevant)}개, {len(history)}자")
+        return history or "이전 대화 없음"
+        
+    except Exception as e:
+        print(f"[ERROR] 이전 대화 기록 구성 중 오류 발생: {e}")
+        traceback.print_exc()
+        return "이전 대화 없음"
+
+def release_memory_index(session_id: str):
+    """세션의 대화 기록 색인을 메모리에서 내립니다. (다음 사용 시 디스크에서 다시 복원)"""
+    memory_indexes.discard(session_id)
+
 def reset_memory(session_id=None):
     """대화 기록을 초기화합니다. session_id가 None이면 모든 세션의 기록을 삭제합니다."""
     if not memory_client:
@@ -323,19 +333,24 @@ def reset_memory(session_id=None):
         return False
     
     try:
+        # 대기 중인 백그라운드 쓰기가 삭제 뒤에 컬렉션을 다시 만들지 않도록 먼저 마침
+        persistence_queue.flush(timeout=30)
+        memory_writes.flush(session_id)
+        summary_updates.flush(session_id)
+        memory_indexes.discard(session_id)
+        memory_summaries.delete(session_id)
         if session_id:
-            collection_name = f"memory_{session_id}"
-            try:
-                memory_client.delete_collection(collection_name)
+            collection_name = f"chat_memory_{session_id}"
+            if memory_collections.delete(collection_name):
                 print(f"[DEBUG] 세션 {session_id}의 대화 기록 삭제 완료")
-            except Exception:
+            else:
                 print(f"[WARNING] 세션 {session_id}의 컬렉션이 존재하지 않거나 삭제할 수 없습니다.")
         else:
             # 모든 메모리 컬렉션 삭제
             collections = memory_client.list_collections()
             for collection in collections:
-                if collection.name.startswith("memory_"):
-                    memory_client.delete_collection(collection.name)
+                if collection.name.startswith("chat_memory_"):
+                    memory_collections.delete(collection.name)
                     print(f"[DEBUG] 컬렉션 {collection.name} 삭제 완료")
         return True
     except Exception as e:
@@ -0,0 +1,297 @@
+"""
+저장소 import/호출 그래프 모듈
+
+인제스트 시 청커(chunk_python_functions, chunk_js)가 정의를 찾으면서 모듈 import와 정의별 참조 이름을
+함께 기록하고, 모든 파일을 본 뒤 resolve()로 참조 이름을 실제 정의에 연결합니다.
+질문 처리 시에는 검색 상위 청크의 라인이 속한 정의에서 호출하는 정의(callee)와
+그 정의를 호출하는 정의(caller)를 추가 ANN 검색 없이 딕셔너리 조회로 찾습니다.
+
+    - 노드: 정의 (키 "경로::정규화된 이름", 경로/라인 범위/종류/부모)
+    - calls / callers: 정의 → 호출하는(호출되는) 정의 목록
+    - imports: 파일 → 저장소 안에서 찾은 import 대상 파일 목록
+
+참조 이름은 같은 파일의 정의 → import한 파일의 정의 → 저장소 전체에서 유일한 정의 순으로 연결하며,
+어느 쪽으로도 하나로 정해지지 않는 이름(흔한 메소드 이름 등)은 연결하지 않습니다.
+"""
+
+import os
+import re
+import ast
+import json
+import bisect
+import builtins
+import threading
+from typing import Optional, List, Dict, Any, Iterable
+
+GRAPH_EXPANSION_ENABLED = os.environ.get("GRAPH_EXPANSION_ENABLED", "1") == "1"  # 검색 결과 이웃 확장 사용 여부
+GRAPH_SEED_COUNT = int(os.environ.get("GRAPH_SEED_COUNT", 3))  # 이웃을 확장할 상위 청크 수
+GRAPH_MAX_NEIGHBOURS = int(os.environ.get("GRAPH_MAX_NEIGHBOURS", 4))  # 컨텍스트에 추가할 최대 이웃 정의 수
+GRAPH_NEIGHBOUR_BUDGET_RATIO = 0.15  # 이웃 정의 하나가 차지할 수 있는 최대 예산 비율
+
+IGNORED_REFERENCES = set(dir(builtins)) | {'self', 'cls', 'super'}
+JS_KEYWORDS = {'if', 'for', 'while', 'switch', 'catch', 'function', 'return', 'with', 'typeof', 'new', 'await',
+               'async', 'import', 'require', 'console', 'constructor'}
+JS_CALL_PATTERN = re.compile(r'(?<![\w$])([A-Za-z_$][\w$]*)\s*\(')
+JS_IMPORT_PATTERN = re.compile(r'''(?:from\s+|require\s*\(\s*|import\s+)['"]([^'"]+)['"]''')
+JS_EXTENSIONS = ['', '.js', '.jsx', '.ts', '.tsx', '/index.js', '/index.ts']
+
+
+def definition_key(path: str, qualified_name: str) -> str:
+    return f"{path}::{qualified_name}"
+
+
+def python_references(node: ast.AST) -> List[str]:
+    """정의 안에서 호출한 이름 목록 (obj.method()는 method, 내장 함수 제외)"""
+    names = []
+    for child in ast.walk(node):
+        if isinstance(child, ast.Call):
+            func = child.func
+            name = func.id if isinstance(func, ast.Name) else func.attr if isinstance(func, ast.Attribute) else None
+            if name and name not in IGNORED_REFERENCES:
+                names.append(name)
+    return names
+
+
+def js_references(source: str, own_name: str = '') -> List[str]:
+    """JS 코드 조각에서 호출한 이름 목록 (제어문/키워드 제외)"""
+    return [name for name in JS_CALL_PATTERN.findall(source) if name not in JS_KEYWORDS and name != own_name]
+
+
+def js_imports(lines: Iterable[str]) -> List[str]:
+    """JS import/require 문의 모듈 경로"""
+    return [spec for line in lines for spec in JS_IMPORT_PATTERN.findall(line)]
+
+
+class CodeGraph:
+    """
+    정의 단위 호출 그래프 + 파일 단위 import 그래프 (스레드 안전)
+
+    노드 형식:
+        {'key': 'app.py::handle', 'path': 'app.py', 'qualified_name': 'handle', 'name': 'handle',
+         'kind': 'function', 'parent': '', 'start_line': 10, 'end_line': 30}
+    """
+
+    def __init__(self, commit: Optional[str] = None):
+        self._lock = threading.RLock()
+        self.commit = commit  # 그래프를 만든 저장소 커밋
+        self.nodes = {}  # 키 -> 노드
+        self.calls = {}  # 키 -> [호출하는 정의 키, ...]
+        self.callers = {}  # 키 -> [이 정의를 호출하는 정의 키, ...]
+        self.imports = {}  # 경로 -> [import한 저장소 파일 경로, ...]
+        self._references = {}  # 키 -> [참조 이름, ...] (resolve 전까지만 보관)
+        self._raw_imports = {}  # 경로 -> [모듈 이름/경로, ...] (resolve 전까지만 보관)
+        self._spans = {}  # 경로 -> [(시작 라인, 끝 라인, 키), ...] (시작 라인 순)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    # ----------------- 인제스트 -----------------
+    def add_definition(self, path: str, qualified_name: str, start_line: int, end_line: int, kind: str,
+                       references: Iterable[str] = ()):
+        """정의와 그 안의 참조 이름을 추가합니다. (라인은 1부터, 끝 라인 포함)"""
+        if not path or not qualified_name:
+            return
+        key = definition_key(path, qualified_name)
+        parent, _, name = qualified_name.rpartition('.')
+        with self._lock:
+            self.nodes[key] = {'key': key, 'path': path, 'qualified_name': qualified_name, 'name': name,
+                               'kind': kind, 'parent': parent, 'start_line': start_line, 'end_line': end_line}
+            self._references.setdefault(key, []).extend(references)
+
+    def add_imports(self, path: str, modules: Iterable[str]):
+        """파일의 import 대상 (파이썬 모듈 이름은 상대 import면 앞에 '.'를 붙임, JS는 경로 그대로)"""
+        with self._lock:
+            self._raw_imports.setdefault(path, []).extend(modules)
+
+    def add_python_module(self, path: str, tree: ast.Module):
+        """파싱된 파이썬 모듈의 import와 클래스/함수 정의를 추가합니다."""
+        modules = []
+        for node in tree.body:
+            if isinstance(node, ast.Import):
+                modules.extend(alias.name for alias in node.names)
+            elif isinstance(node, ast.ImportFrom):
+                base = '.' * (node.level or 0) + (node.module or '')
+                modules.append(base)
+                # "from pkg import module" 형태는 하위 모듈일 수 있음
+                modules.extend(f"{base}.{alias.name}" if node.module else f"{base}{alias.name}" for alias in node.names)
+        self.add_imports(path, modules)
+
+        def visit(body, parent_qualname, in_class):
+            for node in body:
+                if isinstance(node, ast.ClassDef):
+                    qualname = f"{parent_qualname}.{node.name}" if parent_qualname else node.name
+                    bases = [b.id if isinstance(b, ast.Name) else b.attr for b in node.bases if isinstance(b, (ast.Name, ast.Attribute))]
+                    self.add_definition(path, qualname, node.lineno, getattr(node, 'end_lineno', node.lineno), 'class', bases)
+                    visit(node.body, qualname, True)
+                elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    qualname = f"{parent_qualname}.{node.name}" if parent_qualname else node.name
+                    self.add_definition(path, qualname, node.lineno, getattr(node, 'end_lineno', node.lineno),
+                                        'method' if in_class else 'function', python_references(node))
+                    visit(node.body, qualname, False)
+
+        visit(tree.body, '', False)
+
+    # ----------------- 연결 -----------------
+    def _resolve_module(self, path: str, spec: str, paths: set) -> Optional[str]:
+        """import 대상 이름을 저장소 안의 파일 경로로 바꿉니다. (찾지 못하면 None)"""
+        directory = os.path.dirname(path)
+        if path.endswith('.py'):
+            level = len(spec) - len(spec.lstrip('.'))
+            parts = [p for p in spec.lstrip('.').split('.') if p]
+            if level:
+                base = directory
+                for _ in range(level - 1):
+                    base = os.path.dirname(base)
+                candidates = [os.path.join(base, *parts)] if parts else []
+            else:
+                candidates = [os.path.join(*parts)] if parts else []
+            for candidate in candidates:
+                candidate = candidate.replace(os.sep, '/')
+                for option in (f"{candidate}.py", f"{candidate}/__init__.py"):
+                    if option in paths:
+                        return option
+                    if not level:
+                        # src/ 아래 패키지 등 저장소 루트가 아닌 곳에 있는 모듈
+                        matches = [p for p in paths if p.endswith('/' + option)]
+                        if len(matches) == 1:
+                            return matches[0]
+            return None
+        if not spec.startswith('.'):
+            return None  # npm 패키지
+        base = os.path.normpath(os.path.join(directory, spec)).replace(os.sep, '/')
+        for extension in JS_EXTENSIONS:
+            if base + extension in paths:
+                return base + extension
+        return None
+
+    def resolve(self):
+        """모든 파일을 추가한 뒤 import와 참조 이름을 실제 파일/정의에 연결합니다."""
+        with self._lock:
+            paths = {node['path'] for node in self.nodes.values()} | set(self._raw_imports)
+            for path, specs in self._raw_imports.items():
+                resolved = []
+                for spec in specs:
+                    target = self._resolve_module(path, spec, paths)
+                    if target and target != path and target not in resolved:
+                        resolved.append(target)
+                self.imports[path] = resolved
+            self._raw_imports = {}
+
+            by_name = {}
+            for key, node in self.nodes.items():
+                by_name.setdefault(node['name'], []).append(key)
+            self.calls, self.callers = {}, {}
+            for key, names in self._references.items():
+                node = self.nodes.get(key)
+                if node is None:
+                    continue
+                imported = set(self.imports.get(node['path'], []))
+                targets = []
+                for name in dict.fromkeys(names):
+                    candidates = [k for k in by_name.get(name, []) if k != key]
+                    if not candidates:
+                        continue
+                    same_file = [k for k in candidates if self.nodes[k]['path'] == node['path']]
+                    from_imports = [k for k in candidates if self.nodes[k]['path'] in imported]
+                    for group in (same_file, from_imports, candidates):
+                        if len(group) == 1:
+                            targets.append(group[0])
+                            break
+                        if group:
+                            break  # 여러 정의 중 하나로 정할 수 없음
+                for target in dict.fromkeys(targets):
+                    self.calls.setdefault(key, []).append(target)
+                    self.callers.setdefault(target, []).append(key)
+            self._references = {}
+            self._build_spans()
+
+    def _build_spans(self):
+        self._spans = {}
+        for key, node in self.nodes.items():
+            self._spans.setdefault(node['path'], []).append((node['start_line'] or 0, node['end_line'] or 0, key))
+        for spans in self._spans.values():
+            spans.sort()
+
+    # ----------------- 조회 -----------------
+    def node_at(self, path: str, line: int) -> Optional[Dict[str, Any]]:
+        """파일의 line을 감싸는 가장 안쪽 정의"""
+        spans = self._spans.get(path)
+        if not spans or not line or line < 1:
+            return None
+        index = bisect.bisect_right(spans, (line, float('inf'), ''))
+        best = None
+        for start, end, key in reversed(spans[:index]):
+            if end >= line and (best is None or end - start < best[1] - best[0]):
+                best = (start, end, key)
+        return self.nodes[best[2]] if best else None
+
+    def neighbours(self, path: str, line: int, limit: int = GRAPH_MAX_NEIGHBOURS) -> List[Dict[str, Any]]:
+        """
+        line이 속한 정의의 이웃 정의를 호출 대상(callee)과 호출한 쪽(caller)을 번갈아 반환합니다.
+
+        Returns:
+            [{...노드, 'relation': 'callee' | 'caller', 'via': 기준 정의의 정규화된 이름}, ...]
+        """
+        node = self.node_at(path, line)
+        if node is None:
+            return []
+        callees = [('callee', k) for k in self.calls.get(node['key'], [])]
+        callers = [('caller', k) for k in self.callers.get(node['key'], [])]
+        ordered = [item for pair in zip(callees, callers) for item in pair]
+        ordered += callees[len(callers):] + callers[len(callees):]
+        return [{**self.nodes[k], 'relation': relation, 'via': node['qualified_name']} for relation, k in ordered[:limit]]
+
+    def expand(self, seeds: List[Dict[str, Any]], limit: int = GRAPH_MAX_NEIGHBOURS) -> List[Dict[str, Any]]:
+        """
+        검색 상위 청크들의 이웃 정의를 중복 없이 모읍니다. (앞선 청크의 이웃 우선, 청크 자신이 속한 정의 제외)
+
+        Args:
+            seeds (list): [{'path', 'start_line'}, ...] 중요한 순서의 청크 메타데이터
+        """
+        seed_keys = set()
+        for meta in seeds:
+            node = self.node_at(meta.get('path'), meta.get('start_line'))
+            if node:
+                seed_keys.add(node['key'])
+        found, seen = [], set(seed_keys)
+        for meta in seeds:
+            for neighbour in self.neighbours(meta.get('path'), meta.get('start_line'), limit):
+                if neighbour['key'] in seen:
+                    continue
+                seen.add(neighbour['key'])
+                found.append(neighbour)
+                if len(found) >= limit:
+                    return found
+        return found
+
+    # ----------------- 저장 -----------------
+    def save(self, path: str):
+        """연결된 그래프를 JSON으로 저장합니다."""
+        with self._lock:
+            data = {'commit': self.commit, 'nodes': list(self.nodes.values()), 'calls': self.calls, 'imports': self.imports}
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional['CodeGraph']:
+        """저장된 그래프를 불러옵니다. (없거나 읽기 실패 시 None)"""
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"[WARNING] 코드 그래프 로드 실패 ({path}): {e}")
+            return None
+        graph = cls(data.get('commit'))
+        graph.nodes = {node['key']: node for node in data.get('nodes', [])}
+        graph.calls = data.get('calls', {})
+        graph.imports = data.get('imports', {})
+        for key, targets in graph.calls.items():
+            for target in targets:
+                graph.callers.setdefault(target, []).append(key)
+        graph._build_spans()
+        return graph
@@ -0,0 +1,296 @@
+"""
+코드 수정용 컨텍스트 슬라이싱 모듈
+
+코드 수정 요청에서 관련 파일 전체를 프롬프트에 넣는 대신, 검색/심볼 테이블이 찾은 라인 범위를
+감싸는 함수·클래스 단위 영역만 잘라서 보냅니다.
+
+    - 찾은 라인 범위 → 그 범위를 감싸는 가장 안쪽 함수/클래스 정의로 확장
+      (정의가 너무 크면 앞뒤 SLICE_PADDING_LINES 줄, 그래도 크면 예산에 맞게 앞부분만)
+    - 파일 앞부분의 import 헤더는 영역으로 함께 포함 (새 import 추가도 영역 수정으로 처리)
+    - 나머지 정의는 "L시작-끝 시그니처" 한 줄씩의 개요로만 표시
+    - 전체를 토큰 예산(MODIFY_CONTEXT_TOKEN_BUDGET) 안에 맞춤 (예산 안에 파일 전체가 들어가면 전체 전송)
+
+잘라서 보낸 파일은 모델이 영역 단위로 수정 결과를 돌려주고("// REGION: 시작-끝"),
+apply_region_edits가 원본 파일에 다시 끼워 넣어 전체 파일 내용을 만듭니다. (apply_changes는 그대로 전체 파일을 받음)
+"""
+
+import os
+import re
+import ast
+from typing import Optional, List, Dict, Any, Tuple
+
+from context_packer import estimate_tokens
+
+MODIFY_CONTEXT_TOKEN_BUDGET = int(os.environ.get("MODIFY_CONTEXT_TOKEN_BUDGET", 12000))  # 코드 수정 컨텍스트 예산
+SLICE_PADDING_LINES = 20  # 감싸는 정의가 없거나 너무 클 때 범위 앞뒤로 붙일 줄 수
+HEADER_MAX_LINES = 80  # import 헤더로 볼 최대 줄 수
+OUTLINE_LINE_CHARS = 120  # 개요 한 줄의 최대 길이
+REGION_MARKER_TOKENS = 8  # 영역 표시 줄("// REGION: a-b")의 토큰 수
+
+FILE_MARKER = re.compile(r'^\s*//\s*FILE:')
+REGION_MARKER = re.compile(r'^\s*//\s*REGION:\s*(\d+)\s*-\s*(\d+)\s*$')
+FENCE_LINE = re.compile(r'^\s*```')
+# 파이썬 외 언어의 import 계열 줄
+IMPORT_LINE = re.compile(
+    r'^\s*(import\s|from\s+\S+\s+import\s|export\s.*\sfrom\s|#include|#import|using\s|package\s|require\s|use\s|@import'
+    r'|(const|let|var)\s+.*=\s*require\()'
+)
+COMMENT_LINE = re.compile(r'^\s*(#|//|/\*|\*|"""|\'\'\')')
+
+
+def find_definitions(source: str, path: str) -> List[Dict[str, Any]]:
+    """
+    파이썬 파일의 클래스/함수 정의 범위를 찾습니다. (데코레이터 포함, 1부터 시작하는 라인)
+
+    Returns:
+        [{'name', 'kind', 'start_line', 'end_line'}, ...] (파이썬이 아니거나 구문 오류면 빈 목록)
+    """
+    if not path.endswith('.py'):
+        return []
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return []
+    found = []
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+            kind = 'class' if isinstance(node, ast.ClassDef) else 'function'
+            found.append({'name': node.name, 'kind': kind, 'start_line': start,
+                          'end_line': getattr(node, 'end_lineno', None) or node.lineno})
+    return sorted(found, key=lambda d: (d['start_line'], -d['end_line']))
+
+
+def import_header(lines: List[str], path: str) -> Optional[Tuple[int, int]]:
+    """
+    파일 앞부분의 import 헤더 범위 (1, 마지막 import 줄). 없으면 None.
+
+    파이썬은 맨 앞의 docstring/import 문(ImportError 대비 try 블록 포함)을, 그 외 언어는
+    주석·빈 줄 사이의 import 계열 줄을 헤더로 봅니다.
+    """
+    end = 0
+    if path.endswith('.py'):
+        try:
+            tree = ast.parse('\n'.join(lines))
+        except (SyntaxError, ValueError):
+            tree = None
+        for index, node in enumerate(tree.body if tree else []):
+            is_docstring = index == 0 and isinstance(node, ast.Expr) and isinstance(getattr(node, 'value', None), ast.Constant) \
+                and isinstance(node.value.value, str)
+            is_import = isinstance(node, (ast.Import, ast.ImportFrom)) or (
+                isinstance(node, ast.Try) and node.body and all(isinstance(n, (ast.Import, ast.ImportFrom)) for n in node.body))
+            if not (is_docstring or is_import):
+                break
+            if is_import:
+                end = getattr(node, 'end_lineno', None) or node.lineno
+    else:
+        for number, line in enumerate(lines[:HEADER_MAX_LINES], start=1):
+            if IMPORT_LINE.match(line):
+                end = number
+            elif line.strip() and not COMMENT_LINE.match(line):
+                break
+    return (1, min(end, HEADER_MAX_LINES)) if end else None
+
+
+def enclosing_definition(definitions: List[Dict[str, Any]], start: int, end: int) -> Optional[Dict[str, Any]]:
+    """범위 [start, end]를 모두 감싸는 가장 안쪽(가장 짧은) 정의"""
+    best = None
+    for d in definitions:
+        d_start, d_end = d.get('start_line') or 0, d.get('end_line') or 0
+        if d_start <= start and d_end >= end and d_start > 0:
+            if best is None or d_end - d_start < best['end_line'] - best['start_line']:
+                best = d
+    return best
+
+
+def _spans(lines: set) -> List[Tuple[int, int]]:
+    """라인 번호 집합 → 연속 구간 목록"""
+    spans = []
+    for number in sorted(lines):
+        if spans and number == spans[-1][1] + 1:
+            spans[-1] = (spans[-1][0], number)
+        else:
+            spans.append((number, number))
+    return spans
+
+
+def slice_file(path: str, source: str, ranges: List[Tuple[int, int]], definitions: Optional[List[Dict[str, Any]]] = None,
+               budget: int = MODIFY_CONTEXT_TOKEN_BUDGET) -> Dict[str, Any]:
+    """
+    파일 하나를 예산 안의 영역들로 자릅니다.
+
+    Args:
+        path (str): 파일 경로
+        source (str): 파일 전체 내용
+        ranges (list): 검색/심볼 테이블이 찾은 (시작, 끝) 라인 범위 (중요한 순서)
+        definitions (list): 정의 목록 (None이면 파이썬은 ast로 직접 찾음, 다른 언어는 심볼 테이블 정의를 넘김)
+        budget (int): 이 파일에 쓸 토큰 예산
+
+    Returns:
+        {'path', 'text', 'tokens', 'whole', 'regions': [(시작, 끝), ...]}
+    """
+    lines = source.splitlines()
+    total = len(lines)
+    whole_text = f"// FILE: {path}\n{source}"
+    whole_tokens = estimate_tokens(whole_text)
+    if whole_tokens <= budget or total == 0:
+        return {'path': path, 'text': whole_text, 'tokens': whole_tokens, 'whole': True, 'regions': [(1, max(total, 1))]}
+
+    if definitions is None:
+        definitions = find_definitions(source, path)
+    title = f"// FILE: {path} (전체 {total}줄 중 일부 영역)"
+    used = estimate_tokens(title)
+    line_tokens = [estimate_tokens(line) + 1 for line in lines]
+    covered = set()
+
+    def cost(start, end):
+        new_lines = [n for n in range(start, end + 1) if n not in covered]
+        return sum(line_tokens[n - 1] for n in new_lines) + (REGION_MARKER_TOKENS if new_lines else 0)
+
+    targets = []
+    header = import_header(lines, path)
+    if header:
+        targets.append([header])
+    for start, end in ranges:
+        start, end = max(1, int(start or 0)), min(total, int(end or 0))
+        if start > end:
+            continue
+        options = []
+        enclosing = enclosing_definition(definitions, start, end)
+        if enclosing:
+            options.append((enclosing['start_line'], min(total, enclosing['end_line'])))
+        options.append((max(1, start - SLICE_PADDING_LINES), min(total, end + SLICE_PADDING_LINES)))
+        options.append((start, end))
+        targets.append(options)
+    if len(targets) == (1 if header else 0):
+        targets.append([(1, total)])  # 라인 정보가 없으면 파일 앞부분부터
+
+    for options in targets:
+        for start, end in options:
+            tokens = cost(start, end)
+            if used + tokens <= budget:
+                covered.update(range(start, end + 1))
+                used += tokens
+                break
+        else:
+            # 가장 좁은 범위도 넘치면 예산이 허락하는 데까지 앞부분만
+            start, end = options[-1]
+            used += REGION_MARKER_TOKENS
+            for number in range(start, end + 1):
+                if number in covered:
+                    continue
+                if used + line_tokens[number - 1] > budget:
+                    break
+                covered.add(number)
+                used += line_tokens[number - 1]
+
+    regions = _spans(covered)
+    outline = []
+    for d in definitions:
+        d_start = d.get('start_line') or 0
+        if d_start < 1 or d_start > total or d_start in covered:
+            continue
+        entry = f"L{d_start}-{d.get('end_line') or d_start} {lines[d_start - 1].strip()[:OUTLINE_LINE_CHARS]}"
+        tokens = estimate_tokens(entry) + 1
+        if used + tokens > budget:
+            break
+        outline.append(entry)
+        used += tokens
+
+    parts = [title]
+    if outline:
+        parts.append("[개요: 표시하지 않은 정의]\n" + '\n'.join(outline))
+    for start, end in regions:
+        parts.append(f"// REGION: {start}-{end}\n" + '\n'.join(lines[start - 1:end]))
+    return {'path': path, 'text': '\n'.join(parts), 'tokens': used, 'whole': False, 'regions': regions}
+
+
+def pack_modify_context(files: List[Dict[str, Any]], budget: int = MODIFY_CONTEXT_TOKEN_BUDGET) -> List[Dict[str, Any]]:
+    """
+    여러 파일을 예산 안에 자릅니다. 남은 예산을 남은 파일 수로 나눠 앞(중요한) 파일부터 배정하고,
+    덜 쓴 만큼은 다음 파일로 넘어갑니다.
+
+    Args:
+        files (list): [{'path', 'source', 'ranges', 'definitions'(선택)}, ...] (중요한 순서)
+
+    Returns:
+        slice_file 결과 목록
+    """
+    slices = []
+    remaining = budget
+    for index, item in enumerate(files):
+        share = remaining // (len(files) - index)
+        piece = slice_file(item['path'], item['source'], item.get('ranges') or [], item.get('definitions'), share)
+        remaining = max(0, remaining - piece['tokens'])
+        slices.append(piece)
+    return slices
+
+
+def parse_region_edits(code: str) -> List[Tuple[int, int, str]]:
+    """
+    모델 응답 코드에서 "// REGION: 시작-끝" 블록을 추출합니다.
+
+    다음 "// FILE:" 표시(다른 파일) 전까지만 읽고, 코드 블록 펜스(```)와 그 뒤의 설명은 버립니다.
+
+    Returns:
+        [(시작, 끝, 새 내용), ...] (영역 표시가 없으면 빈 목록)
+    """
+    edits = []
+    current = None
+    opened = False
+    for line in code.splitlines():
+        if FILE_MARKER.match(line):
+            break
+        marker = REGION_MARKER.match(line)
+        if marker:
+            if current:
+                edits.append(current)
+            current, opened = (int(marker.group(1)), int(marker.group(2)), []), False
+            continue
+        if current is None:
+            continue
+        if FENCE_LINE.match(line):
+            if not current[2] and not opened:
+                opened = True  # 영역 바로 뒤에 연 코드 블록
+                continue
+            edits.append(current)
+            current = None
+            continue
+        current[2].append(line)
+    if current:
+        edits.append(current)
+    result = []
+    for start, end, body in edits:
+        while body and not body[-1].strip():
+            body.pop()
+        result.append((start, end, '\n'.join(body)))
+    return result
+
+
+def apply_region_edits(source: str, edits: List[Tuple[int, int, str]],
+                       allowed: Optional[List[Tuple[int, int]]] = None) -> Optional[str]:
+    """
+    영역 수정 결과를 원본 파일에 끼워 넣어 전체 파일 내용을 만듭니다.
+
+    Args:
+        source (str): 원본 파일 내용
+        edits (list): parse_region_edits 결과
+        allowed (list): 모델에 보낸 영역 목록 (주면 각 수정이 그 안에 있어야 함)
+
+    Returns:
+        str: 수정된 전체 파일 내용 또는 None (범위가 파일 밖이거나 겹치거나 보내지 않은 영역인 경우)
+    """
+    lines = source.splitlines()
+    ordered = sorted(edits, key=lambda e: e[0])
+    previous_end = 0
+    for start, end, _ in ordered:
+        if start < 1 or end > len(lines) or start > end or start <= previous_end:
+            print(f"[WARNING] 잘못된 수정 영역: {start}-{end} (파일 {len(lines)}줄)")
+            return None
+        if allowed is not None and not any(a <= start and end <= b for a, b in allowed):
+            print(f"[WARNING] 보내지 않은 영역에 대한 수정: {start}-{end}")
+            return None
+        previous_end = end
+    for start, end, body in reversed(ordered):
+        lines[start - 1:end] = body.splitlines()
+    return '\n'.join(lines) + ('\n' if source.endswith('\n') else '')
@@ -0,0 +1,163 @@
+"""
+컬렉션 핸들 레지스트리 모듈.
+
+열린 ChromaDB 컬렉션 핸들과 문서 수를 LRU 방식으로 캐시하여
+요청마다 list_collections()로 전체 카탈로그를 훑지 않도록 합니다.
+조회 비용은 컬렉션 이름 하나에 대한 캐시 조회(또는 get_collection 한 번)로,
+세션 수와 무관합니다.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import chromadb
+
+# 동시에 열어둘 컬렉션 핸들 최대 개수
+COLLECTION_REGISTRY_CAPACITY = int(os.environ.get("COLLECTION_REGISTRY_CAPACITY", 256))
+
+
+class CollectionRegistry:
+    """
+    컬렉션 이름 → (핸들, 문서 수) LRU 캐시
+
+    - get: 캐시에 없을 때만 get_collection을 한 번 호출 (없는 컬렉션은 None)
+    - count: 문서 수를 캐시하며, 쓰기 후 invalidate_count로 무효화
+    - get_or_create / delete: 생성·삭제 시 해당 항목을 무효화
+    """
+
+    def __init__(self, client, capacity: int = COLLECTION_REGISTRY_CAPACITY, embedding_function=None):
+        """
+        Args:
+            client: ChromaDB 클라이언트
+            capacity (int): 캐시할 최대 핸들 수
+            embedding_function: 컬렉션을 열 때 사용할 임베딩 함수 (선택)
+        """
+        self.client = client
+        self.capacity = max(1, capacity)
+        self.embedding_function = embedding_function
+        self._entries = OrderedDict()  # name -> {'collection': ..., 'count': int | None}
+        self._lock = threading.RLock()
+
+    def _collection_kwargs(self):
+        if self.embedding_function is None:
+            return {}
+        return {'embedding_function': self.embedding_function}
+
+    def _remember(self, name, collection):
+        """핸들을 캐시에 넣고 용량을 넘으면 가장 오래 쓰지 않은 항목을 내보냅니다."""
+        self._entries[name] = {'collection': collection, 'count': None}
+        self._entries.move_to_end(name)
+        while len(self._entries) > self.capacity:
+            evicted, _ = self._entries.popitem(last=False)
+            print(f"[DEBUG] 컬렉션 핸들 캐시에서 제거: {evicted}")
+
+    def get(self, name: str):
+        """
+        컬렉션 핸들을 반환합니다.
+
+        Args:
+            name (str): 컬렉션 이름
+
+        Returns:
+            컬렉션 객체 또는 None (클라이언트가 없거나 컬렉션이 없는 경우)
+        """
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None:
+                self._entries.move_to_end(name)
+                return entry['collection']
+            if not self.client:
+                return None
+            try:
+                collection = self.client.get_collection(name=name, **self._collection_kwargs())
+            except chromadb.errors.NotFoundError:
+                return None
+            self._remember(name, collection)
+            return collection
+
+    def get_or_create(self, name: str, metadata: dict = None):
+        """
+        컬렉션을 가져오거나 없으면 생성합니다.
+
+        Args:
+            name (str): 컬렉션 이름
+            metadata (dict): 생성 시 사용할 컬렉션 메타데이터 (선택)
+
+        Returns:
+            컬렉션 객체 또는 None (클라이언트가 없는 경우)
+        """
+        with self._lock:
+            collection = self.get(name)
+            if collection is not None:
+                return collection
+            if not self.client:
+                return None
+            kwargs = self._collection_kwargs()
+            if metadata:
+                kwargs['metadata'] = metadata
+            print(f"[DEBUG] 컬렉션 생성: {name}")
+            collection = self.client.get_or_create_collection(name=name, **kwargs)
+            self._remember(name, collection)
+            return collection
+
+    def count(self, name: str):
+        """
+        컬렉션의 문서 수를 반환합니다. (캐시된 값이 있으면 재사용)
+
+        Returns:
+            int 또는 None (컬렉션이 없는 경우)
+        """
+        with self._lock:
+            collection = self.get(name)
+            if collection is None:
+                return None
+            entry = self._entries.get(name)
+            if entry is not None and entry['count'] is not None:
+                return entry['count']
+            count = collection.count()
+            if entry is not None:
+                entry['count'] = count
+            return count
+
+    def invalidate_count(self, name: str):
+        """쓰기 이후 캐시된 문서 수만 무효화합니다."""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None:
+                entry['count'] = None
+
+    def invalidate(self, name: str):
+        """캐시된 핸들과 문서 수를 모두 제거합니다."""
+        with self._lock:
+            self._entries.pop(name, None)
+
+    def delete(self, name: str) -> bool:
+        """
+        컬렉션을 삭제하고 캐시에서도 제거합니다.
+
+        Returns:
+            bool: 삭제 성공 여부 (컬렉션이 없으면 False)
+        """
+        with self._lock:
+            self.invalidate(name)
+            if not self.client:
+                return False
+            try:
+                self.client.delete_collection(name)
+                return True
+            except (chromadb.errors.NotFoundError, ValueError):
+                return False
+
+    def clear(self):
+        """캐시된 모든 핸들을 제거합니다. (컬렉션 자체는 유지)"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def __contains__(self, name):
+        with self._lock:
+            return name in self._entries
@@ -0,0 +1,137 @@
+"""
+컨텍스트 토큰 예산 관리 모듈
+
+청크 본문은 인제스트 이후 바뀌지 않으므로, 답변 모델 토크나이저 기준 토큰 수를 인제스트 시
+한 번만 계산해 청크 메타데이터(token_count)에 저장합니다. 질문 처리 시에는 저장된 값으로
+예산 계산만 하고 토크나이저를 호출하지 않습니다.
+
+    - count_tokens: 모델에 맞는 인코딩(gpt-4o → o200k_base)으로 정확한 토큰 수 계산 (인제스트용)
+    - estimate_tokens: 토크나이저 없이 문자 수로 보수적으로 추정 (질문, 디스크에서 읽은 소스 등)
+    - chunk_tokens: 메타데이터의 token_count 사용, 없으면(이전 인덱스) 추정값
+    - ContextPacker: 예산 안에서 컨텍스트 조각을 쌓는 산술 전용 패커
+"""
+
+import os
+import math
+import threading
+from typing import Optional, List, Dict, Any
+
+ANSWER_MODEL = os.environ.get("ANSWER_MODEL", "gpt-4o")  # 답변 생성 모델 (토큰 수 계산 기준)
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", 8192))  # 프롬프트 컨텍스트 예산
+RESPONSE_TOKEN_RESERVE = 1000  # 예산에서 응답/템플릿용으로 남겨 둘 토큰 수
+
+# 모델 이름 접두어 → tiktoken 인코딩 (긴 접두어 우선)
+MODEL_ENCODINGS = [
+    ("gpt-4o", "o200k_base"),
+    ("gpt-4.1", "o200k_base"),
+    ("o1", "o200k_base"),
+    ("o3", "o200k_base"),
+    ("gpt-4", "cl100k_base"),
+    ("gpt-3.5", "cl100k_base"),
+    ("text-embedding-3", "cl100k_base"),
+]
+DEFAULT_ENCODING = "o200k_base"
+
+_encodings = {}
+_encodings_lock = threading.Lock()
+
+
+def encoding_name_for_model(model: str) -> str:
+    """모델 이름에 맞는 tiktoken 인코딩 이름"""
+    for prefix, name in MODEL_ENCODINGS:
+        if model.startswith(prefix):
+            return name
+    return DEFAULT_ENCODING
+
+
+def get_encoding(model: str = ANSWER_MODEL):
+    """
+    모델 인코딩을 불러옵니다. (인코딩별로 한 번만 로드)
+
+    Returns:
+        tiktoken.Encoding 또는 None (tiktoken이 없거나 인코딩 파일을 받을 수 없는 경우)
+    """
+    name = encoding_name_for_model(model)
+    with _encodings_lock:
+        if name not in _encodings:
+            try:
+                import tiktoken
+                _encodings[name] = tiktoken.get_encoding(name)
+            except Exception as e:
+                print(f"[WARNING] 토크나이저 로드 실패 ({name}), 문자 수 기반 추정 사용: {e}")
+                _encodings[name] = None
+        return _encodings[name]
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    토크나이저 없이 토큰 수를 추정합니다.
+
+    영문/코드는 약 4자당 1토큰, 한글 등 비ASCII 문자는 1자당 1토큰으로 계산하여
+    실제보다 약간 크게 잡습니다. (예산 초과 방지)
+    """
+    if not text:
+        return 0
+    non_ascii = sum(1 for c in text if ord(c) > 127)
+    return math.ceil((len(text) - non_ascii) / 4) + non_ascii
+
+
+def count_tokens(text: str, model: str = ANSWER_MODEL) -> int:
+    """모델 토크나이저 기준 토큰 수 (인코딩을 쓸 수 없으면 추정값)"""
+    if not text:
+        return 0
+    encoding = get_encoding(model)
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def chunk_tokens(document: str, metadata: Optional[Dict[str, Any]]) -> int:
+    """청크 토큰 수 (인제스트 시 저장한 token_count, 없으면 추정값)"""
+    stored = (metadata or {}).get('token_count')
+    if isinstance(stored, int) and stored > 0:
+        return stored
+    return estimate_tokens(document)
+
+
+def context_budget(question: str, budget: int = CONTEXT_TOKEN_BUDGET, reserve: int = RESPONSE_TOKEN_RESERVE) -> int:
+    """질문과 응답 여유분을 뺀 컨텍스트 토큰 예산"""
+    return max(0, budget - estimate_tokens(question) - reserve)
+
+
+class ContextPacker:
+    """
+    토큰 예산 안에서 컨텍스트 조각을 쌓는 패커 (토크나이저 호출 없음)
+
+    Attributes:
+        max_tokens (int): 전체 예산
+        used (int): 지금까지 담은 토큰 수
+        parts (List[str]): 담은 조각
+    """
+
+    def __init__(self, max_tokens: int):
+        self.max_tokens = max_tokens
+        self.used = 0
+        self.parts = []
+
+    def __len__(self):
+        return len(self.parts)
+
+    @property
+    def remaining(self) -> int:
+        return max(0, self.max_tokens - self.used)
+
+    def fits(self, tokens: int, ratio: float = 1.0) -> bool:
+        """tokens를 더해도 예산의 ratio 비율 이하인지 확인"""
+        return self.used + tokens <= self.max_tokens * ratio
+
+    def is_full(self, ratio: float = 1.0) -> bool:
+        return self.used >= self.max_tokens * ratio
+
+    def add(self, text: str, tokens: int):
+        """조각을 추가합니다. (예산 확인은 호출하는 쪽에서 fits로)"""
+        self.parts.append(text)
+        self.used += tokens
+
+    def text(self, separator: str = '\n\n') -> str:
+        return separator.join(self.parts)
@@ -2,6 +2,7 @@ import pymysql
 import os
 from dotenv import load_dotenv
 import uuid
+from db_pool import ConnectionPool
 
 # 환경 변수 로드
 load_dotenv()
@@ -13,23 +14,37 @@ DB_PASSWORD = os.environ.get('DB_PASSWORD')
 DB_NAME = os.environ.get('DB_NAME')
 DB_PORT = int(os.environ.get('DB_PORT', 3306))
 
+def _connect():
+    """풀에 넣을 새 연결을 엽니다."""
+    return pymysql.connect(
+        host=DB_HOST,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        database=DB_NAME,
+        port=DB_PORT,
+        charset='utf8mb4',
+        cursorclass=pymysql.cursors.DictCursor
+    )
+
+# 프로세스 전역 연결 풀 (크기/대기 시간 등은 db_pool의 DB_POOL_* 환경 변수)
+pool = ConnectionPool(_connect)
+
 def get_db_connection():
-    """데이터베이스 연결을 반환하는 함수"""
+    """데이터베이스 연결을 반환하는 함수 (풀에서 꺼내며, conn.close()를 부르면 풀로 반납됨)"""
     try:
-        connection = pymysql.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME,
-            port=DB_PORT,
-            charset='utf8mb4',
-            cursorclass=pymysql.cursors.DictCursor
-        )
-        return connection
+        return pool.connection()
     except Exception as e:
         print(f"[ERROR] 데이터베이스 연결 오류: {e}")
         return None
 
+def begin_request():
+    """요청 범위 시작: 요청이 끝날 때까지 현재 스레드가 연결 하나를 재사용합니다."""
+    pool.begin_scope()
+
+def end_request():
+    """요청 범위 끝: 재사용하던 연결을 풀로 반납합니다."""
+    pool.end_scope()
+
 def init_db():
     """데이터베이스와 필요한 테이블들을 초기화하는 함수"""
     conn = get_db_connection()
@@ -338,6 +353,28 @@ def add_chat_history(session_id, role, content):
     finally:
         conn.close()
 
+def add_chat_turn(session_id, messages):
+    """대화 한 턴의 채팅 기록 여러 건((role, content) 목록)을 한 트랜잭션으로 추가하는 함수"""
+    conn = get_db_connection()
+    if not conn:
+        return False
+
+    try:
+        with conn.cursor() as cursor:
+            sql = '''
+            INSERT INTO chat_history (session_id, role, content)
+            VALUES (%s, %s, %s)
+            '''
+            cursor.executemany(sql, [(session_id, role, content) for role, content in messages])
+        conn.commit()
+        return True
+    except Exception as e:
+        conn.rollback()
+        print(f"[ERROR] 채팅 기록 추가 오류: {e}")
+        return False
+    finally:
+        conn.close()
+
 def create_new_chat_session(user_id, repo_url, token):
     """같은 사용자와 레포에 대한 새 채팅 세션을 만드는 함수"""
     conn = get_db_connection()
@@ -0,0 +1,232 @@
+"""
+DB 연결 풀 모듈
+
+db.py의 함수들은 호출마다 pymysql.connect(TCP + 인증 핸드셰이크)로 새 연결을 열고 닫았습니다.
+/chat 한 번에 연결이 두 번 이상, 채팅 화면을 열 때는 여러 번 열립니다. 연결을 풀에 보관해 재사용합니다.
+
+    - 평소에는 DB_POOL_SIZE개까지 보관하고, 부족하면 DB_POOL_MAX_OVERFLOW개까지 더 열었다가 반납 시 닫음
+    - 모두 사용 중이면 DB_POOL_TIMEOUT초까지 기다린 뒤 실패 (기다린 시간은 metrics의 "db.pool.wait")
+    - 꺼낼 때 DB_POOL_PING_AFTER초 이상 쉬었던 연결은 ping으로 확인하고, DB_POOL_RECYCLE초가 지난 연결은 새로 엶
+    - 반납할 때 rollback으로 끝나지 않은 트랜잭션(읽기 스냅샷 포함)을 정리
+
+요청 범위(begin_scope ~ end_scope) 안에서는 같은 스레드가 처음 꺼낸 연결 하나를 요청이 끝날 때까지 재사용합니다.
+호출하는 쪽은 기존처럼 conn.close()를 부르면 됩니다. (풀로 반납되거나, 요청 범위 안에서는 무시됨)
+"""
+
+import os
+import time
+import threading
+from collections import deque
+from typing import Dict, Any, Callable
+
+from metrics import metrics
+
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))  # 보관할 연결 수
+DB_POOL_MAX_OVERFLOW = int(os.environ.get("DB_POOL_MAX_OVERFLOW", 10))  # 보관 수를 넘어 추가로 열 수 있는 연결 수
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 10))  # 연결이 반납되기를 기다리는 최대 시간(초)
+DB_POOL_RECYCLE = float(os.environ.get("DB_POOL_RECYCLE", 3600))  # 이 시간(초)이 지난 연결은 닫고 새로 엶
+DB_POOL_PING_AFTER = float(os.environ.get("DB_POOL_PING_AFTER", 30))  # 이 시간(초) 이상 쉬었던 연결은 ping으로 확인
+
+
+class PoolTimeout(Exception):
+    """DB_POOL_TIMEOUT 안에 연결을 얻지 못함"""
+
+
+class PooledConnection:
+    """
+    풀에서 꺼낸 연결 래퍼. close()를 부르면 연결을 닫지 않고 풀로 반납합니다.
+    그 밖의 속성(cursor, commit, rollback 등)은 실제 연결로 넘깁니다.
+    """
+
+    def __init__(self, pool: 'ConnectionPool', raw, scoped: bool = False):
+        self._pool = pool
+        self._raw = raw
+        self._scoped = scoped
+
+    def __getattr__(self, name):
+        raw = self.__dict__.get('_raw')
+        if raw is None:
+            raise AttributeError(f"반납된 연결입니다: {name}")
+        return getattr(raw, name)
+
+    def close(self):
+        raw, self._raw = self._raw, None
+        if raw is not None and not self._scoped:
+            self._pool.release(raw)
+
+
+class ConnectionPool:
+    """
+    스레드 안전 연결 풀
+
+    Args:
+        connect (Callable): 새 연결을 여는 함수
+        size (int): 보관할 연결 수
+        max_overflow (int): 추가로 열 수 있는 연결 수
+        timeout (float): 연결을 기다리는 최대 시간(초)
+    """
+
+    def __init__(self, connect: Callable[[], Any], size: int = DB_POOL_SIZE, max_overflow: int = DB_POOL_MAX_OVERFLOW,
+                 timeout: float = DB_POOL_TIMEOUT, recycle: float = DB_POOL_RECYCLE,
+                 ping_after: float = DB_POOL_PING_AFTER, name: str = "db.pool"):
+        self._connect = connect
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_after = ping_after
+        self.name = name
+        self._condition = threading.Condition()
+        self._idle = deque()  # (연결, 연 시각, 마지막 반납 시각), 최근 반납한 연결부터 꺼냄
+        self._created_at = {}  # id(연결) -> 연 시각
+        self._open = 0
+        self._in_use = 0
+        self._peak_in_use = 0
+        self._local = threading.local()
+
+    @property
+    def capacity(self) -> int:
+        return self.size + self.max_overflow
+
+    # ---------- 꺼내기 / 반납 ----------
+    def _close_raw(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def _discard(self, raw):
+        """연결을 닫고 열린 연결 수에서 뺍니다. (self._condition을 잡지 않은 상태에서 호출)"""
+        self._close_raw(raw)
+        with self._condition:
+            self._created_at.pop(id(raw), None)
+            self._open -= 1
+            self._condition.notify()
+        metrics.increment(f"{self.name}.discard")
+
+    def _healthy(self, raw, created_at: float, released_at: float) -> bool:
+        now = time.time()
+        if self.recycle and now - created_at > self.recycle:
+            return False
+        if self.ping_after is not None and now - released_at >= self.ping_after:
+            try:
+                raw.ping(reconnect=False)
+            except Exception as e:
+                print(f"[WARNING] 풀의 DB 연결이 끊어져 새로 엽니다: {e}")
+                return False
+        return True
+
+    def acquire(self):
+        """
+        연결을 꺼냅니다. (쉬고 있는 연결 → 새 연결 → 반납 대기 순)
+
+        Raises:
+            PoolTimeout: timeout 안에 연결을 얻지 못한 경우
+        """
+        started = time.perf_counter()
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._condition:
+                while not self._idle and self._open >= self.capacity:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        metrics.increment(f"{self.name}.timeout")
+                        raise PoolTimeout(f"DB 연결 풀 대기 시간 초과 ({self.timeout}초, 사용 중 {self._in_use}/{self.capacity})")
+                    self._condition.wait(remaining)
+                if self._idle:
+                    raw, created_at, released_at = self._idle.pop()
+                else:
+                    raw, created_at, released_at = None, None, None
+                    self._open += 1
+                self._in_use += 1
+                self._peak_in_use = max(self._peak_in_use, self._in_use)
+
+            if raw is not None:
+                if self._healthy(raw, created_at, released_at):
+                    break
+                with self._condition:
+                    self._in_use -= 1
+                self._discard(raw)
+                continue
+
+            try:
+                raw = self._connect()
+            except Exception:
+                with self._condition:
+                    self._open -= 1
+                    self._in_use -= 1
+                    self._condition.notify()
+                raise
+            with self._condition:
+                self._created_at[id(raw)] = time.time()
+            metrics.increment(f"{self.name}.connect")
+            break
+        metrics.observe(f"{self.name}.wait", time.perf_counter() - started)
+        return raw
+
+    def release(self, raw):
+        """연결을 반납합니다. 끝나지 않은 트랜잭션은 rollback하고, 보관 수를 넘는 연결이나 끊어진 연결은 닫습니다."""
+        try:
+            raw.rollback()
+        except Exception:
+            with self._condition:
+                self._in_use -= 1
+            self._discard(raw)
+            return
+        with self._condition:
+            self._in_use -= 1
+            if len(self._idle) < self.size:
+                self._idle.append((raw, self._created_at.get(id(raw), time.time()), time.time()))
+                self._condition.notify()
+                return
+        self._discard(raw)  # 추가로 열었던 연결
+
+    # ---------- 요청 범위 재사용 ----------
+    def begin_scope(self):
+        """현재 스레드의 요청 범위를 시작합니다. 범위 안에서는 처음 꺼낸 연결을 계속 재사용합니다."""
+        self.end_scope()
+        self._local.scope = {'raw': None}
+
+    def end_scope(self):
+        """요청 범위를 끝내고 재사용하던 연결을 반납합니다."""
+        scope = getattr(self._local, 'scope', None)
+        self._local.scope = None
+        if scope and scope['raw'] is not None:
+            self.release(scope['raw'])
+
+    def connection(self) -> PooledConnection:
+        """
+        연결을 꺼내 PooledConnection으로 감싸 반환합니다.
+
+        Raises:
+            PoolTimeout: 연결을 기다리다 시간이 초과된 경우
+            Exception: 새 연결을 열지 못한 경우 (connect 함수의 예외)
+        """
+        scope = getattr(self._local, 'scope', None)
+        if scope is None:
+            return PooledConnection(self, self.acquire())
+        if scope['raw'] is None:
+            scope['raw'] = self.acquire()
+        else:
+            metrics.increment(f"{self.name}.reuse")
+        return PooledConnection(self, scope['raw'], scoped=True)
+
+    def close(self):
+        """쉬고 있는 연결을 모두 닫습니다. (사용 중인 연결은 반납될 때 정리)"""
+        with self._condition:
+            idle, self._idle = list(self._idle), deque()
+        for raw, _, _ in idle:
+            self._discard(raw)
+
+    def stats(self) -> Dict[str, Any]:
+        """풀 크기, 열린/사용 중/쉬는 연결 수, 사용률(사용 중 / 최대 연결 수), 최대 동시 사용 수"""
+        with self._condition:
+            return {
+                'size': self.size,
+                'max_overflow': self.max_overflow,
+                'open': self._open,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'utilization': round(self._in_use / self.capacity, 3) if self.capacity else 0.0,
+                'peak_in_use': self._peak_in_use,
+            }
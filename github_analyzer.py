@@ -19,7 +19,7 @@ import re
 import openai
 import git
 import base64
-from typing import Optional, List, Dict, Any, Tuple
+from typing import Optional, List, Dict, Any, Tuple, Callable
 from langchain.schema import Document
 from cryptography.fernet import Fernet
 import tiktoken
@@ -28,15 +28,394 @@ import markdown
 import concurrent.futures
 import asyncio
 import sys
+import time
+import shutil
+import threading
+from collections import OrderedDict
+from collection_registry import CollectionRegistry, COLLECTION_REGISTRY_CAPACITY
+from vector_store import open_vector_store, create_vector_store, create_chroma_client, NumpyVectorStore, forget_numpy_store, is_numpy_store_cached
+from lexical_index import LexicalIndex
+from symbol_table import SymbolTable
+from code_graph import CodeGraph, js_references, js_imports
+from context_packer import count_tokens
 
 # ----------------- 상수 정의 -----------------
 MAIN_EXTENSIONS = ['.py', '.js', '.md']  # 분석할 주요 파일 확장자
 CHUNK_SIZE = 500  # 텍스트 청크 크기
 GITHUB_TOKEN = "GITHUB_TOKEN"  # 환경 변수 키 이름
 KEY_FILE = ".key"  # 암호화 키 파일
+EMBED_WRITE_BATCH_SIZE = int(os.environ.get("EMBED_WRITE_BATCH_SIZE", 256))  # 벡터 저장소 upsert 배치 크기
+EMBED_WRITE_QUEUE_SIZE = int(os.environ.get("EMBED_WRITE_QUEUE_SIZE", 4))  # 저장 대기 배치 수 상한 (넘으면 임베딩 결과 수집이 기다림)
+REPO_DB_PATH = os.environ.get("REPO_DB_PATH", "./repo_db")  # 저장소 인덱스 영구 저장 경로
+REPOS_PATH = "./repos"  # 저장소 로컬 클론 경로
+CHROMA_BYTES_PER_CHUNK = 8 * 1024  # ChromaDB 엔진 인덱스의 청크당 디스크 사용량 추정치
+NUMPY_STORE_PATH = os.path.join(REPO_DB_PATH, "numpy")  # NumPy 벡터 엔진 저장 경로
+LEXICAL_INDEX_PATH = os.path.join(REPO_DB_PATH, "lexical")  # BM25 어휘 색인 저장 경로
+SYMBOL_TABLE_PATH = os.path.join(REPO_DB_PATH, "symbols")  # 심볼 테이블 저장 경로
+CODE_GRAPH_PATH = os.path.join(REPO_DB_PATH, "graphs")  # import/호출 그래프 저장 경로
+JS_NON_METHOD_KEYWORDS = {'if', 'for', 'while', 'switch', 'catch', 'function', 'return', 'with'}  # 메소드로 오인되는 JS 제어문
 
-# ChromaDB 기본 클라이언트 (로컬)
-chroma_client = chromadb.Client()
+# ChromaDB 클라이언트 초기화 (디스크 영구 저장 또는 공유 서버)
+def init_repo_client():
+    """
+    저장소 인덱스용 ChromaDB 클라이언트를 초기화합니다.
+
+    컬렉션 데이터는 REPO_DB_PATH 아래에 저장되므로 서버를 재시작해도
+    repo_* 컬렉션이 유지됩니다. 클라이언트 생성 시에는 카탈로그만 열고,
+    각 컬렉션의 인덱스는 처음 조회될 때 로드됩니다.
+    VECTOR_STORE_MODE=server이면 모든 워커가 같은 공유 서버에 접속합니다.
+    """
+    try:
+        client = create_chroma_client(REPO_DB_PATH)
+        print(f"[DEBUG] 저장소 인덱스 DB 클라이언트 초기화 완료: {REPO_DB_PATH}")
+        return client
+    except Exception as e:
+        print(f"[ERROR] 저장소 인덱스 DB 클라이언트 초기화 실패: {e}")
+        return None
+
+chroma_client = init_repo_client()
+
+# 열린 repo_* 컬렉션 핸들과 문서 수 캐시
+repo_collections = CollectionRegistry(chroma_client)
+
+def get_repo_store(session_id: str):
+    """
+    세션의 저장소 인덱스를 엽니다. (첫 조회 시점에 지연 로드)
+
+    인덱스 크기에 따라 NumPy 엔진 또는 ChromaDB 컬렉션 중 저장된 쪽을 엽니다.
+
+    Args:
+        session_id (str): 세션 ID
+
+    Returns:
+        VectorStore 또는 None (인덱스가 없는 경우)
+    """
+    return open_vector_store(f"repo_{session_id}", repo_collections, NUMPY_STORE_PATH)
+
+def has_repo_index(session_id: str) -> bool:
+    """세션의 저장소 인덱스가 디스크에 존재하고 비어 있지 않은지 확인합니다."""
+    try:
+        store = get_repo_store(session_id)
+        return store is not None and store.count() > 0
+    except Exception as e:
+        print(f"[WARNING] 저장소 인덱스 문서 수 확인 실패: {e}")
+        return False
+
+def _file_mtime(path: str) -> Optional[float]:
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+class ArtifactCache:
+    """
+    세션 ID -> 디스크에서 불러온 저장소 산출물(어휘 색인, 심볼 테이블, 코드 그래프) LRU 캐시
+
+    다른 워커가 같은 산출물을 다시 만들면 파일 수정 시각이 바뀌므로, 캐시할 때의 수정 시각과 다르면
+    loader로 다시 불러옵니다.
+    """
+
+    def __init__(self, loader: Callable[[str], Any], path: Callable[[str], str],
+                 max_size: int = COLLECTION_REGISTRY_CAPACITY):
+        """
+        Args:
+            loader: 세션 ID로 산출물을 불러오는 함수 (없으면 None 반환)
+            path: 세션 ID -> 산출물 파일 경로
+            max_size (int): 캐시할 최대 세션 수
+        """
+        self.loader = loader
+        self.path = path
+        self.max_size = max(1, max_size)
+        self._entries = OrderedDict()  # 세션 ID -> (산출물, 파일 수정 시각)
+        self._lock = threading.Lock()
+
+    def put(self, session_id: str, artifact: Any):
+        with self._lock:
+            self._entries[session_id] = (artifact, _file_mtime(self.path(session_id)))
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get(self, session_id: str) -> Any:
+        """캐시된 산출물을 반환하고, 없거나 파일이 바뀌었으면 loader로 불러와 캐시합니다."""
+        with self._lock:
+            cached = self._entries.get(session_id)
+            if cached is not None and cached[1] == _file_mtime(self.path(session_id)):
+                self._entries.move_to_end(session_id)
+                return cached[0]
+        artifact = self.loader(session_id)
+        if artifact is not None:
+            self.put(session_id, artifact)
+        return artifact
+
+    def evict(self, session_id: str):
+        """세션의 산출물을 캐시에서 내립니다. (디스크 파일은 유지)"""
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def __contains__(self, session_id):
+        with self._lock:
+            return session_id in self._entries
+
+def lexical_index_file(session_id: str) -> str:
+    return os.path.join(LEXICAL_INDEX_PATH, f"repo_{session_id}.json")
+
+def _load_lexical_index(session_id: str) -> Optional[LexicalIndex]:
+    index = LexicalIndex.load(lexical_index_file(session_id))
+    if index is not None:
+        return index
+    try:
+        store = get_repo_store(session_id)
+        if store is None or store.count() == 0:
+            return None
+        records = store.get(include=["documents", "metadatas"])
+        index = LexicalIndex()
+        index.add(records['ids'], records['documents'], records['metadatas'])
+        index.save(lexical_index_file(session_id))
+        return index
+    except Exception as e:
+        print(f"[WARNING] 어휘 색인 생성 실패: {e}")
+        return None
+
+def symbol_table_file(session_id: str) -> str:
+    return os.path.join(SYMBOL_TABLE_PATH, f"repo_{session_id}.json")
+
+def _load_symbol_table(session_id: str) -> Optional[SymbolTable]:
+    table = SymbolTable.load(symbol_table_file(session_id))
+    if table is not None:
+        return table
+    try:
+        store = get_repo_store(session_id)
+        if store is None or store.count() == 0:
+            return None
+        records = store.get(include=["metadatas"])
+        table = SymbolTable()
+        for meta in records['metadatas']:
+            chunk_type = meta.get('chunk_type')
+            if chunk_type == 'class':
+                table.add(meta.get('class_name'), meta.get('path'), meta.get('start_line'), meta.get('end_line'), 'class')
+            elif chunk_type in ('function', 'method'):
+                table.add(meta.get('function_name'), meta.get('path'), meta.get('start_line'), meta.get('end_line'),
+                          chunk_type, meta.get('class_name') or None)
+        table.save(symbol_table_file(session_id))
+        return table
+    except Exception as e:
+        print(f"[WARNING] 심볼 테이블 생성 실패: {e}")
+        return None
+
+def code_graph_file(session_id: str) -> str:
+    return os.path.join(CODE_GRAPH_PATH, f"repo_{session_id}.json")
+
+# 불러온 산출물 캐시 (release_repo_index가 모두 함께 내림)
+_lexical_indexes = ArtifactCache(_load_lexical_index, lexical_index_file)
+_symbol_tables = ArtifactCache(_load_symbol_table, symbol_table_file)
+_code_graphs = ArtifactCache(lambda session_id: CodeGraph.load(code_graph_file(session_id)), code_graph_file)
+_artifact_caches = (_lexical_indexes, _symbol_tables, _code_graphs)
+
+def cache_lexical_index(session_id: str, index: LexicalIndex):
+    _lexical_indexes.put(session_id, index)
+
+def get_lexical_index(session_id: str) -> Optional[LexicalIndex]:
+    """
+    세션의 BM25 어휘 색인을 반환합니다.
+
+    디스크에 색인이 없으면(이전 버전에서 만든 인덱스 등) 벡터 저장소의 청크로
+    한 번 만들어 저장합니다.
+
+    Returns:
+        LexicalIndex 또는 None (저장소 인덱스가 없는 경우)
+    """
+    return _lexical_indexes.get(session_id)
+
+def cache_symbol_table(session_id: str, table: SymbolTable):
+    _symbol_tables.put(session_id, table)
+
+def get_symbol_table(session_id: str) -> Optional[SymbolTable]:
+    """
+    세션의 심볼 테이블을 반환합니다.
+
+    디스크에 테이블이 없으면(이전 버전에서 만든 인덱스 등) 벡터 저장소의 청크 메타데이터
+    (class_name/function_name/라인 범위)로 정의 부분만 복원합니다. (사용 위치는 재분석 시 기록)
+
+    Returns:
+        SymbolTable 또는 None (저장소 인덱스가 없는 경우)
+    """
+    return _symbol_tables.get(session_id)
+
+def cache_code_graph(session_id: str, graph: CodeGraph):
+    _code_graphs.put(session_id, graph)
+
+def get_code_graph(session_id: str) -> Optional[CodeGraph]:
+    """
+    세션의 import/호출 그래프를 반환합니다.
+
+    그래프는 인제스트 시 청커가 만든 것만 사용하며, 디스크에 없으면(이전 버전에서 만든 인덱스)
+    None을 반환하고 검색은 이웃 확장 없이 진행됩니다.
+    그래프를 만든 커밋과 로컬 클론의 HEAD가 다르면(로컬 커밋 적용 등) 라인 범위가 맞지 않으므로 None을 반환합니다.
+
+    Returns:
+        CodeGraph 또는 None
+    """
+    graph = _code_graphs.get(session_id)
+    if graph is None:
+        return None
+    head = repo_head_commit(session_id)
+    if graph.commit and head and graph.commit != head:
+        print(f"[DEBUG] 코드 그래프 커밋({graph.commit[:8]})과 저장소 HEAD({head[:8]})가 달라 이웃 확장을 생략합니다: {session_id}")
+        return None
+    return graph
+
+# ----------------- 저장소 산출물 수명 관리 -----------------
+def repo_artifact_paths(session_id: str) -> Dict[str, str]:
+    """세션의 저장소 산출물(클론, 벡터 인덱스, 어휘 색인, 심볼 테이블, 코드 그래프) 경로"""
+    return {
+        'clone': os.path.join(REPOS_PATH, session_id),
+        'vectors': os.path.join(NUMPY_STORE_PATH, f"repo_{session_id}"),
+        'lexical': lexical_index_file(session_id),
+        'symbols': symbol_table_file(session_id),
+        'graph': code_graph_file(session_id),
+    }
+
+def repo_head_commit(session_id: str) -> Optional[str]:
+    """
+    세션 로컬 클론의 HEAD 커밋 SHA를 반환합니다.
+
+    질문마다 호출되므로 GitPython 대신 .git/HEAD와 ref 파일을 직접 읽습니다.
+    로컬에 변경을 커밋(apply_changes)하거나 다시 클론하면 값이 바뀝니다.
+
+    Returns:
+        str 또는 None (클론이 없거나 읽기 실패)
+    """
+    git_dir = os.path.join(REPOS_PATH, session_id, ".git")
+    try:
+        with open(os.path.join(git_dir, "HEAD"), 'r', encoding='utf-8') as f:
+            head = f.read().strip()
+        if not head.startswith("ref:"):
+            return head or None
+        ref = head[len("ref:"):].strip()
+        ref_file = os.path.join(git_dir, *ref.split('/'))
+        if os.path.exists(ref_file):
+            with open(ref_file, 'r', encoding='utf-8') as f:
+                return f.read().strip() or None
+        packed_refs = os.path.join(git_dir, "packed-refs")
+        if os.path.exists(packed_refs):
+            with open(packed_refs, 'r', encoding='utf-8') as f:
+                for line in f:
+                    parts = line.strip().split(' ')
+                    if len(parts) == 2 and parts[1] == ref:
+                        return parts[0]
+    except OSError:
+        return None
+    return None
+
+def list_repo_sessions() -> List[str]:
+    """디스크에 산출물이 남아 있는 세션 ID 목록 (클론 또는 NumPy 인덱스 기준)"""
+    session_ids = set()
+    if os.path.isdir(REPOS_PATH):
+        session_ids.update(name for name in os.listdir(REPOS_PATH) if os.path.isdir(os.path.join(REPOS_PATH, name)))
+    if os.path.isdir(NUMPY_STORE_PATH):
+        session_ids.update(name[len("repo_"):] for name in os.listdir(NUMPY_STORE_PATH) if name.startswith("repo_"))
+    return sorted(session_ids)
+
+def is_repo_index_loaded(session_id: str) -> bool:
+    """세션의 인덱스가 메모리에 올라와 있는지 확인합니다."""
+    if any(session_id in cache for cache in _artifact_caches):
+        return True
+    return is_numpy_store_cached(repo_artifact_paths(session_id)['vectors']) or f"repo_{session_id}" in repo_collections
+
+def release_repo_index(session_id: str):
+    """
+    세션 인덱스를 메모리에서 내립니다. (디스크 데이터는 유지)
+
+    다음에 get_repo_store / get_lexical_index / get_symbol_table이 호출되면 디스크에서 다시 로드됩니다.
+    """
+    forget_numpy_store(repo_artifact_paths(session_id)['vectors'])
+    for cache in _artifact_caches:
+        cache.evict(session_id)
+    repo_collections.invalidate(f"repo_{session_id}")
+
+def discard_repo_index(session_id: str) -> bool:
+    """
+    세션의 인덱스(벡터 인덱스, 어휘 색인, 심볼 테이블, 코드 그래프)를 디스크와 메모리에서 삭제합니다. (클론은 유지)
+    인제스트가 중간에 실패해 반쯤 만들어진 인덱스가 완성된 것으로 보이지 않도록 할 때도 사용합니다.
+
+    Returns:
+        bool: 삭제한 산출물이 하나라도 있으면 True
+    """
+    paths = repo_artifact_paths(session_id)
+    removed = False
+    release_repo_index(session_id)  # 디스크에 쓰기 전인 메모리 버퍼(캐시된 NumPy 저장소)도 버림
+    if NumpyVectorStore.exists(paths['vectors']):
+        removed = NumpyVectorStore(paths['vectors']).drop() or removed
+    if chroma_client:
+        removed = repo_collections.delete(f"repo_{session_id}") or removed
+    for key in ('lexical', 'symbols', 'graph'):
+        if os.path.exists(paths[key]):
+            os.remove(paths[key])
+            removed = True
+    return removed
+
+def delete_repo_index(session_id: str) -> bool:
+    """
+    세션의 저장소 산출물을 디스크와 메모리에서 모두 삭제합니다.
+
+    Returns:
+        bool: 삭제한 산출물이 하나라도 있으면 True
+    """
+    paths = repo_artifact_paths(session_id)
+    removed = False
+    try:
+        removed = discard_repo_index(session_id)
+        if os.path.isdir(paths['clone']):
+            shutil.rmtree(paths['clone'], ignore_errors=True)
+            removed = True
+    except Exception as e:
+        print(f"[ERROR] 저장소 산출물 삭제 실패 ({session_id}): {e}")
+    return removed
+
+def delete_repo_clone(session_id: str) -> bool:
+    """
+    세션의 로컬 클론만 삭제합니다. (인덱스는 유지, restore_repo_artifacts로 다시 클론)
+
+    Returns:
+        bool: 삭제했으면 True
+    """
+    clone = repo_artifact_paths(session_id)['clone']
+    if not os.path.isdir(clone):
+        return False
+    shutil.rmtree(clone, ignore_errors=True)
+    return True
+
+def has_repo_artifacts(session_id: str) -> bool:
+    """세션의 로컬 클론과 저장소 인덱스가 모두 있는지 확인합니다."""
+    return os.path.isdir(repo_artifact_paths(session_id)['clone']) and has_repo_index(session_id)
+
+def restore_repo_artifacts(repo_url: str, token: Optional[str], session_id: str) -> Dict[str, Any]:
+    """
+    정리된 세션의 저장소 산출물을 다시 준비하고 파일 목록과 디렉토리 구조를 반환합니다.
+
+    - 클론과 인덱스가 모두 있으면 클론에서 파일 목록만 다시 읽음
+    - 인덱스만 있으면(디스크 할당량 정리로 클론만 삭제된 경우) 인덱스를 만든 커밋으로 다시 클론 (재임베딩 없음)
+    - 인덱스가 없으면 전체 재분석
+
+    Returns:
+        Dict[str, Any]: {'files': [...], 'directory_structure': '...'}
+    """
+    fetcher = GitHubRepositoryFetcher(repo_url, token, session_id)
+    if has_repo_index(session_id):
+        if not os.path.isdir(fetcher.repo_path):
+            print(f"[DEBUG] 저장소 인덱스는 남아 있어 클론만 다시 받습니다: {session_id}")
+            graph = get_code_graph(session_id)  # 클론 전에 조회 (클론 후에는 HEAD가 달라 None)
+            fetcher.clone_repo()
+            if graph is not None and graph.commit:
+                try:
+                    git.Repo(fetcher.repo_path).git.checkout(graph.commit)
+                except Exception as e:
+                    print(f"[WARNING] 인덱스를 만든 커밋으로 체크아웃 실패 ({graph.commit}): {e}")
+        if fetcher.load_repo_data():
+            return {'files': fetcher.files, 'directory_structure': fetcher.get_directory_structure()}
+        print(f"[WARNING] 기존 데이터 불러오기 실패, 새로 분석합니다: {session_id}")
+    return analyze_repository(repo_url, token, session_id)
 
 def analyze_repository(repo_url: str, token: Optional[str] = None, session_id: Optional[str] = None) -> Dict[str, Any]:
     """
@@ -119,13 +498,7 @@ class GitHubRepositoryFetcher:
             
         # 세션 및 저장소 경로 설정
         self.session_id = session_id or f"{self.owner}_{self.repo}"
-        self.repo_path = f"./repos/{self.session_id}"
-        
-        # ChromaDB 컬렉션 초기화
-        self.collection = chroma_client.get_or_create_collection(
-            name=self.session_id,
-            metadata={"description": f"Repository: {self.owner}/{self.repo}"}
-        )
+        self.repo_path = f"{REPOS_PATH}/{self.session_id}"
 
     def create_error_response(self, message: str, status_code: int) -> Dict[str, Any]:
         """
@@ -557,7 +930,7 @@ class RepositoryEmbedder:
     저장소 내용을 임베딩하는 클래스
     
     이 클래스는 GitHub 저장소의 파일 내용을 청크로 나누고,
-    OpenAI API를 사용하여 임베딩한 후 ChromaDB에 저장합니다.
+    OpenAI API를 사용하여 임베딩한 후 벡터 저장소(NumPy 또는 ChromaDB)에 저장합니다.
     """
     
     def __init__(self, session_id: str):
@@ -568,7 +941,26 @@ class RepositoryEmbedder:
             session_id (str): 세션 ID
         """
         self.session_id = session_id
-        self.collection = chroma_client.get_or_create_collection(name=f"repo_{session_id}")
+        self.collection_name = f"repo_{session_id}"
+        self.store = None  # 청크 수를 알게 된 뒤 엔진을 골라 생성
+        self.lexical_index = LexicalIndex()
+        self.symbol_table = SymbolTable()
+        self.code_graph = CodeGraph()
+        self.write_stats = None
+
+    def get_write_batch_size(self) -> int:
+        """
+        설정된 배치 크기를 저장소가 허용하는 최대 배치 크기에 맞춰 반환합니다.
+
+        Returns:
+            int: 한 번의 upsert에 넣을 청크 수
+        """
+        try:
+            max_batch_size = chroma_client.get_max_batch_size()
+        except Exception as e:
+            print(f"[WARNING] 최대 배치 크기 조회 실패: {e}")
+            max_batch_size = EMBED_WRITE_BATCH_SIZE
+        return max(1, min(EMBED_WRITE_BATCH_SIZE, max_batch_size))
 
     def process_and_embed(self, files: List[Dict[str, Any]]):
         # 내부 비동기 함수 정의
@@ -591,7 +983,7 @@ class RepositoryEmbedder:
                         break
                     start += max_tokens - overlap
                 return chunks
-            def chunk_python_functions(source_code):
+            def chunk_python_functions(source_code, path=None):
                 try:
                     tree = ast.parse(source_code)
                 except Exception as e:
@@ -602,6 +994,7 @@ class RepositoryEmbedder:
                 chunks = []
                 imports = []
                 parent_map = {}  # 부모-자식 관계 추적
+                self.code_graph.add_python_module(path, tree)  # 모듈 import와 정의별 호출 이름 기록
                 
                 # 부모-자식 관계 맵 구축
                 for node in ast.walk(tree):
@@ -639,8 +1032,8 @@ class RepositoryEmbedder:
                     return 1
                 
                 # 계층적 청킹 함수
-                def process_node(node, parent_class=None, parent_func=None, depth=0):
-                    """노드를 재귀적으로 처리하여 청크 생성"""
+                def process_node(node, parent_class=None, parent_func=None, depth=0, parent_qualname=None):
+                    """노드를 재귀적으로 처리하여 청크 생성 (정의는 심볼 테이블에도 기록)"""
                     if not hasattr(node, 'lineno'):
                         return
                     
@@ -653,6 +1046,8 @@ class RepositoryEmbedder:
                     if isinstance(node, ast.ClassDef):
                         class_name = node.name
                         func_name = None
+                        self.symbol_table.add(class_name, path, start+1, end, 'class', parent_qualname)
+                        qualname = f"{parent_qualname}.{class_name}" if parent_qualname else class_name
                         
                         # 클래스 docstring 추출
                         docstring = ast.get_docstring(node)
@@ -705,10 +1100,13 @@ class RepositoryEmbedder:
                         
                         # 클래스 내부 메소드 처리
                         for child in node.body:
-                            process_node(child, class_name, None, depth+1)
+                            process_node(child, class_name, None, depth+1, qualname)
                     
                     elif isinstance(node, ast.FunctionDef):
                         func_name = node.name
+                        kind = 'method' if parent_class and not parent_func else 'function'
+                        self.symbol_table.add(func_name, path, start+1, end, kind, parent_qualname)
+                        qualname = f"{parent_qualname}.{func_name}" if parent_qualname else func_name
                         
                         # 함수 docstring 추출
                         docstring = ast.get_docstring(node)
@@ -755,7 +1153,7 @@ class RepositoryEmbedder:
                         
                         # 중첩 함수 처리
                         for child in node.body:
-                            process_node(child, parent_class, func_name, depth+1)
+                            process_node(child, parent_class, func_name, depth+1, qualname)
                 
                 # 최상위 노드 처리
                 for node in tree.body:
@@ -849,7 +1247,7 @@ class RepositoryEmbedder:
                 
                 return chunks
                 
-            def chunk_js(source_code):
+            def chunk_js(source_code, path=None):
                 """JavaScript 코드를 구조적으로 청킹하는 함수"""
                 # 함수/클래스/메소드 정의 패턴
                 func_pattern = r'(async\s+)?function\s+(\w+)\s*\([^)]*\)\s*\{'
@@ -867,6 +1265,7 @@ class RepositoryEmbedder:
                         import_lines.append(line)
                 
                 imports_text = '\n'.join(import_lines)
+                self.code_graph.add_imports(path, js_imports(import_lines))
                 
                 # 정규식 패턴 매칭으로 함수/클래스 찾기
                 def find_block_end(start_line, opening_char='{', closing_char='}'):
@@ -907,9 +1306,12 @@ class RepositoryEmbedder:
                         
                         # 블록 끝 찾기
                         end = find_block_end(start)
+                        self.symbol_table.add(name, path, start+1, end+1, 'class' if is_class else 'function')
                         
                         # 전체 코드 청크
                         chunk = '\n'.join(lines[start:end+1])
+                        references = ([parent_class] if parent_class else []) if is_class else js_references(chunk, name)
+                        self.code_graph.add_definition(path, name, start+1, end+1, 'class' if is_class else 'function', references)
                         
                         # 복잡도 추정 (라인 수 + 중첩 레벨)
                         complexity = (end - start) // 5 + chunk.count('{') - chunk.count('}')
@@ -977,8 +1379,11 @@ class RepositoryEmbedder:
                                 if method_match:
                                     method_name = method_match.group(2)
                                     method_end = find_block_end(method_start)
-                                    
                                     method_chunk = '\n'.join(lines[method_start:method_end+1])
+                                    if method_name not in JS_NON_METHOD_KEYWORDS:
+                                        self.symbol_table.add(method_name, path, method_start+1, method_end+1, 'method', name)
+                                        self.code_graph.add_definition(path, f"{name}.{method_name}", method_start+1, method_end+1,
+                                                                       'method', js_references(method_chunk, method_name))
                                     method_complexity = (method_end - method_start) // 3
                                     
                                     # 메소드 청킹
@@ -1035,11 +1440,11 @@ class RepositoryEmbedder:
                 sha = file.get('sha')
                 source_url = file.get('source_url')
                 if ext == '.py':
-                    chunks = chunk_python_functions(content)
+                    chunks = chunk_python_functions(content, path)
                 elif ext == '.md':
                     chunks = chunk_markdown(content)
                 elif ext == '.js':
-                    chunks = chunk_js(content)
+                    chunks = chunk_js(content, path)
                 else:
                     # 오류 수정: 일반 파일은 split_by_tokens로 처리하고 7개 필드 구조에 맞게 조정
                     simple_chunks = split_by_tokens(content, max_tokens=256, overlap=64)
@@ -1067,6 +1472,10 @@ class RepositoryEmbedder:
                     # 디버그 출력 추가하여 실제 값 확인
                     print(f"[DEBUG] 청크 추가: 파일={file.get('path')}, 청크={i}, 길이={len(chunk) if chunk else 0}")
                     all_chunks.append((chunk, file, i, t_start, t_end, func_name, class_name, start_line, end_line))
+            # 청커가 기록한 정의를 기준으로 사용 위치 색인, 호출 이름을 정의에 연결
+            self.symbol_table.index_usages(files)
+            self.code_graph.resolve()
+            self.code_graph.commit = repo_head_commit(self.session_id)
             # 2. 비동기 임베딩+역할태깅 함수
             async def embed_and_tag_async(args, client):
                 chunk, file, i, t_start, t_end, func_name, class_name, start_line, end_line = args
@@ -1095,17 +1504,9 @@ class RepositoryEmbedder:
                     print(f"[WARNING] 역할 태깅 실패: {e}")
                     role_tag = ''
                 return (embedding, role_tag, chunk, file, i, t_start, t_end, func_name, class_name, start_line, end_line)
-            # 3. 비동기 병렬 실행 (max_concurrent=20)
-            print(f"[DEBUG] 임베딩+역할태깅 asyncio 병렬 처리 시작 (청크 수: {len(all_chunks)})")
-            semaphore = asyncio.Semaphore(20)
-            async def sem_task(args):
-                async with semaphore:
-                    return await embed_and_tag_async(args, client)
-            tasks = [sem_task(args) for args in all_chunks]
-            results = await asyncio.gather(*tasks)
-            print(f"[DEBUG] 임베딩+역할태깅 asyncio 병렬 처리 완료")
-            # 4. DB 저장 (동기)
-            for embedding, role_tag, chunk, file, i, t_start, t_end, func_name, class_name, start_line, end_line in results:
+            # 3. 청크 결과를 컬렉션 메타데이터 형식으로 변환
+            def build_record(result):
+                embedding, role_tag, chunk, file, i, t_start, t_end, func_name, class_name, start_line, end_line = result
                 file_name = file.get('file_name')
                 file_type = file.get('file_type')
                 sha = file.get('sha')
@@ -1122,10 +1523,6 @@ class RepositoryEmbedder:
                 parent_entity = None
                 inheritance = None
                 
-                # 청크 튜플에서 추가 메타데이터 추출 (새 형식인 경우)
-                # chunk_data 변수는 이 스코프에 없으므로 사용하지 않음
-                # 대신 현재 언패킹된 값들을 사용
-                
                 metadata = {
                     "path": path or '',
                     "file_name": file_name or '',
@@ -1139,21 +1536,102 @@ class RepositoryEmbedder:
                     "end_line": end_line if end_line is not None else -1,
                     "token_start": t_start if t_start is not None else -1,
                     "token_end": t_end if t_end is not None else -1,
+                    "token_count": count_tokens(chunk),  # 답변 모델 토크나이저 기준 (질문 처리 시 재계산하지 않음)
                     "role_tag": role_tag,
                     "chunk_type": chunk_type,
                     "complexity": complexity or 1,
                     "parent_entity": parent_entity or '',
                     "inheritance": inheritance or ''
                 }
-                self.collection.add(
-                    ids=[f"{path}_{i}"],
-                    embeddings=[embedding],
-                    documents=[chunk],
-                    metadatas=[safe_meta(metadata)]
+                return f"{path}_{i}", embedding, chunk, safe_meta(metadata)
+            # 4. 임베딩과 배치 저장을 파이프라인으로 실행
+            #    임베딩이 끝나는 순서대로 배치를 채우고, 배치가 차면 별도 스레드에서 upsert하여
+            #    저장 시간이 남은 임베딩 네트워크 대기 시간과 겹치도록 함
+            self.store = create_vector_store(self.collection_name, repo_collections, NUMPY_STORE_PATH, len(all_chunks))
+            batch_size = self.get_write_batch_size()
+            print(f"[DEBUG] 임베딩+역할태깅 asyncio 병렬 처리 시작 (청크 수: {len(all_chunks)}, 저장 배치 크기: {batch_size})")
+            semaphore = asyncio.Semaphore(20)
+            async def sem_task(args):
+                async with semaphore:
+                    return await embed_and_tag_async(args, client)
+            # 저장이 임베딩보다 느리면 대기 배치가 메모리에 계속 쌓이지 않도록 큐 크기를 제한
+            write_queue = asyncio.Queue(maxsize=EMBED_WRITE_QUEUE_SIZE)
+            write_stats = {'chunks': 0, 'batches': 0, 'seconds': 0.0}
+            def write_batch(batch):
+                started = time.perf_counter()
+                self.store.upsert(
+                    ids=batch['ids'],
+                    embeddings=batch['embeddings'],
+                    documents=batch['documents'],
+                    metadatas=batch['metadatas']
                 )
-                print(f"[INFO] DB 저장: 파일={path}, 청크={i}, 역할={role_tag}, 임베딩 길이={len(embedding)}")
+                self.lexical_index.add(batch['ids'], batch['documents'], batch['metadatas'])
+                write_stats['seconds'] += time.perf_counter() - started
+                write_stats['chunks'] += len(batch['ids'])
+                write_stats['batches'] += 1
+                print(f"[INFO] DB 배치 저장: {len(batch['ids'])}개 청크 (누적 {write_stats['chunks']}개)")
+            def persist_indexes():
+                # 디스크 반영도 저장 시간에 포함 (chunks/s가 실제 쓰기 처리량을 나타내도록)
+                started = time.perf_counter()
+                self.store.flush()
+                self.lexical_index.save(lexical_index_file(self.session_id))
+                write_stats['seconds'] += time.perf_counter() - started
+            async def writer():
+                # 배치는 하나씩 순서대로 저장 (같은 컬렉션에 대한 동시 쓰기 방지)
+                # 저장이 실패해도 큐는 끝까지 비워 임베딩 쪽이 가득 찬 큐에서 멈추지 않도록 함
+                error = None
+                while True:
+                    batch = await write_queue.get()
+                    if batch is None:
+                        break
+                    if error is None:
+                        try:
+                            await asyncio.to_thread(write_batch, batch)
+                        except Exception as e:
+                            print(f"[ERROR] DB 배치 저장 실패: {e}")
+                            error = e
+                if error is not None:
+                    raise error
+            def new_batch():
+                return {'ids': [], 'embeddings': [], 'documents': [], 'metadatas': []}
+            writer_task = asyncio.create_task(writer())
+            pending = new_batch()
+            try:
+                try:
+                    for next_result in asyncio.as_completed([sem_task(args) for args in all_chunks]):
+                        record_id, embedding, chunk, metadata = build_record(await next_result)
+                        pending['ids'].append(record_id)
+                        pending['embeddings'].append(embedding)
+                        pending['documents'].append(chunk)
+                        pending['metadatas'].append(metadata)
+                        if len(pending['ids']) >= batch_size:
+                            await write_queue.put(pending)
+                            pending = new_batch()
+                    if pending['ids']:
+                        await write_queue.put(pending)
+                finally:
+                    await write_queue.put(None)
+                    await writer_task
+                # 모든 청크가 저장된 뒤에만 디스크에 반영하고 캐시에 올림
+                await asyncio.to_thread(persist_indexes)
+                cache_lexical_index(self.session_id, self.lexical_index)
+                await asyncio.to_thread(self.symbol_table.save, symbol_table_file(self.session_id))
+                cache_symbol_table(self.session_id, self.symbol_table)
+                await asyncio.to_thread(self.code_graph.save, code_graph_file(self.session_id))
+                cache_code_graph(self.session_id, self.code_graph)
+            except BaseException as e:
+                # 반쯤 만들어진 인덱스를 has_repo_index가 완성된 것으로 보지 않도록 삭제 (다음 사용 시 재분석)
+                print(f"[ERROR] 임베딩/저장 중 실패하여 만들던 인덱스를 삭제합니다 ({self.session_id}): {e}")
+                await asyncio.to_thread(discard_repo_index, self.session_id)
+                raise
+            print(f"[DEBUG] 임베딩+역할태깅 asyncio 병렬 처리 완료")
+            rate = write_stats['chunks'] / write_stats['seconds'] if write_stats['seconds'] > 0 else 0.0
+            print(f"[INFO] 저장 단계: {write_stats['chunks']}개 청크, {write_stats['batches']}개 배치, "
+                  f"{write_stats['seconds']:.2f}초 ({rate:.1f} chunks/s)")
+            return {**write_stats, 'chunks_per_second': rate}
         # 동기 함수에서 비동기 실행
         if sys.version_info >= (3, 7):
-            asyncio.run(async_process_and_embed(files))
+            self.write_stats = asyncio.run(async_process_and_embed(files))
+            return self.write_stats
         else:
             raise RuntimeError("Python 3.7 이상에서만 지원됩니다.")
\ No newline at end of file
@@ -0,0 +1,214 @@
+"""
+로컬 의도 분류 모듈
+
+메시지마다 gpt-3.5를 호출하던 두 가지 의도 판단을 로컬에서 처리합니다.
+
+    - classify_push_intent: GitHub 푸시/커밋/PR 의도 (/check_push_intent, 수정 요청)
+    - classify_question_role: 질문이 찾는 코드 역할 태그 (청크 스코어링용 question_role_tag)
+
+판단 순서
+    1. 하나로 컴파일된 패턴 집합 (영문 키워드는 단어 경계 적용: "pr"이 "print", "product", "pr_number"에 걸리지 않음)
+    2. 라벨별 예문을 글자 n-gram 해시 벡터로 미리 계산해 둔 최근접 프로토타입 분류기
+    3. 신뢰도가 임계값보다 낮을 때만 호출하는 쪽에서 LLM 사용
+
+분류는 외부 호출 없이 0.1ms 안팎에 끝나며, 모든 결과에 신뢰도(0~1)가 붙습니다.
+어느 예문과도 닮지 않았거나 1, 2위 라벨이 비슷한 입력은 신뢰도를 낮춰 LLM 확인으로 넘깁니다.
+"""
+
+import os
+import re
+import zlib
+from typing import Dict, List, NamedTuple
+
+import numpy as np
+
+INTENT_VECTOR_DIM = 4096  # 글자 n-gram 해시 벡터 차원
+INTENT_NGRAM_RANGE = (2, 3)  # 사용할 글자 n-gram 길이
+INTENT_TEMPERATURE = 0.08  # 라벨별 유사도를 신뢰도로 바꿀 때의 softmax 온도
+INTENT_MIN_SIMILARITY = 0.45  # 가장 가까운 예문 유사도가 이보다 낮으면 낮은 신뢰도 (어느 예문과도 닮지 않은 입력)
+INTENT_MIN_MARGIN = 0.1  # 1, 2위 라벨 유사도 차이가 이보다 작으면 낮은 신뢰도
+INTENT_LOW_CONFIDENCE = 0.5  # 근거가 약할 때 신뢰도 상한 (LLM 확인 임계값들보다 낮음)
+PUSH_INTENT_LLM_THRESHOLD = float(os.environ.get("PUSH_INTENT_LLM_THRESHOLD", 0.75))  # 이보다 낮으면 LLM 확인
+ROLE_TAG_LLM_THRESHOLD = float(os.environ.get("ROLE_TAG_LLM_THRESHOLD", 0.6))  # 이보다 낮으면 LLM 태깅
+PUSH_STRONG_CONFIDENCE = 0.99  # 분명한 푸시 표현의 신뢰도
+PUSH_WEAK_CONFIDENCE = 0.6  # 코드 설명 질문과 겹칠 수 있는 표현의 신뢰도 (PUSH_INTENT_LLM_THRESHOLD보다 낮아 LLM 확인)
+
+PUSH_LABEL = 'push'
+NO_PUSH_LABEL = 'none'
+
+# 영문 키워드 단어 경계 (밑줄, 숫자도 단어의 일부로 봄: pr_number, commit2)
+_WORD = r'(?<![A-Za-z0-9_])(?:{})(?![A-Za-z0-9_])'
+
+# 원격 저장소 반영 의도가 분명한 표현
+_STRONG_PUSH = [
+    r'(깃허브|github|깃|git)\s*(에|로)?\s*(적용|반영|올려|올리|업로드|푸시|커밋|업데이트|동기화|풀\s*리퀘|'
+    + _WORD.format(r'push|commit|sync|pr|pull\s*request') + ')',
+    _WORD.format(r'pr|pull\s*request') + r'\s*(을|를)?\s*(생성|만들|올려|열어|보내)',
+    _WORD.format(r'create|open|make|submit') + r'\s+(a\s+|the\s+)?' + _WORD.format(r'pr|pull\s*request'),
+    r'풀\s*리퀘(스트)?',
+    r'(푸시|커밋)\s*(해|시켜|하고|해줘|해주세요)',
+]
+# 수정 적용 요청이나 코드 설명 질문과 겹칠 수 있는 표현 ("commit() 설명", "pr_number 변수")
+_WEAK_PUSH = [
+    _WORD.format(r'push|commit|pr|pull\s*request'),
+    r'(적용|반영|업로드|업데이트|동기화)\s*(해|시켜)(줘|주세요)?',
+    r'올려\s*(줘|주세요|달라)',
+]
+PUSH_PATTERN = re.compile(
+    '(?P<strong>' + '|'.join(_STRONG_PUSH) + ')|(?P<weak>' + '|'.join(_WEAK_PUSH) + ')',
+    re.IGNORECASE
+)
+
+PUSH_EXAMPLES = {
+    PUSH_LABEL: [
+        "깃허브에 올려줘", "github에 푸시해줘", "커밋하고 푸시해줘", "변경사항 원격 저장소에 반영해줘",
+        "원격에 적용해 주세요", "PR 만들어줘", "풀리퀘스트 생성해줘", "저장소에 업로드해줘",
+        "push to github", "commit and push the changes", "create a pull request", "open a PR for this",
+        "깃에 반영해줘", "메인 브랜치에 머지해줘", "수정한 거 레포에 올려줘",
+    ],
+    NO_PUSH_LABEL: [
+        "이 함수 설명해줘", "버그 고쳐줘", "코드 리팩토링 해줘", "print 문 추가해줘", "로그인 로직 어디 있어",
+        "product 모델 수정해줘", "에러 처리 추가해줘", "이 코드는 무슨 역할이야", "테스트 코드 작성해줘",
+        "변수 이름 바꿔줘", "explain this function", "fix the bug in the parser", "add logging to the handler",
+        "주석 달아줘", "성능 개선해줘", "타입 힌트 추가해줘",
+    ],
+}
+
+# 라벨 = 청크 역할 태그와 맞춰 볼 한글 키워드 (question_role_tag로 그대로 사용)
+ROLE_EXAMPLES = {
+    "로그인 인증 사용자": [
+        "로그인은 어떻게 동작해", "인증 처리 어디서 해", "비밀번호 해싱", "OAuth 콜백 처리", "회원가입 로직",
+        "세션 로그인 확인", "how does login work", "authentication flow", "토큰 검증",
+    ],
+    "데이터베이스 저장 조회": [
+        "DB 연결 어떻게 해", "테이블 구조 알려줘", "쿼리 어디서 실행해", "데이터 저장은 어디서", "MySQL 연결",
+        "채팅 기록 DB 저장", "database schema", "insert query", "커넥션 관리",
+    ],
+    "API 라우팅 요청 처리": [
+        "엔드포인트 목록", "라우트 어디 있어", "API 요청 처리 흐름", "flask route", "/chat 요청은 어떻게 처리돼",
+        "요청 파라미터 검증", "http handler", "응답 json 형식",
+    ],
+    "임베딩 벡터 검색": [
+        "임베딩 어떻게 만들어", "벡터 검색 방식", "ChromaDB 사용법", "유사도 검색", "청크 나누는 방법",
+        "embedding pipeline", "vector search", "인덱스 구축",
+    ],
+    "설정 환경 변수": [
+        "환경 변수 설정", "설정 파일 어디", "API 키 설정", ".env 파일", "config 값", "configuration settings",
+    ],
+    "오류 처리 예외": [
+        "에러 처리 어떻게 해", "예외 처리 로직", "실패하면 어떻게 돼", "오류 나면 어디서 잡아", "exception handling",
+        "재시도 로직",
+    ],
+    "Git 저장소 커밋": [
+        "git 클론 어떻게 해", "브랜치 생성 로직", "커밋 코드 어디", "깃허브 푸시 구현", "clone repository",
+        "저장소 파일 가져오기",
+    ],
+    "화면 UI 템플릿": [
+        "화면 구성", "html 템플릿", "프론트엔드 코드", "버튼 클릭 처리", "css 스타일", "javascript ui",
+        "채팅 화면",
+    ],
+    "프로젝트 구조 진입점": [
+        "진입점이 어디야", "메인 함수", "프로젝트 구조 설명해줘", "전체 구조", "어떤 파일부터 봐야 해",
+        "entry point", "실행 방법", "전체 흐름",
+    ],
+    "LLM 프롬프트 응답 생성": [
+        "프롬프트 어떻게 만들어", "gpt 호출 부분", "답변 생성 로직", "챗봇 응답", "openai api 호출",
+        "시스템 프롬프트",
+    ],
+    "테스트 검증": [
+        "테스트 코드", "단위 테스트", "pytest 실행", "테스트 어떻게 돌려", "unit test",
+    ],
+    "대화 기록 메모리": [
+        "이전 대화 기억", "대화 기록 저장", "메모리 저장 방식", "채팅 히스토리", "conversation history",
+    ],
+}
+
+
+class IntentResult(NamedTuple):
+    label: str
+    confidence: float
+    source: str  # pattern | prototype
+
+
+def _normalize(text: str) -> str:
+    return ' ' + re.sub(r'\s+', ' ', (text or '').lower()).strip() + ' '
+
+
+def vectorize(text: str) -> np.ndarray:
+    """글자 n-gram을 crc32로 해싱한 L2 정규화 벡터 (프로세스가 달라도 같은 값)"""
+    vector = np.zeros(INTENT_VECTOR_DIM, dtype=np.float32)
+    text = _normalize(text)
+    for n in range(INTENT_NGRAM_RANGE[0], INTENT_NGRAM_RANGE[1] + 1):
+        for i in range(len(text) - n + 1):
+            vector[zlib.crc32(text[i:i + n].encode('utf-8')) % INTENT_VECTOR_DIM] += 1.0
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm > 0 else vector
+
+
+class PrototypeClassifier:
+    """
+    라벨별 예문 벡터에 대한 최근접 프로토타입 분류기
+
+    라벨 점수는 그 라벨 예문 중 가장 가까운 예문과의 코사인 유사도이며,
+    라벨 점수들을 softmax로 바꾼 값을 신뢰도로 사용합니다.
+    softmax는 상대 비교라 어느 예문과도 닮지 않은 입력도 높게 나오므로, 1위 유사도가 min_similarity보다 낮거나
+    2위와의 차이가 min_margin보다 작으면 신뢰도를 INTENT_LOW_CONFIDENCE 이하로 낮춰 호출하는 쪽이 LLM을 쓰게 합니다.
+    """
+
+    def __init__(self, examples: Dict[str, List[str]], temperature: float = INTENT_TEMPERATURE,
+                 min_similarity: float = INTENT_MIN_SIMILARITY, min_margin: float = INTENT_MIN_MARGIN):
+        self.labels = list(examples)
+        self.temperature = temperature
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        rows, owners = [], []
+        for index, label in enumerate(self.labels):
+            for phrase in examples[label]:
+                rows.append(vectorize(phrase))
+                owners.append(index)
+        self.matrix = np.stack(rows)  # 예문 벡터 (예문 수 x 차원), 생성 시 한 번만 계산
+        self.owners = np.asarray(owners)
+
+    def scores(self, text: str) -> Dict[str, float]:
+        """라벨별 최근접 예문 유사도"""
+        similarities = self.matrix @ vectorize(text)
+        best = np.full(len(self.labels), -1.0, dtype=np.float32)
+        np.maximum.at(best, self.owners, similarities)
+        return {label: float(best[i]) for i, label in enumerate(self.labels)}
+
+    def classify(self, text: str) -> IntentResult:
+        scores = self.scores(text)
+        values = np.asarray(list(scores.values()), dtype=np.float64)
+        weights = np.exp((values - values.max()) / self.temperature)
+        probabilities = weights / weights.sum()
+        best = int(np.argmax(probabilities))
+        confidence = float(probabilities[best])
+        ranked = np.sort(values)[::-1]
+        margin = ranked[0] - ranked[1] if len(ranked) > 1 else ranked[0]
+        if ranked[0] < self.min_similarity or margin < self.min_margin:
+            confidence = min(confidence, float(ranked[0]), INTENT_LOW_CONFIDENCE)
+        return IntentResult(self.labels[best], confidence, 'prototype')
+
+
+push_classifier = PrototypeClassifier(PUSH_EXAMPLES)
+role_classifier = PrototypeClassifier(ROLE_EXAMPLES)
+
+
+def classify_push_intent(message: str) -> IntentResult:
+    """
+    GitHub 푸시 의도를 판단합니다.
+
+    분명한 표현(깃허브에 푸시, 커밋해줘, 풀리퀘스트 등)은 PUSH_STRONG_CONFIDENCE,
+    다른 뜻과 겹칠 수 있는 표현(영문 push/commit/PR 단독, 적용해줘, 올려줘 등)은 LLM 확인을 받도록
+    PUSH_WEAK_CONFIDENCE, 패턴이 없으면 프로토타입 분류기의 신뢰도를 사용합니다.
+    """
+    match = PUSH_PATTERN.search(message or '')
+    if match:
+        confidence = PUSH_STRONG_CONFIDENCE if match.group('strong') else PUSH_WEAK_CONFIDENCE
+        return IntentResult(PUSH_LABEL, confidence, 'pattern')
+    return push_classifier.classify(message)
+
+
+def classify_question_role(message: str) -> IntentResult:
+    """질문이 찾는 코드 역할 태그(한글 키워드)와 신뢰도"""
+    return role_classifier.classify(message)
@@ -0,0 +1,232 @@
+"""
+어휘(BM25) 검색 인덱스 모듈
+
+저장소 청크에 대한 역색인을 만들어 식별자 중심 질문("load_repo_data는 뭐 해?")을
+임베딩 없이 찾을 수 있도록 합니다.
+
+    - 청크 본문, 경로, function_name, class_name, role_tag를 토큰화하여 색인
+    - snake_case / camelCase 식별자는 전체 이름과 구성 단어를 모두 색인
+    - 벡터 검색 결과와는 reciprocal-rank fusion(RRF)으로 결합
+    - 식별자만으로 된 질문은 임베딩 호출을 건너뛸 수 있도록 판별 함수 제공
+"""
+
+import os
+import re
+import json
+import math
+import heapq
+import threading
+from collections import Counter
+from typing import Optional, List, Dict, Any, Tuple
+
+from vector_store import metadata_matches
+
+# ----------------- 상수 정의 -----------------
+BM25_K1 = 1.5  # 단어 빈도 포화 계수
+BM25_B = 0.75  # 문서 길이 정규화 계수
+SYMBOL_FIELD_WEIGHT = 3  # 경로/함수명/클래스명 토큰 가중치 (본문 대비 반복 횟수)
+RRF_K = 60  # reciprocal-rank fusion 상수
+FILTER_FIELDS = ('path', 'file_name', 'class_name', 'function_name')  # where 필터용으로 보관할 메타데이터
+
+TOKEN_PATTERN = re.compile(r'[A-Za-z_][A-Za-z0-9_]*|[가-힣]+|\d+')
+CAMEL_PATTERN = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+')
+IDENTIFIER_QUERY_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$')
+
+
+def split_identifier(identifier: str) -> List[str]:
+    """
+    식별자를 구성 단어로 나눕니다.
+
+    예: "load_repo_data" -> ["load", "repo", "data"], "GitHubRepositoryFetcher" -> ["git", "hub", "repository", "fetcher"]
+    """
+    parts = []
+    for piece in identifier.split('_'):
+        if piece:
+            parts.extend(p.lower() for p in CAMEL_PATTERN.findall(piece))
+    return parts
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    텍스트를 색인 토큰으로 변환합니다.
+
+    - 식별자: 소문자 전체 이름 + 구성 단어
+    - 한글: 단어 전체 + 2글자 조각 (조사가 붙은 형태도 매칭되도록)
+    """
+    tokens = []
+    for word in TOKEN_PATTERN.findall(text or ''):
+        if '가' <= word[0] <= '힣':
+            tokens.append(word)
+            if len(word) > 2:
+                tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+            continue
+        lowered = word.lower()
+        tokens.append(lowered)
+        parts = split_identifier(word)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+def is_identifier_query(text: str) -> bool:
+    """
+    질문이 식별자만으로 이루어졌는지 확인합니다. (예: "load_repo_data", "`GitHubRepositoryFetcher.load_repo_data()`")
+
+    이런 질문은 임베딩보다 어휘 검색이 정확하고 빠르므로 임베딩 호출을 건너뛸 수 있습니다.
+    """
+    words = [w.strip('`\'"?!,()') for w in (text or '').split()]
+    words = [w for w in words if w]
+    if not words or len(words) > 3:
+        return False
+    return all(IDENTIFIER_QUERY_PATTERN.match(w) for w in words)
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = RRF_K) -> List[Tuple[str, float]]:
+    """
+    여러 순위 목록을 reciprocal-rank fusion으로 합칩니다.
+
+    Args:
+        rankings: ID 순위 목록들 (앞쪽이 상위)
+        k (int): RRF 상수
+
+    Returns:
+        [(id, 점수), ...] 점수 내림차순
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, record_id in enumerate(ranking):
+            scores[record_id] = scores.get(record_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class LexicalIndex:
+    """
+    청크 단위 BM25 역색인
+
+    본문·메타데이터 텍스트는 보관하지 않고 토큰 통계와 필터용 메타데이터만 저장합니다.
+    검색 결과의 본문은 벡터 저장소에서 ID로 가져옵니다.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.ids = []
+        self.fields = []  # 행별 필터용 메타데이터 (FILTER_FIELDS)
+        self.doc_lengths = []
+        self.postings = {}  # 토큰 -> [[행, 빈도], ...]
+        self.symbols = set()  # 정확히 일치하는 식별자 이름 (소문자)
+        self._row_of = {}
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _document_tokens(self, document: str, metadata: Dict[str, Any]) -> List[str]:
+        symbol_text = ' '.join(str(metadata.get(key) or '') for key in ('path', 'function_name', 'class_name'))
+        tokens = tokenize(document)
+        tokens.extend(tokenize(symbol_text) * SYMBOL_FIELD_WEIGHT)
+        tokens.extend(tokenize(metadata.get('role_tag') or ''))
+        return tokens
+
+    def add(self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]]):
+        """
+        청크를 색인합니다. (이미 있는 ID는 건너뜀)
+        """
+        with self._lock:
+            for record_id, document, metadata in zip(ids, documents, metadatas):
+                if record_id in self._row_of:
+                    continue
+                metadata = metadata or {}
+                row = len(self.ids)
+                self._row_of[record_id] = row
+                self.ids.append(record_id)
+                self.fields.append({key: metadata.get(key) or '' for key in FILTER_FIELDS})
+                tokens = self._document_tokens(document or '', metadata)
+                self.doc_lengths.append(len(tokens))
+                self._total_length += len(tokens)
+                for token, freq in Counter(tokens).items():
+                    self.postings.setdefault(token, []).append([row, freq])
+                for key in ('function_name', 'class_name', 'file_name'):
+                    if metadata.get(key):
+                        self.symbols.add(str(metadata[key]).lower())
+
+    def has_symbol(self, text: str) -> bool:
+        """질문의 식별자 중 하나라도 색인된 함수/클래스/파일 이름과 정확히 일치하는지 확인"""
+        for word in (text or '').split():
+            word = word.strip('`\'"?!,()')
+            for part in word.split('.'):
+                if part.lower() in self.symbols or word.lower() in self.symbols:
+                    return True
+        return False
+
+    def search(self, query: str, n_results: int = 5, where: Optional[Dict[str, Any]] = None) -> List[Tuple[str, float]]:
+        """
+        BM25 점수로 상위 청크를 찾습니다.
+
+        Args:
+            query (str): 검색어
+            n_results (int): 반환할 결과 수
+            where (dict): ChromaDB 형식의 메타데이터 필터 (선택)
+
+        Returns:
+            [(id, 점수), ...] 점수 내림차순
+        """
+        with self._lock:
+            total = len(self.ids)
+            if not total:
+                return []
+            avg_length = self._total_length / total
+            scores = {}
+            for token in set(tokenize(query)):
+                postings = self.postings.get(token)
+                if not postings:
+                    continue
+                idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+                for row, freq in postings:
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[row] / avg_length)
+                    scores[row] = scores.get(row, 0.0) + idf * freq * (BM25_K1 + 1) / (freq + norm)
+            if where:
+                scores = {row: score for row, score in scores.items() if metadata_matches(self.fields[row], where)}
+            top = heapq.nlargest(n_results, scores.items(), key=lambda item: item[1])
+            return [(self.ids[row], score) for row, score in top]
+
+    def save(self, path: str):
+        """색인을 JSON 파일로 저장합니다. (임시 파일에 쓴 뒤 교체)"""
+        with self._lock:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'ids': self.ids,
+                    'fields': self.fields,
+                    'doc_lengths': self.doc_lengths,
+                    'postings': self.postings,
+                    'symbols': sorted(self.symbols),
+                }, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            print(f"[DEBUG] 어휘 색인 저장: {path} ({len(self.ids)}개 청크, {len(self.postings)}개 토큰)")
+
+    @classmethod
+    def load(cls, path: str) -> Optional['LexicalIndex']:
+        """
+        저장된 색인을 불러옵니다.
+
+        Returns:
+            LexicalIndex 또는 None (파일이 없거나 읽기 실패)
+        """
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"[WARNING] 어휘 색인 로드 실패: {e}")
+            return None
+        index = cls()
+        index.ids = data.get('ids', [])
+        index.fields = data.get('fields', [])
+        index.doc_lengths = data.get('doc_lengths', [])
+        index.postings = data.get('postings', {})
+        index.symbols = set(data.get('symbols', []))
+        index._row_of = {record_id: row for row, record_id in enumerate(index.ids)}
+        index._total_length = sum(index.doc_lengths)
+        return index
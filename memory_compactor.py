@@ -0,0 +1,216 @@
+"""
+대화 기록 압축 모듈
+
+이전 대화를 "Q: ... A: ..." 원문 그대로 최대 세 건씩 프롬프트에 넣으면 답변 하나가 수천 토큰이라
+세션이 길어질수록 프롬프트와 지연 시간이 커집니다. 프롬프트의 [이전 대화 기록]을 다음으로 구성합니다.
+
+    - 최근 RECENT_TURNS개 대화는 원문 그대로 (대화 한 건은 TURN_MAX_TOKENS까지)
+    - 그보다 오래된 대화는 세션별 누적 요약에 접어 넣음 (새 대화가 저장될 때 백그라운드에서 갱신)
+    - 질문과 비슷한 예전 대화는 관련 대화로 추가
+    - 전체는 HISTORY_TOKEN_BUDGET을 넘지 않음 (최근 대화 → 관련 대화 순으로 채우고 넘치면 생략)
+
+누적 요약은 세션마다 JSON 파일 하나({'summary': 요약, 'folded': 접어 넣은 질문 해시 목록})로 저장합니다.
+"""
+
+import os
+import json
+import threading
+import traceback
+from typing import Optional, List, Dict, Any, Callable, Tuple
+
+import openai
+
+from context_packer import estimate_tokens
+
+HISTORY_TOKEN_BUDGET = int(os.environ.get("HISTORY_TOKEN_BUDGET", 1500))  # [이전 대화 기록]에 넣을 최대 토큰 수
+RECENT_TURNS = int(os.environ.get("RECENT_TURNS", 2))  # 요약하지 않고 원문으로 넣을 최근 대화 수
+TURN_MAX_TOKENS = int(os.environ.get("TURN_MAX_TOKENS", 500))  # 대화 한 건에 쓸 최대 토큰 수
+SUMMARY_MAX_TOKENS = int(os.environ.get("SUMMARY_MAX_TOKENS", 400))  # 누적 요약 최대 토큰 수
+SUMMARY_MODEL = os.environ.get("SUMMARY_MODEL", "gpt-3.5-turbo")  # 요약 모델
+MEMORY_SUMMARY_DIR = os.environ.get("MEMORY_SUMMARY_DIR", "./chat_memory_db/summaries")  # 세션별 요약 파일 위치
+
+TRUNCATED_MARKER = " … (생략)"
+MIN_SECTION_TOKENS = 40  # 남은 예산이 이보다 적으면 대화를 더 넣지 않음
+
+SUMMARY_PROMPT = """다음은 코드 분석 챗봇과 사용자의 대화 기록입니다. 기존 요약에 새 대화를 합쳐 하나의 요약으로 갱신하세요.
+
+- 사용자가 관심을 가진 파일, 함수, 기능과 챗봇이 설명한 핵심 사실(동작 방식, 위치, 결정 사항)만 남기세요.
+- 코드 원문과 인사말은 빼고, 한국어 글머리표로 {max_tokens} 토큰 이내로 작성하세요.
+
+[기존 요약]
+{summary}
+
+[새 대화]
+{turns}
+
+[갱신된 요약]"""
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """추정 토큰 수가 max_tokens를 넘으면 뒷부분을 잘라내고 생략 표시를 붙입니다."""
+    if not text or estimate_tokens(text) <= max_tokens:
+        return text or ''
+    limit = max(0, max_tokens - estimate_tokens(TRUNCATED_MARKER))
+    cut = len(text)
+    while cut > 0 and estimate_tokens(text[:cut]) > limit:
+        cut = int(cut * limit / estimate_tokens(text[:cut])) if cut > 1 else 0
+    return text[:cut].rstrip() + TRUNCATED_MARKER
+
+
+def order_turns(entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """대화 기록 항목을 저장 시각 순으로 정렬합니다."""
+    return sorted(entries, key=lambda entry: (entry.get('metadata') or {}).get('timestamp', ''))
+
+
+class SummaryStore:
+    """
+    세션별 누적 요약 파일 저장소 (읽은 요약은 메모리에 보관, 스레드 안전)
+
+    다른 워커가 요약 파일을 갱신/삭제했으면 파일 수정 시각이 달라지므로 다음 load에서 다시 읽습니다.
+    """
+
+    def __init__(self, directory: str = MEMORY_SUMMARY_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._states = {}  # session_id -> (파일 수정 시각, 요약 상태)
+
+    def path(self, session_id: str) -> str:
+        return os.path.join(self.directory, f"{session_id}.json")
+
+    def _mtime(self, session_id: str) -> Optional[int]:
+        try:
+            return os.stat(self.path(session_id)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def load(self, session_id: str) -> Dict[str, Any]:
+        mtime = self._mtime(session_id)
+        with self._lock:
+            cached = self._states.get(session_id)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        state = {'summary': '', 'folded': []}
+        try:
+            with open(self.path(session_id), 'r', encoding='utf-8') as f:
+                state.update(json.load(f))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"[WARNING] 대화 요약 파일 로드 실패 ({session_id}): {e}")
+        with self._lock:
+            self._states[session_id] = (mtime, state)
+        return state
+
+    def save(self, session_id: str, state: Dict[str, Any]):
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = self.path(session_id) + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(temp_path, self.path(session_id))
+        with self._lock:
+            self._states[session_id] = (self._mtime(session_id), state)
+
+    def delete(self, session_id: Optional[str] = None):
+        """세션(None이면 전체)의 요약을 삭제합니다."""
+        with self._lock:
+            if session_id is None:
+                self._states.clear()
+            else:
+                self._states.pop(session_id, None)
+        if session_id is not None:
+            paths = [self.path(session_id)]
+        elif os.path.isdir(self.directory):
+            paths = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith('.json')]
+        else:
+            paths = []
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def summarize_turns(summary: str, turns: List[str]) -> Optional[str]:
+    """기존 요약과 새 대화들을 합친 요약을 LLM으로 생성합니다. (실패하면 None)"""
+    try:
+        response = openai.chat.completions.create(
+            model=SUMMARY_MODEL,
+            messages=[{"role": "user", "content": SUMMARY_PROMPT.format(
+                max_tokens=SUMMARY_MAX_TOKENS, summary=summary or '(없음)', turns="\n\n".join(turns))}],
+            temperature=0,
+            max_tokens=SUMMARY_MAX_TOKENS
+        )
+        return response.choices[0].message.content.strip()
+    except Exception as e:
+        print(f"[ERROR] 대화 요약 생성 실패: {e}")
+        traceback.print_exc()
+        return None
+
+
+def fold_turns(session_id: str, entries: List[Dict[str, Any]], store: SummaryStore,
+               summarize: Callable[[str, List[str]], Optional[str]] = summarize_turns) -> bool:
+    """
+    최근 RECENT_TURNS개를 제외한 대화 중 아직 요약에 접어 넣지 않은 대화를 누적 요약에 반영합니다.
+
+    Returns:
+        bool: 요약을 갱신했으면 True
+    """
+    turns = order_turns(entries)
+    older = turns[:-RECENT_TURNS] if RECENT_TURNS > 0 else turns
+    state = store.load(session_id)
+    folded = set(state.get('folded') or [])
+    pending = [turn for turn in older if turn['hash'] not in folded]
+    if not pending:
+        return False
+    summary = summarize(state.get('summary', ''), [truncate_to_tokens(turn['document'], TURN_MAX_TOKENS) for turn in pending])
+    if summary is None:
+        return False
+    store.save(session_id, {'summary': truncate_to_tokens(summary, SUMMARY_MAX_TOKENS),
+                            'folded': sorted(folded | {turn['hash'] for turn in pending})})
+    print(f"[DEBUG] 대화 요약 갱신: 세션 {session_id}, 새로 접은 대화 {len(pending)}개")
+    return True
+
+
+def build_history(summary: str, recent: List[Dict[str, Any]], relevant: List[Tuple[float, Dict[str, Any]]],
+                  budget: int = HISTORY_TOKEN_BUDGET) -> str:
+    """
+    [이전 대화 기록] 섹션을 토큰 예산 안에서 만듭니다.
+
+    요약 → 최근 대화(최신 순) → 관련 대화(유사도 순)로 예산을 채우고, 출력은 요약, 관련 대화, 최근 대화(시간 순) 순서입니다.
+
+    Args:
+        summary (str): 누적 요약
+        recent: 최근 대화 항목 (시간 순)
+        relevant: (유사도, 항목) 목록 (최근 대화와 겹치는 항목은 제외됨)
+        budget (int): 최대 토큰 수
+    """
+    used = 0
+
+    def take(text, limit):
+        nonlocal used
+        remaining = min(limit, budget - used - 1)  # 1: 구분 줄바꿈
+        if remaining < MIN_SECTION_TOKENS:
+            return None
+        text = truncate_to_tokens(text, remaining)
+        used += estimate_tokens(text) + 1
+        return text
+
+    summary_text = take(f"[이전 대화 요약]\n{summary}", SUMMARY_MAX_TOKENS + 10) if summary else None
+    recent_texts = []
+    for position, entry in reversed(list(enumerate(recent))):
+        text = take(f"[최근 대화 {position + 1}]\n{entry['document']}", TURN_MAX_TOKENS)
+        if text is None:
+            break
+        recent_texts.insert(0, text)
+    recent_hashes = {entry['hash'] for entry in recent}
+    relevant_texts = []
+    for similarity, entry in relevant:
+        if entry['hash'] in recent_hashes:
+            continue
+        original = (entry.get('metadata') or {}).get('original_question', '')
+        detail = f"유사도: {similarity:.6f}" + (f", 원본: '{original}'" if original else "")
+        text = take(f"[관련 대화 {len(relevant_texts) + 1} ({detail})]\n{entry['document']}", TURN_MAX_TOKENS)
+        if text is None:
+            break
+        relevant_texts.append(text)
+    return "\n\n".join(([summary_text] if summary_text else []) + relevant_texts + recent_texts)
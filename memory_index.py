@@ -0,0 +1,228 @@
+"""
+세션별 대화 기록 메모리 색인 모듈
+
+chat_memory의 저장/조회는 매번 컬렉션 조회 → 해시 조회(get) → 임베딩 → 유사도 검색(query)으로
+저장소를 서너 번 오가고, 한 턴에 이것이 두 번 일어납니다. 세션의 대화 기록을 메모리에 올려
+중복 확인과 유사 대화 검색을 로컬에서 처리합니다.
+
+    - SessionMemoryIndex: 질문 해시 → 항목 dict + 연속된 임베딩 행렬 (정규화 벡터, 행렬 곱 한 번으로 검색)
+    - MemoryIndexCache: 세션별 색인 LRU (처음 접근할 때 디스크 컬렉션에서 한 번 읽어 복원)
+    - WriteBehind: 디스크 컬렉션 쓰기를 백그라운드 스레드 하나에서 순서대로 처리
+
+색인은 워커 프로세스마다 따로 있으며 다른 워커가 같은 세션에 쓴 대화로 무효화되지 않습니다.
+여러 워커로 실행할 때는 세션 ID 기준 고정 라우팅이 필요합니다. (vector_store_server 참고)
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Optional, List, Dict, Any, Callable, Tuple
+
+import numpy as np
+
+MEMORY_INDEX_CACHE_SIZE = int(os.environ.get("MEMORY_INDEX_CACHE_SIZE", 128))  # 메모리에 올려둘 세션 색인 수
+MEMORY_WRITE_BEHIND = os.environ.get("MEMORY_WRITE_BEHIND", "1") == "1"  # 디스크 쓰기를 백그라운드로 미룰지
+MEMORY_INDEX_INITIAL_ROWS = 16  # 임베딩 행렬의 초기 행 수 (부족하면 두 배로 늘림)
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    """벡터(또는 행렬의 각 행)를 L2 정규화한 float32 배열"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class SessionMemoryIndex:
+    """
+    한 세션의 대화 기록 색인 (스레드 안전)
+
+    항목은 {'id', 'hash', 'document', 'metadata'}이며, 임베딩은 추가 순서대로 행렬의 한 행에 저장됩니다.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries = {}  # 질문 해시 -> 항목
+        self._rows = []  # 행 번호 -> 질문 해시
+        self._matrix = None  # (용량, 차원) float32, 앞의 len(self._rows)개 행만 사용
+
+    @classmethod
+    def from_records(cls, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]],
+                     embeddings) -> 'SessionMemoryIndex':
+        """디스크 컬렉션에서 읽은 레코드로 색인을 만듭니다. (질문 해시가 없는 레코드는 id로 대신함)"""
+        index = cls()
+        if ids and embeddings is not None and len(embeddings):
+            for record_id, document, metadata, embedding in zip(ids, documents, metadatas, embeddings):
+                metadata = metadata or {}
+                index.add(metadata.get('question_hash') or record_id, record_id, document, metadata, embedding)
+        return index
+
+    def __len__(self):
+        with self._lock:
+            return len(self._rows)
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """모든 항목 (추가 순서)"""
+        with self._lock:
+            return [self._entries[question_hash] for question_hash in self._rows]
+
+    def has(self, question_hash: str) -> bool:
+        with self._lock:
+            return question_hash in self._entries
+
+    def get(self, question_hash: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._entries.get(question_hash)
+
+    def add(self, question_hash: str, record_id: str, document: str, metadata: Dict[str, Any], embedding) -> bool:
+        """
+        항목을 추가합니다.
+
+        Returns:
+            bool: 추가했으면 True, 같은 해시가 이미 있으면 False
+        """
+        vector = normalize_rows(embedding).reshape(-1)
+        with self._lock:
+            if question_hash in self._entries:
+                return False
+            size = len(self._rows)
+            if self._matrix is None:
+                self._matrix = np.zeros((MEMORY_INDEX_INITIAL_ROWS, vector.shape[0]), dtype=np.float32)
+            elif vector.shape[0] != self._matrix.shape[1]:
+                print(f"[WARNING] 대화 기록 임베딩 차원이 맞지 않아 색인에 추가하지 않습니다: {vector.shape[0]} != {self._matrix.shape[1]}")
+                return False
+            if size == self._matrix.shape[0]:
+                grown = np.zeros((size * 2, self._matrix.shape[1]), dtype=np.float32)
+                grown[:size] = self._matrix
+                self._matrix = grown
+            self._matrix[size] = vector
+            self._rows.append(question_hash)
+            self._entries[question_hash] = {'id': record_id, 'hash': question_hash,
+                                            'document': document, 'metadata': metadata}
+            return True
+
+    def search(self, embedding, top_k: int, min_similarity: Optional[float] = None) -> List[Tuple[float, Dict[str, Any]]]:
+        """
+        코사인 유사도가 높은 순서로 최대 top_k개의 (유사도, 항목)을 반환합니다.
+        min_similarity를 주면 유사도가 그보다 큰 항목만 남깁니다. (행렬 연산으로 한 번에 거름)
+        """
+        query = normalize_rows(embedding).reshape(-1)
+        with self._lock:
+            size = len(self._rows)
+            if not size or top_k <= 0 or query.shape[0] != self._matrix.shape[1]:
+                return []
+            scores = self._matrix[:size] @ query
+            candidates = np.flatnonzero(scores > min_similarity) if min_similarity is not None else np.arange(size)
+            if top_k < len(candidates):
+                candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+            best = candidates[np.argsort(-scores[candidates], kind='stable')]
+            return [(float(scores[row]), self._entries[self._rows[row]]) for row in best]
+
+    def max_similarity(self, embedding) -> float:
+        """가장 비슷한 항목과의 코사인 유사도 (항목이 없으면 0)"""
+        found = self.search(embedding, 1)
+        return found[0][0] if found else 0.0
+
+
+class MemoryIndexCache:
+    """
+    세션 ID → SessionMemoryIndex LRU
+
+    Args:
+        loader: 세션의 색인을 디스크에서 복원하는 함수 (실패하면 None)
+        capacity (int): 메모리에 올려둘 최대 세션 수
+    """
+
+    def __init__(self, loader: Callable[[str], Optional[SessionMemoryIndex]], capacity: int = MEMORY_INDEX_CACHE_SIZE):
+        self.loader = loader
+        self.capacity = max(1, capacity)
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}  # 세션 ID -> 복원 중 잠금 (같은 세션을 동시에 두 번 읽지 않도록)
+
+    def get(self, session_id: str) -> Optional[SessionMemoryIndex]:
+        """세션 색인 (메모리에 없으면 처음 한 번 복원)"""
+        with self._lock:
+            index = self._indexes.get(session_id)
+            if index is not None:
+                self._indexes.move_to_end(session_id)
+                return index
+            load_lock = self._load_locks.setdefault(session_id, threading.Lock())
+        with load_lock:
+            with self._lock:
+                index = self._indexes.get(session_id)
+            if index is None:
+                index = self.loader(session_id)
+                if index is not None:
+                    with self._lock:
+                        self._indexes[session_id] = index
+                        self._indexes.move_to_end(session_id)
+                        while len(self._indexes) > self.capacity:
+                            evicted, _ = self._indexes.popitem(last=False)
+                            print(f"[DEBUG] 대화 기록 색인 메모리 해제: {evicted}")
+        with self._lock:
+            self._load_locks.pop(session_id, None)
+        return index
+
+    def discard(self, session_id: Optional[str] = None):
+        """세션 색인을 메모리에서 내립니다. (None이면 전체)"""
+        with self._lock:
+            if session_id is None:
+                self._indexes.clear()
+            else:
+                self._indexes.pop(session_id, None)
+
+    def __contains__(self, session_id):
+        with self._lock:
+            return session_id in self._indexes
+
+
+class WriteBehind:
+    """
+    디스크 쓰기를 백그라운드 스레드 하나에서 제출 순서대로 실행합니다.
+
+    enabled가 False면 호출 스레드에서 바로 실행합니다. flush로 세션(또는 전체)의 대기 중인 쓰기를 기다릴 수 있습니다.
+    """
+
+    def __init__(self, name: str, enabled: bool = MEMORY_WRITE_BEHIND):
+        self.name = name
+        self.enabled = enabled
+        self._executor = None
+        self._lock = threading.Lock()
+        self._last = {}  # 키 -> 마지막으로 제출한 Future
+
+    def submit(self, key: str, fn: Callable, *args) -> Optional[Future]:
+        def run():
+            try:
+                return fn(*args)
+            except Exception as e:
+                print(f"[ERROR] {self.name} 백그라운드 쓰기 실패 ({key}): {e}")
+
+        if not self.enabled:
+            run()
+            return None
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=self.name)
+            future = self._executor.submit(run)
+            self._last[key] = future
+        future.add_done_callback(lambda done: self._forget(key, done))
+        return future
+
+    def _forget(self, key: str, future: Future):
+        with self._lock:
+            if self._last.get(key) is future:
+                del self._last[key]
+
+    def flush(self, key: Optional[str] = None, timeout: Optional[float] = None):
+        """대기 중인 쓰기가 끝날 때까지 기다립니다. (한 스레드에서 순서대로 실행하므로 마지막 것만 기다리면 됨)"""
+        with self._lock:
+            futures = list(self._last.values()) if key is None else [self._last.get(key)]
+        for future in futures:
+            if future is not None:
+                future.result(timeout=timeout)
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._last)
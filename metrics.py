@@ -0,0 +1,88 @@
+"""
+요청 처리 지표 수집 모듈
+
+단계별 소요 시간(임베딩, 벡터 검색, 의도 태깅, 대화 기록 조회 등)과 카운터(타임아웃, 오류 등)를
+프로세스 메모리에 최근 METRICS_WINDOW개씩 보관하고, /metrics 엔드포인트에서 요약을 제공합니다.
+"""
+
+import os
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Any
+
+METRICS_WINDOW = int(os.environ.get("METRICS_WINDOW", 500))  # 단계별로 보관할 최근 측정값 수
+
+
+def _percentile(sorted_values, ratio: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(ratio * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Metrics:
+    """
+    단계별 소요 시간과 카운터 저장소 (스레드 안전)
+    """
+
+    def __init__(self, window: int = METRICS_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._timings = {}  # 단계 이름 -> deque[초]
+        self._counters = {}  # 카운터 이름 -> 정수
+
+    def observe(self, name: str, seconds: float):
+        """단계 소요 시간(초)을 기록합니다."""
+        with self._lock:
+            values = self._timings.get(name)
+            if values is None:
+                values = self._timings[name] = deque(maxlen=self.window)
+            values.append(seconds)
+
+    def increment(self, name: str, amount: int = 1):
+        """카운터를 증가시킵니다."""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    @contextmanager
+    def timer(self, name: str):
+        """with 블록의 소요 시간을 기록합니다."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        현재 지표 요약을 반환합니다.
+
+        Returns:
+            {'timings': {단계: {'count', 'avg_ms', 'p50_ms', 'p95_ms', 'max_ms'}}, 'counters': {...}}
+        """
+        with self._lock:
+            timings = {name: sorted(values) for name, values in self._timings.items()}
+            counters = dict(self._counters)
+        summary = {}
+        for name, values in timings.items():
+            if not values:
+                continue
+            summary[name] = {
+                'count': len(values),
+                'avg_ms': round(sum(values) / len(values) * 1000, 1),
+                'p50_ms': round(_percentile(values, 0.5) * 1000, 1),
+                'p95_ms': round(_percentile(values, 0.95) * 1000, 1),
+                'max_ms': round(values[-1] * 1000, 1),
+            }
+        return {'timings': summary, 'counters': counters}
+
+    def reset(self):
+        with self._lock:
+            self._timings.clear()
+            self._counters.clear()
+
+
+# 프로세스 전역 지표 저장소
+metrics = Metrics()
@@ -0,0 +1,265 @@
+"""
+응답 후 저장 작업 큐 모듈
+
+답변이 만들어진 뒤 대화 메모리 저장(임베딩 + 컬렉션 쓰기)과 DB 채팅 기록 저장을 응답 경로에서 바로 하면
+사용자는 그 시간만큼 늦게 응답을 받습니다. 저장 작업은 이 큐에 넣고 바로 응답합니다.
+
+    - 작업은 먼저 기록 파일(JSONL)에 한 줄로 남긴 뒤 메모리 큐에 넣음 (프로세스가 죽어도 재시작 시 다시 실행)
+    - 백그라운드 스레드 하나가 넣은 순서대로 처리하고, 실패하면 간격을 늘려 가며 PERSIST_MAX_RETRIES번까지 재시도
+    - 처리가 끝난 작업은 기록 파일에 완료 줄을 남기고, 큐가 비면 기록 파일을 비움
+
+기록 파일은 프로세스마다 따로 씁니다. (PERSIST_QUEUE_DIR/<pid>-<임의값>.jsonl)
+각 프로세스는 자기 기록 파일 옆의 .lock 파일을 살아 있는 동안 잠가 두고, 시작할 때 잠기지 않은
+(주인 프로세스가 종료된) 기록 파일만 가져와 다시 실행합니다. 그래서 다른 워커가 처리 중인 작업을
+중복 실행하거나 지우지 않습니다. (파일 잠금이 없는 환경에서는 단일 프로세스로 보고 모두 가져옴)
+
+큐 지연(넣은 뒤 처리 완료까지 걸린 시간)은 metrics에 "<이름>.lag"로, 대기 작업 수와 가장 오래된 작업의
+대기 시간은 stats()로 확인합니다.
+"""
+
+import os
+import json
+import time
+import uuid
+import queue
+import threading
+import traceback
+from typing import Optional, Dict, Any, Callable
+
+from metrics import metrics
+
+try:
+    import fcntl  # 기록 파일 주인 프로세스 확인용 잠금 (Windows에는 없음)
+except ImportError:
+    fcntl = None
+
+PERSIST_QUEUE_DIR = os.environ.get("PERSIST_QUEUE_DIR", "sessions/persist_queue")  # 처리 전 작업 기록 파일 위치
+PERSIST_MAX_RETRIES = int(os.environ.get("PERSIST_MAX_RETRIES", 5))  # 작업당 최대 재시도 횟수
+PERSIST_RETRY_DELAY = float(os.environ.get("PERSIST_RETRY_DELAY", 1.0))  # 첫 재시도 대기 시간(초, 재시도마다 두 배)
+
+
+def _try_lock(path: str):
+    """잠금 파일을 열어 배타 잠금을 시도합니다. 성공하면 파일 디스크립터, 다른 프로세스가 잡고 있거나 없으면 None"""
+    try:
+        fd = os.open(path, os.O_RDWR)
+    except FileNotFoundError:
+        return None
+    if fcntl:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return None
+    return fd
+
+
+def read_journal(path: str) -> Dict[str, Dict[str, Any]]:
+    """기록 파일에서 완료되지 않은 작업을 넣은 순서대로 읽습니다. {작업 ID: 작업}"""
+    jobs = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # 마지막 줄이 쓰다 만 경우
+            if record.get('op') == 'add':
+                jobs[record['job']['id']] = record['job']
+            elif record.get('op') == 'done':
+                jobs.pop(record.get('id'), None)
+    return jobs
+
+
+class PersistenceQueue:
+    """
+    기록 파일로 유실을 막는 단일 스레드 쓰기 큐
+
+    Args:
+        name (str): metrics에 기록할 이름
+        directory (str): 기록 파일 위치
+    """
+
+    def __init__(self, name: str, directory: str = PERSIST_QUEUE_DIR, max_retries: int = PERSIST_MAX_RETRIES,
+                 retry_delay: float = PERSIST_RETRY_DELAY):
+        self.name = name
+        self.directory = directory
+        self.path = os.path.join(directory, f"{os.getpid()}-{uuid.uuid4().hex[:8]}.jsonl")
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self._handlers = {}  # 작업 종류 -> 처리 함수 (성공하면 True)
+        self._queue = queue.Queue()
+        self._pending = {}  # 작업 ID -> 작업 (넣은 순서)
+        # 잠금 순서: _lock → _file_lock
+        # _pending 변경과 그에 맞는 기록 파일 쓰기는 _lock 안에서 함께 해야 정리(_compact)가 새 작업을 빠뜨리지 않음
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self._thread = None
+        self._owner_fd = None
+        self.processed = 0
+        self.failed = 0
+
+    def register(self, kind: str, handler: Callable[[Dict[str, Any]], bool]):
+        """작업 종류별 처리 함수를 등록합니다. (False를 반환하거나 예외가 나면 재시도)"""
+        self._handlers[kind] = handler
+
+    # ---------- 기록 파일 ----------
+    def _append(self, record: Dict[str, Any]):
+        with self._file_lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _compact(self):
+        """대기 중인 작업만 남기고 기록 파일을 다시 씁니다. (대기 작업이 없으면 빈 파일)"""
+        with self._lock, self._file_lock:
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                for job in self._pending.values():
+                    f.write(json.dumps({'op': 'add', 'job': job}, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+
+    def _adopt_orphans(self):
+        """주인 프로세스가 종료된 기록 파일의 남은 작업을 이 프로세스의 큐로 가져옵니다."""
+        adopted = 0
+        for name in sorted(os.listdir(self.directory)):
+            journal = os.path.join(self.directory, name)
+            if not name.endswith('.jsonl') or journal == self.path:
+                continue
+            lock_path = journal[:-len('.jsonl')] + '.lock'
+            fd = None
+            if fcntl:
+                fd = _try_lock(lock_path)
+                if fd is None:
+                    continue  # 주인 프로세스가 아직 살아 있거나 다른 프로세스가 먼저 가져감
+            try:
+                if not os.path.exists(journal):
+                    continue  # 다른 프로세스가 먼저 가져감
+                jobs = read_journal(journal)
+                with self._lock:
+                    for job_id, job in jobs.items():
+                        self._append({'op': 'add', 'job': job})
+                        self._pending[job_id] = job
+                        self._queue.put(job)
+                adopted += len(jobs)
+                os.remove(journal)
+                if os.path.exists(lock_path):
+                    os.remove(lock_path)
+            except Exception as e:
+                print(f"[ERROR] {self.name} 작업 기록 파일 가져오기 실패 ({journal}): {e}")
+            finally:
+                if fd is not None:
+                    os.close(fd)
+        if adopted:
+            print(f"[INFO] {self.name} 처리되지 않은 저장 작업 {adopted}개를 다시 실행합니다.")
+
+    # ---------- 큐 ----------
+    def start(self):
+        """
+        이 프로세스의 기록 파일을 만들고, 종료된 프로세스가 남긴 작업을 가져온 뒤 처리 스레드를 시작합니다.
+        (앱 시작 시 호출, 여러 번 호출해도 한 번만 시작)
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-writer", daemon=True)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            lock_path = self.path[:-len('.jsonl')] + '.lock'
+            open(lock_path, 'a').close()
+            self._owner_fd = _try_lock(lock_path)  # 프로세스가 살아 있는 동안 잡아 둠
+            open(self.path, 'a').close()
+            self._adopt_orphans()
+        except Exception as e:
+            print(f"[ERROR] {self.name} 작업 기록 파일 준비 실패: {e}")
+        self._thread.start()
+
+    def enqueue(self, kind: str, **payload) -> str:
+        """
+        작업을 기록 파일에 남기고 큐에 넣습니다.
+
+        Returns:
+            str: 작업 ID
+        """
+        self.start()
+        job = {'id': uuid.uuid4().hex, 'kind': kind, 'payload': payload, 'enqueued_at': time.time()}
+        with self._lock:
+            try:
+                self._append({'op': 'add', 'job': job})
+            except Exception as e:
+                print(f"[WARNING] {self.name} 작업 기록 파일 쓰기 실패 (메모리 큐로만 처리): {e}")
+            self._pending[job['id']] = job
+        self._queue.put(job)
+        return job['id']
+
+    def _process(self, job: Dict[str, Any]) -> bool:
+        handler = self._handlers.get(job['kind'])
+        if handler is None:
+            print(f"[ERROR] {self.name} 알 수 없는 작업 종류: {job['kind']}")
+            return False
+        delay = self.retry_delay
+        for attempt in range(self.max_retries + 1):
+            try:
+                if handler(job['payload']):
+                    return True
+                print(f"[WARNING] {self.name} 작업 실패 ({job['kind']}, 시도 {attempt + 1})")
+            except Exception as e:
+                print(f"[WARNING] {self.name} 작업 오류 ({job['kind']}, 시도 {attempt + 1}): {e}")
+                traceback.print_exc()
+            if attempt < self.max_retries:
+                metrics.increment(f"{self.name}.retry")
+                time.sleep(delay)
+                delay *= 2
+        return False
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if self._process(job):
+                    self.processed += 1
+                else:
+                    self.failed += 1
+                    metrics.increment(f"{self.name}.failed")
+                    print(f"[ERROR] {self.name} 작업을 {self.max_retries}번 재시도했지만 실패하여 버립니다: {job['kind']} {job['id']}")
+                metrics.observe(f"{self.name}.lag", time.time() - job['enqueued_at'])
+                try:
+                    with self._lock:
+                        self._pending.pop(job['id'], None)
+                        empty = not self._pending
+                        if not empty:
+                            self._append({'op': 'done', 'id': job['id']})
+                    if empty:
+                        self._compact()
+                except Exception as e:
+                    print(f"[WARNING] {self.name} 작업 기록 파일 갱신 실패: {e}")
+            finally:
+                self._queue.task_done()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """대기 중인 작업이 모두 처리될 때까지 기다립니다. (제한 시간 안에 끝났으면 True)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                if not self._pending:
+                    return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+
+    def stats(self) -> Dict[str, Any]:
+        """대기 작업 수, 가장 오래된 작업의 대기 시간(초), 처리/실패 수"""
+        with self._lock:
+            oldest = min((job['enqueued_at'] for job in self._pending.values()), default=None)
+            pending = len(self._pending)
+        return {
+            'pending': pending,
+            'oldest_age_seconds': round(time.time() - oldest, 3) if oldest else 0.0,
+            'processed': self.processed,
+            'failed': self.failed,
+        }
+
+
+# 답변 후 대화 기록 저장 큐 (처리 함수는 chat_handler에서 등록, 시작은 app에서)
+persistence_queue = PersistenceQueue("persist")
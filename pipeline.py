@@ -0,0 +1,207 @@
+"""
+요청 처리 단계 병렬 실행 모듈
+
+handle_chat의 LLM 호출 전 단계 중 서로 의존하지 않는 네트워크 단계
+(질문 임베딩 → 벡터 검색, 질문 의도 태깅, 이전 대화 기록 조회)를 공용 스레드 풀에서 동시에 실행하여
+LLM 호출 전 지연 시간이 단계 합이 아니라 가장 느린 단계 하나가 되도록 합니다.
+
+    steps = StepRunner("chat")
+    steps.submit("intent_tag", tag_question, message, timeout=8, default='')
+    with steps.timed("embedding"):
+        ...                                   # 호출 스레드에서 임계 경로 실행
+    role_tag = steps.result("intent_tag")     # 타임아웃/오류 시 default 반환
+
+단계별 소요 시간은 metrics 모듈에 "<이름>.<단계>"로 기록됩니다.
+
+답변 생성은 LLM 호출(run/arun으로 토큰 조각을 내보내는 객체)을 yield해 전체 응답을 돌려받고
+최종 결과 dict를 return하는 생성기로 작성합니다. 같은 생성기를 drain(비스트리밍 호출),
+token_events(WSGI 스트리밍 응답), atoken_events(ASGI 스트리밍 응답)로 소비합니다.
+"""
+
+import os
+import time
+import asyncio
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, AsyncIterator, Callable, Dict, Generator, Iterator, Optional
+
+from metrics import metrics
+
+PIPELINE_WORKERS = int(os.environ.get("PIPELINE_WORKERS", 16))  # 단계 병렬 실행용 스레드 수
+DEFAULT_STEP_TIMEOUT = float(os.environ.get("DEFAULT_STEP_TIMEOUT", 10))  # 단계별 기본 제한 시간(초)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """공용 스레드 풀 (처음 사용할 때 생성)"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix="pipeline")
+        return _executor
+
+
+class StepRunner:
+    """
+    한 요청 안의 단계들을 동시에 실행하고 단계별 소요 시간을 기록하는 실행기
+
+    - submit: 단계를 스레드 풀에 제출 (제출 시점부터 timeout 초까지 기다림)
+    - timed: 호출 스레드에서 실행하는 단계의 소요 시간 기록
+    - result: 제출한 단계의 결과 (타임아웃/오류 시 default)
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.timings = {}  # 단계 -> 초
+        self._steps = {}  # 단계 -> (future, 제출 시각, timeout, default)
+        self._started = time.perf_counter()
+
+    def _record(self, step: str, seconds: float):
+        self.timings[step] = seconds
+        metrics.observe(f"{self.name}.{step}", seconds)
+
+    def submit(self, step: str, fn: Callable, *args, timeout: Optional[float] = None, default: Any = None, **kwargs):
+        """단계를 스레드 풀에서 실행합니다."""
+        def run():
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._record(step, time.perf_counter() - started)
+
+        future = get_executor().submit(run)
+        self._steps[step] = (future, time.perf_counter(), timeout or DEFAULT_STEP_TIMEOUT, default)
+        return future
+
+    @contextmanager
+    def timed(self, step: str):
+        """호출 스레드에서 실행하는 단계의 소요 시간을 기록합니다."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(step, time.perf_counter() - started)
+
+    def result(self, step: str) -> Any:
+        """
+        제출한 단계의 결과를 기다립니다.
+
+        제한 시간은 제출 시점부터 계산하므로, 다른 단계가 도는 동안 이미 지난 시간만큼 덜 기다립니다.
+        타임아웃이나 오류가 나면 경고를 출력하고 default를 반환합니다. (요청 전체를 실패시키지 않음)
+        """
+        future, submitted, timeout, default = self._steps[step]
+        remaining = max(0.0, timeout - (time.perf_counter() - submitted))
+        try:
+            return future.result(timeout=remaining)
+        except FutureTimeoutError:
+            print(f"[WARNING] {self.name}.{step} 단계 제한 시간({timeout}초) 초과, 기본값 사용")
+            metrics.increment(f"{self.name}.{step}.timeout")
+            return default
+        except Exception as e:
+            print(f"[WARNING] {self.name}.{step} 단계 실패, 기본값 사용: {e}")
+            metrics.increment(f"{self.name}.{step}.error")
+            return default
+
+    def mark(self, step: str):
+        """요청 시작부터 지금까지의 경과 시간을 기록합니다. (예: 첫 토큰까지 걸린 시간)"""
+        self._record(step, time.perf_counter() - self._started)
+
+    def summary(self) -> Dict[str, float]:
+        """지금까지 기록된 단계별 소요 시간(ms)과 전체 경과 시간"""
+        summary = {step: round(seconds * 1000, 1) for step, seconds in self.timings.items()}
+        summary['total'] = round((time.perf_counter() - self._started) * 1000, 1)
+        return summary
+
+
+def _advance(events: Generator, value: Any, error: Optional[BaseException] = None):
+    """
+    생성기를 한 단계 진행합니다. 끝나면 (True, 최종 결과), 아니면 (False, yield된 LLM 호출)
+    error가 있으면 LLM 호출 실패를 생성기 안으로 던져, 생성기의 예외 처리(오류 응답 만들기)가 실행되게 합니다.
+    """
+    try:
+        if error is not None:
+            return False, events.throw(error)
+        return False, events.send(value)
+    except StopIteration as stop:
+        return True, stop.value
+
+
+def run_events(events: Generator) -> Generator[str, None, Any]:
+    """
+    답변 생성기를 동기로 실행합니다.
+
+    생성기가 yield한 LLM 호출은 call.run()으로 스트리밍하며 토큰 조각을 그대로 yield하고,
+    모은 전체 응답을 생성기에 돌려줍니다. 생성기가 끝나면 최종 결과를 return합니다.
+    """
+    value, error = None, None
+    while True:
+        finished, call = _advance(events, value, error)
+        if finished:
+            return call
+        parts, error = [], None
+        try:
+            for token in call.run():
+                parts.append(token)
+                yield token
+        except Exception as e:
+            error = e
+        value = ''.join(parts)
+
+
+def drain(events: Generator) -> Any:
+    """답변 생성기를 끝까지 실행하고 최종 결과를 반환합니다. (비스트리밍 호출)"""
+    tokens = run_events(events)
+    while True:
+        try:
+            next(tokens)
+        except StopIteration as stop:
+            return stop.value
+
+
+def token_events(events: Generator) -> Iterator[Dict[str, Any]]:
+    """
+    답변 생성기를 스트리밍 이벤트로 바꿉니다.
+
+    Yields:
+        {'type': 'token', 'content': 조각} ... 마지막에 {'type': 'done', **최종 결과}
+    """
+    tokens = run_events(events)
+    while True:
+        try:
+            token = next(tokens)
+        except StopIteration as stop:
+            yield {'type': 'done', **(stop.value or {})}
+            return
+        yield {'type': 'token', 'content': token}
+
+
+async def atoken_events(events: Generator) -> AsyncIterator[Dict[str, Any]]:
+    """
+    비동기 서버용 token_events
+
+    생성기의 동기 단계(검색, 대화 기록 저장 등)는 스레드에서 실행하고, LLM 호출은 call.arun()으로
+    이벤트 루프에서 스트리밍합니다. LLM 응답을 기다리는 동안에는 스레드를 점유하지 않습니다.
+    """
+    value, error = None, None
+    try:
+        while True:
+            finished, call = await asyncio.to_thread(_advance, events, value, error)
+            if finished:
+                yield {'type': 'done', **(call or {})}
+                return
+            parts, error = [], None
+            try:
+                async for token in call.arun():
+                    parts.append(token)
+                    yield {'type': 'token', 'content': token}
+            except Exception as e:
+                error = e
+            value = ''.join(parts)
+    finally:
+        try:
+            events.close()
+        except ValueError:
+            pass  # 스레드에서 실행 중인 단계는 끝까지 실행된 뒤 정리됨
@@ -0,0 +1,165 @@
+"""
+프롬프트용 저장소 구조 렌더링 모듈
+
+저장소 전체 트리(모든 파일, 이모지 접두어)를 매 질문마다 프롬프트에 넣는 대신 두 가지로 나눕니다.
+
+    - repo_outline: 깊이 OUTLINE_MAX_DEPTH까지만 펼치고 나머지는 "디렉토리/ (파일 N개)"로 접은 개요.
+      질문과 무관하게 저장소마다 항상 같은 문자열이므로 시스템 프롬프트 뒤에 붙여 프롬프트 캐싱 접두어로 사용
+    - related_tree: 검색된 파일로 가는 경로만 펼치고, 관련 없는 하위 트리는 개수 요약 한 줄로 생략한 트리
+
+렌더링 결과는 같은 입력에 대해 항상 같은 바이트열이 되도록 이름 순으로 정렬합니다.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, List, Dict, Any, Iterable
+
+OUTLINE_MAX_DEPTH = int(os.environ.get("OUTLINE_MAX_DEPTH", 2))  # 개요에서 펼칠 디렉토리 깊이
+OUTLINE_MAX_FILES = 10  # 개요에서 디렉토리마다 이름을 보여줄 최대 파일 수
+OUTLINE_MAX_LINES = 80  # 개요 최대 줄 수 (넘으면 깊이를 줄여 다시 렌더링)
+OUTLINE_CACHE_SIZE = 64  # 렌더링한 개요를 보관할 저장소 수
+
+DIR_MARKER = "📁 "
+FILE_MARKER = "📄 "
+
+
+def parse_directory_structure(text: str) -> List[str]:
+    """
+    generate_directory_structure가 만든 트리 텍스트(2칸 들여쓰기, 📁/📄 접두어)를 파일 경로 목록으로 바꿉니다.
+    """
+    paths, stack = [], []
+    for line in (text or '').splitlines():
+        stripped = line.lstrip(' ')
+        depth = (len(line) - len(stripped)) // 2
+        del stack[depth:]
+        if stripped.startswith(DIR_MARKER):
+            stack.append(stripped[len(DIR_MARKER):].strip())
+        elif stripped.startswith(FILE_MARKER):
+            paths.append('/'.join(stack + [stripped[len(FILE_MARKER):].strip()]))
+    return paths
+
+
+class _Dir:
+    __slots__ = ('dirs', 'files', 'count')
+
+    def __init__(self):
+        self.dirs = {}
+        self.files = []
+        self.count = 0  # 하위 전체 파일 수
+
+
+def _build(paths: Iterable[str]) -> _Dir:
+    root = _Dir()
+    for path in paths:
+        parts = [p for p in path.strip('/').split('/') if p]
+        if not parts:
+            continue
+        node = root
+        node.count += 1
+        for part in parts[:-1]:
+            node = node.dirs.setdefault(part, _Dir())
+            node.count += 1
+        node.files.append(parts[-1])
+    return root
+
+
+def _chain(name: str, node: _Dir):
+    """파일 없이 디렉토리 하나만 있는 경로는 "a/b/c"처럼 한 줄로 합침"""
+    while not node.files and len(node.dirs) == 1:
+        child_name, node = next(iter(node.dirs.items()))
+        name = f"{name}/{child_name}"
+    return name, node
+
+
+def render_tree(paths: Iterable[str], max_depth: int = OUTLINE_MAX_DEPTH, focus: Optional[Iterable[str]] = None,
+                max_files: int = OUTLINE_MAX_FILES) -> str:
+    """
+    파일 경로 목록을 간결한 트리 텍스트로 렌더링합니다.
+
+    Args:
+        paths: 저장소 파일 경로 목록
+        max_depth (int): focus가 없을 때 펼칠 깊이 (더 깊은 디렉토리는 파일 수만 표시)
+        focus: 펼쳐 보여줄 파일 경로 (주면 이 파일로 가는 경로만 펼치고 나머지는 요약)
+        max_files (int): focus가 없을 때 디렉토리마다 이름을 보여줄 최대 파일 수
+    """
+    root = _build(paths)
+    focus_files = set(focus or [])
+    focus_dirs = set()
+    for path in focus_files:
+        parts = path.split('/')
+        focus_dirs.update('/'.join(parts[:i]) for i in range(1, len(parts)))
+    lines = []
+
+    def walk(node, path, depth):
+        indent = '  ' * depth
+        hidden_dirs, hidden_files = 0, 0
+        for name in sorted(node.dirs):
+            label, child = _chain(name, node.dirs[name])
+            child_path = f"{path}/{label}" if path else label
+            if focus_files:
+                if child_path in focus_dirs:
+                    lines.append(f"{indent}{label}/ (파일 {child.count}개)")
+                    walk(child, child_path, depth + 1)
+                else:
+                    hidden_dirs += 1
+                    hidden_files += child.count
+            elif depth + 1 < max_depth:
+                lines.append(f"{indent}{label}/ (파일 {child.count}개)")
+                walk(child, child_path, depth + 1)
+            else:
+                lines.append(f"{indent}{label}/ (파일 {child.count}개)")
+        files = sorted(node.files)
+        if focus_files:
+            shown = [f for f in files if (f"{path}/{f}" if path else f) in focus_files]
+        else:
+            shown = files[:max_files]
+        lines.extend(f"{indent}{name}" for name in shown)
+        hidden_files += len(files) - len(shown)
+        if hidden_dirs or hidden_files:
+            summary = f"디렉토리 {hidden_dirs}개, " if hidden_dirs else ""
+            lines.append(f"{indent}… 그 외 {summary}파일 {hidden_files}개")
+
+    walk(root, '', 0)
+    return '\n'.join(lines)
+
+
+_outlines = OrderedDict()
+_outlines_lock = threading.Lock()
+
+
+def repo_outline(paths: List[str]) -> str:
+    """
+    저장소 개요 (질문과 무관하게 같은 저장소면 항상 같은 문자열, 최근 OUTLINE_CACHE_SIZE개 저장소 캐시)
+
+    OUTLINE_MAX_LINES를 넘으면 펼치는 깊이를 줄입니다.
+    """
+    key = tuple(sorted(paths))
+    with _outlines_lock:
+        if key in _outlines:
+            _outlines.move_to_end(key)
+            return _outlines[key]
+    depth = OUTLINE_MAX_DEPTH
+    outline = render_tree(key, depth)
+    while depth > 1 and outline.count('\n') + 1 > OUTLINE_MAX_LINES:
+        depth -= 1
+        outline = render_tree(key, depth)
+    with _outlines_lock:
+        _outlines[key] = outline
+        while len(_outlines) > OUTLINE_CACHE_SIZE:
+            _outlines.popitem(last=False)
+    return outline
+
+
+def related_tree(paths: List[str], focus: Iterable[str]) -> str:
+    """검색된 파일로 가는 경로만 펼친 트리 (focus가 비어 있으면 빈 문자열)"""
+    focus = [p for p in dict.fromkeys(focus) if p]
+    return render_tree(paths, focus=focus) if focus else ''
+
+
+def session_paths(session_data: Dict[str, Any]) -> List[str]:
+    """세션의 저장소 파일 경로 (디렉토리 구조 텍스트 우선, 없으면 분석한 파일 목록)"""
+    paths = parse_directory_structure(session_data.get('directory_structure') or '')
+    if not paths:
+        paths = [f.get('path') for f in session_data.get('files') or [] if f.get('path')]
+    return paths
@@ -0,0 +1,128 @@
+"""
+검색 후보 재순위(rerank) 모듈
+
+벡터/어휘 검색으로 넉넉히 가져온 후보를 컨텍스트에 넣기 전에 로컬 CPU에서 다시 점수를 매깁니다.
+RERANKER 환경 변수로 구현을 고를 수 있습니다.
+
+    - none: 재순위 없음 (검색 순서 유지)
+    - lexical: 질문 토큰과 청크 본문/심볼 이름의 BM25식 겹침 점수 (기본값, 추가 의존성 없음)
+    - cross-encoder: sentence-transformers의 소형 cross-encoder (설치되어 있지 않으면 lexical로 대체)
+
+모든 재순위기는 score(question, documents, metadatas) -> 0~1 범위 점수 목록을 반환합니다.
+"""
+
+import os
+import math
+import threading
+from collections import Counter
+from typing import List, Dict, Any, Optional
+
+from lexical_index import tokenize
+
+try:
+    from sentence_transformers import CrossEncoder  # 선택 의존성
+except ImportError:
+    CrossEncoder = None
+
+RERANKER = os.environ.get("RERANKER", "lexical")  # none | lexical | cross-encoder
+CROSS_ENCODER_MODEL = os.environ.get("CROSS_ENCODER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")  # cross-encoder 모델
+SYMBOL_MATCH_BONUS = 0.5  # 함수/클래스 이름이 질문 토큰과 겹칠 때 더할 점수 (정규화 전)
+
+
+def _normalize(scores: List[float]) -> List[float]:
+    """점수를 0~1 범위로 정규화"""
+    if not scores:
+        return []
+    low, high = min(scores), max(scores)
+    if high - low < 1e-9:
+        return [1.0 if high > 0 else 0.0 for _ in scores]
+    return [(s - low) / (high - low) for s in scores]
+
+
+class Reranker:
+    """재순위기 기본 클래스 (검색 순서 유지)"""
+
+    name = 'none'
+
+    def score(self, question: str, documents: List[str], metadatas: List[Dict[str, Any]]) -> List[float]:
+        count = len(documents)
+        return [1.0 - i / count for i in range(count)] if count else []
+
+
+class LexicalReranker(Reranker):
+    """
+    질문 토큰과 후보 본문의 겹침으로 점수를 매기는 재순위기
+
+    후보 집합 안에서 IDF를 계산하므로 여러 후보에 흔한 토큰보다 드문 토큰의 일치가 더 중요하고,
+    함수/클래스 이름이 질문 토큰과 겹치면 가산점을 줍니다.
+    """
+
+    name = 'lexical'
+
+    def score(self, question, documents, metadatas):
+        query_tokens = set(tokenize(question))
+        if not documents or not query_tokens:
+            return [0.0] * len(documents)
+        doc_counts = [Counter(tokenize(doc or '')) for doc in documents]
+        total = len(documents)
+        idf = {}
+        for token in query_tokens:
+            df = sum(1 for counts in doc_counts if token in counts)
+            idf[token] = math.log(1 + (total - df + 0.5) / (df + 0.5))
+        scores = []
+        for counts, meta in zip(doc_counts, metadatas):
+            length = sum(counts.values()) or 1
+            score = sum(idf[t] * (1 + math.log(counts[t])) for t in query_tokens if counts.get(t))
+            score /= length ** 0.25  # 긴 청크가 겹침 수만으로 유리하지 않도록
+            symbols = set(tokenize(f"{(meta or {}).get('function_name', '')} {(meta or {}).get('class_name', '')}"))
+            if symbols & query_tokens:
+                score += SYMBOL_MATCH_BONUS * max(idf.values())
+            scores.append(score)
+        return _normalize(scores)
+
+
+class CrossEncoderReranker(Reranker):
+    """sentence-transformers cross-encoder 재순위기 (CPU)"""
+
+    name = 'cross-encoder'
+
+    def __init__(self, model_name: str = CROSS_ENCODER_MODEL):
+        self.model = CrossEncoder(model_name, device='cpu')
+
+    def score(self, question, documents, metadatas):
+        if not documents:
+            return []
+        raw = self.model.predict([(question, doc or '') for doc in documents])
+        return _normalize([float(s) for s in raw])
+
+
+_rerankers = {}
+_rerankers_lock = threading.Lock()
+
+
+def get_reranker(name: Optional[str] = None) -> Reranker:
+    """
+    이름에 맞는 재순위기를 반환합니다. (프로세스당 한 번만 생성)
+
+    cross-encoder를 쓸 수 없으면(패키지 미설치, 모델 로드 실패) lexical로 대체합니다.
+    """
+    name = (name or RERANKER).lower()
+    with _rerankers_lock:
+        if name in _rerankers:
+            return _rerankers[name]
+        if name == 'cross-encoder':
+            reranker = None
+            if CrossEncoder is None:
+                print("[WARNING] sentence-transformers가 설치되어 있지 않아 lexical 재순위기를 사용합니다.")
+            else:
+                try:
+                    reranker = CrossEncoderReranker()
+                except Exception as e:
+                    print(f"[WARNING] cross-encoder 로드 실패, lexical 재순위기를 사용합니다: {e}")
+            reranker = reranker or LexicalReranker()
+        elif name == 'lexical':
+            reranker = LexicalReranker()
+        else:
+            reranker = Reranker()
+        _rerankers[name] = reranker
+        return reranker
@@ -0,0 +1,328 @@
+"""
+저장소 산출물 수명 관리 모듈
+
+세션마다 쌓이는 산출물(로컬 클론, 벡터 인덱스, 어휘 색인, 심볼 테이블, 대화 기록 컬렉션)의
+크기와 마지막 사용 시각을 추적하여 다음 규칙으로 정리합니다.
+
+    - TTL: RESOURCE_TTL_SECONDS 동안 쓰이지 않은 세션은 저장소 산출물 삭제 (다음 사용 시 재분석으로 다시 만들어짐)
+    - 디스크 할당량: DISK_QUOTA_MB를 넘으면 가장 오래 쓰지 않은 세션부터
+      1) 로컬 클론만 삭제 (인덱스는 유지되어 다음 사용 시 인덱스를 만든 커밋으로 다시 클론만 하면 됨)
+      2) 그래도 넘으면 인덱스까지 삭제 (다음 사용 시 재분석)
+    - 메모리 할당량: MEMORY_IDLE_SECONDS 동안 쓰이지 않았거나 MEMORY_QUOTA_MB를 넘으면
+      메모리에 올라온 인덱스를 내림 (디스크에서 다시 로드됨)
+
+사용자의 대화 기록(대화 메모리, 요약, DB 채팅 기록)과 세션 정보는 자동 정리 대상이 아니며,
+사용자가 세션을 삭제할 때(purge_session)만 지웁니다.
+최근 ACTIVE_GRACE_SECONDS 안에 사용된 세션은 할당량 초과 시에도 삭제하지 않습니다.
+
+여러 워커가 같은 사용 기록 파일을 쓰므로, 저장할 때 파일 잠금 후 디스크 내용과 세션별 최신 시각으로
+병합합니다. 각 워커는 RESOURCE_STATE_SAVE_INTERVAL마다 사용 기록을 파일에 반영하고, 정리 전에
+다른 워커의 기록을 합쳐 읽으므로 다른 워커에서 쓰이는 세션을 정리하지 않습니다.
+"""
+
+import os
+import json
+import time
+import threading
+from typing import Optional, List, Dict, Any, Callable
+
+import github_analyzer
+import chat_memory
+
+try:
+    import fcntl  # 사용 기록 파일 잠금 (Windows에는 없음)
+except ImportError:
+    fcntl = None
+
+# ----------------- 상수 정의 -----------------
+RESOURCE_TTL_SECONDS = int(os.environ.get("RESOURCE_TTL_SECONDS", 7 * 24 * 3600))  # 미사용 세션 산출물 보관 기간
+DISK_QUOTA_MB = int(os.environ.get("DISK_QUOTA_MB", 10 * 1024))  # 저장소 산출물 디스크 할당량
+MEMORY_QUOTA_MB = int(os.environ.get("MEMORY_QUOTA_MB", 2 * 1024))  # 메모리에 올릴 인덱스 할당량
+MEMORY_IDLE_SECONDS = int(os.environ.get("MEMORY_IDLE_SECONDS", 30 * 60))  # 이 시간 동안 안 쓰면 메모리에서 내림
+ACTIVE_GRACE_SECONDS = int(os.environ.get("ACTIVE_GRACE_SECONDS", 5 * 60))  # 할당량 정리에서 제외할 최근 사용 시간
+RESOURCE_SWEEP_INTERVAL = int(os.environ.get("RESOURCE_SWEEP_INTERVAL", 10 * 60))  # 정리 주기 (0이면 주기 정리 안 함)
+RESOURCE_STATE_FILE = os.environ.get("RESOURCE_STATE_FILE", "sessions/resource_state.json")  # 마지막 사용 시각 저장 파일
+RESOURCE_STATE_SAVE_INTERVAL = int(os.environ.get("RESOURCE_STATE_SAVE_INTERVAL", 60))  # 사용 기록을 파일에 반영하는 최소 간격(초)
+
+MB = 1024 * 1024
+
+
+def _path_size(path: str) -> int:
+    """파일 또는 디렉토리의 바이트 크기"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _path_mtime(path: str) -> Optional[float]:
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+class ResourceManager:
+    """
+    세션 산출물의 마지막 사용 시각과 크기를 추적하고 TTL/LRU 규칙으로 정리하는 관리자
+
+    사용 예:
+        resource_manager.touch(session_id)          # 요청을 처리할 때마다 호출
+        resource_manager.purge_session(session_id)  # 세션 삭제 시 산출물 전체 삭제
+        resource_manager.start_sweeper()            # 주기 정리 스레드 시작
+    """
+
+    def __init__(self, state_file: str = RESOURCE_STATE_FILE, ttl_seconds: int = RESOURCE_TTL_SECONDS,
+                 disk_quota_bytes: int = DISK_QUOTA_MB * MB, memory_quota_bytes: int = MEMORY_QUOTA_MB * MB,
+                 memory_idle_seconds: int = MEMORY_IDLE_SECONDS, active_grace_seconds: int = ACTIVE_GRACE_SECONDS):
+        self.state_file = state_file
+        self.ttl_seconds = ttl_seconds
+        self.disk_quota_bytes = disk_quota_bytes
+        self.memory_quota_bytes = memory_quota_bytes
+        self.memory_idle_seconds = memory_idle_seconds
+        self.active_grace_seconds = active_grace_seconds
+        self._lock = threading.RLock()
+        self._last_access = {}  # session_id -> 마지막 사용 시각 (epoch 초)
+        self._last_saved = 0.0
+        self._purge_hooks = []  # 저장소 산출물 삭제 후 호출할 콜백 (session_id)
+        self._sweeper = None
+        self._stop_event = threading.Event()
+        self._load_state()
+
+    # ---------- 상태 저장 ----------
+    def _read_state(self) -> Dict[str, float]:
+        if not self.state_file or not os.path.exists(self.state_file):
+            return {}
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                return {k: float(v) for k, v in json.load(f).get('last_access', {}).items()}
+        except Exception as e:
+            print(f"[WARNING] 리소스 사용 기록 로드 실패: {e}")
+            return {}
+
+    def _load_state(self):
+        self._last_access = self._read_state()
+        if self._last_access:
+            print(f"[DEBUG] 리소스 사용 기록 로드 완료 (세션 수: {len(self._last_access)})")
+
+    def save_state(self, removed=()):
+        """
+        마지막 사용 시각을 파일에 저장합니다.
+        파일 잠금 후 다른 워커가 저장한 기록과 세션별 최신 시각으로 병합하고, 병합 결과를 메모리에도 반영합니다.
+
+        Args:
+            removed: 추적을 멈출 세션 ID 목록
+        """
+        if not self.state_file:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.state_file) or '.', exist_ok=True)
+            with open(self.state_file + ".lock", 'w') as lock_file:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                merged = self._read_state()
+                with self._lock:
+                    for session_id, last in self._last_access.items():
+                        merged[session_id] = max(merged.get(session_id, 0.0), last)
+                    for session_id in removed:
+                        merged.pop(session_id, None)
+                    self._last_access = dict(merged)
+                    self._last_saved = time.time()
+                tmp_path = self.state_file + ".tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({'last_access': merged}, f)
+                os.replace(tmp_path, self.state_file)
+        except Exception as e:
+            print(f"[WARNING] 리소스 사용 기록 저장 실패: {e}")
+
+    # ---------- 추적 ----------
+    def touch(self, session_id: str):
+        """세션 사용 시각을 갱신합니다. (RESOURCE_STATE_SAVE_INTERVAL마다 파일에도 반영)"""
+        if not session_id:
+            return
+        now = time.time()
+        with self._lock:
+            self._last_access[session_id] = now
+            due = now - self._last_saved >= RESOURCE_STATE_SAVE_INTERVAL
+        if due:
+            self.save_state()
+
+    def last_access(self, session_id: str) -> Optional[float]:
+        """
+        세션의 마지막 사용 시각. 기록이 없으면(이전 버전에서 만든 산출물) 산출물 수정 시각을 사용합니다.
+        """
+        with self._lock:
+            if session_id in self._last_access:
+                return self._last_access[session_id]
+        mtimes = [_path_mtime(p) for p in github_analyzer.repo_artifact_paths(session_id).values()]
+        mtimes = [m for m in mtimes if m is not None]
+        return max(mtimes) if mtimes else None
+
+    def add_purge_hook(self, hook: Callable[[str], None]):
+        """저장소 산출물이 삭제된 뒤 호출할 콜백을 등록합니다. (예: 메모리의 세션 정보 정리)"""
+        self._purge_hooks.append(hook)
+
+    def known_sessions(self) -> List[str]:
+        """사용 기록이 있거나 디스크에 산출물이 있는 세션 목록"""
+        with self._lock:
+            tracked = set(self._last_access)
+        return sorted(tracked | set(github_analyzer.list_repo_sessions()))
+
+    def disk_usage(self, session_id: str) -> int:
+        """세션 저장소 산출물의 디스크 사용량 (ChromaDB 엔진 인덱스는 청크 수로 추정)"""
+        paths = github_analyzer.repo_artifact_paths(session_id)
+        total = sum(_path_size(path) for path in paths.values() if os.path.exists(path))
+        if not os.path.exists(paths['vectors']) and github_analyzer.chroma_client:
+            collection_name = f"repo_{session_id}"
+            count = github_analyzer.repo_collections.count(collection_name) or 0
+            total += count * github_analyzer.CHROMA_BYTES_PER_CHUNK
+        return total
+
+    def memory_usage(self, session_id: str) -> int:
+        """메모리에 올라온 세션 인덱스의 크기 추정치 (올라와 있지 않으면 0)"""
+        if not github_analyzer.is_repo_index_loaded(session_id):
+            return 0
+        paths = github_analyzer.repo_artifact_paths(session_id)
+        return sum(_path_size(paths[key]) for key in ('vectors', 'lexical', 'symbols', 'graph') if os.path.exists(paths[key]))
+
+    # ---------- 정리 ----------
+    def release(self, session_id: str):
+        """세션 인덱스를 메모리에서 내립니다. (다음 사용 시 디스크에서 다시 로드)"""
+        github_analyzer.release_repo_index(session_id)
+        chat_memory.release_memory_index(session_id)
+        print(f"[INFO] 세션 인덱스 메모리 해제: {session_id}")
+
+    def clone_usage(self, session_id: str) -> int:
+        """세션 로컬 클론의 디스크 사용량"""
+        path = github_analyzer.repo_artifact_paths(session_id)['clone']
+        return _path_size(path) if os.path.isdir(path) else 0
+
+    def evict_clone(self, session_id: str) -> bool:
+        """세션의 로컬 클론만 삭제합니다. (인덱스는 유지, 다음 사용 시 인덱스를 만든 커밋으로 다시 클론)"""
+        removed = github_analyzer.delete_repo_clone(session_id)
+        print(f"[INFO] 세션 로컬 클론 삭제: {session_id} (삭제 항목 있음: {removed})")
+        return removed
+
+    def purge_repo(self, session_id: str) -> bool:
+        """
+        세션의 저장소 산출물(클론, 벡터 인덱스, 어휘 색인, 심볼 테이블)을 삭제합니다.
+        대화 기록과 세션 정보는 유지되며, 저장소 산출물은 다음 사용 시 재분석으로 다시 만들어집니다.
+        """
+        removed = github_analyzer.delete_repo_index(session_id)
+        for hook in self._purge_hooks:
+            try:
+                hook(session_id)
+            except Exception as e:
+                print(f"[WARNING] 산출물 삭제 콜백 실패 ({session_id}): {e}")
+        print(f"[INFO] 세션 저장소 산출물 삭제: {session_id} (삭제 항목 있음: {removed})")
+        return removed
+
+    def purge_session(self, session_id: str) -> bool:
+        """
+        세션의 모든 산출물(저장소 산출물 + 대화 기록 컬렉션)을 삭제하고 추적을 멈춥니다.
+        사용자가 세션을 삭제할 때만 호출합니다.
+        """
+        removed = self.purge_repo(session_id)
+        chat_memory.reset_memory(session_id)
+        with self._lock:
+            self._last_access.pop(session_id, None)
+        self.save_state(removed=[session_id])
+        return removed
+
+    def sweep(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """
+        TTL 만료, 디스크 할당량, 메모리 할당량 순서로 정리합니다.
+
+        Returns:
+            dict: {'expired': [...], 'clone_evicted': [...], 'disk_evicted': [...], 'released': [...],
+                   'disk_bytes': int, 'memory_bytes': int}
+        """
+        now = now or time.time()
+        stats = {'expired': [], 'clone_evicted': [], 'disk_evicted': [], 'released': []}
+        self.save_state()  # 다른 워커의 사용 기록을 합쳐 읽음
+
+        # 1. TTL 만료 세션의 저장소 산출물 삭제 (대화 기록과 세션 정보는 유지)
+        access = {sid: self.last_access(sid) for sid in self.known_sessions()}
+        expired = [sid for sid, last in access.items() if last is not None and now - last > self.ttl_seconds]
+        for session_id in expired:
+            self.purge_repo(session_id)
+            stats['expired'].append(session_id)
+        if expired:
+            with self._lock:
+                for session_id in expired:
+                    self._last_access.pop(session_id, None)
+        live = {sid: last or 0.0 for sid, last in access.items() if sid not in stats['expired']}
+        lru_order = sorted(live, key=lambda sid: live[sid])
+        evictable = [sid for sid in lru_order if now - live[sid] >= self.active_grace_seconds]
+
+        # 2. 디스크 할당량 초과 시 오래된 세션의 로컬 클론부터 삭제하고, 그래도 넘으면 인덱스까지 삭제
+        disk = {sid: self.disk_usage(sid) for sid in live}
+        disk_total = sum(disk.values())
+        for session_id in evictable:
+            if disk_total <= self.disk_quota_bytes:
+                break
+            clone_bytes = self.clone_usage(session_id)
+            if not clone_bytes:
+                continue
+            self.evict_clone(session_id)
+            disk[session_id] -= clone_bytes
+            disk_total -= clone_bytes
+            stats['clone_evicted'].append(session_id)
+        for session_id in evictable:
+            if disk_total <= self.disk_quota_bytes:
+                break
+            if not disk[session_id]:
+                continue
+            self.purge_repo(session_id)
+            disk_total -= disk[session_id]
+            stats['disk_evicted'].append(session_id)
+
+        # 3. 오래 쓰지 않았거나 메모리 할당량을 넘은 인덱스를 메모리에서 내림
+        memory = {sid: self.memory_usage(sid) for sid in live if sid not in stats['disk_evicted']}
+        memory_total = sum(memory.values())
+        for session_id in lru_order:
+            if not memory.get(session_id):
+                continue
+            idle = now - live[session_id]
+            over_quota = memory_total > self.memory_quota_bytes and idle >= self.active_grace_seconds
+            if idle > self.memory_idle_seconds or over_quota:
+                self.release(session_id)
+                memory_total -= memory[session_id]
+                stats['released'].append(session_id)
+
+        stats['disk_bytes'] = disk_total
+        stats['memory_bytes'] = memory_total
+        self.save_state(removed=stats['expired'])
+        if stats['expired'] or stats['clone_evicted'] or stats['disk_evicted'] or stats['released']:
+            print(f"[INFO] 리소스 정리 결과: {stats}")
+        return stats
+
+    # ---------- 주기 정리 ----------
+    def start_sweeper(self, interval: int = RESOURCE_SWEEP_INTERVAL):
+        """백그라운드 정리 스레드를 시작합니다. (interval이 0 이하이면 시작하지 않음)"""
+        if interval <= 0 or (self._sweeper and self._sweeper.is_alive()):
+            return
+        self._stop_event.clear()
+
+        def run():
+            while not self._stop_event.wait(interval):
+                try:
+                    self.sweep()
+                except Exception as e:
+                    print(f"[ERROR] 리소스 정리 실패: {e}")
+
+        self._sweeper = threading.Thread(target=run, name="resource-sweeper", daemon=True)
+        self._sweeper.start()
+        print(f"[DEBUG] 리소스 정리 스레드 시작 (주기: {interval}초)")
+
+    def stop_sweeper(self):
+        self._stop_event.set()
+
+
+resource_manager = ResourceManager()
@@ -0,0 +1,416 @@
+"""
+저장소 인덱스 검색 보조 모듈
+
+질문에서 추출한 범위(파일/디렉토리/클래스/함수)를 벡터 검색의 메타데이터 필터(where)로
+변환하여, 범위가 지정된 질문은 인덱스의 해당 부분만 검색하도록 합니다.
+필터로 찾은 결과가 없으면 점차 조건을 완화하고, 마지막에는 전체 검색으로 돌아갑니다.
+
+벡터 검색 결과는 BM25 어휘 검색 결과와 reciprocal-rank fusion으로 결합할 수 있고,
+식별자만으로 된 질문은 임베딩 없이 어휘 검색만으로 처리할 수 있습니다.
+
+retrieve_candidates는 컨텍스트 패킹 전 단계를 묶은 파이프라인입니다.
+
+    1. 후보 과다 검색 (fetch_k개, 저장소 크기별 프로필)
+    2. MMR(maximal marginal relevance)로 비슷한 청크를 걸러 mmr_k개 선택
+    3. 로컬 재순위기(reranker 모듈)로 점수 부여 후 정렬
+"""
+
+import os
+import re
+import time
+from typing import Optional, List, Dict, Any, Tuple
+
+import numpy as np
+
+from lexical_index import reciprocal_rank_fusion, tokenize
+from reranker import get_reranker
+from metrics import metrics
+
+IDENTIFIER_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+# ----------------- 검색 파이프라인 설정 -----------------
+# 저장소 크기(청크 수)별 (최대 청크 수, 과다 검색 후보 수, MMR 후 남길 수). 큰 저장소일수록 넓게 가져옴
+RETRIEVAL_PROFILES = [
+    (500, 20, 12),
+    (5000, 40, 15),
+    (None, 60, 20),
+]
+RETRIEVAL_FETCH_K = int(os.environ.get("RETRIEVAL_FETCH_K", 0))  # 후보 수 직접 지정 (0이면 프로필 사용)
+RETRIEVAL_MMR_K = int(os.environ.get("RETRIEVAL_MMR_K", 0))  # MMR 후 남길 수 직접 지정 (0이면 프로필 사용)
+MMR_LAMBDA = float(os.environ.get("MMR_LAMBDA", 0.7))  # 관련도 가중치 (1이면 다양성 무시)
+
+
+def _unique(values):
+    seen = []
+    for value in values:
+        if value and value not in seen:
+            seen.append(value)
+    return seen
+
+
+def _session_paths(files) -> List[str]:
+    """세션 파일 목록(dict 또는 경로 문자열)에서 경로만 추출"""
+    paths = []
+    for f in files or []:
+        path = f.get('path') if isinstance(f, dict) else f
+        if path:
+            paths.append(path.replace('\\', '/'))
+    return paths
+
+
+def resolve_scope_paths(scope: Dict[str, List[str]], files) -> List[str]:
+    """
+    질문에 등장한 파일명/디렉토리명을 세션의 실제 파일 경로로 변환합니다.
+
+    파일명이 하나라도 매칭되면 파일 경로만 사용하고, 없을 때만 디렉토리 접두어로 찾습니다.
+    ("src/utils.py" 같은 질문에서 디렉토리 "src" 전체로 범위가 넓어지지 않도록)
+
+    Args:
+        scope (dict): extract_scope_from_question 결과
+        files: 세션 파일 목록
+
+    Returns:
+        List[str]: 범위에 해당하는 파일 경로 목록
+    """
+    paths = _session_paths(files)
+    matched = []
+    for token in scope.get('file') or []:
+        token = token.replace('\\', '/').removeprefix('./')
+        if not token:
+            continue
+        for path in paths:
+            if path == token or path.endswith('/' + token) or path.rsplit('/', 1)[-1] == token:
+                matched.append(path)
+    if matched:
+        return _unique(matched)
+    for directory in scope.get('directory') or []:
+        directory = directory.replace('\\', '/').removeprefix('./').strip('/')
+        if not directory:
+            continue
+        prefix = directory + '/'
+        for path in paths:
+            if path.startswith(prefix) or ('/' + prefix) in path:
+                matched.append(path)
+    return _unique(matched)
+
+
+def _in_filter(key: str, values: List[str]) -> Dict[str, Any]:
+    return {key: values[0]} if len(values) == 1 else {key: {'$in': values}}
+
+
+def _combine(conditions: List[Dict[str, Any]], op: str = '$and') -> Optional[Dict[str, Any]]:
+    conditions = [c for c in conditions if c]
+    if not conditions:
+        return None
+    if len(conditions) == 1:
+        return conditions[0]
+    return {op: conditions}
+
+
+def build_scope_filters(scope: Dict[str, List[str]], files) -> List[Dict[str, Any]]:
+    """
+    범위 정보를 구체적인 것부터 순서대로 where 필터 후보 목록으로 만듭니다.
+
+    1. 경로 AND (클래스 OR 함수)
+    2. 경로만
+    3. 클래스 OR 함수만
+
+    Returns:
+        List[dict]: 시도할 where 필터 목록 (범위가 없으면 빈 리스트)
+    """
+    paths = resolve_scope_paths(scope, files)
+    classes = _unique(c for c in scope.get('class') or [] if IDENTIFIER_PATTERN.match(c))
+    functions = _unique(f for f in scope.get('function') or [] if IDENTIFIER_PATTERN.match(f))
+
+    path_filter = _in_filter('path', paths) if paths else None
+    symbol_filter = _combine([
+        _in_filter('class_name', classes) if classes else None,
+        _in_filter('function_name', functions) if functions else None,
+    ], op='$or')
+
+    candidates = [
+        _combine([path_filter, symbol_filter]) if path_filter and symbol_filter else None,
+        path_filter,
+        symbol_filter,
+    ]
+    filters = []
+    for candidate in candidates:
+        if candidate and candidate not in filters:
+            filters.append(candidate)
+    return filters
+
+
+def _has_results(results) -> bool:
+    return bool(results and results.get('ids') and results['ids'][0])
+
+
+def scoped_query(collection, embedding, n_results: int, scope: Dict[str, List[str]], files,
+                 include: Optional[List[str]] = None) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    """
+    범위 필터를 적용해 검색하고, 결과가 없으면 조건을 완화하다가 전체 검색으로 돌아갑니다.
+
+    Args:
+        collection: 벡터 저장소 (VectorStore 또는 ChromaDB 컬렉션)
+        embedding: 질문 임베딩
+        n_results (int): 가져올 결과 수
+        scope (dict): extract_scope_from_question 결과
+        files: 세션 파일 목록 (경로 해석용)
+        include: 결과에 포함할 항목 (None이면 저장소 기본값, 임베딩이 필요하면 "embeddings" 추가)
+
+    Returns:
+        (검색 결과, 적용된 where 필터 또는 None)
+    """
+    extra = {'include': include} if include else {}
+    for where in build_scope_filters(scope, files):
+        try:
+            results = collection.query(query_embeddings=[embedding], n_results=n_results, where=where, **extra)
+        except Exception as e:
+            print(f"[WARNING] 범위 필터 검색 실패 (필터: {where}): {e}")
+            continue
+        if _has_results(results):
+            print(f"[DEBUG] 범위 필터 검색 적용: {where} ({len(results['ids'][0])}개)")
+            return results, where
+        print(f"[DEBUG] 범위 필터 결과 없음, 조건 완화: {where}")
+    return collection.query(query_embeddings=[embedding], n_results=n_results, **extra), None
+
+
+def _empty_results():
+    return {'ids': [[]], 'documents': [[]], 'metadatas': [[]], 'distances': [[]]}
+
+
+def retrieval_profile(chunk_count: Optional[int]) -> Tuple[int, int]:
+    """
+    저장소 크기에 맞는 (과다 검색 후보 수, MMR 후 남길 수)를 반환합니다.
+
+    RETRIEVAL_FETCH_K / RETRIEVAL_MMR_K 환경 변수가 설정되어 있으면 그 값을 우선합니다.
+    """
+    fetch_k, mmr_k = RETRIEVAL_PROFILES[-1][1:]
+    for max_chunks, profile_fetch_k, profile_mmr_k in RETRIEVAL_PROFILES:
+        if max_chunks is None or (chunk_count or 0) <= max_chunks:
+            fetch_k, mmr_k = profile_fetch_k, profile_mmr_k
+            break
+    fetch_k = RETRIEVAL_FETCH_K or fetch_k
+    mmr_k = min(RETRIEVAL_MMR_K or mmr_k, fetch_k)
+    return fetch_k, mmr_k
+
+
+def mmr_select(relevance: List[float], similarity: np.ndarray, k: int, lambda_mult: float = MMR_LAMBDA) -> List[int]:
+    """
+    maximal marginal relevance로 관련도가 높으면서 서로 덜 비슷한 후보 k개를 고릅니다.
+
+    Args:
+        relevance: 후보별 관련도 (클수록 관련)
+        similarity: 후보 간 유사도 행렬 (n x n)
+        k (int): 고를 개수
+        lambda_mult (float): 관련도 가중치
+
+    Returns:
+        List[int]: 선택 순서대로의 후보 인덱스
+    """
+    n = len(relevance)
+    if n <= k:
+        return list(range(n))
+    relevance = np.asarray(relevance, dtype=np.float32)
+    selected = [int(np.argmax(relevance))]
+    max_similarity = similarity[selected[0]].astype(np.float32).copy()
+    remaining = np.ones(n, dtype=bool)
+    remaining[selected[0]] = False
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~remaining] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        remaining[best] = False
+        np.maximum(max_similarity, similarity[best], out=max_similarity)
+    return selected
+
+
+def _similarity_matrix(embeddings: List[Any], documents: List[str]) -> np.ndarray:
+    """후보 간 코사인 유사도 (임베딩이 없는 후보가 있으면 토큰 집합 자카드 유사도)"""
+    if embeddings and all(e is not None for e in embeddings):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.maximum(norms, 1e-12)
+        return vectors @ vectors.T
+    token_sets = [set(tokenize(doc or '')) for doc in documents]
+    n = len(token_sets)
+    similarity = np.eye(n, dtype=np.float32)
+    for i in range(n):
+        for j in range(i + 1, n):
+            union = len(token_sets[i] | token_sets[j])
+            similarity[i, j] = similarity[j, i] = len(token_sets[i] & token_sets[j]) / union if union else 0.0
+    return similarity
+
+
+def _select_rows(results: Dict[str, Any], order: List[int]) -> Dict[str, Any]:
+    selected = _empty_results()
+    for key in ('ids', 'documents', 'metadatas', 'distances'):
+        selected[key][0] = [results[key][0][i] for i in order]
+    if _result_embeddings(results) is not None:
+        selected['embeddings'] = [[results['embeddings'][0][i] for i in order]]
+    return selected
+
+
+def _result_embeddings(results: Dict[str, Any]):
+    """검색 결과에 포함된 첫 질의의 임베딩 목록 (요청하지 않았으면 None)"""
+    embeddings = results.get('embeddings')
+    if embeddings is None or not len(embeddings):
+        return None
+    return embeddings[0]
+
+
+def _fetch_records(collection, ids: List[str], include: List[str]) -> Dict[str, Dict[str, Any]]:
+    """ID 목록의 본문/메타데이터(/임베딩)를 가져와 ID별 dict로 반환"""
+    if not ids:
+        return {}
+    records = collection.get(ids=ids, include=include)
+    fetched = {}
+    embeddings = records.get('embeddings') if 'embeddings' in include else None
+    for i, record_id in enumerate(records.get('ids') or []):
+        fetched[record_id] = {
+            'document': records['documents'][i],
+            'metadata': records['metadatas'][i],
+            'embedding': embeddings[i] if embeddings is not None and len(embeddings) > i else None,
+        }
+    return fetched
+
+
+def lexical_query(collection, lexical, question: str, n_results: int, scope: Dict[str, List[str]], files) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    """
+    임베딩 없이 BM25 어휘 검색만으로 결과를 만듭니다. (식별자 질문용)
+
+    거리 값은 최고 점수 대비 비율로 환산합니다. (최고 점수 = 0.0)
+
+    Returns:
+        (검색 결과, 적용된 where 필터 또는 None)
+    """
+    hits, applied = [], None
+    for where in build_scope_filters(scope, files) + [None]:
+        hits = lexical.search(question, n_results, where=where)
+        if hits:
+            applied = where
+            break
+    if not hits:
+        return _empty_results(), None
+    records = _fetch_records(collection, [record_id for record_id, _ in hits], ["documents", "metadatas"])
+    top_score = hits[0][1] or 1.0
+    results = _empty_results()
+    for record_id, score in hits:
+        record = records.get(record_id)
+        if record is None:
+            continue
+        results['ids'][0].append(record_id)
+        results['documents'][0].append(record['document'])
+        results['metadatas'][0].append(record['metadata'])
+        results['distances'][0].append(max(0.0, 1.0 - score / top_score))
+    print(f"[DEBUG] 어휘 검색 결과: {len(results['ids'][0])}개 (필터: {applied})")
+    return results, applied
+
+
+def hybrid_query(collection, lexical, embedding, question: str, n_results: int, scope: Dict[str, List[str]], files,
+                 with_embeddings: bool = False) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    """
+    벡터 검색과 BM25 어휘 검색을 reciprocal-rank fusion으로 결합합니다.
+
+    - embedding이 None이면 어휘 검색만 사용 (lexical_query)
+    - lexical이 None이면 벡터 검색만 사용 (scoped_query)
+    - 어휘 검색에만 나온 청크는 저장된 임베딩으로 실제 거리(제곱 L2)를 계산
+    - with_embeddings이면 벡터 검색에서 청크 임베딩도 함께 받아 결과에 'embeddings'로 포함 (MMR용, 추가 조회 없음)
+
+    Returns:
+        (검색 결과, 적용된 where 필터 또는 None)
+    """
+    if embedding is None:
+        return lexical_query(collection, lexical, question, n_results, scope, files)
+    include = ["documents", "metadatas", "distances", "embeddings"] if with_embeddings else None
+    results, where = scoped_query(collection, embedding, n_results, scope, files, include=include)
+    if lexical is None or not len(lexical):
+        return results, where
+    lexical_hits = lexical.search(question, n_results, where=where)
+    if not lexical_hits:
+        return results, where
+
+    vector_ids = results['ids'][0] if _has_results(results) else []
+    vector_embeddings = _result_embeddings(results)
+    by_id = {}
+    for i, record_id in enumerate(vector_ids):
+        by_id[record_id] = {
+            'document': results['documents'][0][i],
+            'metadata': results['metadatas'][0][i],
+            'distance': results['distances'][0][i],
+            'embedding': vector_embeddings[i] if vector_embeddings is not None else None,
+        }
+    fused = reciprocal_rank_fusion([vector_ids, [record_id for record_id, _ in lexical_hits]])[:n_results]
+    missing = [record_id for record_id, _ in fused if record_id not in by_id]
+    if missing:
+        query_vector = np.asarray(embedding, dtype=np.float32)
+        for record_id, record in _fetch_records(collection, missing, ["documents", "metadatas", "embeddings"]).items():
+            distance = 1.0
+            if record['embedding'] is not None:
+                diff = np.asarray(record['embedding'], dtype=np.float32) - query_vector
+                distance = float(np.dot(diff, diff))
+            by_id[record_id] = {'document': record['document'], 'metadata': record['metadata'], 'distance': distance,
+                                'embedding': record['embedding']}
+
+    fused_results = _empty_results()
+    if with_embeddings:
+        fused_results['embeddings'] = [[]]
+    for record_id, _ in fused:
+        record = by_id.get(record_id)
+        if record is None:
+            continue
+        fused_results['ids'][0].append(record_id)
+        fused_results['documents'][0].append(record['document'])
+        fused_results['metadatas'][0].append(record['metadata'])
+        fused_results['distances'][0].append(record['distance'])
+        if with_embeddings:
+            fused_results['embeddings'][0].append(record['embedding'])
+    print(f"[DEBUG] 하이브리드 검색: 벡터 {len(vector_ids)}개 + 어휘 {len(lexical_hits)}개 -> {len(fused_results['ids'][0])}개 (어휘 전용 {len(missing)}개)")
+    return fused_results, where
+
+
+def retrieve_candidates(collection, lexical, embedding, question: str, scope: Dict[str, List[str]], files,
+                        chunk_count: Optional[int] = None, reranker=None) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    """
+    과다 검색 → MMR 다양화 → 재순위를 거친 후보 목록을 반환합니다.
+
+    결과에는 재순위 점수(0~1)가 'rerank_scores'로 추가되며, 재순위 점수 내림차순으로 정렬됩니다.
+    단계별 소요 시간은 metrics에 "retrieval.<단계>"로 기록됩니다.
+
+    Returns:
+        (검색 결과, 적용된 where 필터 또는 None)
+    """
+    fetch_k, mmr_k = retrieval_profile(chunk_count)
+    timings = {}
+
+    started = time.perf_counter()
+    results, where = hybrid_query(collection, lexical, embedding, question, fetch_k, scope, files,
+                                  with_embeddings=embedding is not None)
+    timings['fetch'] = time.perf_counter() - started
+    if not _has_results(results):
+        return results, where
+    candidate_count = len(results['ids'][0])
+
+    started = time.perf_counter()
+    if candidate_count > mmr_k:
+        distances = results['distances'][0]
+        relevance = [1.0 / (1.0 + d) for d in distances]
+        embeddings = _result_embeddings(results)  # 벡터 검색에서 함께 받은 임베딩 (어휘 검색만 했으면 None)
+        similarity = _similarity_matrix(list(embeddings) if embeddings is not None else [], results['documents'][0])
+        results = _select_rows(results, mmr_select(relevance, similarity, mmr_k, MMR_LAMBDA))
+    timings['mmr'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    reranker = reranker or get_reranker()
+    scores = reranker.score(question, results['documents'][0], results['metadatas'][0])
+    order = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+    results = _select_rows(results, order)
+    results['rerank_scores'] = [[scores[i] for i in order]]
+    timings['rerank'] = time.perf_counter() - started
+
+    for stage, seconds in timings.items():
+        metrics.observe(f"retrieval.{stage}", seconds)
+    timing_text = ', '.join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in timings.items())
+    print(f"[DEBUG] 검색 파이프라인: 후보 {candidate_count}개(fetch_k={fetch_k}) -> MMR {len(results['ids'][0])}개 "
+          f"-> 재순위({reranker.name}) [{timing_text}]")
+    return results, where
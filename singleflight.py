@@ -0,0 +1,232 @@
+"""
+진행 중인 동일 요청 합치기(single-flight) 모듈
+
+더블 클릭, 클라이언트 재시도, 여러 팀원이 같은 저장소에 같은 질문을 동시에 보내면 요청마다
+임베딩 → 검색 → 태깅 → gpt-4o 호출을 따로 실행합니다. 같은 키의 요청이 이미 진행 중이면 새 요청은
+그 계산에 붙어 결과와 토큰 스트림을 함께 받습니다.
+
+    - 먼저 온 요청(leader)이 답변 생성기를 실행하고, LLM 토큰 조각을 Flight에 기록
+    - 뒤에 온 요청(follower)은 기록된 토큰을 처음부터 이어 받고, leader가 끝나면 같은 최종 결과를 사용
+    - leader가 실패하거나(예외, 'error'가 담긴 결과) 중간에 끊기면 follower는 각자 생성기를 직접 실행
+    - 단, follower가 이미 leader의 토큰을 받아 내보냈다면 다시 실행하지 않음 (같은 답변이 두 번 이어 붙지 않도록)
+      leader의 오류 결과가 있으면 그대로 쓰고, 없으면 FlightFailed 예외를 냄
+
+답변 생성기는 pipeline 모듈의 규약(LLM 호출 객체를 yield해 전체 응답을 돌려받고 최종 결과를 return)을 따릅니다.
+합쳐진 요청 수(= 아낀 LLM 호출 수)는 metrics에 "<이름>.coalesced"로 기록됩니다.
+"""
+
+import os
+import time
+import asyncio
+import threading
+from typing import Any, Callable, Dict, Generator, Hashable, Optional
+
+from metrics import metrics
+
+SINGLEFLIGHT_ENABLED = os.environ.get("SINGLEFLIGHT_ENABLED", "1") == "1"  # 동일 요청 합치기 사용 여부
+SINGLEFLIGHT_WAIT_TIMEOUT = float(os.environ.get("SINGLEFLIGHT_WAIT_TIMEOUT", 180))  # follower가 leader를 기다릴 최대 시간(초)
+SINGLEFLIGHT_POLL_INTERVAL = 0.05  # 비동기 follower가 새 토큰을 확인하는 간격(초)
+
+
+class FlightFailed(RuntimeError):
+    """follower가 leader의 토큰을 이미 내보낸 뒤 leader가 실패해 직접 처리할 수 없을 때"""
+
+
+class Flight:
+    """진행 중인 계산 하나 (leader가 쓰고 follower들이 읽는 토큰 기록과 최종 결과)"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self.tokens = []
+        self.stream_closed = False  # leader의 LLM 스트림이 끝났는지
+        self.done = False
+        self.result = None
+        self.failed = False
+
+    def append(self, token: str):
+        with self._cond:
+            self.tokens.append(token)
+            self._cond.notify_all()
+
+    def close_stream(self):
+        with self._cond:
+            self.stream_closed = True
+            self._cond.notify_all()
+
+    def finish(self, result: Optional[Dict[str, Any]], failed: bool = False):
+        with self._cond:
+            self.result = result
+            self.failed = failed
+            self.stream_closed = True
+            self.done = True
+            self._cond.notify_all()
+
+    def read(self, start: int, timeout: Optional[float] = None):
+        """
+        start 이후의 토큰을 반환합니다. 새 토큰이 없으면 timeout까지 기다립니다. (None이면 기다리지 않음)
+
+        Returns:
+            (토큰 목록, 스트림 종료 여부)
+        """
+        with self._cond:
+            if timeout is not None:
+                self._cond.wait_for(lambda: len(self.tokens) > start or self.stream_closed, timeout)
+            return self.tokens[start:], self.stream_closed and len(self.tokens) <= start
+
+    def wait(self, timeout: float) -> bool:
+        """leader가 끝날 때까지 기다립니다. 제한 시간 안에 성공적으로 끝났으면 True"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.done, timeout)
+            return self.done and not self.failed
+
+    def publish(self, call):
+        """leader의 LLM 호출을 감싸 토큰 조각을 Flight에도 기록합니다."""
+        return _PublishedCall(self, call)
+
+    def follow(self):
+        """follower용 LLM 호출 대용: leader가 기록한 토큰을 처음부터 이어 받음"""
+        return _FollowCall(self)
+
+
+class _PublishedCall:
+    def __init__(self, flight: Flight, call):
+        self.flight = flight
+        self.call = call
+
+    def run(self):
+        try:
+            for token in self.call.run():
+                self.flight.append(token)
+                yield token
+        finally:
+            self.flight.close_stream()
+
+    async def arun(self):
+        try:
+            async for token in self.call.arun():
+                self.flight.append(token)
+                yield token
+        finally:
+            self.flight.close_stream()
+
+
+class _FollowCall:
+    def __init__(self, flight: Flight):
+        self.flight = flight
+        self.position = 0  # 내보낸 토큰 수
+
+    def run(self):
+        deadline = time.monotonic() + SINGLEFLIGHT_WAIT_TIMEOUT
+        while time.monotonic() < deadline:
+            tokens, closed = self.flight.read(self.position, timeout=max(0.0, deadline - time.monotonic()))
+            for token in tokens:
+                self.position += 1
+                yield token
+            if closed:
+                return
+
+    async def arun(self):
+        deadline = time.monotonic() + SINGLEFLIGHT_WAIT_TIMEOUT
+        while time.monotonic() < deadline:
+            tokens, closed = self.flight.read(self.position)
+            for token in tokens:
+                self.position += 1
+                yield token
+            if closed:
+                return
+            if not tokens:
+                await asyncio.sleep(SINGLEFLIGHT_POLL_INTERVAL)
+
+
+class SingleFlight:
+    """
+    키별 진행 중인 Flight 모음 (스레드 안전)
+
+    Args:
+        name (str): metrics에 기록할 이름
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._flights = {}  # 키 -> Flight
+
+    def join(self, key: Hashable):
+        """
+        키의 진행 중인 Flight에 붙거나 새로 시작합니다.
+
+        Returns:
+            (Flight, leader 여부)
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                metrics.increment(f"{self.name}.coalesced")
+                return flight, False
+            flight = self._flights[key] = Flight()
+            metrics.increment(f"{self.name}.leader")
+            return flight, True
+
+    def finish(self, key: Hashable, flight: Flight, result: Optional[Dict[str, Any]], failed: bool = False):
+        """Flight를 끝내고 목록에서 뺍니다. (이후 같은 키의 요청은 새로 계산)"""
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.finish(result, failed)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._flights)
+
+    def events(self, key: Hashable, make_events: Callable[[], Generator],
+               on_shared: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None) -> Generator:
+        """
+        답변 생성기를 합쳐서 실행하는 생성기 (pipeline 규약)
+
+        Args:
+            key: 합칠 요청을 구분하는 키
+            make_events: 답변 생성기를 만드는 함수 (leader이거나 leader가 실패했을 때 호출)
+            on_shared: follower가 leader의 최종 결과를 받았을 때 자기 요청용으로 처리하는 함수
+
+        leader의 결과 dict에 'error'가 있으면(검색 실패, 세션 없음 등) 실패로 보고 follower가 직접 처리합니다.
+        """
+        if not SINGLEFLIGHT_ENABLED:
+            return (yield from make_events())
+
+        flight, leader = self.join(key)
+        if not leader:
+            print(f"[INFO] 진행 중인 같은 요청에 합류합니다: {self.name} {key}")
+            follow = flight.follow()
+            yield follow
+            if flight.wait(SINGLEFLIGHT_WAIT_TIMEOUT):
+                return on_shared(flight.result) if on_shared else flight.result
+            if follow.position:
+                # 이미 내보낸 토큰 뒤에 새 답변을 이어 붙일 수 없으므로 직접 처리하지 않음
+                print(f"[WARNING] 합류한 요청이 토큰 스트리밍 중 실패했습니다: {self.name} {key}")
+                metrics.increment(f"{self.name}.failed_after_stream")
+                if flight.result is not None:
+                    return on_shared(flight.result) if on_shared else flight.result
+                raise FlightFailed(f"같은 요청을 처리하던 작업이 중간에 실패했습니다: {self.name}")
+            print(f"[WARNING] 합류한 요청이 실패하거나 제한 시간을 넘겨 직접 처리합니다: {self.name} {key}")
+            metrics.increment(f"{self.name}.fallback")
+            return (yield from make_events())
+
+        events = make_events()
+        result, failed = None, True
+        try:
+            value, error = None, None
+            while True:
+                try:
+                    # LLM 호출 실패는 답변 생성기 안으로 던져 생성기가 오류 응답을 만들게 함 (pipeline._advance와 같은 규약)
+                    call = events.throw(error) if error is not None else events.send(value)
+                except StopIteration as stop:
+                    result = stop.value
+                    failed = isinstance(result, dict) and bool(result.get('error'))
+                    return result
+                value, error = None, None
+                try:
+                    value = yield flight.publish(call)
+                except Exception as e:
+                    error = e
+        finally:
+            self.finish(key, flight, result, failed)
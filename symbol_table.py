@@ -0,0 +1,220 @@
+"""
+저장소 심볼 테이블 모듈
+
+인제스트 시 청커(chunk_python_functions, chunk_js)가 찾은 클래스/함수/메소드 정의를
+정규화된 이름(qualified name) 기준으로 저장하여, 이름이 언급된 질문은 임베딩이나
+벡터 검색 없이 정의 위치를 바로 찾을 수 있도록 합니다.
+
+    - lookup / definitions: 이름 → 정의 목록 (경로, 시작·끝 라인, 종류, 부모)
+    - usages: 이름 → 사용 위치 목록 (경로, 라인)
+    - find_in_text: 질문에 등장한 심볼 찾기
+"""
+
+import os
+import re
+import json
+import threading
+from typing import Optional, List, Dict, Any
+
+IDENTIFIER_PATTERN = re.compile(r'[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)*')
+USAGE_PATTERN = re.compile(r'\b[A-Za-z_][A-Za-z0-9_]*\b')
+MAX_USAGES_PER_SYMBOL = 200  # 심볼당 저장할 최대 사용 위치 수
+MIN_SYMBOL_NAME_LENGTH = 3  # 질문에서 찾을 최소 심볼 이름 길이 (짧은 이름의 오탐 방지)
+
+
+class SymbolTable:
+    """
+    정규화된 이름 → 정의 정보 테이블
+
+    정의 항목 형식:
+        {'name': 'load_repo_data', 'qualified_name': 'GitHubRepositoryFetcher.load_repo_data',
+         'path': 'github_analyzer.py', 'start_line': 10, 'end_line': 30,
+         'kind': 'method', 'parent': 'GitHubRepositoryFetcher'}
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.definitions_by_name = {}  # qualified_name -> [정의, ...] (같은 이름이 여러 파일에 있을 수 있음)
+        self.short_names = {}  # 짧은 이름(소문자) -> {qualified_name, ...}
+        self.usages_by_name = {}  # 짧은 이름 -> [[path, line], ...]
+
+    def __len__(self):
+        return sum(len(entries) for entries in self.definitions_by_name.values())
+
+    def add(self, name: str, path: str, start_line: int, end_line: int, kind: str, parent: Optional[str] = None):
+        """
+        정의를 추가합니다.
+
+        Args:
+            name (str): 심볼 이름
+            path (str): 파일 경로
+            start_line (int): 시작 라인 (1부터)
+            end_line (int): 끝 라인 (포함)
+            kind (str): class | function | method
+            parent (str): 부모 클래스/함수의 정규화된 이름 (선택)
+        """
+        if not name or not path:
+            return
+        qualified_name = f"{parent}.{name}" if parent else name
+        entry = {
+            'name': name,
+            'qualified_name': qualified_name,
+            'path': path,
+            'start_line': start_line,
+            'end_line': end_line,
+            'kind': kind,
+            'parent': parent or '',
+        }
+        with self._lock:
+            entries = self.definitions_by_name.setdefault(qualified_name, [])
+            if any(e['path'] == path and e['start_line'] == start_line for e in entries):
+                return
+            entries.append(entry)
+            self.short_names.setdefault(name.lower(), set()).add(qualified_name)
+
+    def lookup(self, name: str) -> List[Dict[str, Any]]:
+        """
+        이름으로 정의를 찾습니다. 정규화된 이름이 정확히 일치하면 그 정의만,
+        아니면 짧은 이름(대소문자 무시)이 같은 모든 정의를 반환합니다.
+        """
+        with self._lock:
+            if name in self.definitions_by_name:
+                return list(self.definitions_by_name[name])
+            short = name.rsplit('.', 1)[-1].lower()
+            found = []
+            for qualified_name in sorted(self.short_names.get(short, ())):
+                found.extend(self.definitions_by_name.get(qualified_name, []))
+            return found
+
+    def definitions(self, name: str) -> List[Dict[str, Any]]:
+        """'X는 어디에 정의되어 있나' 질문용 별칭"""
+        return self.lookup(name)
+
+    def definitions_in_file(self, path: str) -> List[Dict[str, Any]]:
+        """파일 하나에 있는 모든 정의 (시작 라인 순)"""
+        with self._lock:
+            found = [e for entries in self.definitions_by_name.values() for e in entries if e['path'] == path]
+        return sorted(found, key=lambda e: (e['start_line'] or 0, -(e['end_line'] or 0)))
+
+    def usages(self, name: str) -> List[Dict[str, Any]]:
+        """
+        이름이 사용된 위치를 반환합니다. (정의 라인 제외)
+
+        Returns:
+            [{'path': ..., 'line': ...}, ...]
+        """
+        short = name.rsplit('.', 1)[-1]
+        with self._lock:
+            return [{'path': path, 'line': line} for path, line in self.usages_by_name.get(short, [])]
+
+    def index_usages(self, files: List[Dict[str, Any]]):
+        """
+        파일 내용을 한 번씩 훑어 알려진 심볼 이름의 사용 위치를 기록합니다.
+
+        Args:
+            files: [{'path': ..., 'content': ...}, ...]
+        """
+        with self._lock:
+            names = {entries[0]['name'] for entries in self.definitions_by_name.values() if entries}
+            definition_lines = {
+                (e['path'], e['start_line'])
+                for entries in self.definitions_by_name.values() for e in entries
+            }
+            usages = {}
+            for f in files:
+                path = f.get('path')
+                content = f.get('content') or ''
+                for line_no, line in enumerate(content.splitlines(), start=1):
+                    for word in set(USAGE_PATTERN.findall(line)):
+                        if word not in names or (path, line_no) in definition_lines:
+                            continue
+                        locations = usages.setdefault(word, [])
+                        if len(locations) < MAX_USAGES_PER_SYMBOL:
+                            locations.append([path, line_no])
+            self.usages_by_name = usages
+
+    def find_in_text(self, text: str, names: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        텍스트(질문)에 등장하는 심볼의 정의를 찾습니다.
+
+        일반 단어와의 오탐을 줄이기 위해 코드 식별자 모양(snake_case, camelCase, "Class.method")인
+        토큰만 매칭하며, names로 넘긴 이름(예: "X 함수"처럼 질문에서 명시된 이름)은 모양과 무관하게 매칭합니다.
+        """
+        found, seen = [], set()
+        tokens = [t for t in IDENTIFIER_PATTERN.findall(text or '') if looks_like_code(t)]
+        tokens.extend(names or [])
+        for token in tokens:
+            if len(token) < MIN_SYMBOL_NAME_LENGTH:
+                continue
+            for entry in self.lookup(token):
+                key = (entry['qualified_name'], entry['path'], entry['start_line'])
+                if key not in seen:
+                    seen.add(key)
+                    found.append(entry)
+        return found
+
+    def save(self, path: str):
+        """테이블을 JSON 파일로 저장합니다. (임시 파일에 쓴 뒤 교체)"""
+        with self._lock:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'definitions': self.definitions_by_name,
+                    'usages': self.usages_by_name,
+                }, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            print(f"[DEBUG] 심볼 테이블 저장: {path} ({len(self)}개 정의)")
+
+    @classmethod
+    def load(cls, path: str) -> Optional['SymbolTable']:
+        """
+        저장된 테이블을 불러옵니다.
+
+        Returns:
+            SymbolTable 또는 None (파일이 없거나 읽기 실패)
+        """
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"[WARNING] 심볼 테이블 로드 실패: {e}")
+            return None
+        table = cls()
+        table.definitions_by_name = data.get('definitions', {})
+        table.usages_by_name = data.get('usages', {})
+        for qualified_name, entries in table.definitions_by_name.items():
+            for entry in entries:
+                table.short_names.setdefault(entry['name'].lower(), set()).add(qualified_name)
+        return table
+
+
+def looks_like_code(token: str) -> bool:
+    """snake_case, camelCase/PascalCase(대문자 두 개 이상), 점으로 연결된 이름인지 확인"""
+    return '_' in token.strip('_') or '.' in token or sum(1 for c in token if c.isupper()) >= 2 or \
+        (token[:1].islower() and any(c.isupper() for c in token))
+
+
+def read_symbol_source(repo_path: str, entry: Dict[str, Any]) -> Optional[str]:
+    """
+    로컬 저장소 클론에서 심볼 정의 부분의 소스를 읽습니다.
+
+    Args:
+        repo_path (str): 로컬 저장소 경로
+        entry (dict): 심볼 정의 항목
+
+    Returns:
+        str 또는 None (파일이 없거나 읽기 실패)
+    """
+    file_path = os.path.join(repo_path, entry['path'])
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    except Exception as e:
+        print(f"[WARNING] 심볼 소스 읽기 실패 ({file_path}): {e}")
+        return None
+    start = max(1, entry.get('start_line') or 1)
+    end = entry.get('end_line') or start
+    return '\n'.join(lines[start - 1:end])
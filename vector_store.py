@@ -0,0 +1,524 @@
+"""
+벡터 저장소 추상화 모듈
+
+저장소 인덱스(repo_*)를 저장·검색하는 엔진을 교체할 수 있도록
+공통 인터페이스(VectorStore)와 두 가지 구현을 제공합니다.
+
+    - NumpyVectorStore: 메모리 매핑된 .npy 벡터 + 컬럼형 메타데이터 파일을 쓰는
+      프로세스 내 완전 탐색 엔진 (소·중형 저장소용)
+    - ChromaVectorStore: 기존 ChromaDB 컬렉션 래퍼 (대형 저장소용)
+
+두 엔진 모두 ChromaDB query()와 같은 형태의 결과(ids/documents/metadatas/distances)를
+반환하며, 거리는 ChromaDB 기본값과 같은 제곱 L2 거리입니다.
+
+VECTOR_STORE_MODE=server이면 모든 앱 워커가 하나의 ChromaDB 서버(vector_store_server.py)에
+접속하고, 프로세스마다 따로 열리는 NumPy 엔진은 사용하지 않습니다.
+"""
+
+import os
+import json
+import shutil
+import threading
+from collections import OrderedDict
+from typing import Optional, List, Dict, Any, Callable
+
+import numpy as np
+import chromadb
+
+# ----------------- 상수 정의 -----------------
+VECTOR_STORE_MODE = os.environ.get("VECTOR_STORE_MODE", "embedded")  # embedded (프로세스 내) | server (공유 서버)
+VECTOR_STORE_HOST = os.environ.get("VECTOR_STORE_HOST", "localhost")  # 공유 벡터 저장소 서버 호스트
+VECTOR_STORE_PORT = int(os.environ.get("VECTOR_STORE_PORT", 8001))  # 공유 벡터 저장소 서버 포트
+VECTOR_ENGINE = os.environ.get("VECTOR_ENGINE", "auto")  # auto | numpy | chroma
+NUMPY_ENGINE_MAX_CHUNKS = int(os.environ.get("NUMPY_ENGINE_MAX_CHUNKS", 50000))  # 이 청크 수 이하면 NumPy 엔진 사용
+NUMPY_STORE_CACHE_SIZE = int(os.environ.get("NUMPY_STORE_CACHE_SIZE", 64))  # 동시에 열어둘 NumPy 저장소 수
+VECTORS_FILE = "vectors.npy"  # 벡터 행렬 파일 이름
+METADATA_FILE = "metadata.json"  # 컬럼형 메타데이터 파일 이름
+
+DEFAULT_INCLUDE = ["documents", "metadatas", "distances"]
+
+
+def is_server_mode() -> bool:
+    return VECTOR_STORE_MODE == "server"
+
+
+def create_chroma_client(path: str):
+    """
+    ChromaDB 클라이언트를 만듭니다.
+
+    - embedded: path에 저장하는 프로세스 내 PersistentClient
+    - server: VECTOR_STORE_HOST:VECTOR_STORE_PORT의 공유 서버에 접속하는 HttpClient
+      (서버가 응답하지 않으면 예외 발생)
+
+    Args:
+        path (str): embedded 모드에서 사용할 저장 경로
+    """
+    if is_server_mode():
+        client = chromadb.HttpClient(host=VECTOR_STORE_HOST, port=VECTOR_STORE_PORT)
+        client.heartbeat()
+        print(f"[DEBUG] 공유 벡터 저장소 서버 연결: {VECTOR_STORE_HOST}:{VECTOR_STORE_PORT}")
+        return client
+    os.makedirs(path, exist_ok=True)
+    return chromadb.PersistentClient(path=path)
+
+
+class VectorStore:
+    """
+    벡터 저장소 공통 인터페이스
+
+    결과 형식은 ChromaDB와 같습니다.
+        - query(): {'ids': [[...]], 'documents': [[...]], 'metadatas': [[...]], 'distances': [[...]]}
+        - get():   {'ids': [...], 'documents': [...], 'metadatas': [...]}
+    """
+
+    engine = None
+
+    def upsert(self, ids: List[str], embeddings: List[List[float]], documents: List[str], metadatas: List[Dict[str, Any]]):
+        raise NotImplementedError
+
+    def query(self, query_embeddings: List[List[float]], n_results: int = 5, where: Optional[Dict[str, Any]] = None, include: Optional[List[str]] = None) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None, include: Optional[List[str]] = None, limit: Optional[int] = None) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def flush(self):
+        """버퍼에 쌓인 쓰기를 디스크에 반영합니다. (필요 없는 엔진은 아무 것도 하지 않음)"""
+        pass
+
+    def drop(self) -> bool:
+        """저장소 데이터를 삭제합니다."""
+        raise NotImplementedError
+
+
+class ChromaVectorStore(VectorStore):
+    """ChromaDB 컬렉션을 VectorStore 인터페이스로 감싼 구현"""
+
+    engine = "chroma"
+
+    def __init__(self, registry, name: str, collection=None):
+        """
+        Args:
+            registry: 컬렉션 핸들 레지스트리 (CollectionRegistry)
+            name (str): 컬렉션 이름
+            collection: 이미 열린 컬렉션 핸들 (선택)
+        """
+        self.registry = registry
+        self.name = name
+        self.collection = collection if collection is not None else registry.get_or_create(name)
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+        self.registry.invalidate_count(self.name)
+
+    def query(self, query_embeddings, n_results=5, where=None, include=None):
+        kwargs = {'query_embeddings': query_embeddings, 'n_results': n_results, 'include': include or DEFAULT_INCLUDE}
+        if where:
+            kwargs['where'] = where
+        return self.collection.query(**kwargs)
+
+    def get(self, ids=None, where=None, include=None, limit=None):
+        kwargs = {'include': include or ["documents", "metadatas"]}
+        if ids is not None:
+            kwargs['ids'] = ids
+        if where:
+            kwargs['where'] = where
+        if limit is not None:
+            kwargs['limit'] = limit
+        return self.collection.get(**kwargs)
+
+    def count(self):
+        return self.registry.count(self.name) or 0
+
+    def drop(self):
+        return self.registry.delete(self.name)
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    메모리 매핑 NumPy 벡터 저장소
+
+    디렉토리 구조:
+        <path>/vectors.npy    float32 (N, D) 행렬 - 읽을 때 mmap_mode='r'로 매핑
+        <path>/metadata.json  {'ids': [...], 'documents': [...], 'columns': {키: [값, ...]}}
+
+    upsert는 메모리 버퍼에 쌓았다가 flush()에서 임시 파일에 쓴 뒤 교체하므로,
+    쓰는 도중에도 이전 스냅샷을 읽는 쪽은 영향을 받지 않습니다.
+    검색은 연속된 float32 행렬에 대한 행렬-벡터 곱 한 번으로 끝나는 완전 탐색입니다.
+    """
+
+    engine = "numpy"
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): 저장소 디렉토리 경로
+        """
+        self.path = path
+        self._lock = threading.RLock()
+        self._vectors = None  # (N, D) float32 (mmap 또는 메모리 배열)
+        self._sq_norms = None  # (N,) 각 벡터의 제곱 노름
+        self._ids = []
+        self._documents = []
+        self._columns = {}  # 메타데이터 키 -> 값 리스트
+        self._row_of = {}  # id -> 행 번호
+        self._column_arrays = {}  # 필터용 object 배열 캐시
+        self._pending = []  # 아직 행렬에 합치지 않은 새 벡터
+        self._updates = {}  # 기존 행 번호 -> 교체할 벡터
+        self._dirty = False
+        self._load()
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.exists(os.path.join(path, METADATA_FILE))
+
+    def _load(self):
+        """디스크의 스냅샷을 엽니다. (벡터는 메모리 매핑)"""
+        metadata_path = os.path.join(self.path, METADATA_FILE)
+        vectors_path = os.path.join(self.path, VECTORS_FILE)
+        if not os.path.exists(metadata_path):
+            return
+        with open(metadata_path, 'r', encoding='utf-8') as f:
+            sidecar = json.load(f)
+        self._ids = sidecar.get('ids', [])
+        self._documents = sidecar.get('documents', [])
+        self._columns = sidecar.get('columns', {})
+        self._row_of = {record_id: row for row, record_id in enumerate(self._ids)}
+        if self._ids and os.path.exists(vectors_path):
+            self._vectors = np.load(vectors_path, mmap_mode='r')
+            self._sq_norms = np.einsum('ij,ij->i', self._vectors, self._vectors)
+        print(f"[DEBUG] NumPy 벡터 저장소 로드: {self.path} ({len(self._ids)}개)")
+
+    def _materialize(self):
+        """버퍼에 쌓인 추가·교체 벡터를 행렬에 합칩니다."""
+        if not self._pending and not self._updates:
+            return
+        if self._updates:
+            vectors = np.array(self._vectors, dtype=np.float32)  # mmap은 읽기 전용이므로 복사
+            for row, vector in self._updates.items():
+                vectors[row] = vector
+        else:
+            vectors = self._vectors
+        if self._pending:
+            new_rows = np.asarray(self._pending, dtype=np.float32)
+            vectors = new_rows if vectors is None else np.concatenate([vectors, new_rows])
+        self._vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self._sq_norms = np.einsum('ij,ij->i', self._vectors, self._vectors)
+        self._pending = []
+        self._updates = {}
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        with self._lock:
+            for record_id, embedding, document, metadata in zip(ids, embeddings, documents, metadatas):
+                metadata = metadata or {}
+                row = self._row_of.get(record_id)
+                if row is None:
+                    row = len(self._ids)
+                    self._row_of[record_id] = row
+                    self._ids.append(record_id)
+                    self._documents.append(document)
+                    for values in self._columns.values():
+                        values.append(None)
+                    self._pending.append(embedding)
+                elif row >= len(self._ids) - len(self._pending):
+                    # 아직 행렬에 합쳐지지 않은 행
+                    self._documents[row] = document
+                    self._pending[row - (len(self._ids) - len(self._pending))] = embedding
+                else:
+                    self._documents[row] = document
+                    self._updates[row] = embedding
+                for key, value in metadata.items():
+                    if key not in self._columns:
+                        self._columns[key] = [None] * len(self._ids)
+                    self._columns[key][row] = value
+            self._column_arrays = {}
+            self._dirty = True
+
+    def flush(self):
+        """메모리 버퍼를 디스크에 씁니다. (임시 파일에 쓴 뒤 교체)"""
+        with self._lock:
+            if not self._dirty:
+                return
+            self._materialize()
+            os.makedirs(self.path, exist_ok=True)
+            vectors_path = os.path.join(self.path, VECTORS_FILE)
+            metadata_path = os.path.join(self.path, METADATA_FILE)
+            tmp_vectors = vectors_path + ".tmp"
+            tmp_metadata = metadata_path + ".tmp"
+            vectors = self._vectors if self._vectors is not None else np.zeros((0, 0), dtype=np.float32)
+            with open(tmp_vectors, 'wb') as f:
+                np.save(f, vectors)
+            with open(tmp_metadata, 'w', encoding='utf-8') as f:
+                json.dump({'ids': self._ids, 'documents': self._documents, 'columns': self._columns}, f, ensure_ascii=False)
+            os.replace(tmp_vectors, vectors_path)
+            os.replace(tmp_metadata, metadata_path)
+            if len(self._ids):
+                self._vectors = np.load(vectors_path, mmap_mode='r')
+            self._dirty = False
+            print(f"[DEBUG] NumPy 벡터 저장소 저장: {self.path} ({len(self._ids)}개)")
+
+    def count(self):
+        with self._lock:
+            return len(self._ids)
+
+    def _column(self, key):
+        """필터 비교용 object 배열 (없는 키는 None으로 채움)"""
+        array = self._column_arrays.get(key)
+        if array is None:
+            values = self._columns.get(key)
+            array = np.empty(len(self._ids), dtype=object)
+            if values is not None:
+                array[:] = values
+            self._column_arrays[key] = array
+        return array
+
+    def _where_mask(self, where):
+        """where 조건을 행별 불리언 마스크로 변환 (열 단위 비교)"""
+        return where_mask(where, self._column, len(self._ids))
+
+    def _metadata_at(self, row):
+        return {key: values[row] for key, values in self._columns.items() if values[row] is not None}
+
+    def query(self, query_embeddings, n_results=5, where=None, include=None):
+        include = include or DEFAULT_INCLUDE
+        with self._lock:
+            self._materialize()
+            queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+            result = {'ids': [], 'documents': [], 'metadatas': [], 'distances': [], 'embeddings': None}
+            if self._vectors is None or not len(self._ids):
+                for _ in range(len(queries)):
+                    for key in ('ids', 'documents', 'metadatas', 'distances'):
+                        result[key].append([])
+                return result
+            rows = np.flatnonzero(self._where_mask(where)) if where else None
+            vectors = self._vectors if rows is None else self._vectors[rows]
+            sq_norms = self._sq_norms if rows is None else self._sq_norms[rows]
+            # 제곱 L2 거리: |q|^2 + |v|^2 - 2 q·v  (배치 질의는 행렬곱 한 번)
+            distances = np.einsum('ij,ij->i', queries, queries)[:, None] + sq_norms[None, :] - 2.0 * (queries @ vectors.T)
+            np.maximum(distances, 0.0, out=distances)
+            k = min(n_results, distances.shape[1])
+            if 'embeddings' in include:
+                result['embeddings'] = []
+            for q_distances in distances:
+                if k == 0:
+                    top = np.array([], dtype=int)
+                elif k < len(q_distances):
+                    top = np.argpartition(q_distances, k - 1)[:k]
+                    top = top[np.argsort(q_distances[top], kind='stable')]
+                else:
+                    top = np.argsort(q_distances, kind='stable')
+                selected = top if rows is None else rows[top]
+                result['ids'].append([self._ids[row] for row in selected])
+                result['documents'].append([self._documents[row] for row in selected] if 'documents' in include else None)
+                result['metadatas'].append([self._metadata_at(row) for row in selected] if 'metadatas' in include else None)
+                result['distances'].append([float(d) for d in q_distances[top]] if 'distances' in include else None)
+                if 'embeddings' in include:
+                    result['embeddings'].append(np.asarray(self._vectors[selected]))
+            return result
+
+    def get(self, ids=None, where=None, include=None, limit=None):
+        include = include or ["documents", "metadatas"]
+        with self._lock:
+            if ids is not None:
+                selected = [self._row_of[record_id] for record_id in ids if record_id in self._row_of]
+                if where:
+                    mask = self._where_mask(where)
+                    selected = [row for row in selected if mask[row]]
+            else:
+                selected = np.flatnonzero(self._where_mask(where)).tolist()
+            if limit is not None:
+                selected = selected[:limit]
+            result = {'ids': [self._ids[row] for row in selected]}
+            result['documents'] = [self._documents[row] for row in selected] if 'documents' in include else None
+            result['metadatas'] = [self._metadata_at(row) for row in selected] if 'metadatas' in include else None
+            if 'embeddings' in include:
+                self._materialize()
+                result['embeddings'] = np.asarray(self._vectors[selected]) if selected else []
+            return result
+
+    def drop(self):
+        with self._lock:
+            self._vectors = None
+            self._sq_norms = None
+            self._ids, self._documents, self._columns = [], [], {}
+            self._row_of, self._column_arrays = {}, {}
+            self._pending, self._updates = [], {}
+            self._dirty = False
+            if os.path.exists(self.path):
+                shutil.rmtree(self.path, ignore_errors=True)
+                return True
+            return False
+
+
+# ----------------- 엔진 선택 및 저장소 열기 -----------------
+_numpy_stores = OrderedDict()  # 경로 -> NumpyVectorStore (LRU)
+_numpy_stores_lock = threading.Lock()
+
+
+def _cached_numpy_store(path: str) -> NumpyVectorStore:
+    """같은 경로의 NumPy 저장소는 한 번만 로드하여 재사용합니다."""
+    with _numpy_stores_lock:
+        store = _numpy_stores.get(path)
+        if store is None:
+            store = NumpyVectorStore(path)
+            _numpy_stores[path] = store
+        _numpy_stores.move_to_end(path)
+        while len(_numpy_stores) > max(1, NUMPY_STORE_CACHE_SIZE):
+            evicted, _ = _numpy_stores.popitem(last=False)
+            print(f"[DEBUG] NumPy 저장소 캐시에서 제거: {evicted}")
+        return store
+
+
+def forget_numpy_store(path: str):
+    """캐시된 NumPy 저장소를 내보냅니다. (디스크 데이터는 유지)"""
+    with _numpy_stores_lock:
+        _numpy_stores.pop(path, None)
+
+
+def is_numpy_store_cached(path: str) -> bool:
+    """NumPy 저장소가 메모리에 올라와 있는지 확인합니다."""
+    with _numpy_stores_lock:
+        return path in _numpy_stores
+
+
+def select_engine(expected_chunks: int) -> str:
+    """
+    인덱스 크기에 따라 사용할 엔진을 결정합니다.
+
+    Args:
+        expected_chunks (int): 저장할 청크 수
+
+    Returns:
+        str: 'numpy' 또는 'chroma'
+    """
+    if is_server_mode():
+        # NumPy 엔진은 프로세스별 캐시이므로 여러 워커가 공유할 수 없음
+        return "chroma"
+    if VECTOR_ENGINE in ("numpy", "chroma"):
+        return VECTOR_ENGINE
+    return "numpy" if expected_chunks <= NUMPY_ENGINE_MAX_CHUNKS else "chroma"
+
+
+def open_vector_store(name: str, registry, numpy_root: str) -> Optional[VectorStore]:
+    """
+    이미 만들어진 저장소를 엽니다. NumPy 저장소가 있으면 우선 사용합니다.
+
+    Args:
+        name (str): 저장소(컬렉션) 이름
+        registry: ChromaDB 컬렉션 레지스트리
+        numpy_root (str): NumPy 저장소 루트 디렉토리
+
+    Returns:
+        VectorStore 또는 None (어느 엔진에도 없는 경우)
+    """
+    path = os.path.join(numpy_root, name)
+    if not is_server_mode() and NumpyVectorStore.exists(path):
+        return _cached_numpy_store(path)
+    collection = registry.get(name)
+    if collection is None:
+        return None
+    return ChromaVectorStore(registry, name, collection)
+
+
+def create_vector_store(name: str, registry, numpy_root: str, expected_chunks: int) -> VectorStore:
+    """
+    쓰기용 저장소를 준비합니다. 선택되지 않은 엔진에 남은 같은 이름의 데이터는 삭제합니다.
+
+    Args:
+        name (str): 저장소(컬렉션) 이름
+        registry: ChromaDB 컬렉션 레지스트리
+        numpy_root (str): NumPy 저장소 루트 디렉토리
+        expected_chunks (int): 저장할 청크 수
+
+    Returns:
+        VectorStore
+    """
+    engine = select_engine(expected_chunks)
+    path = os.path.join(numpy_root, name)
+    print(f"[INFO] 벡터 엔진 선택: {engine} (청크 수: {expected_chunks}, 기준: {NUMPY_ENGINE_MAX_CHUNKS})")
+    if engine == "numpy":
+        if registry.get(name) is not None:
+            registry.delete(name)
+        return _cached_numpy_store(path)
+    if not is_server_mode() and NumpyVectorStore.exists(path):
+        _cached_numpy_store(path).drop()
+        forget_numpy_store(path)
+    return ChromaVectorStore(registry, name)
+
+
+def _compare(column: np.ndarray, op: str, value: Any) -> np.ndarray:
+    """object 배열의 각 값을 연산자 하나로 비교한 불리언 배열"""
+    if op == '$eq':
+        return np.asarray(column == value, dtype=bool)
+    if op == '$ne':
+        return np.asarray(column != value, dtype=bool)
+    if op in ('$in', '$nin'):
+        mask = np.zeros(len(column), dtype=bool)
+        for candidate in value:
+            mask |= np.asarray(column == candidate, dtype=bool)
+        return mask if op == '$in' else ~mask
+    if op in ('$gt', '$gte', '$lt', '$lte'):
+        def check(v):
+            try:
+                if op == '$gt':
+                    return v > value
+                if op == '$gte':
+                    return v >= value
+                if op == '$lt':
+                    return v < value
+                return v <= value
+            except TypeError:
+                return False
+        return np.fromiter((v is not None and check(v) for v in column), dtype=bool, count=len(column))
+    raise ValueError(f"지원하지 않는 필터 연산자: {op}")
+
+
+def where_mask(where: Optional[Dict[str, Any]], column: Callable[[str], np.ndarray], size: int) -> np.ndarray:
+    """
+    ChromaDB where 문법($eq/$ne/$in/$nin/$gt/$gte/$lt/$lte, $and/$or)을 불리언 마스크로 변환합니다.
+    (이 모듈의 유일한 where 해석기: NumpyVectorStore와 metadata_matches가 함께 사용)
+
+    Args:
+        where: where 조건
+        column: 메타데이터 키 -> 길이 size의 object 배열 (없는 값은 None)
+        size: 행 수
+    """
+    mask = np.ones(size, dtype=bool)
+    if not where:
+        return mask
+    for key, condition in where.items():
+        if key == '$and':
+            for sub in condition:
+                mask &= where_mask(sub, column, size)
+        elif key == '$or':
+            any_mask = np.zeros(size, dtype=bool)
+            for sub in condition:
+                any_mask |= where_mask(sub, column, size)
+            mask &= any_mask
+        else:
+            if not isinstance(condition, dict):
+                condition = {'$eq': condition}
+            values = column(key)
+            for op, value in condition.items():
+                mask &= _compare(values, op, value)
+    return mask
+
+
+def metadata_matches(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """
+    메타데이터 한 건이 ChromaDB where 조건을 만족하는지 확인합니다.
+    (벡터 저장소 밖에서 같은 필터 문법을 적용할 때 사용)
+    """
+    if not where:
+        return True
+    metadata = metadata or {}
+
+    def column(key):
+        values = np.empty(1, dtype=object)
+        values[0] = metadata.get(key)
+        return values
+
+    return bool(where_mask(where, column, 1)[0])
@@ -0,0 +1,83 @@
+"""
+공유 벡터 저장소 서버 실행 모듈
+
+여러 앱 워커(gunicorn 등)가 같은 저장소 인덱스와 대화 기록을 보도록,
+ChromaDB 서버를 같은 머신에서 실행합니다. 앱은 VECTOR_STORE_MODE=server로 실행하면
+이 서버에 HttpClient로 접속합니다.
+
+사용 예:
+    python vector_store_server.py
+    VECTOR_STORE_MODE=server gunicorn -w 4 app:app
+
+여러 워커로 실행할 때 주의:
+    - 세션 파일(sessions.json), 저장소 인덱스, 대화 기록 컬렉션, 대화 요약 파일은 워커끼리 공유됨
+    - 대화 기록 메모리 색인(memory_index)과 답변 캐시(answer_cache)는 워커 프로세스마다 따로 있고
+      다른 워커의 쓰기로 무효화되지 않음. 같은 세션의 요청이 항상 같은 워커로 가도록 세션 ID 기준
+      고정 라우팅(로드 밸런서의 sticky session 등)을 사용해야 대화 기록 검색이 최신 상태로 유지됨
+      (답변 캐시는 (저장소, 커밋) 기준이라 워커마다 따로 채워질 뿐 잘못된 답을 내지는 않음)
+"""
+
+import os
+import sys
+import time
+import shutil
+import subprocess
+
+from vector_store import VECTOR_STORE_HOST, VECTOR_STORE_PORT
+
+VECTOR_STORE_DATA_PATH = os.environ.get("VECTOR_STORE_DATA_PATH", "./vector_store_data")  # 서버 데이터 저장 경로
+
+
+def build_command(path: str = VECTOR_STORE_DATA_PATH, host: str = VECTOR_STORE_HOST, port: int = VECTOR_STORE_PORT):
+    """
+    chroma 서버 실행 명령을 만듭니다.
+
+    Returns:
+        list 또는 None (chroma CLI를 찾을 수 없는 경우)
+    """
+    executable = shutil.which("chroma")
+    if not executable:
+        return None
+    bind_host = "0.0.0.0" if host not in ("localhost", "127.0.0.1") else host
+    return [executable, "run", "--path", path, "--host", bind_host, "--port", str(port)]
+
+
+def wait_until_ready(host: str = VECTOR_STORE_HOST, port: int = VECTOR_STORE_PORT, timeout: float = 30.0) -> bool:
+    """
+    서버가 heartbeat에 응답할 때까지 기다립니다.
+
+    Returns:
+        bool: 제한 시간 안에 응답하면 True
+    """
+    import chromadb
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            chromadb.HttpClient(host=host, port=port).heartbeat()
+            return True
+        except Exception:
+            time.sleep(0.5)
+    return False
+
+
+def main() -> int:
+    command = build_command()
+    if not command:
+        print("[ERROR] chroma CLI를 찾을 수 없습니다. chromadb 패키지 설치를 확인하세요.")
+        return 1
+    os.makedirs(VECTOR_STORE_DATA_PATH, exist_ok=True)
+    print(f"[INFO] 공유 벡터 저장소 서버 시작: {' '.join(command)}")
+    process = subprocess.Popen(command)
+    try:
+        if wait_until_ready():
+            print(f"[INFO] 공유 벡터 저장소 서버 준비 완료: {VECTOR_STORE_HOST}:{VECTOR_STORE_PORT}")
+        else:
+            print("[WARNING] 서버 응답 확인 시간이 초과되었습니다. 로그를 확인하세요.")
+        return process.wait()
+    except KeyboardInterrupt:
+        process.terminate()
+        return process.wait()
+
+
+if __name__ == '__main__':
+    sys.exit(main())